@@ -0,0 +1,82 @@
+"""
+Micro-benchmark OBDConfirm — escalamiento de batch_outbound_delivery_confirm.
+
+Genera archivos SHP_OBDLV_CONFIRM_DECENTRAL sintéticos (por defecto hasta
+5.000 entregas en un solo archivo, como los confirm de fin de mes) y mide el
+tiempo por entrega en ambos read_mode. Con la cabecera indexada por
+(NombreArchivo, Numero_Entrega) el costo por entrega debe mantenerse plano al
+duplicar el volumen (escalamiento lineal).
+
+Uso (desde ops_ped_ingest_cartoning_sftp/):
+    python -m benchmarks.bench_obdc_confirm
+    python -m benchmarks.bench_obdc_confirm --deliveries 5000 --steps 3
+"""
+
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.abspath(os.path.join(current_dir, "..")))
+
+from src.domain.duckdb_batch_processor import (  # noqa: E402
+    DuckDBBatchProcessor, READ_MODE_NATIVE, READ_MODE_PYTHON,
+)
+from benchmarks.ewm_generator import generate_confirm_file  # noqa: E402
+
+
+def _log(tag: str, msg: str):
+    ts = datetime.now().strftime('%H:%M:%S.%f')[:-3]
+    print(f"[{ts}] [{tag}] {msg}")
+
+
+def run(max_deliveries: int, steps: int):
+    sizes = [max_deliveries // (2 ** s) for s in reversed(range(steps))]
+    processor = DuckDBBatchProcessor()
+    work_dir = tempfile.mkdtemp(prefix='bench_obdc_')
+    results = []
+    try:
+        for n in sizes:
+            processing_dir = os.path.join(work_dir, f'n{n}')
+            os.makedirs(processing_dir)
+            generate_confirm_file(
+                os.path.join(processing_dir, f'SHP_OBDLV_CONFIRM_DECENTRAL_BENCH_{n}.txt'), n)
+
+            for read_mode in (READ_MODE_PYTHON, READ_MODE_NATIVE):
+                t0 = time.perf_counter()
+                result = processor.batch_outbound_delivery_confirm(processing_dir, read_mode=read_mode)
+                elapsed = time.perf_counter() - t0
+                cab = result['Staging_EWM_OBDConfirm_Cabecera'].num_rows
+                assert cab == n, f'{read_mode}: {cab} cabeceras, esperadas {n}'
+                results.append((read_mode, n, elapsed))
+    finally:
+        processor.close()
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    _log('BENCH-OBDC', '========== RESULTADOS ==========')
+    for read_mode in (READ_MODE_PYTHON, READ_MODE_NATIVE):
+        rows = [r for r in results if r[0] == read_mode]
+        base_per = rows[0][2] / rows[0][1]
+        for _, n, elapsed in rows:
+            per = elapsed / n
+            _log('BENCH-OBDC', f'  [{read_mode:>6}] {n:>6} entregas: {elapsed:7.3f}s  '
+                               f'{per * 1e6:8.1f} us/entrega  (x{per / base_per:.2f} vs {rows[0][1]})')
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Micro-benchmark OBDConfirm (escalamiento cabecera)')
+    parser.add_argument('--deliveries', type=int, default=5000,
+                        help='Entregas del archivo más grande (default 5000)')
+    parser.add_argument('--steps', type=int, default=3,
+                        help='Tamaños a medir, duplicando hasta --deliveries (default 3)')
+    args = parser.parse_args()
+    run(args.deliveries, args.steps)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,355 @@
+"""
+Benchmark del pipeline de ingesta — parseo + carga a staging por fuente.
+
+Genera archivos sintéticos (benchmarks.ewm_generator) para cada fuente y
+mide cada combinación (fuente, modo):
+  - native / python : DuckDBBatchProcessor.batch_* con ese read_mode
+  - stream          : DuckDBBatchProcessor.stream_batch (RecordBatchReader)
+  - legacy          : FileParser archivo por archivo (requiere pandas)
+
+La carga va a un destino sustituto de SQL Server (DuckDB o SQLite en disco,
+truncate + insert como staging) para medir el camino completo sin tocar
+producción. Cada caso corre en un proceso nuevo, así el pico de RSS es del
+caso y no de los anteriores.
+
+Reporta archivos/s, filas/s y pico de RSS, y guarda todo en JSON; con
+--compare se contrasta contra un JSON anterior (regresiones entre versiones).
+
+Uso (desde ops_ped_ingest_cartoning_sftp/):
+    python -m benchmarks.bench_pipeline
+    python -m benchmarks.bench_pipeline --files 500 --scale 2 --modes native,stream
+    python -m benchmarks.bench_pipeline --target sqlite --compare benchmarks/results/anterior.json
+"""
+
+import argparse
+import importlib.util
+import json
+import multiprocessing
+import os
+import platform
+import shutil
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.abspath(os.path.join(current_dir, "..")))
+
+import duckdb  # noqa: E402
+import pyarrow as pa  # noqa: E402
+
+from benchmarks.ewm_generator import SOURCES, generate_source  # noqa: E402
+
+
+def _log(tag: str, msg: str):
+    ts = datetime.now().strftime('%H:%M:%S.%f')[:-3]
+    print(f"[{ts}] [{tag}] {msg}")
+
+
+MODES = ('native', 'python', 'stream', 'legacy')
+TARGETS = ('duckdb', 'sqlite', 'none')
+
+# fuente -> (batch_method, parser legacy de FileParser, tablas staging en orden)
+SOURCE_SPECS = {
+    'cart': ('batch_cartoning', 'parse_cartoning_to_dataframe',
+             ['Staging_EWM_Cartoning']),
+    'wave': ('batch_waveconfirm', 'parse_waveconfirm_to_dataframe',
+             ['Staging_EWM_WaveConfirm']),
+    'obd': ('batch_outbound_delivery', 'parse_outbound_delivery_to_dataframes',
+            ['Staging_EWM_OutboundDelivery_Header', 'Staging_EWM_OutboundDelivery_Items']),
+    'obdc': ('batch_outbound_delivery_confirm', 'parse_outbound_delivery_confirm_to_dataframes',
+             ['Staging_EWM_OBDConfirm_Cabecera', 'Staging_EWM_OBDConfirm_Posiciones',
+              'Staging_EWM_OBDConfirm_Control_Posiciones', 'Staging_EWM_OBDConfirm_Unidades_HDR',
+              'Staging_EWM_OBDConfirm_Contenido_Embalaje', 'Staging_EWM_OBDConfirm_Extensiones']),
+}
+
+DEFAULT_OUTPUT_DIR = os.path.join(current_dir, 'results')
+
+
+def _peak_rss_mb():
+    """Pico de memoria residente del proceso en MB (None si no se puede medir)."""
+    try:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+    except ImportError:
+        pass
+    try:
+        import psutil  # Windows: peak working set
+        return psutil.Process().memory_info().peak_wset / (1024 * 1024)
+    except (ImportError, AttributeError):
+        return None
+
+
+# ─── Destino sustituto de SQL Server ─────────────────────────────
+
+class StandInTarget:
+    """Staging local con la misma secuencia que SqlRepository: truncate + insert."""
+
+    def __init__(self, kind: str, path: str):
+        self.kind = kind
+        self.con = None
+        if kind == 'duckdb':
+            self.con = duckdb.connect(path)
+        elif kind == 'sqlite':
+            self.con = sqlite3.connect(path, isolation_level=None)
+            self.con.execute("PRAGMA journal_mode=WAL")
+
+    def close(self):
+        if self.con is not None:
+            self.con.close()
+
+    def truncate(self, table_names: list):
+        if self.con is None:
+            return
+        for name in table_names:
+            self.con.execute(f'DROP TABLE IF EXISTS "{name}"')
+
+    def insert(self, table_name: str, reader: 'pa.RecordBatchReader') -> int:
+        """Carga un RecordBatchReader completo; retorna filas."""
+        if self.kind == 'duckdb':
+            self.con.register('_bench_src', reader)
+            self.con.execute(f'CREATE TABLE "{table_name}" AS SELECT * FROM _bench_src')
+            self.con.unregister('_bench_src')
+            return self.con.execute(f'SELECT COUNT(*) FROM "{table_name}"').fetchone()[0]
+
+        if self.kind == 'sqlite':
+            names = reader.schema.names
+            cols = ', '.join(f'"{n}" TEXT' for n in names)
+            marks = ', '.join('?' * len(names))
+            self.con.execute(f'CREATE TABLE "{table_name}" ({cols})')
+            rows = 0
+            self.con.execute("BEGIN")
+            for batch in reader:
+                self.con.executemany(f'INSERT INTO "{table_name}" VALUES ({marks})',
+                                     zip(*(_sqlite_values(col) for col in batch.columns)))
+                rows += batch.num_rows
+            self.con.execute("COMMIT")
+            return rows
+
+        return sum(batch.num_rows for batch in reader)  # 'none': solo consumir
+
+
+def _sqlite_values(column: 'pa.Array') -> list:
+    """Valores bindeables por sqlite3 (DECIMAL → float, fechas → texto ISO)."""
+    if pa.types.is_decimal(column.type):
+        column = column.cast(pa.float64())
+    elif pa.types.is_temporal(column.type):
+        column = column.cast(pa.string())
+    return column.to_pylist()
+
+
+# ─── Un caso (proceso hijo) ──────────────────────────────────────
+
+def _parse_legacy(parser_name: str, processing_dir: str, tables: list) -> dict:
+    """FileParser archivo por archivo → {tabla: pa.Table} (concat por tabla)."""
+    from src.domain.file_parser import FileParser
+
+    parse = getattr(FileParser, parser_name)
+    parts = {name: [] for name in tables}
+    for fname in sorted(os.listdir(processing_dir)):
+        if not fname.lower().endswith('.txt'):
+            continue
+        result = parse(os.path.join(processing_dir, fname))
+        frames = result if isinstance(result, tuple) else (result,)
+        for name, df in zip(tables, frames):
+            if df is not None and not df.empty:
+                parts[name].append(pa.Table.from_pandas(df, preserve_index=False))
+    return {name: pa.concat_tables(p, promote_options='default')
+            for name, p in parts.items() if p}
+
+
+def _run_case(source: str, mode: str, processing_dir: str, target_kind: str,
+              target_path: str, max_memory_mb: int, files: int) -> dict:
+    from src.domain.duckdb_batch_processor import DuckDBBatchProcessor
+
+    batch_method, parser_name, tables = SOURCE_SPECS[source]
+    result = {'source': source, 'mode': mode, 'target': target_kind, 'files': files}
+    if mode == 'legacy':
+        if importlib.util.find_spec('pandas') is None:
+            result['skipped'] = 'pandas no instalado'
+            return result
+
+    rss_base = _peak_rss_mb()
+    processor = DuckDBBatchProcessor() if mode != 'legacy' else None
+    target = StandInTarget(target_kind, target_path)
+    try:
+        t0 = time.perf_counter()
+        if mode == 'legacy':
+            parsed = _parse_legacy(parser_name, processing_dir, tables)
+            openers = {name: (lambda t=t: t.to_reader()) for name, t in parsed.items()}
+        elif mode == 'stream':
+            openers = processor.stream_batch(batch_method, processing_dir,
+                                             read_mode='native', max_memory_mb=max_memory_mb)
+        else:
+            parsed = getattr(processor, batch_method)(processing_dir, read_mode=mode)
+            openers = {name: (lambda t=t: t.to_reader()) for name, t in parsed.items()}
+        parse_s = time.perf_counter() - t0
+
+        t0 = time.perf_counter()
+        target.truncate(tables)
+        table_rows = {name: target.insert(name, openers[name]()) for name in tables if name in openers}
+        load_s = time.perf_counter() - t0
+    finally:
+        target.close()
+        if processor is not None:
+            processor.close()
+
+    rows = sum(table_rows.values())
+    total_s = parse_s + load_s
+    rss_peak = _peak_rss_mb()
+    result.update({
+        'rows': rows,
+        'tables': table_rows,
+        'parse_s': round(parse_s, 4),
+        'load_s': round(load_s, 4),
+        'total_s': round(total_s, 4),
+        'files_per_s': round(files / total_s, 1) if total_s > 0 else None,
+        'rows_per_s': round(rows / total_s, 1) if total_s > 0 else None,
+        'rss_base_mb': round(rss_base, 1) if rss_base is not None else None,
+        'rss_peak_mb': round(rss_peak, 1) if rss_peak is not None else None,
+    })
+    return result
+
+
+# ─── Orquestación ────────────────────────────────────────────────
+
+def _git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=current_dir,
+                              capture_output=True, text=True, timeout=10).stdout.strip() or None
+    except Exception:
+        return None
+
+
+def _best_of(repeat: int, submit) -> dict:
+    """Corre el caso `repeat` veces (un proceso nuevo cada vez) y deja el más rápido."""
+    best = None
+    for _ in range(repeat):
+        case = submit()
+        if 'skipped' in case:
+            return case
+        if best is None or case['total_s'] < best['total_s']:
+            best = case
+    return best
+
+
+def run(sources: list, modes: list, files: int, scale: float, target: str,
+        max_memory_mb: int, seed: int = 0, repeat: int = 1) -> dict:
+    work_dir = tempfile.mkdtemp(prefix='bench_ewm_')
+    spawn = multiprocessing.get_context('spawn')
+    results = []
+    try:
+        for source in sources:
+            processing_dir = os.path.join(work_dir, source)
+            t0 = time.time()
+            paths = generate_source(source, processing_dir, files, scale, seed)
+            size_mb = sum(os.path.getsize(p) for p in paths) / (1024 * 1024)
+            _log('BENCH', f'{source}: {files} archivos sintéticos ({size_mb:.1f} MB) '
+                          f'en {time.time()-t0:.2f}s')
+
+            for mode in modes:
+                target_path = os.path.join(work_dir, f'target_{source}_{mode}.{target}')
+                def submit():
+                    with ProcessPoolExecutor(max_workers=1, mp_context=spawn) as pool:
+                        return pool.submit(_run_case, source, mode, processing_dir, target,
+                                           target_path, max_memory_mb, files).result()
+                try:
+                    case = _best_of(repeat, submit)
+                except Exception as e:
+                    case = {'source': source, 'mode': mode, 'target': target, 'files': files,
+                            'skipped': f'error: {e}'}
+                case['input_mb'] = round(size_mb, 2)
+                results.append(case)
+                if 'skipped' in case:
+                    _log('BENCH', f'  [{source:>4}/{mode:<6}] omitido: {case["skipped"]}')
+                    continue
+                _log('BENCH', f'  [{source:>4}/{mode:<6}] {case["rows"]:>9} filas  '
+                              f'parse {case["parse_s"]:7.3f}s  load {case["load_s"]:7.3f}s  '
+                              f'{case["files_per_s"]:>8} arch/s  {case["rows_per_s"]:>10} filas/s  '
+                              f'RSS {case["rss_peak_mb"]} MB')
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    return {
+        'meta': {
+            'timestamp': datetime.now().isoformat(timespec='seconds'),
+            'git_revision': _git_revision(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'duckdb': duckdb.__version__,
+            'pyarrow': pa.__version__,
+            'params': {'sources': sources, 'modes': modes, 'files': files, 'scale': scale,
+                       'target': target, 'max_memory_mb': max_memory_mb, 'seed': seed,
+                       'repeat': repeat},
+        },
+        'results': results,
+    }
+
+
+def compare(current: dict, previous: dict):
+    """Imprime filas/s y RSS contra una corrida anterior, por (fuente, modo)."""
+    prev = {(r['source'], r['mode']): r for r in previous.get('results', []) if 'skipped' not in r}
+    _log('BENCH', f'Comparación vs {previous["meta"].get("git_revision")} '
+                  f'({previous["meta"].get("timestamp")}):')
+    for r in current['results']:
+        old = prev.get((r['source'], r['mode']))
+        if 'skipped' in r or old is None or not old.get('rows_per_s'):
+            continue
+        ratio = r['rows_per_s'] / old['rows_per_s']
+        rss = ''
+        if r.get('rss_peak_mb') and old.get('rss_peak_mb'):
+            rss = f'  RSS {old["rss_peak_mb"]} → {r["rss_peak_mb"]} MB'
+        flag = '  << REGRESIÓN' if ratio < 0.9 else ''
+        _log('BENCH', f'  [{r["source"]:>4}/{r["mode"]:<6}] {old["rows_per_s"]:>10} → '
+                      f'{r["rows_per_s"]:>10} filas/s (x{ratio:.2f}){rss}{flag}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark parseo + carga staging por fuente')
+    parser.add_argument('--sources', default=','.join(SOURCES),
+                        help=f'Fuentes separadas por coma (default {",".join(SOURCES)})')
+    parser.add_argument('--modes', default=','.join(MODES),
+                        help=f'Modos separados por coma (default {",".join(MODES)})')
+    parser.add_argument('--files', type=int, default=200, help='Archivos por fuente (default 200)')
+    parser.add_argument('--scale', type=float, default=1.0,
+                        help='Multiplicador de unidades por archivo (default 1.0)')
+    parser.add_argument('--target', choices=TARGETS, default='duckdb',
+                        help='Destino sustituto de SQL Server (default duckdb)')
+    parser.add_argument('--max-memory-mb', type=int, default=512,
+                        help='Tope del modo stream (default 512)')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--repeat', type=int, default=1,
+                        help='Corridas por caso; se reporta la más rápida (default 1)')
+    parser.add_argument('--output', help='JSON de resultados (default benchmarks/results/bench_<ts>.json)')
+    parser.add_argument('--compare', help='JSON de una corrida anterior para comparar')
+    args = parser.parse_args()
+
+    sources = args.sources.split(',')
+    modes = args.modes.split(',')
+    for value, valid in ((sources, SOURCE_SPECS), (modes, MODES)):
+        unknown = [v for v in value if v not in valid]
+        if unknown:
+            parser.error(f'valores inválidos: {unknown} (opciones: {list(valid)})')
+
+    report = run(sources, modes, args.files, args.scale, args.target, args.max_memory_mb,
+                 args.seed, max(1, args.repeat))
+
+    output = args.output or os.path.join(
+        DEFAULT_OUTPUT_DIR, f'bench_{datetime.now():%Y%m%d_%H%M%S}.json')
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
+    _log('BENCH', f'Resultados en {output}')
+
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as f:
+            compare(report, json.load(f))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+"""
+Chequeo StagingSchema — fechas SAP en cero contra la muestra SHP del repo.
+
+SAP entrega '00000000' (o un timestamp en ceros) cuando no hay fecha. Los SP
+antiguos lo convertían a NULL con TRY_CONVERT(DATE, LEFT(..., 8), 112) y la
+fila seguía; la conversión en DuckDB debe hacer lo mismo en vez de mandar la
+cabecera a EWM_Staging_Rechazos. Con un valor basura también: la fila sigue
+en staging con la fecha NULL (y de ahí el SP la pasa a las tablas finales) y
+solo una copia va a rechazos para auditoría.
+
+Toma la muestra SHP_OBDLV_CONFIRM_DECENTRAL_*.txt de esta carpeta, pone en
+cero WSHDRLFDAT / WSHDRWADTI y agrega un valor basura en una copia, y revisa
+en ambos read_mode que:
+  - la copia en cero carga su cabecera con fechas NULL y sin rechazos;
+  - la copia con basura carga las mismas cabeceras, con fechas NULL, y deja
+    una copia de cada una en rechazos.
+
+Uso (desde ops_ped_ingest_cartoning_sftp/):
+    python -m benchmarks.check_staging_schema
+"""
+
+import glob
+import os
+import re
+import shutil
+import sys
+import tempfile
+from datetime import datetime
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+base_dir = os.path.abspath(os.path.join(current_dir, ".."))
+sys.path.insert(0, base_dir)
+
+from src.domain.duckdb_batch_processor import (  # noqa: E402
+    DuckDBBatchProcessor, READ_MODE_NATIVE, READ_MODE_PYTHON,
+)
+from src.domain.staging_schema import StagingSchema  # noqa: E402
+
+CABECERA = 'Staging_EWM_OBDConfirm_Cabecera'
+_DEADLINE = re.compile(r'^(E1BPDLVDEADLN;[^;]*;WSHDR(?:LFDAT|WADTI);)[^;\r\n]*', re.MULTILINE)
+
+
+def _log(tag: str, msg: str):
+    ts = datetime.now().strftime('%H:%M:%S.%f')[:-3]
+    print(f"[{ts}] [{tag}] {msg}")
+
+
+def _write_variant(sample: str, processing_dir: str, date_value: str):
+    """Copia de la muestra con todas las fechas WSHDR reemplazadas por date_value."""
+    os.makedirs(processing_dir)
+    with open(sample, 'r', encoding='utf-8', newline='') as f:
+        content = f.read()
+    content, n = _DEADLINE.subn(lambda m: m.group(1) + date_value, content)
+    assert n, 'la muestra no tiene segmentos E1BPDLVDEADLN WSHDR*'
+    with open(os.path.join(processing_dir, os.path.basename(sample)), 'w',
+              encoding='utf-8', newline='') as f:
+        f.write(content)
+
+
+def run() -> bool:
+    samples = glob.glob(os.path.join(base_dir, 'SHP_OBDLV_CONFIRM_DECENTRAL_*.txt'))
+    assert samples, 'no hay muestra SHP_OBDLV_CONFIRM_DECENTRAL_*.txt'
+    schema = StagingSchema.from_csv(os.path.join(base_dir, 'sql', 'esquema_tablas.csv'))
+    processor = DuckDBBatchProcessor(staging_schema=schema)
+    work_dir = tempfile.mkdtemp(prefix='check_schema_')
+    ok = True
+    loaded = {}  # read_mode -> cabeceras de la copia en cero
+    try:
+        for label, value, expect_reject in ((' zero date', ' 00000000', False),
+                                            (' zero timestamp', ' 00000000000000', False),
+                                            (' garbage', ' 2025AB21', True)):
+            processing_dir = os.path.join(work_dir, label.strip().replace(' ', '_'))
+            _write_variant(samples[0], processing_dir, value)
+            for read_mode in (READ_MODE_PYTHON, READ_MODE_NATIVE):
+                result = processor.batch_outbound_delivery_confirm(processing_dir, read_mode=read_mode)
+                rejects = processor.take_rejects()
+                rejected = rejects.num_rows if rejects is not None else 0
+                cab = result[CABECERA].to_pydict()
+                dates = cab['Fecha_WSHDRLFDAT'] + cab['Fecha_WSHDRWADTI']
+                passed = cab['Numero_Entrega'] and all(d is None for d in dates)
+                if expect_reject:
+                    passed = (passed and cab['Numero_Entrega'] == loaded[read_mode]
+                              and rejected == len(cab['Numero_Entrega']))
+                else:
+                    passed = passed and rejected == 0
+                    loaded.setdefault(read_mode, cab['Numero_Entrega'])
+                ok = ok and bool(passed)
+                _log('CHECK', f'{"OK  " if passed else "FAIL"} {label.strip():<15} {read_mode:<6} '
+                              f'cabeceras={len(cab["Numero_Entrega"])} rechazos={rejected}')
+    finally:
+        processor.close()
+        shutil.rmtree(work_dir, ignore_errors=True)
+    return ok
+
+
+if __name__ == '__main__':
+    sys.exit(0 if run() else 1)
@@ -0,0 +1,183 @@
+"""
+Generador de archivos EWM sintéticos para benchmarks.
+
+Escribe archivos con los mismos segmentos y layout que los reales de cada
+fuente (latin-1, CRLF, ';' como separador):
+  - Cartoning: ZSIEWM_CARTONIZACAO_PEDIDO / _CAIXA / _ITEM (con los números
+    separados por espacios que corrige el regex de limpieza)
+  - WaveConfirm: WaveID;PedidoID;columna0;CajaID
+  - OutboundDelivery: IDoc SHP_OBDLV_SAVE_REPLICA (HDR, ADR1, EXTC, ITEM)
+  - OutboundDeliveryConfirm: IDoc SHP_OBDLV_CONFIRM_DECENTRAL (misma forma
+    que el ejemplo SHP_OBDLV_CONFIRM_DECENTRAL_*.txt de esta carpeta)
+
+La escala se expresa en unidades por archivo (pedidos, filas o entregas);
+el contenido es determinístico por semilla para comparar corridas.
+
+Uso (desde ops_ped_ingest_cartoning_sftp/):
+    python -m benchmarks.ewm_generator --out /tmp/ewm_synth --files 200
+    python -m benchmarks.ewm_generator --out /tmp/ewm_synth --sources obdc --scale 10
+"""
+
+import argparse
+import os
+import random
+import time
+import uuid
+from datetime import datetime, timedelta
+
+
+def _log(tag: str, msg: str):
+    ts = datetime.now().strftime('%H:%M:%S.%f')[:-3]
+    print(f"[{ts}] [{tag}] {msg}")
+
+
+def _open(path: str):
+    return open(path, 'w', encoding='latin-1', newline='\r\n')
+
+
+def generate_cartoning_file(path: str, orders: int, boxes_per_order: int = 2,
+                            items_per_box: int = 3, seed: int = 0):
+    """Pedidos con sus cajas e items (segmentos ZSIEWM_CARTONIZACAO_*)."""
+    rnd = random.Random(seed)
+    with _open(path) as f:
+        for o in range(orders):
+            pedido = f'{seed % 1000:03d}{o:07d}'
+            entrega = str(80000000 + seed * 10000 + o)
+            boxes = boxes_per_order + rnd.randint(0, 1)
+            volumen = rnd.randint(1, 900) / 10
+            peso = rnd.randint(10, 9999) / 100
+            # Volumen/peso pegados con espacios: el parser inserta el ';' faltante
+            f.write(f"ZSIEWM_CARTONIZACAO_PEDIDO;{pedido};{entrega};X;{volumen:.3f};M3;"
+                    f"{peso:.3f}  {boxes};KG;;;;;{boxes};CLI{rnd.randint(1, 99999):05d};\n")
+            for b in range(boxes):
+                caja = f'CX{pedido}{b:02d}'
+                f.write(f"ZSIEWM_CARTONIZACAO_CAIXA;{pedido};{caja};T{rnd.randint(1, 6)};"
+                        f"{volumen / boxes:.3f};M3;{peso / boxes:.3f};KG;;;;"
+                        f"TRK{rnd.randint(10 ** 9, 10 ** 10 - 1)}\n")
+                for i in range(items_per_box):
+                    f.write(f"ZSIEWM_CARTONIZACAO_ITEM;{pedido};{(b * items_per_box + i + 1) * 10};"
+                            f"{caja};{50300000 + rnd.randint(0, 99999)};"
+                            f"Producto {rnd.randint(1, 500)} ção;{rnd.randint(1, 6)};UN\n")
+            f.write("\n")
+
+
+def generate_waveconfirm_file(path: str, rows: int, seed: int = 0):
+    """Filas WaveID;PedidoID;columna0;CajaID (varias cajas por pedido)."""
+    rnd = random.Random(seed)
+    wave = f'W{seed:06d}'
+    with _open(path) as f:
+        for r in range(rows):
+            pedido = f'{seed % 1000:03d}{r // 3:07d}'
+            f.write(f"{wave};{pedido};0;CX{pedido}{r % 3:02d}"
+                    f"{';' if rnd.random() < 0.1 else ''}\n")
+
+
+def generate_outbound_delivery_file(path: str, deliveries: int, items_per_delivery: int = 6,
+                                    seed: int = 0):
+    """IDoc SHP_OBDLV_SAVE_REPLICA: cabecera, dirección, extensiones Z e items."""
+    rnd = random.Random(seed)
+    base_date = datetime(2025, 10, 1) + timedelta(days=seed % 60)
+    with _open(path) as f:
+        for d in range(deliveries):
+            entrega = str(26000000 + seed * 10000 + d)
+            f.write(f"E1BPOBDLVHDR;{entrega};J;LF;CL01;0001; {rnd.randint(1, 99999) / 100:.3f} ;"
+                    f"KG;;;{rnd.randint(1, 9999) / 1000:.3f};\n")
+            adr = [f'{rnd.randint(10 ** 9, 10 ** 10 - 1)}', '', f'Cliente {d}', '', '', '',
+                   '', f'Ciudad {d % 50}', '', '', '', '', '', '', '',
+                   f'Calle {rnd.randint(1, 999)}', '', '', '', '', '', '', '', '', '', '', '',
+                   f'RM{d % 16:02d}']
+            f.write("E1BPADR1;" + ';'.join(adr) + "\n")
+            f.write(f"E1BPEXTC;ZCARRIER_NAME;Transportes {d % 7}\n")
+            f.write(f"E1BPEXTC;ZDELV_DATE;{(base_date + timedelta(days=d % 5)):%Y%m%d}\n")
+            for i in range(1, items_per_delivery + 1):
+                f.write(f"E1BPOBDLVITEM;{entrega};{i * 10:06d};{50300000 + rnd.randint(0, 99999)};"
+                        f"TAN;Producto {i};;; {rnd.randint(1, 9)}.000 ;PC;;;;;;"
+                        f"{rnd.randint(1, 999) / 1000:.3f}\n")
+
+
+def generate_confirm_file(path: str, deliveries: int, items_per_delivery: int = 6, seed: int = 0):
+    """Escribe un IDoc OBDConfirm sintético con la misma forma que los archivos reales.
+
+    Cada entrega lleva HDRCON/HDRCTRLCON, 2 fechas DEADLN, N posiciones
+    ITEMCON/ITEMCTRLCON, 1 HU con su contenido y extensiones E1BPEXTC.
+    """
+    with _open(path) as f:
+        for d in range(deliveries):
+            entrega = str(25000000 + seed * 10000 + d)
+            hu = str(1230000000 + seed * 10000 + d)
+            fecha = '20251031%06d' % (d % 240000)
+            f.write(f"E1SHP_OBDLV_CONFIRM_DECENTR;{entrega};\n")
+            f.write(f"E1BPOBDLVHDRCON;{entrega};\n")
+            f.write(f"E1BPOBDLVHDRCTRLCON;{entrega};\n")
+            f.write(f"E1BPDLVDEADLN;{entrega};WSHDRLFDAT; {fecha};\n")
+            f.write(f"E1BPDLVDEADLN;{entrega};WSHDRWADTI; {fecha};\n")
+            for i in range(1, items_per_delivery + 1):
+                f.write(f"E1BPOBDLVITEMCON;{entrega};{i * 10:06d};{50300000 + i};A1H{i:03d};"
+                        f"         1.000;    1;    1;PC;\n")
+            for i in range(1, items_per_delivery + 1):
+                f.write(f"E1BPOBDLVITEMCTRLCON;{entrega};{i * 10:06d};X;\n")
+            f.write(f"E1BPDLVHDUNHDR;{entrega};{hu};D;;{d:018d};{'1':>39};\n")
+            for i in range(1, items_per_delivery + 1):
+                f.write(f"E1BPDLVHDUNITM;{hu};;{entrega};{i * 10:06d};           1.000;PC;"
+                        f"{50300000 + i};1;\n")
+            f.write(f"E1BPEXTC;ZSHU_ID;{hu};ZSHU_TYPE;Z05;\n")
+            f.write(f"E1BPEXTC;ZFOLIO;{1061600000 + d};;;\n")
+
+
+# clave -> (generador, prefijo de nombre, unidades por archivo por defecto)
+SOURCES = {
+    'cart': (generate_cartoning_file, 'CARTONING_SIMULATION', 40),
+    'wave': (generate_waveconfirm_file, 'WAVE_CONFIRM', 300),
+    'obd': (generate_outbound_delivery_file, 'SHP_OBDLV_SAVE_REPLICA', 20),
+    'obdc': (generate_confirm_file, 'SHP_OBDLV_CONFIRM_DECENTRAL', 20),
+}
+
+
+def generate_source(source: str, directory: str, files: int, scale: float = 1.0,
+                    seed: int = 0) -> list:
+    """Genera `files` archivos de la fuente en directory.
+
+    Args:
+        source: clave de SOURCES ('cart', 'wave', 'obd', 'obdc')
+        scale: multiplicador de las unidades por archivo por defecto
+
+    Returns:
+        Rutas generadas
+    """
+    generator, prefix, units = SOURCES[source]
+    units = max(1, int(units * scale))
+    os.makedirs(directory, exist_ok=True)
+    stamp = datetime(2025, 10, 21)
+    paths = []
+    for n in range(files):
+        file_seed = seed * 100000 + n
+        name = (f"{prefix}_{stamp + timedelta(seconds=n):%Y%m%d%H%M%S}_{n}_"
+                f"{uuid.UUID(int=random.Random(file_seed).getrandbits(128))}.txt")
+        path = os.path.join(directory, name)
+        generator(path, units, seed=file_seed)
+        paths.append(path)
+    return paths
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Genera archivos EWM sintéticos')
+    parser.add_argument('--out', required=True, help='Carpeta destino (una subcarpeta por fuente)')
+    parser.add_argument('--sources', default=','.join(SOURCES),
+                        help=f'Fuentes separadas por coma (default {",".join(SOURCES)})')
+    parser.add_argument('--files', type=int, default=100, help='Archivos por fuente (default 100)')
+    parser.add_argument('--scale', type=float, default=1.0,
+                        help='Multiplicador de unidades por archivo (default 1.0)')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    for source in args.sources.split(','):
+        t0 = time.time()
+        directory = os.path.join(args.out, source)
+        paths = generate_source(source, directory, args.files, args.scale, args.seed)
+        size_mb = sum(os.path.getsize(p) for p in paths) / (1024 * 1024)
+        _log('GEN', f'{source}: {len(paths)} archivos, {size_mb:.1f} MB en {directory} '
+                    f'({time.time()-t0:.2f}s)')
+
+
+if __name__ == "__main__":
+    main()
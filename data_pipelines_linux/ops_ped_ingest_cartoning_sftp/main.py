@@ -14,6 +14,7 @@ from core_shared.security.vault import Vault
 from src.adapters.local_file_client import LocalFileClient
 from src.adapters.sql_repository import SqlRepository
 from src.adapters.state_manager import StateManager
+from src.adapters.sqlite_state_manager import SqliteStateManager
 from src.use_cases.multi_source_pipeline import MultiSourcePipeline, DataSource
 
 def main():
@@ -24,11 +25,69 @@ def main():
     # 2. Configuración Global
     _log('MAIN', 'Cargando configuración...')
     config = {
-        'threads': 3,
-        'poll_interval': 300,
-        'sql_script_path': os.path.join(current_dir, "sql/setup_database.sql")
+        # Fuentes en paralelo (1 = secuencial). 1 hasta su rollout: subir tras medir
+        # el pool de conexiones y los locks de SQL con varias fuentes a la vez
+        'threads': 1,
+        'poll_interval': 300,  # Modo eventos: re-escaneo de seguridad
+        # Llegada por eventos (inotify / polling fallback) en vez de sleep fijo.
+        # Desactivado hasta su rollout: True tras validar stable_ms/debounce_ms con
+        # los escritores reales del SFTP (False = ciclos cada poll_interval)
+        'event_driven': False,
+        'stable_ms': 2000,        # Tamaño sin cambios N ms = archivo completo
+        'debounce_ms': 1000,      # Carpeta quieta N ms antes de liberar lote
+        'max_batch_files': 500,   # Tope de archivos por micro-lote (también en polling)
+        # Tope adaptativo por fuente (AIMD) según lo que tarda SQL en cada lote.
+        # False hasta su rollout (lotes topados solo por max_batch_files); True tras
+        # fijar batch_target_s con las latencias reales de SQL
+        'adaptive_batch': False,
+        'batch_min_files': 10,    # Piso del tope adaptativo
+        'batch_target_s': 30,     # Objetivo de truncate + insert + SP por lote
+        'max_batch_rows': 1000000,  # Tope de filas por lote (promedio de filas/archivo)
+        'move_workers': 8,        # Moves en paralelo a _processing/ y _archive/
+        'max_wait_s': 30,         # Tope de espera con ráfaga continua
+        # Sin eventos: etapas parse → carga → SP → archivo solapadas entre fuentes
+        'pipelined': False,
+        'pipeline_depth': 1,      # Lotes parseados en espera por etapa (memoria: ~1 lote c/u)
+        'fallback_poll_s': 5,     # Intervalo de escaneo sin inotify
+        # Carga de staging: 'bcp' | 'bulk_insert' | 'pandas' (fallback automático a pandas).
+        # 'pandas' hasta su rollout: 'bcp' requiere mssql-tools (bcp) en el runner y
+        # probarlo primero por tabla con bulk_backends
+        'bulk_backend': 'pandas',
+        'bulk_backends': {},      # Override por tabla: {'Staging_EWM_Cartoning': 'pandas'}
+        'bulk_server_dir': None,  # Solo 'bulk_insert': carpeta de carga vista por SQL Server (UNC)
+        # Staging: 'run' = filas con RunID + @RunID en SP (sin TRUNCATE por lote) | 'truncate'
+        # 'run' recién tras aplicar la migración RunID de setup_database.sql y los SP
+        # con @RunID (sin ellos el pipeline vuelve a 'truncate' al arrancar)
+        'staging_isolation': 'truncate',
+        'staging_run_ttl_h': 24,  # Al arrancar: borra corridas de staging más antiguas
+        # Streaming DuckDB → SQL por RecordBatch con tope de memoria por lote
+        # (None = tablas completas en RAM; DataSource.max_memory_mb lo sobreescribe).
+        # None hasta su rollout: p.ej. 512, empezando por OutboundDeliveryConfirm
+        'max_memory_mb': None,
+        'duckdb_temp_dir': os.path.join(current_dir, "_duckdb_spill"),
+        # Catálogo DuckDB persistente: dedup de re-entregas (nombre + hash) antes de SQL.
+        # None (sin catálogo) hasta su rollout: p.ej. os.path.join(current_dir, "ewm_catalog.duckdb")
+        'catalog_path': None,
+        'catalog_retention_days': 90,
+        'catalog_replay': False,  # True = reprocesar: conocidos se recargan desde el catálogo
+        # Journal de lotes en curso: retome automático tras un corte (None = sin retome).
+        # None hasta su rollout: p.ej. os.path.join(current_dir, "ewm_batch_journal.db")
+        'journal_path': None,
+        # Estado de archivos: 'sqlite' (WAL, escrituras O(lote)) | 'json' (state_store.json legacy)
+        # 'json' hasta su rollout: 'sqlite' recién tras migrar el estado a mano con
+        #   python -m src.adapters.sqlite_state_manager state_store.json state_store.db
+        'state_backend': 'json',
+        # Métricas por etapa: endpoint Prometheus local + JSONL rotativo por lote
+        'metrics_port': None,     # None = sin endpoint HTTP; rollout: 9108 (abrir solo a localhost/Prometheus)
+        'metrics_jsonl': os.path.join(current_dir, "metrics", "ewm_batches.jsonl"),
+        'sql_script_path': os.path.join(current_dir, "sql/setup_database.sql"),
+        # Fechas de staging tipadas (DATE) en DuckDB; None = staging en texto.
+        # None hasta su rollout: con sql/esquema_tablas.csv se ejecuta además
+        # staging_schema_sql al arrancar (migra las columnas staging a DATE)
+        'staging_schema_csv': None,
+        'staging_schema_sql': os.path.join(current_dir, "sql/setup_staging_tipada.sql")
     }
-    _log('MAIN', f'  poll_interval={config["poll_interval"]}s')
+    _log('MAIN', f'  poll_interval={config["poll_interval"]}s, threads={config["threads"]}')
 
     # 3. SQL Repository compartido
     _log('MAIN', 'Creando conexión SQL...')
@@ -36,13 +95,26 @@ def main():
         host=Vault.get_secret("SQL_HOST"),
         db=Vault.get_secret("SQL_DB_NAME"),
         user=Vault.get_secret("SQL_USER"),
-        password=Vault.get_secret("SQL_PASS")
+        password=Vault.get_secret("SQL_PASS"),
+        bulk_backend=config['bulk_backend'],
+        bulk_backends=config['bulk_backends'],
+        bulk_server_dir=config['bulk_server_dir'],
     )
 
     # 4. State Manager compartido
-    state_path = os.path.join(current_dir, "state_store.json")
-    state_adapter = StateManager(state_path)
-    state_count = len(state_adapter.state)
+    json_state_path = os.path.join(current_dir, "state_store.json")
+    if config['state_backend'] == 'sqlite':
+        state_path = os.path.join(current_dir, "state_store.db")
+        if os.path.exists(json_state_path):
+            # Sin migrar: arrancar con SQLite vacío reprocesaría todo el historial
+            _log('MAIN', f'ERROR: {json_state_path} sin migrar a {state_path}. Ejecutar antes: '
+                         f'python -m src.adapters.sqlite_state_manager {json_state_path} {state_path}')
+            sys.exit(1)
+        state_adapter = SqliteStateManager(state_path)
+    else:
+        state_path = json_state_path
+        state_adapter = StateManager(state_path)
+    state_count = state_adapter.count()
     _log('MAIN', f'State Manager: {state_count} archivos registrados en {state_path}')
 
     # 5. Configurar fuentes de datos
@@ -54,9 +126,13 @@ def main():
     _log('MAIN', f'  [1] Cartoning: {cart_path}')
     sources.append(DataSource(
         name="Cartoning",
-        file_client=LocalFileClient(cart_path),
+        file_client=LocalFileClient(cart_path, move_workers=config['move_workers'],
+                                    max_batch_files=config['max_batch_files']),
         staging_tables=["Staging_EWM_Cartoning"],
         sp_name="sp_Procesar_Cartoning_EWM",
+        # SP por lote (sp_Procesar_Cartoning_EWM_Lote): None hasta validarlo contra los
+        # resultados del SP por archivo (mismas filas y versiones en finales)
+        batch_sp_name=None,
         batch_method="batch_cartoning",
     ))
 
@@ -65,9 +141,13 @@ def main():
     _log('MAIN', f'  [2] WaveConfirm: {wave_path}')
     sources.append(DataSource(
         name="WaveConfirm",
-        file_client=LocalFileClient(wave_path),
+        file_client=LocalFileClient(wave_path, move_workers=config['move_workers'],
+                                    max_batch_files=config['max_batch_files']),
         staging_tables=["Staging_EWM_WaveConfirm"],
         sp_name="sp_Procesar_WaveConfirm_EWM",
+        # SP por lote (sp_Procesar_WaveConfirm_EWM_Lote): None hasta validarlo contra los
+        # resultados del SP por archivo (mismas filas y versiones en finales)
+        batch_sp_name=None,
         batch_method="batch_waveconfirm",
     ))
 
@@ -76,12 +156,16 @@ def main():
     _log('MAIN', f'  [3] OutboundDelivery: {obd_path}')
     sources.append(DataSource(
         name="OutboundDelivery",
-        file_client=LocalFileClient(obd_path),
+        file_client=LocalFileClient(obd_path, move_workers=config['move_workers'],
+                                    max_batch_files=config['max_batch_files']),
         staging_tables=[
             "Staging_EWM_OutboundDelivery_Header",
             "Staging_EWM_OutboundDelivery_Items",
         ],
         sp_name="sp_Procesar_OutboundDelivery_EWM",
+        # SP por lote (sp_Procesar_OutboundDelivery_EWM_Lote): None hasta validarlo contra los
+        # resultados del SP por archivo (mismas filas y versiones en finales)
+        batch_sp_name=None,
         batch_method="batch_outbound_delivery",
     ))
 
@@ -90,7 +174,8 @@ def main():
     _log('MAIN', f'  [4] OutboundDeliveryConfirm: {obdc_path}')
     sources.append(DataSource(
         name="OutboundDeliveryConfirm",
-        file_client=LocalFileClient(obdc_path),
+        file_client=LocalFileClient(obdc_path, move_workers=config['move_workers'],
+                                    max_batch_files=config['max_batch_files']),
         staging_tables=[
             "Staging_EWM_OBDConfirm_Cabecera",
             "Staging_EWM_OBDConfirm_Posiciones",
@@ -100,7 +185,11 @@ def main():
             "Staging_EWM_OBDConfirm_Extensiones",
         ],
         sp_name="sp_Procesar_OutboundDeliveryConfirm_EWM",
+        # SP por lote (sp_Procesar_OutboundDeliveryConfirm_EWM_Lote): None hasta validarlo contra los
+        # resultados del SP por archivo (mismas filas y versiones en finales)
+        batch_sp_name=None,
         batch_method="batch_outbound_delivery_confirm",
+        # Rollout del streaming: max_memory_mb=1024 (confirm de fin de mes, 6 tablas)
     ))
 
     _log('MAIN', f'{len(sources)} fuentes configuradas. Iniciando pipeline...')
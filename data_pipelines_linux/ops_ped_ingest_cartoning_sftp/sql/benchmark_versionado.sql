@@ -0,0 +1,387 @@
+-- =====================================================================
+-- BENCHMARK: Versionado con MAX(NumeroVersion) correlacionado vs índice
+--            de versiones (EWM_VersionActual_*)
+--
+-- Siembra EWM_Pedidos / EWM_WaveConfirm con millones de filas y mide el
+-- tiempo por archivo de:
+--   - legado : lógica original (SELECT MAX(NumeroVersion) por fila, sin
+--              índices de versión)
+--   - indice : sp_Procesar_*_EWM actuales (búsqueda por clave)
+--   - lote   : sp_Procesar_*_EWM_Lote con todos los archivos en una llamada
+--
+-- ADVERTENCIA: Ejecutar SOLO en una base de PRUEBAS con setup_database.sql
+-- aplicado (ajustar el USE). Vacía las tablas EWM de Cartoning/WaveConfirm.
+-- =====================================================================
+USE OPS_OrquestaFact_Bench;
+GO
+
+IF DB_NAME() = 'OPS_OrquestaFact'
+BEGIN
+    RAISERROR('benchmark_versionado.sql no debe ejecutarse en la base productiva', 16, 1);
+    SET NOEXEC ON;
+END
+GO
+
+SET NOCOUNT ON;
+GO
+
+-- =============================================
+-- 0. PARÁMETROS
+-- =============================================
+DROP TABLE IF EXISTS #Param;
+CREATE TABLE #Param (
+    Pedidos INT,            -- pedidos sembrados
+    Versiones INT,          -- versiones históricas por pedido
+    Archivos INT,           -- archivos simulados por modo
+    PedidosPorArchivo INT,  -- mitad existentes (nueva versión), mitad nuevos
+    CajasPorPedido INT
+);
+INSERT INTO #Param VALUES (1000000, 3, 20, 500, 4);
+
+DROP TABLE IF EXISTS #Resultados;
+CREATE TABLE #Resultados (
+    SP VARCHAR(50),
+    Modo VARCHAR(20),
+    Archivo INT,
+    Milisegundos DECIMAL(18,3)
+);
+GO
+
+-- =============================================
+-- 1. SIEMBRA (tablas finales + índice de versiones)
+-- =============================================
+DECLARE @Pedidos INT, @Versiones INT;
+SELECT @Pedidos = Pedidos, @Versiones = Versiones FROM #Param;
+
+PRINT '[1/5] Sembrando ' + CAST(@Pedidos AS VARCHAR(10)) + ' pedidos x ' + CAST(@Versiones AS VARCHAR(10)) + ' versiones...';
+
+TRUNCATE TABLE dbo.EWM_Items;
+TRUNCATE TABLE dbo.EWM_Cajas;
+TRUNCATE TABLE dbo.EWM_Pedidos;
+TRUNCATE TABLE dbo.EWM_WaveConfirm;
+TRUNCATE TABLE dbo.EWM_VersionActual_Pedido;
+TRUNCATE TABLE dbo.EWM_VersionActual_WaveCaja;
+DELETE FROM dbo.Staging_EWM_Cartoning WHERE NombreArchivo LIKE 'BENCH[_]%';
+DELETE FROM dbo.Staging_EWM_WaveConfirm WHERE NombreArchivo LIKE 'BENCH[_]%';
+
+;WITH N AS (
+    SELECT TOP (@Pedidos) ROW_NUMBER() OVER (ORDER BY (SELECT NULL)) AS n
+    FROM sys.all_objects a CROSS JOIN sys.all_objects b CROSS JOIN sys.all_objects c
+), V AS (
+    SELECT TOP (@Versiones) ROW_NUMBER() OVER (ORDER BY (SELECT NULL)) AS v
+    FROM sys.all_objects
+)
+INSERT INTO dbo.EWM_Pedidos WITH (TABLOCK) (
+    PedidoID, EntregaSAP, VolumenTotal, UnidadVol, PesoTotal, UnidadPeso,
+    TotalBultos, ClienteID, NombreArchivo, NumeroVersion
+)
+SELECT
+    'BENCH' + RIGHT('0000000000' + CAST(N.n AS VARCHAR(10)), 10),
+    CAST(80000000 + N.n AS VARCHAR(20)), 1.5, 'M3', 10.0, 'KG', 2, 'C' + CAST(N.n % 5000 AS VARCHAR(10)),
+    'BENCH_SEED', V.v
+FROM N CROSS JOIN V;
+
+;WITH N AS (
+    SELECT TOP (@Pedidos) ROW_NUMBER() OVER (ORDER BY (SELECT NULL)) AS n
+    FROM sys.all_objects a CROSS JOIN sys.all_objects b CROSS JOIN sys.all_objects c
+), V AS (
+    SELECT TOP (@Versiones) ROW_NUMBER() OVER (ORDER BY (SELECT NULL)) AS v
+    FROM sys.all_objects
+)
+INSERT INTO dbo.EWM_WaveConfirm WITH (TABLOCK) (WaveID, PedidoID, CajaID, NombreArchivo, NumeroVersion, FechaProceso)
+SELECT
+    'W' + CAST(N.n % 1000 AS VARCHAR(10)),
+    'BENCH' + RIGHT('0000000000' + CAST(N.n AS VARCHAR(10)), 10),
+    'BENCH' + RIGHT('0000000000' + CAST(N.n AS VARCHAR(10)), 10) + '-1',
+    'BENCH_SEED', V.v, GETDATE()
+FROM N CROSS JOIN V;
+
+INSERT INTO dbo.EWM_VersionActual_Pedido (PedidoID, NumeroVersion)
+SELECT PedidoID, MAX(NumeroVersion) FROM dbo.EWM_Pedidos GROUP BY PedidoID;
+
+INSERT INTO dbo.EWM_VersionActual_WaveCaja (WaveID, PedidoID, CajaID, NumeroVersion)
+SELECT WaveID, PedidoID, CajaID, MAX(NumeroVersion) FROM dbo.EWM_WaveConfirm GROUP BY WaveID, PedidoID, CajaID;
+
+UPDATE STATISTICS dbo.EWM_Pedidos;
+UPDATE STATISTICS dbo.EWM_WaveConfirm;
+PRINT '    EWM_Pedidos: ' + CAST((SELECT COUNT(*) FROM dbo.EWM_Pedidos) AS VARCHAR(12)) + ' filas';
+PRINT '    EWM_WaveConfirm: ' + CAST((SELECT COUNT(*) FROM dbo.EWM_WaveConfirm) AS VARCHAR(12)) + ' filas';
+GO
+
+-- =============================================
+-- 2. PROCEDIMIENTOS AUXILIARES DEL BENCHMARK
+-- =============================================
+
+-- Carga staging de un archivo simulado (Cartoning + WaveConfirm)
+CREATE OR ALTER PROCEDURE dbo.sp_Bench_CargarStaging
+    @Archivo NVARCHAR(500),
+    @Indice INT,
+    @OffsetNuevos INT
+AS
+BEGIN
+    SET NOCOUNT ON;
+    DECLARE @Pedidos INT, @PedidosPorArchivo INT, @CajasPorPedido INT;
+    SELECT @Pedidos = Pedidos, @PedidosPorArchivo = PedidosPorArchivo, @CajasPorPedido = CajasPorPedido FROM #Param;
+    DECLARE @Mitad INT = @PedidosPorArchivo / 2;
+
+    -- Mitad pedidos existentes (nueva versión), mitad pedidos nuevos
+    SELECT k,
+           CASE WHEN k <= @Mitad THEN ((@Indice * @Mitad + k) % @Pedidos) + 1
+                ELSE @Pedidos + @OffsetNuevos + @Indice * @PedidosPorArchivo + k END AS PedidoNum
+    INTO #P
+    FROM (SELECT TOP (@PedidosPorArchivo) ROW_NUMBER() OVER (ORDER BY (SELECT NULL)) AS k
+          FROM sys.all_objects) K;
+
+    SELECT P.PedidoNum,
+           'BENCH' + RIGHT('0000000000' + CAST(P.PedidoNum AS VARCHAR(10)), 10) AS PedidoID,
+           C.c
+    INTO #C
+    FROM #P P
+    CROSS JOIN (SELECT TOP (@CajasPorPedido) ROW_NUMBER() OVER (ORDER BY (SELECT NULL)) AS c
+                FROM sys.all_objects) C;
+
+    INSERT INTO dbo.Staging_EWM_Cartoning (TipoRegistro, C1, C2, C4, C5, C6, C7, C13, C14, NombreArchivo)
+    SELECT DISTINCT 'ZSIEWM_CARTONIZACAO_PEDIDO', PedidoID, CAST(80000000 + PedidoNum AS VARCHAR(20)),
+           '1.500', 'M3', '10.000', 'KG', CAST(@CajasPorPedido AS VARCHAR(10)), 'C' + CAST(PedidoNum % 5000 AS VARCHAR(10)), @Archivo
+    FROM #C;
+
+    INSERT INTO dbo.Staging_EWM_Cartoning (TipoRegistro, C1, C2, C3, C4, C6, C11, NombreArchivo)
+    SELECT 'ZSIEWM_CARTONIZACAO_CAIXA', PedidoID, PedidoID + '-' + CAST(c AS VARCHAR(10)), 'Z05',
+           '0.375', '2.500', 'TRK' + CAST(PedidoNum AS VARCHAR(10)) + CAST(c AS VARCHAR(10)), @Archivo
+    FROM #C;
+
+    INSERT INTO dbo.Staging_EWM_Cartoning (TipoRegistro, C1, C2, C3, C4, C5, C6, C7, NombreArchivo)
+    SELECT 'ZSIEWM_CARTONIZACAO_ITEM', PedidoID, RIGHT('000000' + CAST(c * 10 AS VARCHAR(10)), 6),
+           PedidoID + '-' + CAST(c AS VARCHAR(10)), CAST(50300000 + c AS VARCHAR(20)), 'SKU BENCH', '1.000', 'PC', @Archivo
+    FROM #C;
+
+    INSERT INTO dbo.Staging_EWM_WaveConfirm (WaveID, PedidoID, columna0, CajaID, columna_extra, NombreArchivo)
+    SELECT 'W' + CAST(PedidoNum % 1000 AS VARCHAR(10)), PedidoID, '', PedidoID + '-' + CAST(c AS VARCHAR(10)), '', @Archivo
+    FROM #C;
+END
+GO
+
+-- Lógica original de Cartoning (MAX correlacionado por fila)
+CREATE OR ALTER PROCEDURE dbo.sp_Bench_Cartoning_Legado
+    @ArchivoActual NVARCHAR(500)
+AS
+BEGIN
+    SET NOCOUNT ON;
+    BEGIN TRANSACTION;
+
+    SELECT DISTINCT
+        C1 AS PedidoID, C2 AS EntregaSAP,
+        TRY_CAST(C4 AS DECIMAL(18,3)) AS Volumen, C5 AS UnidadVol,
+        TRY_CAST(C6 AS DECIMAL(18,3)) AS Peso, C7 AS UnidadPeso,
+        TRY_CAST(C13 AS INT) AS Bultos, C14 AS Cliente, NombreArchivo
+    INTO #TempPedidos
+    FROM Staging_EWM_Cartoning
+    WHERE NombreArchivo = @ArchivoActual AND TipoRegistro = 'ZSIEWM_CARTONIZACAO_PEDIDO';
+
+    INSERT INTO EWM_Pedidos (PedidoID, EntregaSAP, VolumenTotal, UnidadVol, PesoTotal, UnidadPeso,
+                             TotalBultos, ClienteID, NombreArchivo, NumeroVersion)
+    SELECT T.PedidoID, T.EntregaSAP, T.Volumen, T.UnidadVol, T.Peso, T.UnidadPeso,
+           T.Bultos, T.Cliente, T.NombreArchivo,
+           ISNULL((SELECT MAX(NumeroVersion) FROM EWM_Pedidos WHERE PedidoID = T.PedidoID), 0) + 1
+    FROM #TempPedidos T;
+
+    INSERT INTO EWM_Cajas (CajaID, PedidoID, TipoCaja, Volumen, Peso, TrackingCode, NombreArchivo, NumeroVersion)
+    SELECT DISTINCT R.C2, R.C1, R.C3, TRY_CAST(R.C4 AS DECIMAL(18,3)), TRY_CAST(R.C6 AS DECIMAL(18,3)),
+           R.C11, R.NombreArchivo,
+           (SELECT MAX(NumeroVersion) FROM EWM_Pedidos WHERE PedidoID = R.C1)
+    FROM Staging_EWM_Cartoning R
+    WHERE R.NombreArchivo = @ArchivoActual AND R.TipoRegistro = 'ZSIEWM_CARTONIZACAO_CAIXA';
+
+    INSERT INTO EWM_Items (PedidoID, Posicion, CajaID, SKU, Descripcion, Cantidad, Unidad, NombreArchivo, NumeroVersion)
+    SELECT R.C1, R.C2, R.C3, R.C4, R.C5, TRY_CAST(R.C6 AS DECIMAL(18,3)), R.C7, R.NombreArchivo,
+           (SELECT MAX(NumeroVersion) FROM EWM_Pedidos WHERE PedidoID = R.C1)
+    FROM Staging_EWM_Cartoning R
+    WHERE R.NombreArchivo = @ArchivoActual AND R.TipoRegistro = 'ZSIEWM_CARTONIZACAO_ITEM';
+
+    DELETE FROM Staging_EWM_Cartoning WHERE NombreArchivo = @ArchivoActual;
+    INSERT INTO BitacoraArchivos (NombreArchivo, Estado, Mensaje)
+    VALUES (@ArchivoActual, 'PROCESADO', 'Benchmark legado.');
+
+    COMMIT TRANSACTION;
+END
+GO
+
+-- Lógica original de WaveConfirm (MAX correlacionado por fila)
+CREATE OR ALTER PROCEDURE dbo.sp_Bench_WaveConfirm_Legado
+    @ArchivoActual NVARCHAR(500)
+AS
+BEGIN
+    SET NOCOUNT ON;
+    BEGIN TRANSACTION;
+
+    UPDATE Staging_EWM_WaveConfirm
+    SET WaveID = LTRIM(RTRIM(WaveID)), PedidoID = LTRIM(RTRIM(PedidoID)), CajaID = LTRIM(RTRIM(CajaID))
+    WHERE NombreArchivo = @ArchivoActual AND Procesado = 0;
+
+    SELECT s.WaveID, s.PedidoID, s.CajaID, s.NombreArchivo,
+           ISNULL((SELECT MAX(NumeroVersion) FROM EWM_WaveConfirm
+                   WHERE WaveID = s.WaveID AND PedidoID = s.PedidoID AND CajaID = s.CajaID), 0) AS VersionAnterior
+    INTO #TempWaveConfirm
+    FROM Staging_EWM_WaveConfirm s
+    WHERE s.NombreArchivo = @ArchivoActual AND s.Procesado = 0;
+
+    INSERT INTO EWM_WaveConfirm (WaveID, PedidoID, CajaID, NombreArchivo, NumeroVersion, FechaProceso)
+    SELECT WaveID, PedidoID, CajaID, NombreArchivo, VersionAnterior + 1, GETDATE()
+    FROM #TempWaveConfirm;
+
+    DELETE FROM Staging_EWM_WaveConfirm WHERE NombreArchivo = @ArchivoActual;
+    INSERT INTO BitacoraArchivos (NombreArchivo, Estado, Mensaje)
+    VALUES (@ArchivoActual, 'PROCESADO', 'Benchmark legado.');
+
+    COMMIT TRANSACTION;
+END
+GO
+
+-- =============================================
+-- 3. MEDICIÓN: ÍNDICE DE VERSIONES (por archivo y por lote)
+-- =============================================
+PRINT '[2/5] Modo indice (sp_Procesar_*_EWM)...';
+DECLARE @Archivos INT = (SELECT Archivos FROM #Param);
+DECLARE @i INT = 1, @t0 DATETIME2, @Archivo NVARCHAR(500);
+
+WHILE @i <= @Archivos
+BEGIN
+    SET @Archivo = 'BENCH_INDICE_' + CAST(@i AS VARCHAR(10)) + '.txt';
+    EXEC dbo.sp_Bench_CargarStaging @Archivo, @i, 0;
+
+    SET @t0 = SYSDATETIME();
+    EXEC dbo.sp_Procesar_Cartoning_EWM @Archivo;
+    INSERT INTO #Resultados VALUES ('Cartoning', 'indice', @i, DATEDIFF(MICROSECOND, @t0, SYSDATETIME()) / 1000.0);
+
+    SET @t0 = SYSDATETIME();
+    EXEC dbo.sp_Procesar_WaveConfirm_EWM @Archivo;
+    INSERT INTO #Resultados VALUES ('WaveConfirm', 'indice', @i, DATEDIFF(MICROSECOND, @t0, SYSDATETIME()) / 1000.0);
+
+    SET @i += 1;
+END
+
+PRINT '[3/5] Modo lote (sp_Procesar_*_EWM_Lote)...';
+DECLARE @Json NVARCHAR(MAX) = N'[';
+SET @i = 1;
+WHILE @i <= @Archivos
+BEGIN
+    SET @Archivo = 'BENCH_LOTE_' + CAST(@i AS VARCHAR(10)) + '.txt';
+    EXEC dbo.sp_Bench_CargarStaging @Archivo, @i, 10000000;
+    SET @Json += CASE WHEN @i > 1 THEN N',' ELSE N'' END + N'"' + @Archivo + N'"';
+    SET @i += 1;
+END
+SET @Json += N']';
+
+SET @t0 = SYSDATETIME();
+EXEC dbo.sp_Procesar_Cartoning_EWM_Lote @Json;
+INSERT INTO #Resultados VALUES ('Cartoning', 'lote', 0, DATEDIFF(MICROSECOND, @t0, SYSDATETIME()) / 1000.0 / @Archivos);
+
+SET @t0 = SYSDATETIME();
+EXEC dbo.sp_Procesar_WaveConfirm_EWM_Lote @Json;
+INSERT INTO #Resultados VALUES ('WaveConfirm', 'lote', 0, DATEDIFF(MICROSECOND, @t0, SYSDATETIME()) / 1000.0 / @Archivos);
+GO
+
+-- Consistencia: el índice debe coincidir con MAX(NumeroVersion) de las tablas finales
+DECLARE @Desalineados INT;
+SELECT @Desalineados = COUNT(*)
+FROM (SELECT PedidoID, MAX(NumeroVersion) AS NumeroVersion FROM dbo.EWM_Pedidos GROUP BY PedidoID) M
+FULL JOIN dbo.EWM_VersionActual_Pedido V ON V.PedidoID = M.PedidoID
+WHERE V.PedidoID IS NULL OR M.PedidoID IS NULL OR V.NumeroVersion <> M.NumeroVersion;
+PRINT '    Pedidos desalineados en EWM_VersionActual_Pedido: ' + CAST(@Desalineados AS VARCHAR(10));
+
+SELECT @Desalineados = COUNT(*)
+FROM (SELECT WaveID, PedidoID, CajaID, MAX(NumeroVersion) AS NumeroVersion
+      FROM dbo.EWM_WaveConfirm GROUP BY WaveID, PedidoID, CajaID) M
+FULL JOIN dbo.EWM_VersionActual_WaveCaja V
+    ON V.WaveID = M.WaveID AND V.PedidoID = M.PedidoID AND V.CajaID = M.CajaID
+WHERE V.WaveID IS NULL OR M.WaveID IS NULL OR V.NumeroVersion <> M.NumeroVersion;
+PRINT '    Claves desalineadas en EWM_VersionActual_WaveCaja: ' + CAST(@Desalineados AS VARCHAR(10));
+GO
+
+-- =============================================
+-- 4. MEDICIÓN: LEGADO (sin índices de versión, como antes del cambio)
+-- =============================================
+PRINT '[4/5] Modo legado (MAX correlacionado)...';
+ALTER INDEX IX_EWM_Pedidos_Version ON dbo.EWM_Pedidos DISABLE;
+ALTER INDEX IX_WaveConfirm_Version ON dbo.EWM_WaveConfirm DISABLE;
+GO
+
+DECLARE @Archivos INT = (SELECT Archivos FROM #Param);
+DECLARE @i INT = 1, @t0 DATETIME2, @Archivo NVARCHAR(500);
+
+WHILE @i <= @Archivos
+BEGIN
+    SET @Archivo = 'BENCH_LEGADO_' + CAST(@i AS VARCHAR(10)) + '.txt';
+    EXEC dbo.sp_Bench_CargarStaging @Archivo, @i, 20000000;
+
+    SET @t0 = SYSDATETIME();
+    EXEC dbo.sp_Bench_Cartoning_Legado @Archivo;
+    INSERT INTO #Resultados VALUES ('Cartoning', 'legado', @i, DATEDIFF(MICROSECOND, @t0, SYSDATETIME()) / 1000.0);
+
+    SET @t0 = SYSDATETIME();
+    EXEC dbo.sp_Bench_WaveConfirm_Legado @Archivo;
+    INSERT INTO #Resultados VALUES ('WaveConfirm', 'legado', @i, DATEDIFF(MICROSECOND, @t0, SYSDATETIME()) / 1000.0);
+
+    SET @i += 1;
+END
+GO
+
+ALTER INDEX IX_EWM_Pedidos_Version ON dbo.EWM_Pedidos REBUILD;
+ALTER INDEX IX_WaveConfirm_Version ON dbo.EWM_WaveConfirm REBUILD;
+GO
+
+-- El modo legado no mantiene el índice de versiones: realinear
+UPDATE V SET NumeroVersion = M.NumeroVersion, FechaActualizacion = GETDATE()
+FROM dbo.EWM_VersionActual_Pedido V
+INNER JOIN (SELECT PedidoID, MAX(NumeroVersion) AS NumeroVersion FROM dbo.EWM_Pedidos GROUP BY PedidoID) M
+    ON M.PedidoID = V.PedidoID
+WHERE V.NumeroVersion <> M.NumeroVersion;
+
+INSERT INTO dbo.EWM_VersionActual_Pedido (PedidoID, NumeroVersion)
+SELECT M.PedidoID, M.NumeroVersion
+FROM (SELECT PedidoID, MAX(NumeroVersion) AS NumeroVersion FROM dbo.EWM_Pedidos GROUP BY PedidoID) M
+WHERE NOT EXISTS (SELECT 1 FROM dbo.EWM_VersionActual_Pedido V WHERE V.PedidoID = M.PedidoID);
+
+TRUNCATE TABLE dbo.EWM_VersionActual_WaveCaja;
+INSERT INTO dbo.EWM_VersionActual_WaveCaja (WaveID, PedidoID, CajaID, NumeroVersion)
+SELECT WaveID, PedidoID, CajaID, MAX(NumeroVersion) FROM dbo.EWM_WaveConfirm GROUP BY WaveID, PedidoID, CajaID;
+GO
+
+-- =============================================
+-- 5. RESULTADOS
+-- =============================================
+PRINT '[5/5] Resultados (ms por archivo)';
+SELECT
+    SP,
+    Modo,
+    COUNT(*) AS Mediciones,
+    CAST(AVG(Milisegundos) AS DECIMAL(18,2)) AS PromedioMs,
+    CAST(MIN(Milisegundos) AS DECIMAL(18,2)) AS MinimoMs,
+    CAST(MAX(Milisegundos) AS DECIMAL(18,2)) AS MaximoMs
+FROM #Resultados
+GROUP BY SP, Modo
+ORDER BY SP, CASE Modo WHEN 'legado' THEN 1 WHEN 'indice' THEN 2 ELSE 3 END;
+
+SELECT
+    L.SP,
+    CAST(L.Promedio / NULLIF(I.Promedio, 0) AS DECIMAL(10,2)) AS AceleracionIndice,
+    CAST(L.Promedio / NULLIF(B.Promedio, 0) AS DECIMAL(10,2)) AS AceleracionLote
+FROM (SELECT SP, AVG(Milisegundos) AS Promedio FROM #Resultados WHERE Modo = 'legado' GROUP BY SP) L
+LEFT JOIN (SELECT SP, AVG(Milisegundos) AS Promedio FROM #Resultados WHERE Modo = 'indice' GROUP BY SP) I ON I.SP = L.SP
+LEFT JOIN (SELECT SP, AVG(Milisegundos) AS Promedio FROM #Resultados WHERE Modo = 'lote' GROUP BY SP) B ON B.SP = L.SP;
+GO
+
+DROP PROCEDURE IF EXISTS dbo.sp_Bench_CargarStaging;
+DROP PROCEDURE IF EXISTS dbo.sp_Bench_Cartoning_Legado;
+DROP PROCEDURE IF EXISTS dbo.sp_Bench_WaveConfirm_Legado;
+GO
+
+PRINT '';
+PRINT '============================================================';
+PRINT '  BENCHMARK COMPLETADO - ' + CONVERT(VARCHAR, GETDATE(), 120);
+PRINT '  Los datos BENCH quedan en la base de pruebas (reset_all_tables.sql para limpiar)';
+PRINT '============================================================';
+GO
+
+SET NOEXEC OFF;
+GO
@@ -65,6 +65,16 @@ IF OBJECT_ID('dbo.EWM_OBDConfirm_FileHash', 'U') IS NOT NULL
     TRUNCATE TABLE dbo.EWM_OBDConfirm_FileHash;
 GO
 
+-- Índice de versiones vigentes (debe quedar alineado con las tablas finales)
+PRINT '[13/22] Reiniciando índice de versiones (EWM_VersionActual_*)...';
+IF OBJECT_ID('dbo.EWM_VersionActual_Pedido', 'U') IS NOT NULL
+    TRUNCATE TABLE dbo.EWM_VersionActual_Pedido;
+IF OBJECT_ID('dbo.EWM_VersionActual_WaveCaja', 'U') IS NOT NULL
+    TRUNCATE TABLE dbo.EWM_VersionActual_WaveCaja;
+IF OBJECT_ID('dbo.EWM_VersionActual_Carga', 'U') IS NOT NULL
+    UPDATE dbo.EWM_VersionActual_Carga SET NumeroVersion = 0, FechaActualizacion = GETDATE();
+GO
+
 -- =============================================
 -- 2. TABLAS STAGING (se vacían después de las finales)
 -- =============================================
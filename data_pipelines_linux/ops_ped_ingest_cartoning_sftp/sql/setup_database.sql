@@ -242,6 +242,111 @@ BEGIN
 END
 GO
 
+-- =============================================
+-- 2b. ÍNDICE DE VERSIONES VIGENTES
+-- =============================================
+-- Versión actual por clave de negocio, mantenida por los SP en la misma
+-- transacción que inserta la nueva versión. Reemplaza los
+-- SELECT MAX(NumeroVersion) correlacionados por fila (que escalan con el
+-- tamaño de EWM_Pedidos / EWM_WaveConfirm) por una búsqueda por clave.
+-- Se siembra una sola vez desde las tablas finales al crearse.
+
+-- Versión vigente por pedido (Cartoning: EWM_Pedidos / EWM_Cajas / EWM_Items)
+IF OBJECT_ID('dbo.EWM_VersionActual_Pedido', 'U') IS NULL
+BEGIN
+    CREATE TABLE dbo.EWM_VersionActual_Pedido(
+        PedidoID VARCHAR(100) NOT NULL PRIMARY KEY,
+        NumeroVersion INT NOT NULL,
+        FechaActualizacion DATETIME NOT NULL DEFAULT GETDATE()
+    );
+
+    INSERT INTO dbo.EWM_VersionActual_Pedido (PedidoID, NumeroVersion)
+    SELECT PedidoID, MAX(NumeroVersion)
+    FROM dbo.EWM_Pedidos
+    WHERE PedidoID IS NOT NULL
+    GROUP BY PedidoID;
+END
+GO
+
+-- Versión vigente por (WaveID, PedidoID, CajaID) de WaveConfirm
+IF OBJECT_ID('dbo.EWM_VersionActual_WaveCaja', 'U') IS NULL
+BEGIN
+    CREATE TABLE dbo.EWM_VersionActual_WaveCaja(
+        WaveID VARCHAR(50) NOT NULL,
+        PedidoID VARCHAR(50) NOT NULL,
+        CajaID VARCHAR(100) NOT NULL,
+        NumeroVersion INT NOT NULL,
+        FechaActualizacion DATETIME NOT NULL DEFAULT GETDATE(),
+        CONSTRAINT PK_EWM_VersionActual_WaveCaja PRIMARY KEY (WaveID, PedidoID, CajaID)
+    );
+
+    INSERT INTO dbo.EWM_VersionActual_WaveCaja (WaveID, PedidoID, CajaID, NumeroVersion)
+    SELECT WaveID, PedidoID, CajaID, MAX(NumeroVersion)
+    FROM dbo.EWM_WaveConfirm
+    WHERE WaveID IS NOT NULL AND PedidoID IS NOT NULL AND CajaID IS NOT NULL
+    GROUP BY WaveID, PedidoID, CajaID;
+END
+GO
+
+-- Última versión de carga de las entregas (OutboundDelivery y OBDConfirm
+-- versionan por archivo: una versión global por carga, no por Delivery_ID)
+IF OBJECT_ID('dbo.EWM_VersionActual_Carga', 'U') IS NULL
+BEGIN
+    CREATE TABLE dbo.EWM_VersionActual_Carga(
+        Entidad VARCHAR(50) NOT NULL PRIMARY KEY,
+        NumeroVersion INT NOT NULL,
+        FechaActualizacion DATETIME NOT NULL DEFAULT GETDATE()
+    );
+
+    INSERT INTO dbo.EWM_VersionActual_Carga (Entidad, NumeroVersion)
+    SELECT 'OutboundDelivery', ISNULL(MAX(NumeroVersion), 0)
+    FROM dbo.EWM_OutboundDelivery_Header;
+
+    -- La tabla final de OBDConfirm se crea más abajo; en una base nueva parte en 0
+    IF OBJECT_ID('dbo.EWM_OBDConfirm_Cabecera', 'U') IS NOT NULL
+        INSERT INTO dbo.EWM_VersionActual_Carga (Entidad, NumeroVersion)
+        SELECT 'OBDConfirm', ISNULL(MAX(NumeroVersion), 0)
+        FROM dbo.EWM_OBDConfirm_Cabecera;
+    ELSE
+        INSERT INTO dbo.EWM_VersionActual_Carga (Entidad, NumeroVersion)
+        VALUES ('OBDConfirm', 0);
+END
+GO
+
+-- Índices de soporte para consultas por versión (también aplican a bases existentes)
+IF NOT EXISTS (SELECT 1 FROM sys.indexes WHERE name = 'IX_EWM_Pedidos_Version' AND object_id = OBJECT_ID('dbo.EWM_Pedidos'))
+    CREATE INDEX IX_EWM_Pedidos_Version ON dbo.EWM_Pedidos(PedidoID, NumeroVersion DESC);
+IF NOT EXISTS (SELECT 1 FROM sys.indexes WHERE name = 'IX_EWM_Cajas_Version' AND object_id = OBJECT_ID('dbo.EWM_Cajas'))
+    CREATE INDEX IX_EWM_Cajas_Version ON dbo.EWM_Cajas(PedidoID, NumeroVersion DESC) INCLUDE (CajaID);
+IF NOT EXISTS (SELECT 1 FROM sys.indexes WHERE name = 'IX_EWM_Items_Version' AND object_id = OBJECT_ID('dbo.EWM_Items'))
+    CREATE INDEX IX_EWM_Items_Version ON dbo.EWM_Items(PedidoID, NumeroVersion DESC);
+IF NOT EXISTS (SELECT 1 FROM sys.indexes WHERE name = 'IX_WaveConfirm_Version' AND object_id = OBJECT_ID('dbo.EWM_WaveConfirm'))
+    CREATE INDEX IX_WaveConfirm_Version ON dbo.EWM_WaveConfirm(WaveID, PedidoID, CajaID, NumeroVersion DESC);
+GO
+
+-- Aislamiento por corrida (staging Cartoning / WaveConfirm / OutboundDelivery):
+-- cada lote marca sus filas con RunID para que varias fuentes/lotes carguen
+-- staging a la vez sin TRUNCATE; los SP reciben @RunID y la limpieza de un
+-- lote fallido borra solo lo suyo
+DECLARE @TablasRunID TABLE (Nombre SYSNAME PRIMARY KEY);
+INSERT INTO @TablasRunID (Nombre) VALUES
+    ('Staging_EWM_Cartoning'),
+    ('Staging_EWM_WaveConfirm'),
+    ('Staging_EWM_OutboundDelivery_Header'),
+    ('Staging_EWM_OutboundDelivery_Items');
+DECLARE @TablaRunID SYSNAME;
+WHILE EXISTS (SELECT 1 FROM @TablasRunID)
+BEGIN
+    SELECT TOP 1 @TablaRunID = Nombre FROM @TablasRunID ORDER BY Nombre;
+    IF COL_LENGTH('dbo.' + @TablaRunID, 'RunID') IS NULL
+        EXEC('ALTER TABLE dbo.' + @TablaRunID + ' ADD RunID BIGINT NULL');
+    IF NOT EXISTS (SELECT 1 FROM sys.indexes WHERE name = 'IX_' + @TablaRunID + '_RunID'
+                   AND object_id = OBJECT_ID('dbo.' + @TablaRunID))
+        EXEC('CREATE INDEX IX_' + @TablaRunID + '_RunID ON dbo.' + @TablaRunID + '(RunID) INCLUDE (NombreArchivo)');
+    DELETE FROM @TablasRunID WHERE Nombre = @TablaRunID;
+END
+GO
+
 -- =============================================
 -- 3. STORED PROCEDURES
 -- =============================================
@@ -250,7 +355,8 @@ GO
 -- SP PARA CARTONING (Con versionado)
 -- =====================================================
 CREATE OR ALTER PROCEDURE [dbo].[sp_Procesar_Cartoning_EWM]
-    @ArchivoActual NVARCHAR(500)
+    @ArchivoActual NVARCHAR(500),
+    @RunID BIGINT = NULL
 AS
 BEGIN
     SET NOCOUNT ON;
@@ -258,6 +364,13 @@ BEGIN
     BEGIN TRY
         BEGIN TRANSACTION;
 
+        -- Aislamiento por corrida: filas de este archivo que dejó otra corrida
+        -- (lote fallido o interrumpido) no entran a las tablas finales
+        IF @RunID IS NOT NULL
+        BEGIN
+            DELETE FROM Staging_EWM_Cartoning WHERE NombreArchivo = @ArchivoActual AND (RunID IS NULL OR RunID <> @RunID);
+        END;
+
         -- 1. Capturamos Pedidos desde Staging_EWM_Cartoning
         SELECT DISTINCT
             C1 AS PedidoID, C2 AS EntregaSAP, 
@@ -273,7 +386,12 @@ BEGIN
         WHERE NombreArchivo = @ArchivoActual 
           AND TipoRegistro = 'ZSIEWM_CARTONIZACAO_PEDIDO';
 
-        -- 2. Insertamos Pedidos (Logica +1 Version)
+        -- 2. Nueva versión por pedido desde el índice de versiones (Logica +1 Version)
+        SELECT P.PedidoID, ISNULL(V.NumeroVersion, 0) + 1 AS NumeroVersion
+        INTO #VersionPedido
+        FROM (SELECT DISTINCT PedidoID FROM #TempPedidos WHERE PedidoID IS NOT NULL) P
+        LEFT JOIN EWM_VersionActual_Pedido V WITH (UPDLOCK, HOLDLOCK) ON V.PedidoID = P.PedidoID;
+
         INSERT INTO EWM_Pedidos (
             PedidoID, EntregaSAP, VolumenTotal, UnidadVol, PesoTotal, UnidadPeso, 
             TotalBultos, ClienteID, NombreArchivo, NumeroVersion
@@ -281,8 +399,20 @@ BEGIN
         SELECT 
             T.PedidoID, T.EntregaSAP, T.Volumen, T.UnidadVol, T.Peso, T.UnidadPeso, 
             T.Bultos, T.Cliente, T.NombreArchivo,
-            ISNULL((SELECT MAX(NumeroVersion) FROM EWM_Pedidos WHERE PedidoID = T.PedidoID), 0) + 1
-        FROM #TempPedidos T;
+            ISNULL(N.NumeroVersion, 1)
+        FROM #TempPedidos T
+        LEFT JOIN #VersionPedido N ON N.PedidoID = T.PedidoID;
+
+        -- Actualizar índice de versiones (misma transacción)
+        UPDATE V
+        SET NumeroVersion = N.NumeroVersion, FechaActualizacion = GETDATE()
+        FROM EWM_VersionActual_Pedido V
+        INNER JOIN #VersionPedido N ON N.PedidoID = V.PedidoID;
+
+        INSERT INTO EWM_VersionActual_Pedido (PedidoID, NumeroVersion)
+        SELECT N.PedidoID, N.NumeroVersion
+        FROM #VersionPedido N
+        WHERE NOT EXISTS (SELECT 1 FROM EWM_VersionActual_Pedido V WHERE V.PedidoID = N.PedidoID);
 
         -- 3. Insertamos Cajas
         INSERT INTO EWM_Cajas (
@@ -294,8 +424,9 @@ BEGIN
             TRY_CAST(R.C4 AS DECIMAL(18,3)), 
             TRY_CAST(R.C6 AS DECIMAL(18,3)), 
             R.C11, R.NombreArchivo,
-            (SELECT MAX(NumeroVersion) FROM EWM_Pedidos WHERE PedidoID = R.C1)
+            V.NumeroVersion
         FROM Staging_EWM_Cartoning R
+        LEFT JOIN EWM_VersionActual_Pedido V ON V.PedidoID = R.C1
         WHERE R.NombreArchivo = @ArchivoActual 
           AND R.TipoRegistro = 'ZSIEWM_CARTONIZACAO_CAIXA';
 
@@ -308,13 +439,15 @@ BEGIN
             R.C1, R.C2, R.C3, R.C4, R.C5, 
             TRY_CAST(R.C6 AS DECIMAL(18,3)), R.C7, 
             R.NombreArchivo,
-            (SELECT MAX(NumeroVersion) FROM EWM_Pedidos WHERE PedidoID = R.C1)
+            V.NumeroVersion
         FROM Staging_EWM_Cartoning R
+        LEFT JOIN EWM_VersionActual_Pedido V ON V.PedidoID = R.C1
         WHERE R.NombreArchivo = @ArchivoActual 
           AND R.TipoRegistro = 'ZSIEWM_CARTONIZACAO_ITEM';
 
         -- 5. Limpieza y Bitácora
         DROP TABLE IF EXISTS #TempPedidos;
+        DROP TABLE IF EXISTS #VersionPedido;
         
         -- Borrar del staging
         DELETE FROM Staging_EWM_Cartoning WHERE NombreArchivo = @ArchivoActual;
@@ -343,13 +476,21 @@ GO
 -- SP PARA WAVECONFIRM (Con versionado)
 -- =====================================================
 CREATE OR ALTER PROCEDURE sp_Procesar_WaveConfirm_EWM
-    @ArchivoActual NVARCHAR(500)
+    @ArchivoActual NVARCHAR(500),
+    @RunID BIGINT = NULL
 AS
 BEGIN
     SET NOCOUNT ON;
     
     BEGIN TRY
         BEGIN TRANSACTION;
+
+        -- Aislamiento por corrida: filas de este archivo que dejó otra corrida
+        -- (lote fallido o interrumpido) no entran a las tablas finales
+        IF @RunID IS NOT NULL
+        BEGIN
+            DELETE FROM Staging_EWM_WaveConfirm WHERE NombreArchivo = @ArchivoActual AND (RunID IS NULL OR RunID <> @RunID);
+        END;
         
         DECLARE @TotalRegistros INT;
         SELECT @TotalRegistros = COUNT(*) 
@@ -401,15 +542,12 @@ BEGIN
             s.PedidoID,
             s.CajaID,
             s.NombreArchivo,
-            ISNULL(
-                (SELECT MAX(NumeroVersion) 
-                 FROM EWM_WaveConfirm 
-                 WHERE WaveID = s.WaveID 
-                   AND PedidoID = s.PedidoID 
-                   AND CajaID = s.CajaID), 
-                0
-            ) AS VersionAnterior
+            ISNULL(V.NumeroVersion, 0) AS VersionAnterior
         FROM Staging_EWM_WaveConfirm s
+        LEFT JOIN EWM_VersionActual_WaveCaja V WITH (UPDLOCK, HOLDLOCK)
+            ON V.WaveID = s.WaveID 
+           AND V.PedidoID = s.PedidoID 
+           AND V.CajaID = s.CajaID
         WHERE s.NombreArchivo = @ArchivoActual AND s.Procesado = 0;
         
         DECLARE @Procesados INT = @@ROWCOUNT;
@@ -440,6 +578,25 @@ BEGIN
         
         DECLARE @Insertados INT = @@ROWCOUNT;
         PRINT '    Total insertado en EWM_WaveConfirm: ' + CAST(@Insertados AS VARCHAR(10));
+
+        -- Actualizar índice de versiones (misma transacción)
+        UPDATE V
+        SET NumeroVersion = N.NumeroVersion, FechaActualizacion = GETDATE()
+        FROM EWM_VersionActual_WaveCaja V
+        INNER JOIN (
+            SELECT WaveID, PedidoID, CajaID, MAX(VersionAnterior) + 1 AS NumeroVersion
+            FROM #TempWaveConfirm
+            GROUP BY WaveID, PedidoID, CajaID
+        ) N ON N.WaveID = V.WaveID AND N.PedidoID = V.PedidoID AND N.CajaID = V.CajaID;
+
+        INSERT INTO EWM_VersionActual_WaveCaja (WaveID, PedidoID, CajaID, NumeroVersion)
+        SELECT T.WaveID, T.PedidoID, T.CajaID, MAX(T.VersionAnterior) + 1
+        FROM #TempWaveConfirm T
+        WHERE NOT EXISTS (
+            SELECT 1 FROM EWM_VersionActual_WaveCaja V
+            WHERE V.WaveID = T.WaveID AND V.PedidoID = T.PedidoID AND V.CajaID = T.CajaID
+        )
+        GROUP BY T.WaveID, T.PedidoID, T.CajaID;
         
         -- =====================================================
         -- 4. MARCAR STAGING COMO PROCESADO
@@ -493,7 +650,8 @@ GO
 -- SP PARA OUTBOUND DELIVERY (Con versionado)
 -- =====================================================
 CREATE OR ALTER PROCEDURE sp_Procesar_OutboundDelivery_EWM
-    @ArchivoActual NVARCHAR(500)
+    @ArchivoActual NVARCHAR(500),
+    @RunID BIGINT = NULL
 AS
 BEGIN
     SET NOCOUNT ON;
@@ -504,10 +662,19 @@ BEGIN
     
     BEGIN TRY
         BEGIN TRANSACTION;
+
+        -- Aislamiento por corrida: filas de este archivo que dejó otra corrida
+        -- (lote fallido o interrumpido) no entran a las tablas finales
+        IF @RunID IS NOT NULL
+        BEGIN
+            DELETE FROM Staging_EWM_OutboundDelivery_Header WHERE NombreArchivo = @ArchivoActual AND (RunID IS NULL OR RunID <> @RunID);
+            DELETE FROM Staging_EWM_OutboundDelivery_Items WHERE NombreArchivo = @ArchivoActual AND (RunID IS NULL OR RunID <> @RunID);
+        END;
         
-        -- 1. Determinar número de versión
-        SELECT @NumeroVersion = ISNULL(MAX(NumeroVersion), 0) + 1
-        FROM EWM_OutboundDelivery_Header;
+        -- 1. Determinar número de versión (contador de carga, bloqueado hasta el COMMIT)
+        SELECT @NumeroVersion = NumeroVersion + 1
+        FROM EWM_VersionActual_Carga WITH (UPDLOCK, HOLDLOCK)
+        WHERE Entidad = 'OutboundDelivery';
         
         -- 2. Limpiar datos y transformar fecha
         -- Insertar HEADERS
@@ -523,7 +690,7 @@ BEGIN
             LTRIM(RTRIM(Direccion)),
             LTRIM(RTRIM(Region)),
             LTRIM(RTRIM(Transportista)),
-            -- Convertir fecha de formato YYYYMMDD a DATE
+            -- Convertir fecha de formato YYYYMMDD a DATE (con staging tipada ya es DATE)
             TRY_CONVERT(DATE, Fecha_Entrega, 112),
             @NumeroVersion,
             @ArchivoActual
@@ -554,6 +721,12 @@ BEGIN
         
         SET @RegistrosItems = @@ROWCOUNT;
         
+        -- Un archivo sin headers no consume versión (igual que MAX + 1)
+        IF @RegistrosHeader > 0
+            UPDATE EWM_VersionActual_Carga
+            SET NumeroVersion = @NumeroVersion, FechaActualizacion = GETDATE()
+            WHERE Entidad = 'OutboundDelivery';
+        
         -- 4. Registrar en bitácora
         INSERT INTO BitacoraArchivos (NombreArchivo, Estado, Mensaje)
         VALUES (
@@ -698,6 +871,31 @@ BEGIN
 END
 GO
 
+-- Aislamiento por corrida (staging OutboundDeliveryConfirm):
+-- cada lote marca sus filas con RunID para que varias fuentes/lotes carguen
+-- staging a la vez sin TRUNCATE; los SP reciben @RunID y la limpieza de un
+-- lote fallido borra solo lo suyo
+DECLARE @TablasRunID TABLE (Nombre SYSNAME PRIMARY KEY);
+INSERT INTO @TablasRunID (Nombre) VALUES
+    ('Staging_EWM_OBDConfirm_Cabecera'),
+    ('Staging_EWM_OBDConfirm_Posiciones'),
+    ('Staging_EWM_OBDConfirm_Control_Posiciones'),
+    ('Staging_EWM_OBDConfirm_Unidades_HDR'),
+    ('Staging_EWM_OBDConfirm_Contenido_Embalaje'),
+    ('Staging_EWM_OBDConfirm_Extensiones');
+DECLARE @TablaRunID SYSNAME;
+WHILE EXISTS (SELECT 1 FROM @TablasRunID)
+BEGIN
+    SELECT TOP 1 @TablaRunID = Nombre FROM @TablasRunID ORDER BY Nombre;
+    IF COL_LENGTH('dbo.' + @TablaRunID, 'RunID') IS NULL
+        EXEC('ALTER TABLE dbo.' + @TablaRunID + ' ADD RunID BIGINT NULL');
+    IF NOT EXISTS (SELECT 1 FROM sys.indexes WHERE name = 'IX_' + @TablaRunID + '_RunID'
+                   AND object_id = OBJECT_ID('dbo.' + @TablaRunID))
+        EXEC('CREATE INDEX IX_' + @TablaRunID + '_RunID ON dbo.' + @TablaRunID + '(RunID) INCLUDE (NombreArchivo)');
+    DELETE FROM @TablasRunID WHERE Nombre = @TablaRunID;
+END
+GO
+
 -- TABLAS FINALES CON VERSIONADO
 
 -- FINAL: Tabla 1 - Cabecera
@@ -819,7 +1017,8 @@ GO
 -- SP PARA OUTBOUND DELIVERY CONFIRM (Con versionado + idempotencia por hash)
 -- =====================================================
 CREATE OR ALTER PROCEDURE sp_Procesar_OutboundDeliveryConfirm_EWM
-    @ArchivoActual NVARCHAR(500)
+    @ArchivoActual NVARCHAR(500),
+    @RunID BIGINT = NULL
 AS
 BEGIN
     SET NOCOUNT ON;
@@ -848,6 +1047,18 @@ BEGIN
     
     BEGIN TRY
         BEGIN TRANSACTION;
+
+        -- Aislamiento por corrida: filas de este archivo que dejó otra corrida
+        -- (lote fallido o interrumpido) no entran a las tablas finales
+        IF @RunID IS NOT NULL
+        BEGIN
+            DELETE FROM Staging_EWM_OBDConfirm_Cabecera WHERE NombreArchivo = @ArchivoActual AND (RunID IS NULL OR RunID <> @RunID);
+            DELETE FROM Staging_EWM_OBDConfirm_Posiciones WHERE NombreArchivo = @ArchivoActual AND (RunID IS NULL OR RunID <> @RunID);
+            DELETE FROM Staging_EWM_OBDConfirm_Control_Posiciones WHERE NombreArchivo = @ArchivoActual AND (RunID IS NULL OR RunID <> @RunID);
+            DELETE FROM Staging_EWM_OBDConfirm_Unidades_HDR WHERE NombreArchivo = @ArchivoActual AND (RunID IS NULL OR RunID <> @RunID);
+            DELETE FROM Staging_EWM_OBDConfirm_Contenido_Embalaje WHERE NombreArchivo = @ArchivoActual AND (RunID IS NULL OR RunID <> @RunID);
+            DELETE FROM Staging_EWM_OBDConfirm_Extensiones WHERE NombreArchivo = @ArchivoActual AND (RunID IS NULL OR RunID <> @RunID);
+        END;
         
         -- 0. Calcular hash del set de staging (idempotencia por archivo)
         ;WITH TodoStaging AS (
@@ -880,8 +1091,9 @@ BEGIN
         END;
 
         -- 1. Determinar número de versión (global para todo el archivo)
-        SELECT @NumeroVersion = ISNULL(MAX(NumeroVersion), 0) + 1
-        FROM EWM_OBDConfirm_Cabecera;
+        SELECT @NumeroVersion = NumeroVersion + 1
+        FROM EWM_VersionActual_Carga WITH (UPDLOCK, HOLDLOCK)
+        WHERE Entidad = 'OBDConfirm';
         
         -- 2. Insertar CABECERA
         INSERT INTO EWM_OBDConfirm_Cabecera (
@@ -890,8 +1102,9 @@ BEGIN
         )
         SELECT 
             LTRIM(RTRIM(Numero_Entrega)),
-            TRY_CONVERT(DATE, LEFT(LTRIM(RTRIM(Fecha_WSHDRLFDAT)), 8), 112),
-            TRY_CONVERT(DATE, LEFT(LTRIM(RTRIM(Fecha_WSHDRWADTI)), 8), 112),
+            -- CONVERT(..., 112) deja igual el NVARCHAR y pasa a AAAAMMDD la columna DATE (staging tipada)
+            TRY_CONVERT(DATE, LEFT(LTRIM(RTRIM(CONVERT(NVARCHAR(40), Fecha_WSHDRLFDAT, 112))), 8), 112),
+            TRY_CONVERT(DATE, LEFT(LTRIM(RTRIM(CONVERT(NVARCHAR(40), Fecha_WSHDRWADTI, 112))), 8), 112),
             @NumeroVersion,
             @ArchivoActual
         FROM Staging_EWM_OBDConfirm_Cabecera
@@ -1001,6 +1214,11 @@ BEGIN
         INSERT INTO dbo.EWM_OBDConfirm_FileHash (NombreArchivo, HashValor)
         VALUES (@ArchivoActual, @HashActual);
         
+        IF @RegistrosCabecera > 0
+            UPDATE EWM_VersionActual_Carga
+            SET NumeroVersion = @NumeroVersion, FechaActualizacion = GETDATE()
+            WHERE Entidad = 'OBDConfirm';
+        
         -- 9. Registrar en bitácora
         INSERT INTO BitacoraArchivos (NombreArchivo, Estado, Mensaje)
         VALUES (
@@ -1051,6 +1269,738 @@ BEGIN
 END;
 GO
 
+-- =============================================
+-- 4. STORED PROCEDURES POR LOTE (micro-lote completo en una pasada)
+-- =============================================
+-- Reciben la lista de archivos del micro-lote como arreglo JSON ordenado
+-- (@ArchivosJson = '["a.txt","b.txt",...]'). El índice del arreglo define el
+-- orden de versionado: el resultado es el mismo que ejecutar el SP por archivo
+-- en ese orden, pero en una sola transacción y con operaciones set-based.
+-- Si el SP por lote falla se hace ROLLBACK completo y RAISERROR; Python
+-- reintenta entonces con el SP por archivo.
+
+-- =====================================================
+-- SP POR LOTE PARA CARTONING
+-- =====================================================
+CREATE OR ALTER PROCEDURE [dbo].[sp_Procesar_Cartoning_EWM_Lote]
+    @ArchivosJson NVARCHAR(MAX),
+    @RunID BIGINT = NULL
+AS
+BEGIN
+    SET NOCOUNT ON;
+    
+    BEGIN TRY
+        BEGIN TRANSACTION;
+
+        -- 0. Archivos del lote en orden
+        CREATE TABLE #Lote (Orden INT PRIMARY KEY, NombreArchivo NVARCHAR(500) NOT NULL);
+        INSERT INTO #Lote (Orden, NombreArchivo)
+        SELECT CAST([key] AS INT) + 1, [value] FROM OPENJSON(@ArchivosJson);
+
+        -- Aislamiento por corrida: filas de estos archivos que dejó otra corrida
+        -- (lote fallido o interrumpido) no entran a las tablas finales
+        IF @RunID IS NOT NULL
+        BEGIN
+            DELETE S FROM Staging_EWM_Cartoning S
+            INNER JOIN #Lote L ON L.NombreArchivo = S.NombreArchivo
+            WHERE S.RunID IS NULL OR S.RunID <> @RunID;
+        END;
+
+        -- 1. Capturamos Pedidos del lote (mismo DISTINCT que el SP por archivo)
+        SELECT DISTINCT
+            S.C1 AS PedidoID, S.C2 AS EntregaSAP, 
+            TRY_CAST(S.C4 AS DECIMAL(18,3)) AS Volumen, 
+            S.C5 AS UnidadVol,
+            TRY_CAST(S.C6 AS DECIMAL(18,3)) AS Peso, 
+            S.C7 AS UnidadPeso, 
+            TRY_CAST(S.C13 AS INT) AS Bultos, 
+            S.C14 AS Cliente, 
+            S.NombreArchivo,
+            L.Orden
+        INTO #TempPedidos
+        FROM Staging_EWM_Cartoning S
+        INNER JOIN #Lote L ON L.NombreArchivo = S.NombreArchivo
+        WHERE S.TipoRegistro = 'ZSIEWM_CARTONIZACAO_PEDIDO';
+
+        -- 2. Versión previa al lote de cada pedido referenciado (índice de versiones)
+        SELECT P.PedidoID, V.NumeroVersion AS VersionBase
+        INTO #VersionBase
+        FROM (
+            SELECT DISTINCT S.C1 AS PedidoID
+            FROM Staging_EWM_Cartoning S
+            INNER JOIN #Lote L ON L.NombreArchivo = S.NombreArchivo
+        ) P
+        INNER JOIN EWM_VersionActual_Pedido V WITH (UPDLOCK, HOLDLOCK) ON V.PedidoID = P.PedidoID;
+
+        -- 3. Versión por (archivo, pedido): base + posición del archivo entre
+        --    los archivos del lote que traen ese pedido (Lógica +1 Version)
+        SELECT V.Orden, V.PedidoID,
+               ISNULL(B.VersionBase, 0)
+                 + DENSE_RANK() OVER (PARTITION BY V.PedidoID ORDER BY V.Orden) AS NumeroVersion
+        INTO #VersionPedido
+        FROM (SELECT DISTINCT Orden, PedidoID FROM #TempPedidos) V
+        LEFT JOIN #VersionBase B ON B.PedidoID = V.PedidoID;
+
+        -- 4. Insertamos Pedidos
+        INSERT INTO EWM_Pedidos (
+            PedidoID, EntregaSAP, VolumenTotal, UnidadVol, PesoTotal, UnidadPeso, 
+            TotalBultos, ClienteID, NombreArchivo, NumeroVersion
+        )
+        SELECT 
+            T.PedidoID, T.EntregaSAP, T.Volumen, T.UnidadVol, T.Peso, T.UnidadPeso, 
+            T.Bultos, T.Cliente, T.NombreArchivo,
+            ISNULL(V.NumeroVersion, 1)
+        FROM #TempPedidos T
+        LEFT JOIN #VersionPedido V ON V.Orden = T.Orden AND V.PedidoID = T.PedidoID
+        ORDER BY T.Orden;
+
+        -- 5. Insertamos Cajas (versión vigente del pedido al momento del archivo)
+        INSERT INTO EWM_Cajas (
+            CajaID, PedidoID, TipoCaja, Volumen, Peso, TrackingCode, 
+            NombreArchivo, NumeroVersion
+        )
+        SELECT DISTINCT
+            R.C2, R.C1, R.C3, 
+            TRY_CAST(R.C4 AS DECIMAL(18,3)), 
+            TRY_CAST(R.C6 AS DECIMAL(18,3)), 
+            R.C11, R.NombreArchivo,
+            COALESCE(VL.NumeroVersion, B.VersionBase)
+        FROM Staging_EWM_Cartoning R
+        INNER JOIN #Lote L ON L.NombreArchivo = R.NombreArchivo
+        LEFT JOIN #VersionBase B ON B.PedidoID = R.C1
+        OUTER APPLY (
+            SELECT MAX(V.NumeroVersion) AS NumeroVersion
+            FROM #VersionPedido V
+            WHERE V.PedidoID = R.C1 AND V.Orden <= L.Orden
+        ) VL
+        WHERE R.TipoRegistro = 'ZSIEWM_CARTONIZACAO_CAIXA';
+
+        -- 6. Insertamos Items
+        INSERT INTO EWM_Items (
+            PedidoID, Posicion, CajaID, SKU, Descripcion, 
+            Cantidad, Unidad, NombreArchivo, NumeroVersion
+        )
+        SELECT 
+            R.C1, R.C2, R.C3, R.C4, R.C5, 
+            TRY_CAST(R.C6 AS DECIMAL(18,3)), R.C7, 
+            R.NombreArchivo,
+            COALESCE(VL.NumeroVersion, B.VersionBase)
+        FROM Staging_EWM_Cartoning R
+        INNER JOIN #Lote L ON L.NombreArchivo = R.NombreArchivo
+        LEFT JOIN #VersionBase B ON B.PedidoID = R.C1
+        OUTER APPLY (
+            SELECT MAX(V.NumeroVersion) AS NumeroVersion
+            FROM #VersionPedido V
+            WHERE V.PedidoID = R.C1 AND V.Orden <= L.Orden
+        ) VL
+        WHERE R.TipoRegistro = 'ZSIEWM_CARTONIZACAO_ITEM';
+
+        -- 7. Actualizar índice de versiones con la última versión del lote
+        UPDATE V
+        SET NumeroVersion = N.NumeroVersion, FechaActualizacion = GETDATE()
+        FROM EWM_VersionActual_Pedido V
+        INNER JOIN (
+            SELECT PedidoID, MAX(NumeroVersion) AS NumeroVersion
+            FROM #VersionPedido
+            GROUP BY PedidoID
+        ) N ON N.PedidoID = V.PedidoID;
+
+        INSERT INTO EWM_VersionActual_Pedido (PedidoID, NumeroVersion)
+        SELECT N.PedidoID, MAX(N.NumeroVersion)
+        FROM #VersionPedido N
+        WHERE N.PedidoID IS NOT NULL
+          AND NOT EXISTS (SELECT 1 FROM EWM_VersionActual_Pedido V WHERE V.PedidoID = N.PedidoID)
+        GROUP BY N.PedidoID;
+
+        -- 8. Limpieza y Bitácora (una fila por archivo)
+        DELETE S FROM Staging_EWM_Cartoning S
+        INNER JOIN #Lote L ON L.NombreArchivo = S.NombreArchivo;
+
+        INSERT INTO BitacoraArchivos (NombreArchivo, Estado, Mensaje)
+        SELECT NombreArchivo, 'PROCESADO', 'Carga exitosa con versionado (lote).'
+        FROM #Lote
+        ORDER BY Orden;
+
+        DROP TABLE IF EXISTS #TempPedidos;
+        DROP TABLE IF EXISTS #VersionBase;
+        DROP TABLE IF EXISTS #VersionPedido;
+
+        COMMIT TRANSACTION;
+        PRINT '--> [VERSIONADO] Lote Cartoning procesado: ' + CAST((SELECT COUNT(*) FROM #Lote) AS VARCHAR(10)) + ' archivos';
+        
+    END TRY
+    BEGIN CATCH
+        IF @@TRANCOUNT > 0 ROLLBACK TRANSACTION;
+        
+        DECLARE @ErrorMessage NVARCHAR(4000) = ERROR_MESSAGE();
+        PRINT 'ERROR CRITICO (lote Cartoning): ' + @ErrorMessage;
+        RAISERROR(@ErrorMessage, 16, 1);
+    END CATCH
+END
+GO
+
+-- =====================================================
+-- SP POR LOTE PARA WAVECONFIRM
+-- =====================================================
+CREATE OR ALTER PROCEDURE sp_Procesar_WaveConfirm_EWM_Lote
+    @ArchivosJson NVARCHAR(MAX),
+    @RunID BIGINT = NULL
+AS
+BEGIN
+    SET NOCOUNT ON;
+    
+    BEGIN TRY
+        BEGIN TRANSACTION;
+
+        -- 0. Archivos del lote en orden
+        CREATE TABLE #Lote (Orden INT PRIMARY KEY, NombreArchivo NVARCHAR(500) NOT NULL);
+        INSERT INTO #Lote (Orden, NombreArchivo)
+        SELECT CAST([key] AS INT) + 1, [value] FROM OPENJSON(@ArchivosJson);
+
+        -- Aislamiento por corrida: filas de estos archivos que dejó otra corrida
+        -- (lote fallido o interrumpido) no entran a las tablas finales
+        IF @RunID IS NOT NULL
+        BEGIN
+            DELETE S FROM Staging_EWM_WaveConfirm S
+            INNER JOIN #Lote L ON L.NombreArchivo = S.NombreArchivo
+            WHERE S.RunID IS NULL OR S.RunID <> @RunID;
+        END;
+
+        -- 1. Limpieza y validación de datos (todo el lote)
+        DELETE S FROM Staging_EWM_WaveConfirm S
+        INNER JOIN #Lote L ON L.NombreArchivo = S.NombreArchivo
+        WHERE S.Procesado = 0
+          AND (
+              S.WaveID IS NULL OR LTRIM(RTRIM(S.WaveID)) = '' OR
+              S.PedidoID IS NULL OR LTRIM(RTRIM(S.PedidoID)) = '' OR
+              S.CajaID IS NULL OR LTRIM(RTRIM(S.CajaID)) = ''
+          );
+
+        UPDATE S
+        SET WaveID = LTRIM(RTRIM(S.WaveID)),
+            PedidoID = LTRIM(RTRIM(S.PedidoID)),
+            CajaID = LTRIM(RTRIM(S.CajaID))
+        FROM Staging_EWM_WaveConfirm S
+        INNER JOIN #Lote L ON L.NombreArchivo = S.NombreArchivo
+        WHERE S.Procesado = 0;
+
+        -- 2. Versión anterior por registro: versión existente + archivos previos
+        --    del lote que traen la misma (WaveID, PedidoID, CajaID)
+        SELECT 
+            s.WaveID,
+            s.PedidoID,
+            s.CajaID,
+            s.NombreArchivo,
+            L.Orden,
+            ISNULL(B.VersionBase, 0)
+              + DENSE_RANK() OVER (PARTITION BY s.WaveID, s.PedidoID, s.CajaID ORDER BY L.Orden)
+              - 1 AS VersionAnterior
+        INTO #TempWaveConfirm
+        FROM Staging_EWM_WaveConfirm s
+        INNER JOIN #Lote L ON L.NombreArchivo = s.NombreArchivo
+        OUTER APPLY (
+            SELECT V.NumeroVersion AS VersionBase
+            FROM EWM_VersionActual_WaveCaja V WITH (UPDLOCK, HOLDLOCK)
+            WHERE V.WaveID = s.WaveID 
+              AND V.PedidoID = s.PedidoID 
+              AND V.CajaID = s.CajaID
+        ) B
+        WHERE s.Procesado = 0;
+
+        -- 3. Insertar en tabla final con versionado
+        INSERT INTO EWM_WaveConfirm (WaveID, PedidoID, CajaID, NombreArchivo, NumeroVersion, FechaProceso)
+        SELECT WaveID, PedidoID, CajaID, NombreArchivo, VersionAnterior + 1, GETDATE()
+        FROM #TempWaveConfirm
+        ORDER BY Orden;
+
+        DECLARE @Insertados INT = @@ROWCOUNT;
+
+        -- Actualizar índice de versiones (misma transacción)
+        UPDATE V
+        SET NumeroVersion = N.NumeroVersion, FechaActualizacion = GETDATE()
+        FROM EWM_VersionActual_WaveCaja V
+        INNER JOIN (
+            SELECT WaveID, PedidoID, CajaID, MAX(VersionAnterior) + 1 AS NumeroVersion
+            FROM #TempWaveConfirm
+            GROUP BY WaveID, PedidoID, CajaID
+        ) N ON N.WaveID = V.WaveID AND N.PedidoID = V.PedidoID AND N.CajaID = V.CajaID;
+
+        INSERT INTO EWM_VersionActual_WaveCaja (WaveID, PedidoID, CajaID, NumeroVersion)
+        SELECT T.WaveID, T.PedidoID, T.CajaID, MAX(T.VersionAnterior) + 1
+        FROM #TempWaveConfirm T
+        WHERE NOT EXISTS (
+            SELECT 1 FROM EWM_VersionActual_WaveCaja V
+            WHERE V.WaveID = T.WaveID AND V.PedidoID = T.PedidoID AND V.CajaID = T.CajaID
+        )
+        GROUP BY T.WaveID, T.PedidoID, T.CajaID;
+
+        -- 4. Bitácora por archivo (nuevos vs actualizaciones)
+        INSERT INTO BitacoraArchivos (NombreArchivo, Estado, Mensaje)
+        SELECT 
+            L.NombreArchivo, 
+            'PROCESADO', 
+            'WaveConfirm procesado con versionado: ' + 
+            CAST(ISNULL(C.Nuevos, 0) AS VARCHAR(10)) + ' nuevos, ' + 
+            CAST(ISNULL(C.Actualizaciones, 0) AS VARCHAR(10)) + ' actualizaciones'
+        FROM #Lote L
+        LEFT JOIN (
+            SELECT Orden,
+                   SUM(CASE WHEN VersionAnterior = 0 THEN 1 ELSE 0 END) AS Nuevos,
+                   SUM(CASE WHEN VersionAnterior > 0 THEN 1 ELSE 0 END) AS Actualizaciones
+            FROM #TempWaveConfirm
+            GROUP BY Orden
+        ) C ON C.Orden = L.Orden
+        ORDER BY L.Orden;
+
+        -- 5. Borrar del staging
+        DELETE S FROM Staging_EWM_WaveConfirm S
+        INNER JOIN #Lote L ON L.NombreArchivo = S.NombreArchivo;
+
+        DROP TABLE IF EXISTS #TempWaveConfirm;
+
+        COMMIT TRANSACTION;
+        PRINT '--> [VERSIONADO] Lote WaveConfirm procesado: ' + CAST((SELECT COUNT(*) FROM #Lote) AS VARCHAR(10))
+            + ' archivos, ' + CAST(@Insertados AS VARCHAR(10)) + ' registros';
+        
+    END TRY
+    BEGIN CATCH
+        IF @@TRANCOUNT > 0
+            ROLLBACK TRANSACTION;
+        
+        DROP TABLE IF EXISTS #TempWaveConfirm;
+        
+        DECLARE @ErrorMessage NVARCHAR(4000) = ERROR_MESSAGE();
+        PRINT 'ERROR CRITICO (lote WaveConfirm): ' + @ErrorMessage;
+        RAISERROR(@ErrorMessage, 16, 1);
+    END CATCH
+END
+GO
+
+-- =====================================================
+-- SP POR LOTE PARA OUTBOUND DELIVERY
+-- =====================================================
+CREATE OR ALTER PROCEDURE sp_Procesar_OutboundDelivery_EWM_Lote
+    @ArchivosJson NVARCHAR(MAX),
+    @RunID BIGINT = NULL
+AS
+BEGIN
+    SET NOCOUNT ON;
+    
+    DECLARE @VersionBase INT;
+    
+    BEGIN TRY
+        BEGIN TRANSACTION;
+
+        -- 0. Archivos del lote en orden
+        CREATE TABLE #Lote (Orden INT PRIMARY KEY, NombreArchivo NVARCHAR(500) NOT NULL);
+        INSERT INTO #Lote (Orden, NombreArchivo)
+        SELECT CAST([key] AS INT) + 1, [value] FROM OPENJSON(@ArchivosJson);
+
+        -- Aislamiento por corrida: filas de estos archivos que dejó otra corrida
+        -- (lote fallido o interrumpido) no entran a las tablas finales
+        IF @RunID IS NOT NULL
+        BEGIN
+            DELETE S FROM Staging_EWM_OutboundDelivery_Header S
+            INNER JOIN #Lote L ON L.NombreArchivo = S.NombreArchivo
+            WHERE S.RunID IS NULL OR S.RunID <> @RunID;
+            DELETE S FROM Staging_EWM_OutboundDelivery_Items S
+            INNER JOIN #Lote L ON L.NombreArchivo = S.NombreArchivo
+            WHERE S.RunID IS NULL OR S.RunID <> @RunID;
+        END;
+
+        -- 1. Número de versión por archivo. El contador de carga solo avanza
+        --    cuando el archivo trae headers, así que un archivo sin headers no
+        --    consume versión: versión = base + archivos previos con headers + 1
+        SELECT @VersionBase = NumeroVersion
+        FROM EWM_VersionActual_Carga WITH (UPDLOCK, HOLDLOCK)
+        WHERE Entidad = 'OutboundDelivery';
+
+        SELECT 
+            F.Orden,
+            F.NombreArchivo,
+            F.TieneHeader,
+            @VersionBase + 1 + ISNULL(SUM(F.TieneHeader) OVER (
+                ORDER BY F.Orden ROWS BETWEEN UNBOUNDED PRECEDING AND 1 PRECEDING), 0) AS NumeroVersion
+        INTO #VersionArchivo
+        FROM (
+            SELECT L.Orden, L.NombreArchivo,
+                   CASE WHEN EXISTS (
+                       SELECT 1 FROM Staging_EWM_OutboundDelivery_Header H
+                       WHERE H.NombreArchivo = L.NombreArchivo
+                         AND LTRIM(RTRIM(H.Delivery_ID)) <> ''
+                   ) THEN 1 ELSE 0 END AS TieneHeader
+            FROM #Lote L
+        ) F;
+
+        -- 2. Insertar HEADERS
+        INSERT INTO EWM_OutboundDelivery_Header (
+            Delivery_ID, Peso_Bruto, Volumen, Destinatario, Direccion, 
+            Region, Transportista, Fecha_Entrega, NumeroVersion, NombreArchivo
+        )
+        SELECT 
+            LTRIM(RTRIM(S.Delivery_ID)),
+            NULLIF(S.Peso_Bruto, 0),
+            NULLIF(S.Volumen, 0),
+            LTRIM(RTRIM(S.Destinatario)),
+            LTRIM(RTRIM(S.Direccion)),
+            LTRIM(RTRIM(S.Region)),
+            LTRIM(RTRIM(S.Transportista)),
+            TRY_CONVERT(DATE, S.Fecha_Entrega, 112),
+            V.NumeroVersion,
+            V.NombreArchivo
+        FROM Staging_EWM_OutboundDelivery_Header S
+        INNER JOIN #VersionArchivo V ON V.NombreArchivo = S.NombreArchivo
+        WHERE LTRIM(RTRIM(S.Delivery_ID)) <> ''
+        ORDER BY V.Orden;
+
+        -- 3. Insertar ITEMS
+        INSERT INTO EWM_OutboundDelivery_Items (
+            Delivery_ID_FK, Item_Number, Material_SKU, Descripcion,
+            Cantidad, Unidad_Medida, Peso_Neto_Item, NumeroVersion, NombreArchivo
+        )
+        SELECT 
+            LTRIM(RTRIM(S.Delivery_ID_FK)),
+            LTRIM(RTRIM(S.Item_Number)),
+            LTRIM(RTRIM(S.Material_SKU)),
+            LTRIM(RTRIM(S.Descripcion)),
+            NULLIF(S.Cantidad, 0),
+            LTRIM(RTRIM(S.Unidad_Medida)),
+            NULLIF(S.Peso_Neto_Item, 0),
+            V.NumeroVersion,
+            V.NombreArchivo
+        FROM Staging_EWM_OutboundDelivery_Items S
+        INNER JOIN #VersionArchivo V ON V.NombreArchivo = S.NombreArchivo
+        WHERE LTRIM(RTRIM(S.Delivery_ID_FK)) <> ''
+        ORDER BY V.Orden;
+
+        UPDATE EWM_VersionActual_Carga
+        SET NumeroVersion = @VersionBase + (SELECT ISNULL(SUM(TieneHeader), 0) FROM #VersionArchivo),
+            FechaActualizacion = GETDATE()
+        WHERE Entidad = 'OutboundDelivery';
+
+        -- 4. Bitácora por archivo
+        INSERT INTO BitacoraArchivos (NombreArchivo, Estado, Mensaje)
+        SELECT 
+            V.NombreArchivo, 
+            'PROCESADO', 
+            'OutboundDelivery - Headers: ' + CAST(H.Registros AS NVARCHAR) + ' | Items: ' + CAST(I.Registros AS NVARCHAR) + ' | Version: ' + CAST(V.NumeroVersion AS NVARCHAR)
+        FROM #VersionArchivo V
+        CROSS APPLY (
+            SELECT COUNT(*) AS Registros FROM EWM_OutboundDelivery_Header
+            WHERE NombreArchivo = V.NombreArchivo AND NumeroVersion = V.NumeroVersion
+        ) H
+        CROSS APPLY (
+            SELECT COUNT(*) AS Registros FROM EWM_OutboundDelivery_Items
+            WHERE NombreArchivo = V.NombreArchivo AND NumeroVersion = V.NumeroVersion
+        ) I
+        ORDER BY V.Orden;
+
+        -- 5. Limpiar staging
+        DELETE S FROM Staging_EWM_OutboundDelivery_Header S
+        INNER JOIN #Lote L ON L.NombreArchivo = S.NombreArchivo;
+        DELETE S FROM Staging_EWM_OutboundDelivery_Items S
+        INNER JOIN #Lote L ON L.NombreArchivo = S.NombreArchivo;
+
+        DROP TABLE IF EXISTS #VersionArchivo;
+
+        COMMIT TRANSACTION;
+        
+        PRINT '--> [VERSIONADO] Lote OutboundDelivery procesado: ' + CAST((SELECT COUNT(*) FROM #Lote) AS NVARCHAR) + ' archivos';
+        
+    END TRY
+    BEGIN CATCH
+        IF @@TRANCOUNT > 0
+            ROLLBACK TRANSACTION;
+        
+        DECLARE @ErrorMsg NVARCHAR(4000) = ERROR_MESSAGE();
+        PRINT 'ERROR CRITICO (lote OutboundDelivery): ' + @ErrorMsg;
+        RAISERROR(@ErrorMsg, 16, 1);
+    END CATCH
+END;
+GO
+
+-- =====================================================
+-- SP POR LOTE PARA OUTBOUND DELIVERY CONFIRM (idempotencia por hash por archivo)
+-- =====================================================
+CREATE OR ALTER PROCEDURE sp_Procesar_OutboundDeliveryConfirm_EWM_Lote
+    @ArchivosJson NVARCHAR(MAX),
+    @RunID BIGINT = NULL
+AS
+BEGIN
+    SET NOCOUNT ON;
+    
+    -- Garantiza tabla de hash para idempotencia por archivo
+    IF OBJECT_ID('dbo.EWM_OBDConfirm_FileHash', 'U') IS NULL
+    BEGIN
+        CREATE TABLE dbo.EWM_OBDConfirm_FileHash (
+            Id INT IDENTITY(1,1) PRIMARY KEY,
+            NombreArchivo NVARCHAR(1000) NOT NULL,
+            HashValor VARBINARY(64) NOT NULL,
+            FechaCreacion DATETIME NOT NULL DEFAULT GETDATE()
+        );
+        CREATE UNIQUE INDEX UX_EWM_OBDConfirm_FileHash_FileHash
+            ON dbo.EWM_OBDConfirm_FileHash(NombreArchivo, HashValor);
+    END;
+    
+    DECLARE @VersionBase INT;
+    
+    BEGIN TRY
+        BEGIN TRANSACTION;
+
+        -- 0. Archivos del lote en orden
+        CREATE TABLE #Lote (Orden INT PRIMARY KEY, NombreArchivo NVARCHAR(500) NOT NULL);
+        INSERT INTO #Lote (Orden, NombreArchivo)
+        SELECT CAST([key] AS INT) + 1, [value] FROM OPENJSON(@ArchivosJson);
+
+        -- Aislamiento por corrida: filas de estos archivos que dejó otra corrida
+        -- (lote fallido o interrumpido) no entran a las tablas finales
+        IF @RunID IS NOT NULL
+        BEGIN
+            DELETE S FROM Staging_EWM_OBDConfirm_Cabecera S
+            INNER JOIN #Lote L ON L.NombreArchivo = S.NombreArchivo
+            WHERE S.RunID IS NULL OR S.RunID <> @RunID;
+            DELETE S FROM Staging_EWM_OBDConfirm_Posiciones S
+            INNER JOIN #Lote L ON L.NombreArchivo = S.NombreArchivo
+            WHERE S.RunID IS NULL OR S.RunID <> @RunID;
+            DELETE S FROM Staging_EWM_OBDConfirm_Control_Posiciones S
+            INNER JOIN #Lote L ON L.NombreArchivo = S.NombreArchivo
+            WHERE S.RunID IS NULL OR S.RunID <> @RunID;
+            DELETE S FROM Staging_EWM_OBDConfirm_Unidades_HDR S
+            INNER JOIN #Lote L ON L.NombreArchivo = S.NombreArchivo
+            WHERE S.RunID IS NULL OR S.RunID <> @RunID;
+            DELETE S FROM Staging_EWM_OBDConfirm_Contenido_Embalaje S
+            INNER JOIN #Lote L ON L.NombreArchivo = S.NombreArchivo
+            WHERE S.RunID IS NULL OR S.RunID <> @RunID;
+            DELETE S FROM Staging_EWM_OBDConfirm_Extensiones S
+            INNER JOIN #Lote L ON L.NombreArchivo = S.NombreArchivo
+            WHERE S.RunID IS NULL OR S.RunID <> @RunID;
+        END;
+
+        -- 1. Hash por archivo del set de staging (misma fórmula que el SP por archivo)
+        ;WITH TodoStaging AS (
+            SELECT NombreArchivo, 'CAB' AS Tipo, Numero_Entrega, Numero_Posicion = NULL, Pedido_Ref = NULL, Material_SKU = NULL, Cantidad = NULL, Unidad = NULL, HU_Nivel = NULL, ID_Unidad_Manipulacion = NULL, Nivel_HU = NULL, ID_Referencia = NULL, Valor_1 = NULL, Valor_2 = NULL, Valor_3 = NULL
+            FROM Staging_EWM_OBDConfirm_Cabecera
+            UNION ALL
+            SELECT NombreArchivo, 'POS', Numero_Entrega, Numero_Posicion, Pedido_Ref, Material_SKU, Cantidad, Unidad, NULL, NULL, NULL, NULL, NULL, NULL, NULL
+            FROM Staging_EWM_OBDConfirm_Posiciones
+            UNION ALL
+            SELECT NombreArchivo, 'CTL', Numero_Entrega, Numero_Posicion, NULL, NULL, Flag_Confirmacion, NULL, NULL, NULL, NULL, NULL, NULL, NULL, NULL
+            FROM Staging_EWM_OBDConfirm_Control_Posiciones
+            UNION ALL
+            SELECT NombreArchivo, 'UNI', Numero_Entrega, NULL, NULL, NULL, Cantidad_HU, NULL, HU_Nivel, ID_Unidad_Manipulacion, NULL, NULL, NULL, NULL, NULL
+            FROM Staging_EWM_OBDConfirm_Unidades_HDR
+            UNION ALL
+            SELECT NombreArchivo, 'CON', Numero_Entrega, Numero_Posicion, NULL, Material_SKU, Cantidad_Empacada, Unidad, Nivel_HU, NULL, ID_Unidad_Manipulacion_Padre, NULL, NULL, NULL, NULL
+            FROM Staging_EWM_OBDConfirm_Contenido_Embalaje
+            UNION ALL
+            SELECT NombreArchivo, 'EXT', NULL, NULL, NULL, NULL, NULL, NULL, NULL, NULL, NULL, ID_Referencia, Valor_1, Valor_2, Valor_3
+            FROM Staging_EWM_OBDConfirm_Extensiones
+        )
+        SELECT 
+            L.Orden,
+            L.NombreArchivo,
+            HASHBYTES('SHA2_256', STRING_AGG(CAST(CONCAT_WS('|', T.Tipo, ISNULL(LTRIM(RTRIM(T.Numero_Entrega)), ''), ISNULL(LTRIM(RTRIM(T.Numero_Posicion)), ''), ISNULL(LTRIM(RTRIM(T.Pedido_Ref)), ''), ISNULL(LTRIM(RTRIM(T.Material_SKU)), ''), ISNULL(LTRIM(RTRIM(T.Cantidad)), ''), ISNULL(LTRIM(RTRIM(T.Unidad)), ''), ISNULL(LTRIM(RTRIM(T.HU_Nivel)), ''), ISNULL(LTRIM(RTRIM(T.ID_Unidad_Manipulacion)), ''), ISNULL(LTRIM(RTRIM(T.Nivel_HU)), ''), ISNULL(LTRIM(RTRIM(T.ID_Referencia)), ''), ISNULL(LTRIM(RTRIM(T.Valor_1)), ''), ISNULL(LTRIM(RTRIM(T.Valor_2)), ''), ISNULL(LTRIM(RTRIM(T.Valor_3)), '')) AS NVARCHAR(MAX)), '#') WITHIN GROUP (ORDER BY T.Tipo, T.Numero_Entrega, T.Numero_Posicion)) AS HashValor
+        INTO #HashArchivo
+        FROM #Lote L
+        INNER JOIN TodoStaging T ON T.NombreArchivo = L.NombreArchivo
+        GROUP BY L.Orden, L.NombreArchivo;
+
+        -- 2. Archivos a procesar: hash nuevo (los sin cambios no inflan versión)
+        SELECT H.Orden, H.NombreArchivo, H.HashValor,
+               CASE WHEN EXISTS (
+                   SELECT 1 FROM Staging_EWM_OBDConfirm_Cabecera C
+                   WHERE C.NombreArchivo = H.NombreArchivo
+                     AND LTRIM(RTRIM(C.Numero_Entrega)) <> ''
+               ) THEN 1 ELSE 0 END AS TieneCabecera
+        INTO #Procesar
+        FROM #HashArchivo H
+        WHERE NOT EXISTS (
+            SELECT 1 FROM dbo.EWM_OBDConfirm_FileHash F
+            WHERE F.NombreArchivo = H.NombreArchivo AND F.HashValor = H.HashValor
+        );
+
+        IF EXISTS (SELECT 1 FROM #HashArchivo H WHERE NOT EXISTS (SELECT 1 FROM #Procesar P WHERE P.Orden = H.Orden))
+            PRINT '--> Archivos sin cambios omitidos: ' + CAST((SELECT COUNT(*) FROM #HashArchivo) - (SELECT COUNT(*) FROM #Procesar) AS NVARCHAR);
+
+        -- 3. Versión por archivo (el contador de carga solo avanza con cabecera:
+        --    un archivo sin cabecera no consume versión)
+        SELECT @VersionBase = NumeroVersion
+        FROM EWM_VersionActual_Carga WITH (UPDLOCK, HOLDLOCK)
+        WHERE Entidad = 'OBDConfirm';
+
+        SELECT P.Orden, P.NombreArchivo, P.HashValor,
+               @VersionBase + 1 + ISNULL(SUM(P.TieneCabecera) OVER (
+                   ORDER BY P.Orden ROWS BETWEEN UNBOUNDED PRECEDING AND 1 PRECEDING), 0) AS NumeroVersion
+        INTO #VersionArchivo
+        FROM #Procesar P;
+
+        -- 4. Insertar CABECERA
+        INSERT INTO EWM_OBDConfirm_Cabecera (
+            Numero_Entrega, Fecha_WSHDRLFDAT, Fecha_WSHDRWADTI, 
+            NumeroVersion, NombreArchivo
+        )
+        SELECT 
+            LTRIM(RTRIM(S.Numero_Entrega)),
+            -- CONVERT(..., 112) deja igual el NVARCHAR y pasa a AAAAMMDD la columna DATE (staging tipada)
+            TRY_CONVERT(DATE, LEFT(LTRIM(RTRIM(CONVERT(NVARCHAR(40), S.Fecha_WSHDRLFDAT, 112))), 8), 112),
+            TRY_CONVERT(DATE, LEFT(LTRIM(RTRIM(CONVERT(NVARCHAR(40), S.Fecha_WSHDRWADTI, 112))), 8), 112),
+            V.NumeroVersion,
+            V.NombreArchivo
+        FROM Staging_EWM_OBDConfirm_Cabecera S
+        INNER JOIN #VersionArchivo V ON V.NombreArchivo = S.NombreArchivo
+        WHERE LTRIM(RTRIM(S.Numero_Entrega)) <> ''
+        ORDER BY V.Orden;
+
+        -- 5. Insertar POSICIONES
+        INSERT INTO EWM_OBDConfirm_Posiciones (
+            Numero_Entrega, Numero_Posicion, Pedido_Ref, Material_SKU,
+            Cantidad, Unidad, NumeroVersion, NombreArchivo
+        )
+        SELECT 
+            LTRIM(RTRIM(S.Numero_Entrega)),
+            LTRIM(RTRIM(S.Numero_Posicion)),
+            LTRIM(RTRIM(S.Pedido_Ref)),
+            LTRIM(RTRIM(S.Material_SKU)),
+            TRY_CONVERT(DECIMAL(18,3), REPLACE(NULLIF(LTRIM(RTRIM(S.Cantidad)), ''), ',', '.')),
+            LTRIM(RTRIM(S.Unidad)),
+            V.NumeroVersion,
+            V.NombreArchivo
+        FROM Staging_EWM_OBDConfirm_Posiciones S
+        INNER JOIN #VersionArchivo V ON V.NombreArchivo = S.NombreArchivo
+        WHERE LTRIM(RTRIM(S.Numero_Entrega)) <> ''
+        ORDER BY V.Orden;
+
+        -- 6. Insertar CONTROL POSICIONES
+        INSERT INTO EWM_OBDConfirm_Control_Posiciones (
+            Numero_Entrega, Numero_Posicion, Flag_Confirmacion,
+            NumeroVersion, NombreArchivo
+        )
+        SELECT 
+            LTRIM(RTRIM(S.Numero_Entrega)),
+            LTRIM(RTRIM(S.Numero_Posicion)),
+            LTRIM(RTRIM(S.Flag_Confirmacion)),
+            V.NumeroVersion,
+            V.NombreArchivo
+        FROM Staging_EWM_OBDConfirm_Control_Posiciones S
+        INNER JOIN #VersionArchivo V ON V.NombreArchivo = S.NombreArchivo
+        WHERE LTRIM(RTRIM(S.Numero_Entrega)) <> ''
+        ORDER BY V.Orden;
+
+        -- 7. Insertar UNIDADES MANIPULACION
+        INSERT INTO EWM_OBDConfirm_Unidades_HDR (
+            Numero_Entrega, ID_Unidad_Manipulacion, Tipo_Embalaje, HU_Nivel,
+            Numero_Externo, Cantidad_HU, NumeroVersion, NombreArchivo
+        )
+        SELECT 
+            LTRIM(RTRIM(S.Numero_Entrega)),
+            LTRIM(RTRIM(S.ID_Unidad_Manipulacion)),
+            LTRIM(RTRIM(S.Tipo_Embalaje)),
+            LTRIM(RTRIM(S.HU_Nivel)),
+            LTRIM(RTRIM(S.Numero_Externo)),
+            TRY_CONVERT(DECIMAL(18,3), REPLACE(NULLIF(LTRIM(RTRIM(S.Cantidad_HU)), ''), ',', '.')),
+            V.NumeroVersion,
+            V.NombreArchivo
+        FROM Staging_EWM_OBDConfirm_Unidades_HDR S
+        INNER JOIN #VersionArchivo V ON V.NombreArchivo = S.NombreArchivo
+        WHERE LTRIM(RTRIM(S.Numero_Entrega)) <> ''
+        ORDER BY V.Orden;
+
+        -- 8. Insertar CONTENIDO EMBALAJE
+        INSERT INTO EWM_OBDConfirm_Contenido_Embalaje (
+            ID_Unidad_Manipulacion_Padre, ID_Unidad_Manipulacion_Hijo,
+            Numero_Entrega, Numero_Posicion, Cantidad_Empacada, Unidad,
+            Material_SKU, Nivel_HU, NumeroVersion, NombreArchivo
+        )
+        SELECT 
+            LTRIM(RTRIM(S.ID_Unidad_Manipulacion_Padre)),
+            LTRIM(RTRIM(S.ID_Unidad_Manipulacion_Hijo)),
+            LTRIM(RTRIM(S.Numero_Entrega)),
+            LTRIM(RTRIM(S.Numero_Posicion)),
+            TRY_CONVERT(DECIMAL(18,3), REPLACE(NULLIF(LTRIM(RTRIM(S.Cantidad_Empacada)), ''), ',', '.')),
+            LTRIM(RTRIM(S.Unidad)),
+            LTRIM(RTRIM(S.Material_SKU)),
+            LTRIM(RTRIM(S.Nivel_HU)),
+            V.NumeroVersion,
+            V.NombreArchivo
+        FROM Staging_EWM_OBDConfirm_Contenido_Embalaje S
+        INNER JOIN #VersionArchivo V ON V.NombreArchivo = S.NombreArchivo
+        ORDER BY V.Orden;
+
+        -- 9. Insertar EXTENSIONES
+        INSERT INTO EWM_OBDConfirm_Extensiones (
+            Nombre_Campo, ID_Referencia, Valor_1, Valor_2, Valor_3,
+            NumeroVersion, NombreArchivo
+        )
+        SELECT 
+            LTRIM(RTRIM(S.Nombre_Campo)),
+            LTRIM(RTRIM(S.ID_Referencia)),
+            LTRIM(RTRIM(S.Valor_1)),
+            LTRIM(RTRIM(S.Valor_2)),
+            LTRIM(RTRIM(S.Valor_3)),
+            V.NumeroVersion,
+            V.NombreArchivo
+        FROM Staging_EWM_OBDConfirm_Extensiones S
+        INNER JOIN #VersionArchivo V ON V.NombreArchivo = S.NombreArchivo
+        ORDER BY V.Orden;
+
+        -- 10. Registrar hash de cada archivo procesado y avanzar el contador de carga
+        INSERT INTO dbo.EWM_OBDConfirm_FileHash (NombreArchivo, HashValor)
+        SELECT NombreArchivo, HashValor FROM #VersionArchivo ORDER BY Orden;
+
+        UPDATE EWM_VersionActual_Carga
+        SET NumeroVersion = @VersionBase + (SELECT ISNULL(SUM(TieneCabecera), 0) FROM #Procesar),
+            FechaActualizacion = GETDATE()
+        WHERE Entidad = 'OBDConfirm';
+
+        -- 11. Bitácora por archivo
+        INSERT INTO BitacoraArchivos (NombreArchivo, Estado, Mensaje)
+        SELECT 
+            V.NombreArchivo, 
+            'PROCESADO', 
+            'OBDConfirm - Cab:' + CAST(C1.N AS NVARCHAR) + 
+            ' | Pos:' + CAST(C2.N AS NVARCHAR) + 
+            ' | Ctrl:' + CAST(C3.N AS NVARCHAR) + 
+            ' | Units:' + CAST(C4.N AS NVARCHAR) + 
+            ' | Cont:' + CAST(C5.N AS NVARCHAR) + 
+            ' | Ext:' + CAST(C6.N AS NVARCHAR) + 
+            ' | Ver:' + CAST(V.NumeroVersion AS NVARCHAR)
+        FROM #VersionArchivo V
+        CROSS APPLY (SELECT COUNT(*) AS N FROM EWM_OBDConfirm_Cabecera WHERE NombreArchivo = V.NombreArchivo AND NumeroVersion = V.NumeroVersion) C1
+        CROSS APPLY (SELECT COUNT(*) AS N FROM EWM_OBDConfirm_Posiciones WHERE NombreArchivo = V.NombreArchivo AND NumeroVersion = V.NumeroVersion) C2
+        CROSS APPLY (SELECT COUNT(*) AS N FROM EWM_OBDConfirm_Control_Posiciones WHERE NombreArchivo = V.NombreArchivo AND NumeroVersion = V.NumeroVersion) C3
+        CROSS APPLY (SELECT COUNT(*) AS N FROM EWM_OBDConfirm_Unidades_HDR WHERE NombreArchivo = V.NombreArchivo AND NumeroVersion = V.NumeroVersion) C4
+        CROSS APPLY (SELECT COUNT(*) AS N FROM EWM_OBDConfirm_Contenido_Embalaje WHERE NombreArchivo = V.NombreArchivo AND NumeroVersion = V.NumeroVersion) C5
+        CROSS APPLY (SELECT COUNT(*) AS N FROM EWM_OBDConfirm_Extensiones WHERE NombreArchivo = V.NombreArchivo AND NumeroVersion = V.NumeroVersion) C6
+        ORDER BY V.Orden;
+
+        -- 12. Limpiar staging (incluye archivos omitidos por hash)
+        DELETE S FROM Staging_EWM_OBDConfirm_Cabecera S INNER JOIN #Lote L ON L.NombreArchivo = S.NombreArchivo;
+        DELETE S FROM Staging_EWM_OBDConfirm_Posiciones S INNER JOIN #Lote L ON L.NombreArchivo = S.NombreArchivo;
+        DELETE S FROM Staging_EWM_OBDConfirm_Control_Posiciones S INNER JOIN #Lote L ON L.NombreArchivo = S.NombreArchivo;
+        DELETE S FROM Staging_EWM_OBDConfirm_Unidades_HDR S INNER JOIN #Lote L ON L.NombreArchivo = S.NombreArchivo;
+        DELETE S FROM Staging_EWM_OBDConfirm_Contenido_Embalaje S INNER JOIN #Lote L ON L.NombreArchivo = S.NombreArchivo;
+        DELETE S FROM Staging_EWM_OBDConfirm_Extensiones S INNER JOIN #Lote L ON L.NombreArchivo = S.NombreArchivo;
+
+        DROP TABLE IF EXISTS #HashArchivo;
+        DROP TABLE IF EXISTS #Procesar;
+        DROP TABLE IF EXISTS #VersionArchivo;
+
+        COMMIT TRANSACTION;
+        
+        PRINT '--> [VERSIONADO] Lote OutboundDeliveryConfirm procesado: ' + CAST((SELECT COUNT(*) FROM #Lote) AS NVARCHAR) + ' archivos';
+        
+    END TRY
+    BEGIN CATCH
+        IF @@TRANCOUNT > 0
+            ROLLBACK TRANSACTION;
+        
+        DECLARE @ErrorMsg NVARCHAR(4000) = ERROR_MESSAGE();
+        PRINT 'ERROR CRITICO (lote OBDConfirm): ' + @ErrorMsg;
+        RAISERROR(@ErrorMsg, 16, 1);
+    END CATCH
+END;
+GO
+
 PRINT '=============================================';
 PRINT 'SCHEMA COMPLETO CREADO EXITOSAMENTE';
 PRINT '=============================================';
@@ -1082,11 +2032,20 @@ PRINT '  - EWM_OBDConfirm_Unidades_HDR';
 PRINT '  - EWM_OBDConfirm_Contenido_Embalaje';
 PRINT '  - EWM_OBDConfirm_Extensiones';
 PRINT '';
-PRINT 'STORED PROCEDURES (4):';
+PRINT 'INDICE DE VERSIONES (3):';
+PRINT '  - EWM_VersionActual_Pedido';
+PRINT '  - EWM_VersionActual_WaveCaja';
+PRINT '  - EWM_VersionActual_Carga';
+PRINT '';
+PRINT 'STORED PROCEDURES (8):';
 PRINT '  - sp_Procesar_Cartoning_EWM';
 PRINT '  - sp_Procesar_WaveConfirm_EWM';
 PRINT '  - sp_Procesar_OutboundDelivery_EWM';
 PRINT '  - sp_Procesar_OutboundDeliveryConfirm_EWM';
+PRINT '  - sp_Procesar_Cartoning_EWM_Lote';
+PRINT '  - sp_Procesar_WaveConfirm_EWM_Lote';
+PRINT '  - sp_Procesar_OutboundDelivery_EWM_Lote';
+PRINT '  - sp_Procesar_OutboundDeliveryConfirm_EWM_Lote';
 PRINT '';
 PRINT 'Todas las tablas incluyen versionado automatico';
 PRINT '=============================================';
@@ -0,0 +1,56 @@
+USE OPS_OrquestaFact;
+GO
+
+-- =============================================
+-- STAGING TIPADA (opcional)
+-- Se ejecuta después de setup_database.sql solo si el pipeline corre con
+-- config['staging_schema_csv'] (tipos de sql/esquema_tablas.csv aplicados en
+-- DuckDB). Sin esa opción las columnas staging siguen en NVARCHAR.
+-- =============================================
+
+-- Rechazos de tipo: copia de auditoría de las filas con un valor que DuckDB
+-- no pudo convertir. La fila sigue en staging con esa columna en NULL; acá
+-- queda la fila original en JSON, las columnas que fallaron, el archivo y el
+-- RunID del lote
+IF OBJECT_ID('dbo.EWM_Staging_Rechazos', 'U') IS NULL
+BEGIN
+    CREATE TABLE dbo.EWM_Staging_Rechazos (
+        ID BIGINT IDENTITY(1,1) PRIMARY KEY,
+        TablaStaging NVARCHAR(200) NOT NULL,
+        Columnas NVARCHAR(1000) NULL,
+        FilaJson NVARCHAR(MAX) NULL,
+        NombreArchivo NVARCHAR(1000) NULL,
+        RunID BIGINT NULL,
+        FechaCreacion DATETIME NOT NULL DEFAULT GETDATE()
+    );
+END
+GO
+
+-- Fechas staging a DATE. Solo fechas: las cantidades de OBDConfirm siguen en
+-- texto porque entran al hash por archivo (EWM_OBDConfirm_FileHash) tal como
+-- vienen en el archivo. Los SP convierten con CONVERT(NVARCHAR, ..., 112) +
+-- TRY_CONVERT, que sirve con la columna en NVARCHAR o en DATE.
+-- Bases existentes con la columna en NVARCHAR: los valores que no convierten
+-- quedan NULL (igual que el TRY_CONVERT de los SP) y luego se cambia el tipo
+DECLARE @ColumnasTipadas TABLE (Tabla SYSNAME, Columna SYSNAME,
+                                PRIMARY KEY (Tabla, Columna));
+INSERT INTO @ColumnasTipadas (Tabla, Columna) VALUES
+    ('Staging_EWM_OutboundDelivery_Header', 'Fecha_Entrega'),
+    ('Staging_EWM_OBDConfirm_Cabecera', 'Fecha_WSHDRLFDAT'),
+    ('Staging_EWM_OBDConfirm_Cabecera', 'Fecha_WSHDRWADTI');
+DECLARE @Tabla SYSNAME, @Columna SYSNAME;
+WHILE EXISTS (SELECT 1 FROM @ColumnasTipadas)
+BEGIN
+    SELECT TOP 1 @Tabla = Tabla, @Columna = Columna
+    FROM @ColumnasTipadas ORDER BY Tabla, Columna;
+    IF EXISTS (SELECT 1 FROM INFORMATION_SCHEMA.COLUMNS
+               WHERE TABLE_SCHEMA = 'dbo' AND TABLE_NAME = @Tabla
+                 AND COLUMN_NAME = @Columna AND DATA_TYPE = 'nvarchar')
+    BEGIN
+        EXEC('UPDATE dbo.' + @Tabla + ' SET ' + @Columna +
+             ' = TRY_CONVERT(DATE, LEFT(LTRIM(RTRIM(' + @Columna + ')), 8), 112)');
+        EXEC('ALTER TABLE dbo.' + @Tabla + ' ALTER COLUMN ' + @Columna + ' DATE NULL');
+    END
+    DELETE FROM @ColumnasTipadas WHERE Tabla = @Tabla AND Columna = @Columna;
+END
+GO
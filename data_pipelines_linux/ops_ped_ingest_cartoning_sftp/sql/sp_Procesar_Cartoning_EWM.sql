@@ -38,7 +38,12 @@ BEGIN
         WHERE NombreArchivo = @ArchivoActual 
           AND TipoRegistro = 'ZSIEWM_CARTONIZACAO_PEDIDO';
 
-        -- 2. Insertamos Pedidos (Logica +1 Version)
+        -- 2. Nueva versión por pedido desde el índice de versiones (Logica +1 Version)
+        SELECT P.PedidoID, ISNULL(V.NumeroVersion, 0) + 1 AS NumeroVersion
+        INTO #VersionPedido
+        FROM (SELECT DISTINCT PedidoID FROM #TempPedidos WHERE PedidoID IS NOT NULL) P
+        LEFT JOIN EWM_VersionActual_Pedido V WITH (UPDLOCK, HOLDLOCK) ON V.PedidoID = P.PedidoID;
+
         INSERT INTO EWM_Pedidos (
             PedidoID, EntregaSAP, VolumenTotal, UnidadVol, PesoTotal, UnidadPeso, 
             TotalBultos, ClienteID, NombreArchivo, NumeroVersion
@@ -46,8 +51,20 @@ BEGIN
         SELECT 
             T.PedidoID, T.EntregaSAP, T.Volumen, T.UnidadVol, T.Peso, T.UnidadPeso, 
             T.Bultos, T.Cliente, T.NombreArchivo,
-            ISNULL((SELECT MAX(NumeroVersion) FROM EWM_Pedidos WHERE PedidoID = T.PedidoID), 0) + 1
-        FROM #TempPedidos T;
+            ISNULL(N.NumeroVersion, 1)
+        FROM #TempPedidos T
+        LEFT JOIN #VersionPedido N ON N.PedidoID = T.PedidoID;
+
+        -- Actualizar índice de versiones (misma transacción)
+        UPDATE V
+        SET NumeroVersion = N.NumeroVersion, FechaActualizacion = GETDATE()
+        FROM EWM_VersionActual_Pedido V
+        INNER JOIN #VersionPedido N ON N.PedidoID = V.PedidoID;
+
+        INSERT INTO EWM_VersionActual_Pedido (PedidoID, NumeroVersion)
+        SELECT N.PedidoID, N.NumeroVersion
+        FROM #VersionPedido N
+        WHERE NOT EXISTS (SELECT 1 FROM EWM_VersionActual_Pedido V WHERE V.PedidoID = N.PedidoID);
 
         -- 3. Insertamos Cajas
         INSERT INTO EWM_Cajas (
@@ -59,8 +76,9 @@ BEGIN
             TRY_CAST(R.C4 AS DECIMAL(18,3)), 
             TRY_CAST(R.C6 AS DECIMAL(18,3)), 
             R.C11, R.NombreArchivo,
-            (SELECT MAX(NumeroVersion) FROM EWM_Pedidos WHERE PedidoID = R.C1)
+            V.NumeroVersion
         FROM Staging_EWM_Cartoning R
+        LEFT JOIN EWM_VersionActual_Pedido V ON V.PedidoID = R.C1
         WHERE R.NombreArchivo = @ArchivoActual 
           AND R.TipoRegistro = 'ZSIEWM_CARTONIZACAO_CAIXA';
 
@@ -73,13 +91,15 @@ BEGIN
             R.C1, R.C2, R.C3, R.C4, R.C5, 
             TRY_CAST(R.C6 AS DECIMAL(18,3)), R.C7, 
             R.NombreArchivo,
-            (SELECT MAX(NumeroVersion) FROM EWM_Pedidos WHERE PedidoID = R.C1)
+            V.NumeroVersion
         FROM Staging_EWM_Cartoning R
+        LEFT JOIN EWM_VersionActual_Pedido V ON V.PedidoID = R.C1
         WHERE R.NombreArchivo = @ArchivoActual 
           AND R.TipoRegistro = 'ZSIEWM_CARTONIZACAO_ITEM';
 
         -- 5. Limpieza y Bitácora
         DROP TABLE IF EXISTS #TempPedidos;
+        DROP TABLE IF EXISTS #VersionPedido;
         
         -- Borrar del staging
         DELETE FROM Staging_EWM_Cartoning WHERE NombreArchivo = @ArchivoActual;
@@ -70,8 +70,9 @@ BEGIN
         END;
 
         -- 1. Determinar número de versión (global para todo el archivo)
-        SELECT @NumeroVersion = ISNULL(MAX(NumeroVersion), 0) + 1
-        FROM EWM_OBDConfirm_Cabecera;
+        SELECT @NumeroVersion = NumeroVersion + 1
+        FROM EWM_VersionActual_Carga WITH (UPDLOCK, HOLDLOCK)
+        WHERE Entidad = 'OBDConfirm';
         
         -- 2. Insertar CABECERA
         INSERT INTO EWM_OBDConfirm_Cabecera (
@@ -81,8 +82,9 @@ BEGIN
         SELECT 
             LTRIM(RTRIM(Numero_Entrega)),
             -- Convertir YYYYMMDDHHMMSS (14 chars) a DATE usando solo los primeros 8 chars
-            TRY_CONVERT(DATE, LEFT(LTRIM(RTRIM(Fecha_WSHDRLFDAT)), 8), 112),
-            TRY_CONVERT(DATE, LEFT(LTRIM(RTRIM(Fecha_WSHDRWADTI)), 8), 112),
+            -- CONVERT(..., 112) deja igual el NVARCHAR y pasa a AAAAMMDD la columna DATE (staging tipada)
+            TRY_CONVERT(DATE, LEFT(LTRIM(RTRIM(CONVERT(NVARCHAR(40), Fecha_WSHDRLFDAT, 112))), 8), 112),
+            TRY_CONVERT(DATE, LEFT(LTRIM(RTRIM(CONVERT(NVARCHAR(40), Fecha_WSHDRWADTI, 112))), 8), 112),
             @NumeroVersion,
             @ArchivoActual
         FROM Staging_EWM_OBDConfirm_Cabecera
@@ -192,6 +194,11 @@ BEGIN
         INSERT INTO dbo.EWM_OBDConfirm_FileHash (NombreArchivo, HashValor)
         VALUES (@ArchivoActual, @HashActual);
         
+        IF @RegistrosCabecera > 0
+            UPDATE EWM_VersionActual_Carga
+            SET NumeroVersion = @NumeroVersion, FechaActualizacion = GETDATE()
+            WHERE Entidad = 'OBDConfirm';
+        
         -- 9. Registrar en bitácora
         INSERT INTO BitacoraArchivos (NombreArchivo, Estado, Mensaje)
         VALUES (
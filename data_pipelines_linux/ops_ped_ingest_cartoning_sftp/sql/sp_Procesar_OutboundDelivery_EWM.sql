@@ -23,9 +23,10 @@ BEGIN
     BEGIN TRY
         BEGIN TRANSACTION;
         
-        -- 1. Determinar número de versión
-        SELECT @NumeroVersion = ISNULL(MAX(NumeroVersion), 0) + 1
-        FROM EWM_OutboundDelivery_Header;
+        -- 1. Determinar número de versión (contador de carga, bloqueado hasta el COMMIT)
+        SELECT @NumeroVersion = NumeroVersion + 1
+        FROM EWM_VersionActual_Carga WITH (UPDLOCK, HOLDLOCK)
+        WHERE Entidad = 'OutboundDelivery';
         
         -- 2. Limpiar datos y transformar fecha
         -- Insertar HEADERS
@@ -72,6 +73,12 @@ BEGIN
         
         SET @RegistrosItems = @@ROWCOUNT;
         
+        -- Un archivo sin headers no consume versión (igual que MAX + 1)
+        IF @RegistrosHeader > 0
+            UPDATE EWM_VersionActual_Carga
+            SET NumeroVersion = @NumeroVersion, FechaActualizacion = GETDATE()
+            WHERE Entidad = 'OutboundDelivery';
+        
         -- 4. Registrar en bitácora
         INSERT INTO BitacoraArchivos (NombreArchivo, Estado, Mensaje)
         VALUES (
@@ -69,15 +69,12 @@ BEGIN
             s.PedidoID,
             s.CajaID,
             s.NombreArchivo,
-            ISNULL(
-                (SELECT MAX(NumeroVersion) 
-                 FROM EWM_WaveConfirm 
-                 WHERE WaveID = s.WaveID 
-                   AND PedidoID = s.PedidoID 
-                   AND CajaID = s.CajaID), 
-                0
-            ) AS VersionAnterior
+            ISNULL(V.NumeroVersion, 0) AS VersionAnterior
         FROM Staging_EWM_WaveConfirm s
+        LEFT JOIN EWM_VersionActual_WaveCaja V WITH (UPDLOCK, HOLDLOCK)
+            ON V.WaveID = s.WaveID 
+           AND V.PedidoID = s.PedidoID 
+           AND V.CajaID = s.CajaID
         WHERE s.NombreArchivo = @ArchivoActual AND s.Procesado = 0;
         
         DECLARE @Procesados INT = @@ROWCOUNT;
@@ -108,6 +105,25 @@ BEGIN
         
         DECLARE @Insertados INT = @@ROWCOUNT;
         PRINT '    Total insertado en EWM_WaveConfirm: ' + CAST(@Insertados AS VARCHAR(10));
+
+        -- Actualizar índice de versiones (misma transacción)
+        UPDATE V
+        SET NumeroVersion = N.NumeroVersion, FechaActualizacion = GETDATE()
+        FROM EWM_VersionActual_WaveCaja V
+        INNER JOIN (
+            SELECT WaveID, PedidoID, CajaID, MAX(VersionAnterior) + 1 AS NumeroVersion
+            FROM #TempWaveConfirm
+            GROUP BY WaveID, PedidoID, CajaID
+        ) N ON N.WaveID = V.WaveID AND N.PedidoID = V.PedidoID AND N.CajaID = V.CajaID;
+
+        INSERT INTO EWM_VersionActual_WaveCaja (WaveID, PedidoID, CajaID, NumeroVersion)
+        SELECT T.WaveID, T.PedidoID, T.CajaID, MAX(T.VersionAnterior) + 1
+        FROM #TempWaveConfirm T
+        WHERE NOT EXISTS (
+            SELECT 1 FROM EWM_VersionActual_WaveCaja V
+            WHERE V.WaveID = T.WaveID AND V.PedidoID = T.PedidoID AND V.CajaID = T.CajaID
+        )
+        GROUP BY T.WaveID, T.PedidoID, T.CajaID;
         
         -- =====================================================
         -- 4. MARCAR STAGING COMO PROCESADO
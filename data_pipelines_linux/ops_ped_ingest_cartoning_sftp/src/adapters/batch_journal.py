@@ -0,0 +1,131 @@
+"""
+BatchJournal — Bitácora write-ahead de lotes en curso (SQLite WAL).
+
+Si el proceso muere entre la carga a staging y el archivado (p.ej. el
+Stop-Process del runner), los archivos quedan en _processing/ y parte de los
+SP ya hizo COMMIT. El journal registra por archivo hasta dónde llegó el lote
+para que el arranque siguiente retome sin limpieza manual:
+
+  - begin(): antes de tocar SQL, los archivos del lote quedan en 'moved'
+    (con mtime y tamaño del archivo cargado).
+  - mark_sp_ok(): tras cada COMMIT de SP (lote completo o archivo a archivo)
+    los archivos pasan a 'sp_ok'.
+  - finish(): con el lote archivado (o descartado) sus filas se borran.
+
+Al arrancar, pending() entrega por fuente el estado de cada archivo en el
+último lote sin terminar que lo incluyó: 'sp_ok' se archiva sin re-ejecutar
+el SP (si mtime y tamaño siguen siendo los del lote), el resto se vuelve a
+cargar. Queda una ventana mínima entre el COMMIT del SP y
+mark_sp_ok(): un corte justo ahí re-ejecuta ese SP (nueva versión, o se omite
+por hash en OBDConfirm).
+
+synchronous=FULL: pocas escrituras por lote, y cada una sobrevive a un corte.
+"""
+
+import sqlite3
+import threading
+import uuid
+from datetime import datetime
+
+
+def _log(tag: str, msg: str):
+    ts = datetime.now().strftime('%H:%M:%S.%f')[:-3]
+    print(f"[{ts}] [{tag}] {msg}")
+
+
+STAGE_MOVED = 'moved'   # en _processing/, SP sin COMMIT
+STAGE_SP_OK = 'sp_ok'   # SP con COMMIT, falta registrar estado y archivar
+
+_SCHEMA_SQL = """
+    CREATE TABLE IF NOT EXISTS batch_file (
+        batch_id   TEXT NOT NULL,
+        source     TEXT NOT NULL,
+        filename   TEXT NOT NULL,
+        stage      TEXT NOT NULL,
+        mtime      REAL,
+        size       INTEGER,
+        updated_at TEXT NOT NULL,
+        PRIMARY KEY (batch_id, filename)
+    ) WITHOUT ROWID
+"""
+
+
+class BatchJournal:
+    """Estado por archivo de los lotes en curso; thread-safe (un lote por fuente)."""
+
+    def __init__(self, db_path: str):
+        self.path = db_path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=FULL")
+        self._conn.execute(_SCHEMA_SQL)
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(batch_file)")}
+        for column, sql_type in (('mtime', 'REAL'), ('size', 'INTEGER')):
+            if column not in columns:
+                self._conn.execute(f"ALTER TABLE batch_file ADD COLUMN {column} {sql_type}")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS ix_batch_file_source ON batch_file(source)")
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def _write(self, sql: str, rows: list):
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._conn.executemany(sql, rows)
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def begin(self, source_name: str, filenames: list, file_meta: dict = None) -> str:
+        """Registra un lote antes de cargar staging.
+
+        Args:
+            file_meta: {filename: (mtime, size)} del archivo que se carga; al
+                retomar, un 'sp_ok' solo vale si el archivo sigue igual
+
+        Returns:
+            batch_id del lote
+        """
+        batch_id = uuid.uuid4().hex
+        ts = datetime.now().isoformat()
+        file_meta = file_meta or {}
+        self._write("INSERT INTO batch_file (batch_id, source, filename, stage, mtime, size, updated_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    [(batch_id, source_name, fname, STAGE_MOVED,
+                      *file_meta.get(fname, (None, None)), ts) for fname in filenames])
+        return batch_id
+
+    def mark_sp_ok(self, batch_id: str, filenames: list):
+        """Archivos cuyo SP hizo COMMIT (no se re-ejecuta al retomar)."""
+        ts = datetime.now().isoformat()
+        self._write("UPDATE batch_file SET stage = ?, updated_at = ? "
+                    "WHERE batch_id = ? AND filename = ?",
+                    [(STAGE_SP_OK, ts, batch_id, fname) for fname in filenames])
+
+    def finish(self, batch_ids: list):
+        """Cierra lotes (archivados o descartados)."""
+        self._write("DELETE FROM batch_file WHERE batch_id = ?", [(b,) for b in batch_ids])
+
+    def pending(self, source_name: str) -> tuple:
+        """Lotes sin cerrar de una fuente.
+
+        Returns:
+            ([batch_id], {filename: (stage, mtime, size)}); si un archivo
+            aparece en más de un lote vale el lote más reciente
+        """
+        batch_ids, stages, begun = set(), {}, {}
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT batch_id, filename, stage, mtime, size, "
+                "       MIN(updated_at) OVER (PARTITION BY batch_id) "
+                "FROM batch_file WHERE source = ?", (source_name,)).fetchall()
+        for batch_id, filename, stage, mtime, size, batch_ts in rows:
+            batch_ids.add(batch_id)
+            if batch_ts >= begun.get(filename, ''):
+                begun[filename] = batch_ts
+                stages[filename] = (stage, mtime, size)
+        return sorted(batch_ids), stages
@@ -0,0 +1,498 @@
+"""
+FileCatalog — Catálogo DuckDB persistente (en disco) de archivos ingestados.
+
+Guarda una copia columnar ya parseada de cada archivo cargado con éxito,
+identificado por (Fuente, NombreArchivo, HashContenido):
+  - catalog_files: un registro por archivo (última versión por nombre);
+    Estado 'PENDIENTE' al catalogar el lote, 'OK' cuando SQL Server lo confirmó
+  - una tabla por staging (mismo nombre y columnas + Fuente, HashContenido)
+
+Usos en MultiSourcePipeline:
+  - Dedup: una re-entrega idéntica de EWM (mismo nombre + mismo hash) se
+    archiva sin llegar a SQL Server.
+  - Replay (config['catalog_replay']): al reprocesar un día, los archivos sin
+    cambios se recargan a staging desde el catálogo y solo se re-leen los
+    archivos nuevos o modificados.
+
+Escritura: store() con las tablas Arrow del lote (modo tabla) o tee() en modo
+streaming, que copia al catálogo los mismos RecordBatch que van a staging
+(sin volver a parsear el lote y con el lock solo por batch).
+
+Retención y compactación (maintain(), como mucho cada maintain_interval_h):
+  - Borra archivos no vistos en retention_days y sus filas.
+  - DuckDB no achica el archivo al borrar: si los bloques libres superan
+    compact_free_ratio se reescribe la base (COPY FROM DATABASE) y se reemplaza.
+
+Errores del catálogo nunca cortan el pipeline: se loguean y el lote sigue
+como si el catálogo no existiera.
+"""
+
+import hashlib
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+
+import duckdb
+import pyarrow as pa
+
+
+def _log(tag: str, msg: str):
+    ts = datetime.now().strftime('%H:%M:%S.%f')[:-3]
+    print(f"[{ts}] [{tag}] {msg}")
+
+
+_HASH_CHUNK = 1024 * 1024
+
+_SCHEMA_SQL = """
+    CREATE TABLE IF NOT EXISTS catalog_files (
+        Fuente VARCHAR NOT NULL,
+        NombreArchivo VARCHAR NOT NULL,
+        HashContenido VARCHAR NOT NULL,
+        Tamano BIGINT,
+        Filas BIGINT,
+        Estado VARCHAR NOT NULL,
+        FechaIngesta TIMESTAMP,
+        UltimaVez TIMESTAMP,
+        PRIMARY KEY (Fuente, NombreArchivo)
+    )
+"""
+
+
+class FileCatalog:
+    """Catálogo persistente de archivos ingestados (thread-safe, un proceso)."""
+
+    def __init__(self, db_path: str, retention_days: int = 90,
+                 maintain_interval_h: float = 24.0, compact_free_ratio: float = 0.5):
+        """
+        Args:
+            db_path: archivo .duckdb del catálogo (se crea si no existe)
+            retention_days: días sin ver un archivo antes de olvidarlo
+            maintain_interval_h: intervalo mínimo entre pasadas de maintain()
+            compact_free_ratio: fracción de bloques libres que dispara la reescritura
+        """
+        self.db_path = db_path
+        self.retention_days = retention_days
+        self.maintain_interval_s = maintain_interval_h * 3600
+        self.compact_free_ratio = compact_free_ratio
+        self._lock = threading.RLock()
+        self._last_maintain = 0.0
+
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        self._con = self._connect()
+        count = self._con.execute(
+            "SELECT COUNT(*) FROM catalog_files WHERE Estado = 'OK'").fetchone()[0]
+        _log('CATALOG', f'Catálogo DuckDB en {db_path}: {count} archivos '
+                        f'(retención {retention_days} días)')
+
+    def _connect(self):
+        con = duckdb.connect(self.db_path)
+        con.execute(_SCHEMA_SQL)
+        # Copias de staging anteriores sin Fuente: se completa desde catalog_files
+        for (staging_name,) in con.execute("""
+            SELECT table_name FROM information_schema.tables t
+            WHERE table_name <> 'catalog_files' AND NOT EXISTS (
+                SELECT 1 FROM information_schema.columns c
+                WHERE c.table_name = t.table_name AND c.column_name = 'Fuente')
+        """).fetchall():
+            con.execute(f'ALTER TABLE "{staging_name}" ADD COLUMN Fuente VARCHAR')
+            con.execute(f"""
+                UPDATE "{staging_name}" SET Fuente = c.Fuente
+                FROM catalog_files c
+                WHERE c.NombreArchivo = "{staging_name}".NombreArchivo
+                  AND c.HashContenido = "{staging_name}".HashContenido
+            """)
+        return con
+
+    def close(self):
+        with self._lock:
+            self._con.close()
+
+    # ── Dedup ─────────────────────────────────────────────────────
+
+    @staticmethod
+    def file_hash(path: str) -> str:
+        """Hash de contenido (BLAKE2b-128) leyendo el archivo por bloques."""
+        h = hashlib.blake2b(digest_size=16)
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(_HASH_CHUNK), b''):
+                h.update(chunk)
+        return h.hexdigest()
+
+    def known(self, source_name: str, hashes: dict) -> set:
+        """Archivos de `hashes` ({nombre: hash}) ya catalogados con el mismo contenido.
+
+        Marca UltimaVez en los encontrados (una re-entrega renueva la retención).
+        """
+        if not hashes:
+            return set()
+        probe = pa.table({'NombreArchivo': list(hashes), 'HashContenido': list(hashes.values())})
+        try:
+            with self._lock:
+                cur = self._con.cursor()
+                try:
+                    cur.register('_probe', probe)
+                    found = {row[0] for row in cur.execute("""
+                        SELECT c.NombreArchivo
+                        FROM catalog_files c
+                        JOIN _probe p USING (NombreArchivo, HashContenido)
+                        WHERE c.Fuente = ? AND c.Estado = 'OK'
+                    """, [source_name]).fetchall()}
+                    if found:
+                        cur.execute("""
+                            UPDATE catalog_files SET UltimaVez = now()
+                            WHERE Fuente = ? AND NombreArchivo IN (SELECT UNNEST(?))
+                        """, [source_name, sorted(found)])
+                finally:
+                    cur.close()
+            return found
+        except Exception as e:
+            _log('CATALOG', f'WARN: consulta de duplicados falló ({e}). Sin dedup para este lote')
+            return set()
+
+    # ── Escritura ─────────────────────────────────────────────────
+
+    @staticmethod
+    def _files_table(hashes: dict, sizes: dict = None) -> pa.Table:
+        sizes = sizes or {}
+        return pa.table({
+            'NombreArchivo': list(hashes),
+            'HashContenido': list(hashes.values()),
+            'Tamano': pa.array([sizes.get(n) for n in hashes], pa.int64()),
+        })
+
+    def store(self, source_name: str, tables: dict, hashes: dict, sizes: dict = None) -> bool:
+        """Cataloga (Estado 'PENDIENTE') los archivos parseados de un lote (modo tabla).
+
+        Se llama antes de cargar staging (la carga pandas destruye la tabla
+        Arrow); confirm() los deja vigentes para dedup cuando el lote cerró OK.
+        En modo streaming se usa tee().
+
+        Args:
+            tables: {staging: pa.Table}
+            hashes: {nombre: hash} de los archivos parseados en el lote
+            sizes: {nombre: bytes} opcional
+
+        Reemplaza la versión anterior de cada nombre (un archivo re-entregado
+        con otro contenido queda con su último hash).
+        """
+        if not hashes:
+            return True
+        t0 = time.time()
+        try:
+            with self._lock:
+                cur = self._con.cursor()
+                try:
+                    cur.execute("BEGIN TRANSACTION")
+                    cur.register('_files', self._files_table(hashes, sizes))
+                    self._mark_pending(cur, source_name)
+                    for staging_name, table in tables.items():
+                        self._clear_rows(cur, source_name, staging_name)
+                        self._write_rows(cur, source_name, staging_name, table)
+                    filas = self._count_rows(cur, source_name, list(tables))
+                    cur.execute("COMMIT")
+                except Exception:
+                    cur.execute("ROLLBACK")
+                    raise
+                finally:
+                    cur.close()
+            _log('CATALOG', f'{source_name}: {len(hashes)} archivos catalogados '
+                            f'({sum(filas.values())} filas) en {time.time()-t0:.2f}s')
+            return True
+        except Exception as e:
+            _log('CATALOG', f'WARN: no se pudo catalogar lote de {source_name}: {e}')
+            return False
+
+    def tee(self, source_name: str, hashes: dict, sizes: dict = None) -> 'CatalogTee':
+        """Cataloga (Estado 'PENDIENTE') un lote en streaming, desde los readers de la carga.
+
+        Returns:
+            CatalogTee para envolver los open_reader del lote, o None si no se
+            pudo registrar el lote (se carga sin catálogo)
+        """
+        if not hashes:
+            return None
+        tee = CatalogTee(self, source_name, self._files_table(hashes, sizes))
+        return tee if tee.run(lambda cur: self._mark_pending(cur, source_name)) else None
+
+    @staticmethod
+    def _mark_pending(cur, source_name: str):
+        cur.execute("""
+            INSERT OR REPLACE INTO catalog_files
+            SELECT ?, NombreArchivo, HashContenido, Tamano, NULL,
+                   'PENDIENTE', now(), now()
+            FROM _files
+        """, [source_name])
+
+    @staticmethod
+    def _clear_rows(cur, source_name: str, staging_name: str):
+        """Borra de la copia de staging las filas previas de los archivos en _files."""
+        if cur.execute("SELECT 1 FROM information_schema.tables WHERE table_name = ?",
+                       [staging_name]).fetchone() is None:
+            return
+        cur.execute(f"""
+            DELETE FROM "{staging_name}"
+            WHERE Fuente = ? AND NombreArchivo IN (SELECT NombreArchivo FROM _files)
+        """, [source_name])
+
+    def _write_rows(self, cur, source_name: str, staging_name: str, table: pa.Table):
+        """Agrega filas parseadas a la copia de staging (con Fuente y HashContenido)."""
+        cur.register('_src', self._string_nulls(table))
+        try:
+            self._ensure_table(cur, staging_name)
+            cur.execute(f"""
+                INSERT INTO "{staging_name}" BY NAME
+                SELECT s.*, ? AS Fuente, f.HashContenido
+                FROM _src s JOIN _files f USING (NombreArchivo)
+            """, [source_name])
+        finally:
+            cur.unregister('_src')
+
+    @staticmethod
+    def _count_rows(cur, source_name: str, staging_names: list) -> dict:
+        """Filas por archivo de _files en las copias de staging → catalog_files.Filas."""
+        existing = {row[0] for row in cur.execute(
+            "SELECT table_name FROM information_schema.tables").fetchall()}
+        filas = {}
+        for staging_name in staging_names:
+            if staging_name not in existing:
+                continue
+            for name, n in cur.execute(f"""
+                SELECT NombreArchivo, COUNT(*) FROM "{staging_name}"
+                WHERE Fuente = ? AND NombreArchivo IN (SELECT NombreArchivo FROM _files)
+                GROUP BY NombreArchivo
+            """, [source_name]).fetchall():
+                filas[name] = filas.get(name, 0) + n
+        if filas:
+            cur.execute("""
+                UPDATE catalog_files SET Filas = f.n
+                FROM (SELECT UNNEST(?) AS NombreArchivo, UNNEST(?) AS n) f
+                WHERE catalog_files.Fuente = ?
+                  AND catalog_files.NombreArchivo = f.NombreArchivo
+            """, [list(filas), list(filas.values()), source_name])
+        return filas
+
+    def confirm(self, source_name: str, filenames: list):
+        """Marca como vigentes ('OK') archivos catalogados con store()."""
+        if not filenames:
+            return
+        try:
+            with self._lock:
+                cur = self._con.cursor()
+                try:
+                    cur.execute("""
+                        UPDATE catalog_files SET Estado = 'OK', UltimaVez = now()
+                        WHERE Fuente = ? AND NombreArchivo IN (SELECT UNNEST(?))
+                    """, [source_name, list(filenames)])
+                finally:
+                    cur.close()
+        except Exception as e:
+            _log('CATALOG', f'WARN: no se pudo confirmar lote de {source_name}: {e}')
+
+    @staticmethod
+    def _string_nulls(source: pa.Table) -> pa.Table:
+        """Columnas tipo null (p.ej. OBD sin items) → string, como _create_from_pylist."""
+        if not any(pa.types.is_null(f.type) for f in source.schema):
+            return source
+        return source.cast(pa.schema([
+            pa.field(f.name, pa.string()) if pa.types.is_null(f.type) else f
+            for f in source.schema
+        ]))
+
+    @staticmethod
+    def _ensure_table(cur, staging_name: str):
+        """Crea la copia de staging o agrega columnas nuevas (Cartoning varía en ancho)."""
+        src_cols = [(name, ctype) for name, ctype, *_ in
+                    cur.execute("DESCRIBE SELECT * FROM _src").fetchall()]
+        existing = {row[0] for row in cur.execute(
+            "SELECT column_name FROM information_schema.columns WHERE table_name = ?",
+            [staging_name]).fetchall()}
+        if not existing:
+            cols = ', '.join(f'"{name}" {ctype}' for name, ctype in src_cols)
+            cur.execute(f'CREATE TABLE "{staging_name}" ({cols}, Fuente VARCHAR, HashContenido VARCHAR)')
+            return
+        for name, ctype in src_cols:
+            if name not in existing:
+                cur.execute(f'ALTER TABLE "{staging_name}" ADD COLUMN "{name}" {ctype}')
+
+    # ── Replay ────────────────────────────────────────────────────
+
+    def replay_tables(self, source_name: str, staging_tables: list, hashes: dict) -> dict:
+        """Filas catalogadas de los archivos `hashes` → {staging: pa.Table}.
+
+        Solo tablas con filas; el lote de replay está acotado por max_batch_files.
+        Retorna None si el catálogo falla (el caller re-lee los archivos).
+        """
+        if not hashes:
+            return {}
+        probe = pa.table({'NombreArchivo': list(hashes), 'HashContenido': list(hashes.values())})
+        result = {}
+        try:
+            with self._lock:
+                cur = self._con.cursor()
+                try:
+                    cur.register('_probe', probe)
+                    existing = {row[0] for row in cur.execute(
+                        "SELECT table_name FROM information_schema.tables").fetchall()}
+                    for staging_name in staging_tables:
+                        if staging_name not in existing:
+                            continue
+                        table = cur.execute(f"""
+                            SELECT t.* EXCLUDE (Fuente, HashContenido)
+                            FROM "{staging_name}" t
+                            JOIN _probe p USING (NombreArchivo, HashContenido)
+                            JOIN catalog_files c USING (Fuente, NombreArchivo, HashContenido)
+                            WHERE c.Fuente = ? AND c.Estado = 'OK'
+                        """, [source_name]).arrow()
+                        if table.num_rows:
+                            result[staging_name] = table
+                finally:
+                    cur.close()
+        except Exception as e:
+            _log('CATALOG', f'WARN: replay desde catálogo falló ({e}). Se re-leen los archivos')
+            return None
+        return result
+
+    # ── Retención / compactación ──────────────────────────────────
+
+    def maintain(self, force: bool = False):
+        """Aplica retención y compacta si corresponde (como mucho cada maintain_interval_h)."""
+        now = time.time()
+        if not force and now - self._last_maintain < self.maintain_interval_s:
+            return
+        self._last_maintain = now
+        t0 = time.time()
+        cutoff = datetime.now() - timedelta(days=self.retention_days)
+        try:
+            with self._lock:
+                con = self._con
+                expired = con.execute(
+                    "SELECT COUNT(*) FROM catalog_files WHERE UltimaVez < ?", [cutoff]).fetchone()[0]
+                if expired:
+                    con.execute("BEGIN TRANSACTION")
+                    con.execute("DELETE FROM catalog_files WHERE UltimaVez < ?", [cutoff])
+                    for (staging_name,) in con.execute("""
+                        SELECT table_name FROM information_schema.tables
+                        WHERE table_name <> 'catalog_files'
+                    """).fetchall():
+                        con.execute(f"""
+                            DELETE FROM "{staging_name}" t
+                            WHERE NOT EXISTS (
+                                SELECT 1 FROM catalog_files c
+                                WHERE c.Fuente = t.Fuente
+                                  AND c.NombreArchivo = t.NombreArchivo
+                                  AND c.HashContenido = t.HashContenido)
+                        """)
+                    con.execute("COMMIT")
+                con.execute("CHECKPOINT")
+                total, free = con.execute(
+                    "SELECT total_blocks, free_blocks FROM pragma_database_size()").fetchone()
+                compacted = bool(total) and free / total >= self.compact_free_ratio
+                if compacted:
+                    self._rewrite()
+            _log('CATALOG', f'Mantención: {expired} archivos vencidos'
+                            f'{", base reescrita" if compacted else ""} en {time.time()-t0:.2f}s')
+        except Exception as e:
+            _log('CATALOG', f'WARN: mantención del catálogo falló: {e}')
+
+    def _rewrite(self):
+        """Copia la base a un archivo nuevo (sin bloques libres) y lo reemplaza."""
+        tmp_path = self.db_path + '.compact'
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        before = os.path.getsize(self.db_path)
+        tmp_literal = tmp_path.replace("'", "''")
+        self._con.execute(f"ATTACH '{tmp_literal}' AS compact_db")
+        try:
+            src_db = self._con.execute("SELECT current_database()").fetchone()[0]
+            self._con.execute(f'COPY FROM DATABASE "{src_db}" TO compact_db')
+        finally:
+            self._con.execute("DETACH compact_db")
+        self._con.close()
+        try:
+            os.replace(tmp_path, self.db_path)
+            wal = self.db_path + '.wal'
+            if os.path.exists(wal):
+                os.remove(wal)
+        finally:
+            self._con = self._connect()
+        _log('CATALOG', f'Compactado: {before / 1e6:.1f} MB → '
+                        f'{os.path.getsize(self.db_path) / 1e6:.1f} MB')
+
+
+class CatalogTee:
+    """Copia al catálogo los RecordBatch que la carga lleva a staging (modo streaming).
+
+    Cada batch se inserta en el catálogo al pasar hacia SQL Server, con el
+    lock del catálogo solo durante ese insert: el lote no se vuelve a parsear
+    y las otras fuentes no esperan la carga completa. Si la carga reabre un
+    reader (reintento con pandas) esa copia se vuelve a escribir desde cero.
+    Una falla deja el lote fuera del catálogo (failed) sin cortar la carga.
+    """
+
+    def __init__(self, catalog: FileCatalog, source_name: str, files: pa.Table):
+        self.catalog = catalog
+        self.source_name = source_name
+        self.files = files
+        self.failed = False
+        self.t0 = time.time()
+        self._written = []
+
+    def run(self, fn, force: bool = False) -> bool:
+        """Ejecuta fn(cursor) con _files registrado, bajo el lock del catálogo.
+
+        Tras una falla no ejecuta nada más, salvo con force (descarte).
+        """
+        if self.failed and not force:
+            return False
+        try:
+            with self.catalog._lock:
+                cur = self.catalog._con.cursor()
+                try:
+                    cur.register('_files', self.files)
+                    fn(cur)
+                finally:
+                    cur.close()
+            return True
+        except Exception as e:
+            self.failed = True
+            _log('CATALOG', f'WARN: copia al catálogo de {self.source_name} falló ({e}). '
+                            f'Lote sin catálogo')
+            return False
+
+    def wrap(self, staging_name: str, open_reader):
+        """open_reader equivalente que además copia cada batch al catálogo."""
+        def opener():
+            reader = open_reader()
+            if not self.run(lambda cur: self.catalog._clear_rows(cur, self.source_name, staging_name)):
+                return reader
+            if staging_name not in self._written:
+                self._written.append(staging_name)
+            return pa.RecordBatchReader.from_batches(reader.schema, self._copy(staging_name, reader))
+        return opener
+
+    def _copy(self, staging_name: str, reader):
+        for batch in reader:
+            if batch.num_rows and not self.failed:
+                table = pa.Table.from_batches([batch])
+                self.run(lambda cur: self.catalog._write_rows(cur, self.source_name, staging_name, table))
+            yield batch
+
+    def finish(self) -> bool:
+        """Tras la carga: filas por archivo en catalog_files; si la copia falló, descarta el lote.
+
+        Returns:
+            True si el lote quedó catalogado (se puede confirmar)
+        """
+        if not self.failed:
+            filas = {}
+            if self.run(lambda cur: filas.update(
+                    self.catalog._count_rows(cur, self.source_name, self._written))):
+                _log('CATALOG', f'{self.source_name}: {self.files.num_rows} archivos catalogados '
+                                f'({sum(filas.values())} filas, streaming) en {time.time()-self.t0:.2f}s')
+                return True
+        self.run(lambda cur: cur.execute("""
+            DELETE FROM catalog_files
+            WHERE Fuente = ? AND NombreArchivo IN (SELECT NombreArchivo FROM _files)
+        """, [self.source_name]), force=True)
+        return False
@@ -0,0 +1,328 @@
+"""
+FileArrivalWatcher — Detección de llegada de archivos por eventos.
+
+Reemplaza el sleep fijo de poll_interval entre ciclos:
+  - Linux: inotify (vía ctypes, sin dependencias) sobre las carpetas fuente.
+    El hilo queda bloqueado en select() hasta que llega un evento o vence
+    el próximo deadline → CPU ~0 en reposo.
+  - Otros SO / inotify no disponible: fallback a escaneo periódico
+    (fallback_poll_s) con os.scandir.
+  - En modo inotify se hace además un re-escaneo de seguridad cada rescan_s
+    (archivos cuyo move falló, eventos perdidos).
+
+Un archivo entra a un lote solo cuando está estable: tamaño y mtime sin
+cambios durante stable_ms. Los .partial (rclone en descarga) se ignoran.
+
+Ventana de micro-lote por fuente:
+  - debounce_ms: espera a que la carpeta quede quieta antes de liberar el lote
+  - max_batch_files: si hay tantos archivos estables, se libera de inmediato
+    (set_batch_limit() lo baja por fuente, p.ej. con AdaptiveBatchSizer)
+  - max_wait_s: tope de espera desde el primer archivo pendiente (ráfagas largas)
+"""
+
+import ctypes
+import ctypes.util
+import os
+import select
+import struct
+import sys
+import threading
+import time
+from datetime import datetime
+from typing import Dict, List, Set
+
+
+def _log(tag: str, msg: str):
+    ts = datetime.now().strftime('%H:%M:%S.%f')[:-3]
+    print(f"[{ts}] [{tag}] {msg}")
+
+
+# inotify(7)
+_IN_MODIFY = 0x00000002
+_IN_CLOSE_WRITE = 0x00000008
+_IN_MOVED_TO = 0x00000080
+_IN_CREATE = 0x00000100
+_IN_Q_OVERFLOW = 0x00004000
+_IN_MASK = _IN_MODIFY | _IN_CLOSE_WRITE | _IN_MOVED_TO | _IN_CREATE
+_EVENT_HEADER = struct.Struct('iIII')  # wd, mask, cookie, len
+
+
+class _Inotify:
+    """Wrapper mínimo de inotify sobre libc (solo lo que usa el watcher)."""
+
+    def __init__(self):
+        libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+        self._libc = libc
+        self.fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), 'inotify_init1 falló')
+        self.wd_to_key: Dict[int, str] = {}
+
+    def add_watch(self, key: str, path: str):
+        wd = self._libc.inotify_add_watch(self.fd, os.fsencode(path), _IN_MASK)
+        if wd < 0:
+            raise OSError(ctypes.get_errno(), f'inotify_add_watch falló en {path}')
+        self.wd_to_key[wd] = key
+
+    def read_events(self) -> list:
+        """Lee eventos pendientes → [(key | None, nombre, mask)]. key None = overflow."""
+        events = []
+        while True:
+            try:
+                buf = os.read(self.fd, 65536)
+            except BlockingIOError:
+                break
+            if not buf:
+                break
+            offset = 0
+            while offset < len(buf):
+                wd, mask, _, name_len = _EVENT_HEADER.unpack_from(buf, offset)
+                offset += _EVENT_HEADER.size
+                name = buf[offset:offset + name_len].rstrip(b'\0').decode('utf-8', 'replace')
+                offset += name_len
+                if mask & _IN_Q_OVERFLOW:
+                    events.append((None, '', mask))
+                else:
+                    events.append((self.wd_to_key.get(wd), name, mask))
+        return events
+
+    def close(self):
+        os.close(self.fd)
+
+
+class FileArrivalWatcher:
+    """Observa varias carpetas fuente y avisa cuándo hay un micro-lote listo.
+
+    Uso:
+        watcher = FileArrivalWatcher({'Cartoning': path, ...})
+        ready = watcher.wait(timeout)          # fuentes con lote listo
+        files = watcher.take_batch('Cartoning')  # consume hasta max_batch_files
+    """
+
+    def __init__(self, directories: Dict[str, str], stable_ms: int = 2000,
+                 debounce_ms: int = 1000, max_batch_files: int = 500,
+                 max_wait_s: float = 30.0, fallback_poll_s: float = 5.0,
+                 rescan_s: float = 300.0, use_inotify: bool = True):
+        self.directories = dict(directories)
+        self.stable_s = stable_ms / 1000.0
+        self.debounce_s = debounce_ms / 1000.0
+        self.max_batch_files = max_batch_files
+        self.max_wait_s = max_wait_s
+        self.fallback_poll_s = fallback_poll_s
+        self.rescan_s = rescan_s
+
+        # key -> {filename: [size, mtime, estable_desde]}
+        self._pending: Dict[str, Dict[str, list]] = {k: {} for k in self.directories}
+        self._last_event: Dict[str, float] = {k: 0.0 for k in self.directories}
+        self._first_seen: Dict[str, float] = {}
+        self._taken: Dict[str, Set[str]] = {k: set() for k in self.directories}
+        self._limits: Dict[str, int] = {}
+
+        self._wake_event = threading.Event()
+        self._inotify = None
+        self._wake_r = self._wake_w = None
+        if use_inotify and sys.platform.startswith('linux'):
+            try:
+                self._inotify = _Inotify()
+                for key, path in self.directories.items():
+                    self._inotify.add_watch(key, path)
+                self._wake_r, self._wake_w = os.pipe()
+                os.set_blocking(self._wake_r, False)
+            except (OSError, AttributeError) as e:
+                _log('WATCH', f'WARN: inotify no disponible ({e}). Usando polling')
+                if self._inotify is not None:
+                    self._inotify.close()
+                self._inotify = None
+
+        self.mode = 'inotify' if self._inotify else 'polling'
+        self._last_full_scan = 0.0
+        self._full_scan()
+        _log('WATCH', f'Watcher activo ({self.mode}) sobre {len(self.directories)} carpetas '
+                      f'(estable={stable_ms}ms, debounce={debounce_ms}ms, '
+                      f'max_lote={max_batch_files}, max_wait={max_wait_s}s)')
+
+    # ── API ───────────────────────────────────────────────────────
+
+    def wait(self, timeout: float, busy: Set[str] = frozenset()) -> List[str]:
+        """Bloquea hasta que alguna fuente tenga un lote listo, wake() o timeout.
+
+        Args:
+            busy: fuentes con un lote en curso; no cuentan como listas
+
+        Returns:
+            Claves de las fuentes con lote listo (puede ser [] por timeout/wake)
+        """
+        deadline = time.time() + timeout
+        while True:
+            now = time.time()
+            self._refresh_pending(now)
+            ready = [k for k in self.directories
+                     if k not in busy and self._is_ready(k, now)]
+            if ready or now >= deadline:
+                return ready
+
+            sleep_s = min(deadline, self._next_deadline(now)) - now
+            if self._block(max(0.0, sleep_s)):
+                return []  # wake() explícito
+
+    def take_batch(self, key: str) -> List[str]:
+        """Consume hasta batch_limit(key) archivos estables de la fuente (orden mtime)."""
+        now = time.time()
+        pending = self._pending[key]
+        stable = sorted((info[1], name) for name, info in pending.items()
+                        if now - info[2] >= self.stable_s)
+        batch = [name for _, name in stable[:self.batch_limit(key)]]
+        for name in batch:
+            del pending[name]
+        self._taken[key].update(batch)
+        if pending:
+            self._first_seen[key] = now
+        else:
+            self._first_seen.pop(key, None)
+        return batch
+
+    def release(self, key: str, filenames: List[str]):
+        """Olvida archivos entregados en take_batch (ya movidos o descartados).
+
+        Los que sigan en la carpeta fuente (p.ej. move fallido) se vuelven a
+        detectar en el siguiente escaneo.
+        """
+        self._taken[key].difference_update(filenames)
+
+    def set_batch_limit(self, key: str, limit: int):
+        """Tope de archivos por lote de la fuente (nunca sobre max_batch_files)."""
+        self._limits[key] = limit
+
+    def batch_limit(self, key: str) -> int:
+        return min(self._limits.get(key, self.max_batch_files), self.max_batch_files)
+
+    def pending_count(self, key: str) -> int:
+        """Archivos detectados de la fuente que aún no entran a un lote (backlog)."""
+        return len(self._pending[key])
+
+    def wake(self):
+        """Despierta un wait() en curso (p.ej. al terminar un worker)."""
+        self._wake_event.set()
+        if self._wake_w is not None:
+            try:
+                os.write(self._wake_w, b'\0')
+            except OSError:
+                pass
+
+    def close(self):
+        if self._inotify is not None:
+            self._inotify.close()
+            os.close(self._wake_r)
+            os.close(self._wake_w)
+            self._inotify = None
+
+    # ── Internos ──────────────────────────────────────────────────
+
+    def _block(self, timeout: float) -> bool:
+        """Espera eventos hasta timeout. Retorna True si fue un wake() explícito."""
+        if self._inotify is None:
+            woke = self._wake_event.wait(timeout)
+            self._wake_event.clear()
+            return woke
+
+        readable, _, _ = select.select([self._inotify.fd, self._wake_r], [], [], timeout)
+        woke = False
+        if self._wake_r in readable:
+            try:
+                while os.read(self._wake_r, 1024):
+                    pass
+            except BlockingIOError:
+                pass
+            self._wake_event.clear()
+            woke = True
+        if self._inotify.fd in readable:
+            now = time.time()
+            for key, name, _ in self._inotify.read_events():
+                if key is None:
+                    _log('WATCH', 'WARN: overflow de cola inotify. Re-escaneo completo')
+                    self._full_scan()
+                    continue
+                if name and not name.endswith('.partial'):
+                    self._observe(key, name, now)
+        return woke
+
+    def _next_deadline(self, now: float) -> float:
+        """Próximo instante en que el estado de algún lote puede cambiar."""
+        candidates = []
+        for key, pending in self._pending.items():
+            if not pending:
+                continue
+            candidates.extend(info[2] + self.stable_s for info in pending.values())
+            candidates.append(self._last_event[key] + self.debounce_s)
+            if key in self._first_seen:
+                candidates.append(self._first_seen[key] + self.max_wait_s)
+        candidates.append(self._last_full_scan + self._scan_interval())
+        future = [c for c in candidates if c > now]
+        return min(future) if future else now + self.fallback_poll_s
+
+    def _refresh_pending(self, now: float):
+        """Polling: re-escanea carpetas. inotify: re-stat solo de pendientes."""
+        if now - self._last_full_scan >= self._scan_interval():
+            self._full_scan()
+            return
+        if self._inotify is None:
+            return
+        for key, pending in self._pending.items():
+            for name in list(pending):
+                self._observe(key, name, now, from_event=False)
+
+    def _scan_interval(self) -> float:
+        return self.fallback_poll_s if self._inotify is None else self.rescan_s
+
+    def _full_scan(self):
+        now = time.time()
+        self._last_full_scan = now
+        for key, path in self.directories.items():
+            try:
+                with os.scandir(path) as it:
+                    names = [e.name for e in it
+                             if not e.name.endswith('.partial') and e.is_file()]
+            except OSError as e:
+                _log('WATCH', f'Error escaneando {path}: {e}')
+                continue
+            present = set(names)
+            for name in list(self._pending[key]):
+                if name not in present:
+                    del self._pending[key][name]
+            self._taken[key].intersection_update(present)
+            for name in names:
+                self._observe(key, name, now, from_event=False)
+
+    def _observe(self, key: str, name: str, now: float, from_event: bool = True):
+        """Registra/actualiza un archivo pendiente y su ventana de estabilidad."""
+        if name in self._taken[key]:
+            return
+        try:
+            st = os.stat(os.path.join(self.directories[key], name))
+        except OSError:
+            self._pending[key].pop(name, None)  # movido/borrado
+            return
+        pending = self._pending[key]
+        info = pending.get(name)
+        if info is None:
+            pending[name] = [st.st_size, st.st_mtime, now]
+            self._first_seen.setdefault(key, now)
+            self._last_event[key] = now
+        elif info[0] != st.st_size or info[1] != st.st_mtime:
+            info[:] = [st.st_size, st.st_mtime, now]
+            self._last_event[key] = now
+        elif from_event:
+            self._last_event[key] = now
+
+    def _is_ready(self, key: str, now: float) -> bool:
+        pending = self._pending[key]
+        if not pending:
+            return False
+        stable = sum(1 for info in pending.values() if now - info[2] >= self.stable_s)
+        if not stable:
+            return False
+        if stable >= self.batch_limit(key):
+            return True
+        if now - self._last_event[key] >= self.debounce_s:
+            return True
+        return now - self._first_seen.get(key, now) >= self.max_wait_s
@@ -1,6 +1,10 @@
 import os
 import shutil
-from typing import List, Dict
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Optional
 from dataclasses import dataclass
 from datetime import datetime
 
@@ -8,6 +12,12 @@ def _log(tag: str, msg: str):
     ts = datetime.now().strftime('%H:%M:%S.%f')[:-3]
     print(f"[{ts}] [{tag}] {msg}")
 
+# Backoff de reintento de un move fallido: 0.5s, 1s, 2s, ... tope 60s
+_RETRY_BASE_S = 0.5
+_RETRY_MAX_S = 60.0
+# Reintentos de archivado dentro de la misma llamada (el archivo sigue en _processing/)
+_ARCHIVE_RETRY_ROUNDS = 2
+
 @dataclass
 class FileInfo:
     """Información de archivo para compatibilidad con StateManager"""
@@ -16,24 +26,78 @@ class FileInfo:
     mtime: float
     size: int
 
+
+class _MoveCounter:
+    """Contadores de latencia de moves (total, fallidos, max, p50/p95 de los últimos N)."""
+
+    def __init__(self, window: int = 1024):
+        self._lock = threading.Lock()
+        self.moved = 0
+        self.failed = 0
+        self.total_s = 0.0
+        self.max_s = 0.0
+        self._recent = deque(maxlen=window)
+
+    def record(self, elapsed: float, ok: bool):
+        with self._lock:
+            if ok:
+                self.moved += 1
+                self.total_s += elapsed
+                self.max_s = max(self.max_s, elapsed)
+                self._recent.append(elapsed)
+            else:
+                self.failed += 1
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            recent = sorted(self._recent)
+            pick = lambda q: recent[min(len(recent) - 1, int(q * len(recent)))] if recent else 0.0
+            return {
+                'moved': self.moved,
+                'failed': self.failed,
+                'avg_ms': 1000 * self.total_s / self.moved if self.moved else 0.0,
+                'p50_ms': 1000 * pick(0.50),
+                'p95_ms': 1000 * pick(0.95),
+                'max_ms': 1000 * self.max_s,
+            }
+
+
 class LocalFileClient:
     """Cliente para leer archivos directamente de carpetas locales.
     
     Soporta dos modos:
     - Legacy: lectura directa desde source_path (list_files + get_file_path)
     - Micro-batch: mover archivos a _processing/, leer desde ahí, archivar al terminar
+
+    Los moves (a _processing/ y a _archive/YYYYMMDD/) corren en un pool acotado
+    (move_workers): en el share E: la latencia por archivo domina, no el ancho
+    de banda. Un move fallido no bloquea el lote: el archivo queda en origen con
+    backoff exponencial y entra en un escaneo posterior.
     """
     
-    def __init__(self, source_path: str):
+    def __init__(self, source_path: str, move_workers: int = 8,
+                 max_batch_files: Optional[int] = None):
         """
         Args:
             source_path: Ruta local donde rclone descarga archivos (ej: E:\\Datalake\\Archivos\\EWM\\...)
+            move_workers: moves en paralelo (1 = serial)
+            max_batch_files: tope de archivos por micro-lote (los más antiguos
+                primero); el resto queda en `backlog` para el siguiente lote
         """
         self.source_path = source_path
         # Carpetas de micro-batch (hermanas de source_path)
         parent = os.path.dirname(source_path)
         self.processing_path = os.path.join(parent, "_processing")
         self.archive_path = os.path.join(parent, "_archive")
+        self.move_workers = max(1, move_workers)
+        self.max_batch_files = max_batch_files
+        self.backlog = 0  # archivos elegibles que quedaron fuera del último lote
+
+        self._pool = None
+        self._pool_lock = threading.Lock()
+        self._retry_lock = threading.Lock()
+        self._retry: Dict[str, tuple] = {}  # filename -> (intentos, no_antes_de)
+        self.move_counters = {'processing': _MoveCounter(), 'archive': _MoveCounter()}
         
         if not os.path.exists(source_path):
             raise ValueError(f"La ruta no existe: {source_path}")
@@ -52,56 +116,57 @@ class LocalFileClient:
     
     # ── Modo Micro-batch (nuevo) ──────────────────────────────────
     
-    def batch_move_to_processing(self) -> List[FileInfo]:
-        """Mueve atómicamente todos los .txt de source_path a _processing/.
+    def batch_move_to_processing(self, filenames: Optional[List[str]] = None,
+                                 max_files: Optional[int] = None) -> List[FileInfo]:
+        """Mueve en paralelo los archivos de source_path a _processing/.
+        
+        Args:
+            filenames: si se indica, solo mueve esos archivos (lote entregado
+                por FileArrivalWatcher con archivos ya estables)
+            max_files: tope de este lote (p.ej. AdaptiveBatchSizer); None = max_batch_files
         
         Returns:
-            Lista de FileInfo con rutas apuntando a _processing/
+            Lista de FileInfo con rutas apuntando a _processing/ (solo los movidos;
+            los fallidos quedan en origen con backoff de reintento)
         """
         os.makedirs(self.processing_path, exist_ok=True)
         
         source_files = self._scan_dir(self.source_path)
+        if filenames is not None:
+            wanted = set(filenames)
+            source_files = [fi for fi in source_files if fi.filename in wanted]
+
+        now = time.time()
+        with self._retry_lock:
+            # Olvidar reintentos de archivos que ya no están en origen
+            present = {fi.filename for fi in source_files}
+            for name in [n for n in self._retry if n not in present]:
+                del self._retry[name]
+            waiting = {n for n, (_, not_before) in self._retry.items() if not_before > now}
+        if waiting:
+            source_files = [fi for fi in source_files if fi.filename not in waiting]
+            _log('FILE-IO', f'{len(waiting)} archivos en espera de reintento de move')
+
+        # Tope por micro-lote: primero los más antiguos (orden de llegada)
+        source_files.sort(key=lambda fi: (fi.mtime, fi.filename))
+        cap = max_files or self.max_batch_files
+        self.backlog = 0
+        if cap and len(source_files) > cap:
+            self.backlog = len(source_files) - cap
+            source_files = source_files[:cap]
         if not source_files:
             return []
         
+        t0 = time.time()
+        jobs = [(fi.full_path, os.path.join(self.processing_path, fi.filename))
+                for fi in source_files]
+        errors = self._move_many(jobs, self.move_counters['processing'])
+
         moved: List[FileInfo] = []
-        for fi in source_files:
-            dest = os.path.join(self.processing_path, fi.filename)
-            # Intentos con retry para errores temporales (locks/antivirus)
-            success = False
-            for attempt in range(1, 4):
-                try:
-                    # Intentar rename/move atómico
-                    shutil.move(fi.full_path, dest)
-                    success = True
-                    break
-                except PermissionError as e:
-                    _log('FILE-IO', f'Permiso denegado moviendo {fi.filename} (intento {attempt}): {e}')
-                except OSError as e:
-                    # Windows puede devolver errno 13 / WinError 5
-                    _log('FILE-IO', f'Error OS moviendo {fi.filename} (intento {attempt}): {e}')
-                # Intentar relajar permisos y reintentar
-                try:
-                    os.chmod(fi.full_path, 0o666)
-                except Exception:
-                    pass
-                import time
-                time.sleep(0.5 * attempt)
-
-            # Fallback: intentar copy2 + remove (útil si el archivo está en otro volumen)
-            if not success:
-                try:
-                    _log('FILE-IO', f'Intentando fallback copy para {fi.filename}')
-                    shutil.copy2(fi.full_path, dest)
-                    try:
-                        os.remove(fi.full_path)
-                    except Exception as e_rm:
-                        _log('FILE-IO', f'Warning: no se pudo borrar original {fi.filename} tras copy: {e_rm}')
-                    success = True
-                except Exception as e2:
-                    _log('FILE-IO', f'Error moviendo {fi.filename} a _processing (fallback falló): {e2}')
-
-            if success:
+        failed = 0
+        for fi, (_, dest), err in zip(source_files, jobs, errors):
+            if err is None:
+                self._clear_retry(fi.filename)
                 moved.append(FileInfo(
                     filename=fi.filename,
                     full_path=dest,
@@ -109,47 +174,67 @@ class LocalFileClient:
                     size=fi.size
                 ))
             else:
-                _log('FILE-IO', f'Fallo definitivo moviendo {fi.filename}; se omite por ahora')
+                failed += 1
+                attempts, delay = self._schedule_retry(fi.filename)
+                _log('FILE-IO', f'Error moviendo {fi.filename} a _processing (intento {attempts}, '
+                                f'reintento en {delay:.1f}s): {err}')
         
-        _log('FILE-IO', f'Movidos {len(moved)}/{len(source_files)} archivos a _processing/')
+        stats = self.move_counters['processing'].snapshot()
+        _log('FILE-IO', f'Movidos {len(moved)}/{len(source_files)} archivos a _processing/ '
+                        f'en {time.time()-t0:.2f}s (p95 {stats["p95_ms"]:.1f}ms'
+                        f'{f", {failed} en reintento" if failed else ""}'
+                        f'{f", backlog {self.backlog}" if self.backlog else ""})')
         return moved
     
     def archive_processed(self, filenames: List[str]):
-        """Mueve archivos ya procesados de _processing/ a _archive/YYYYMMDD/.
+        """Mueve en paralelo archivos ya procesados de _processing/ a _archive/YYYYMMDD/.
+
+        Los fallidos se reintentan en rondas (todos juntos, con backoff) sin
+        frenar al resto del lote.
         
         Args:
             filenames: Lista de nombres de archivo a archivar
         """
+        t0 = time.time()
         date_folder = datetime.now().strftime("%Y%m%d")
         dest_dir = os.path.join(self.archive_path, date_folder)
         os.makedirs(dest_dir, exist_ok=True)
         
+        pending = [(os.path.join(self.processing_path, fname), os.path.join(dest_dir, fname))
+                   for fname in filenames
+                   if os.path.exists(os.path.join(self.processing_path, fname))]
         archived = 0
-        for fname in filenames:
-            src = os.path.join(self.processing_path, fname)
-            if os.path.exists(src):
-                dest = os.path.join(dest_dir, fname)
-                try:
-                    shutil.move(src, dest)
-                    archived += 1
-                except Exception as e:
-                    _log('FILE-IO', f'Error archivando {fname}: {e}')
-                    # Intentar fallback copy
-                    try:
-                        shutil.copy2(src, dest)
-                        try:
-                            os.remove(src)
-                            archived += 1
-                        except Exception:
-                            _log('FILE-IO', f'Warning: no se pudo borrar origen {fname} tras copy a archive')
-                    except Exception as e2:
-                        _log('FILE-IO', f'Fallback archivado falló para {fname}: {e2}')
+        counter = self.move_counters['archive']
+        for round_no in range(_ARCHIVE_RETRY_ROUNDS + 1):
+            if round_no:
+                time.sleep(_RETRY_BASE_S * 2 ** (round_no - 1))
+            errors = self._move_many(pending, counter)
+            archived += sum(1 for err in errors if err is None)
+            failed = [(job, err) for job, err in zip(pending, errors) if err is not None]
+            pending = [job for job, _ in failed]
+            if not pending:
+                break
+            for (src, _), err in failed:
+                _log('FILE-IO', f'Error archivando {os.path.basename(src)} '
+                                f'(ronda {round_no + 1}): {err}')
         
-        _log('FILE-IO', f'Archivados {archived}/{len(filenames)} -> {dest_dir}')
+        stats = counter.snapshot()
+        _log('FILE-IO', f'Archivados {archived}/{len(filenames)} -> {dest_dir} '
+                        f'en {time.time()-t0:.2f}s (p95 {stats["p95_ms"]:.1f}ms)')
     
     def get_processing_path(self) -> str:
         """Retorna ruta de _processing/ (para lectura masiva con DuckDB)."""
         return self.processing_path
+
+    def list_processing(self) -> List[FileInfo]:
+        """Archivos que quedaron en _processing/ (lote interrumpido), sin subcarpetas."""
+        if not os.path.exists(self.processing_path):
+            return []
+        return self._scan_dir(self.processing_path)
+
+    def move_stats(self) -> dict:
+        """Latencias de move acumuladas: {'processing': {...}, 'archive': {...}}."""
+        return {kind: counter.snapshot() for kind, counter in self.move_counters.items()}
     
     def cleanup_processing(self):
         """Limpia carpeta _processing/ (por si quedaron residuos)."""
@@ -165,18 +250,21 @@ class LocalFileClient:
     # ── Internos ──────────────────────────────────────────────────
     
     def _scan_dir(self, directory: str) -> List[FileInfo]:
-        """Escanea un directorio retornando FileInfo, excluyendo .partial."""
+        """Escanea un directorio con os.scandir, excluyendo .partial.
+
+        En Windows DirEntry.stat() viene cacheado del listado (sin una
+        llamada extra por archivo al share).
+        """
         try:
             files = []
-            for filename in os.listdir(directory):
-                if filename.endswith('.partial'):
-                    continue
-                full_path = os.path.join(directory, filename)
-                if os.path.isfile(full_path):
-                    stat = os.stat(full_path)
+            with os.scandir(directory) as it:
+                for entry in it:
+                    if entry.name.endswith('.partial') or not entry.is_file():
+                        continue
+                    stat = entry.stat()
                     files.append(FileInfo(
-                        filename=filename,
-                        full_path=full_path,
+                        filename=entry.name,
+                        full_path=entry.path,
                         mtime=stat.st_mtime,
                         size=stat.st_size
                     ))
@@ -185,6 +273,73 @@ class LocalFileClient:
             _log('FILE-IO', f'Error listando archivos en {directory}: {e}')
             return []
     
+    def _move_many(self, jobs: list, counter: _MoveCounter) -> list:
+        """Ejecuta [(src, dest)] en el pool. Retorna el error de cada job (None = OK)."""
+        if not jobs:
+            return []
+        if self.move_workers == 1 or len(jobs) == 1:
+            return [self._timed_move(src, dest, counter) for src, dest in jobs]
+        pool = self._get_pool()
+        return list(pool.map(lambda job: self._timed_move(job[0], job[1], counter), jobs))
+
+    def _get_pool(self) -> ThreadPoolExecutor:
+        with self._pool_lock:
+            if self._pool is None:
+                self._pool = ThreadPoolExecutor(max_workers=self.move_workers,
+                                                thread_name_prefix='file-mv')
+            return self._pool
+
+    def _timed_move(self, src: str, dest: str, counter: _MoveCounter) -> Optional[str]:
+        t0 = time.perf_counter()
+        err = self._move_file(src, dest)
+        counter.record(time.perf_counter() - t0, err is None)
+        return err
+
+    @staticmethod
+    def _move_file(src: str, dest: str) -> Optional[str]:
+        """Un intento de move (rename; fallback copy2 + remove). Retorna el error o None."""
+        try:
+            os.replace(src, dest)
+            return None
+        except PermissionError as e:
+            # Windows: errno 13 / WinError 5 (locks/antivirus): relajar permisos
+            err = e
+            try:
+                os.chmod(src, 0o666)
+                os.replace(src, dest)
+                return None
+            except OSError as e2:
+                err = e2
+        except OSError as e:
+            err = e
+
+        # Fallback: copy2 + remove (útil si el archivo está en otro volumen)
+        try:
+            shutil.copy2(src, dest)
+        except Exception as e2:
+            return f'{err}; fallback copy falló: {e2}'
+        try:
+            os.remove(src)
+        except Exception as e_rm:
+            _log('FILE-IO', f'Warning: no se pudo borrar original {os.path.basename(src)} '
+                            f'tras copy: {e_rm}')
+        return None
+
+    def _schedule_retry(self, filename: str) -> tuple:
+        """Registra un move fallido. Retorna (intentos, segundos hasta el reintento)."""
+        with self._retry_lock:
+            attempts = self._retry.get(filename, (0, 0.0))[0] + 1
+            delay = min(_RETRY_MAX_S, _RETRY_BASE_S * 2 ** (attempts - 1))
+            self._retry[filename] = (attempts, time.time() + delay)
+        return attempts, delay
+
+    def _clear_retry(self, filename: str):
+        with self._retry_lock:
+            self._retry.pop(filename, None)
+
     def close(self):
-        """Método para compatibilidad con interfaz SFTP (no hace nada)"""
-        pass
+        """Libera el pool de moves (compatibilidad con interfaz SFTP)."""
+        with self._pool_lock:
+            if self._pool is not None:
+                self._pool.shutdown(wait=True)
+                self._pool = None
@@ -0,0 +1,195 @@
+"""
+PipelineMetrics — Métricas por etapa y por fuente del servicio de ingesta EWM.
+
+Reemplaza "grepear" los logs del runner para saber qué fuente optimizar:
+  - Histogramas de duración por (fuente, etapa): move, parse, truncate,
+    insert, sp_batch, sp_file, archive, total.
+  - Contadores por fuente: lotes, archivos, filas, errores, duplicados.
+  - Gauges por fuente: backlog de archivos (y su ETA), filas/s del último
+    lote, tope de archivos del próximo lote (modo adaptativo).
+
+Salidas (ambas opcionales, solo stdlib):
+  - Endpoint HTTP local con formato de texto Prometheus (GET /metrics).
+  - Archivo JSONL rotativo con un registro por lote (RotatingFileHandler),
+    para graficar parse vs insert vs SP por fuente a lo largo de días.
+"""
+
+import json
+import logging
+import logging.handlers
+import os
+import threading
+import time
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+def _log(tag: str, msg: str):
+    ts = datetime.now().strftime('%H:%M:%S.%f')[:-3]
+    print(f"[{ts}] [{tag}] {msg}")
+
+
+_PREFIX = 'ewm'
+
+# Segundos: de un move en disco local (ms) a un SP de fin de mes (minutos)
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0,
+                   10.0, 30.0, 60.0, 120.0, 300.0, 600.0)
+
+_COUNTER_HELP = {
+    'batches': 'Lotes completados',
+    'files': 'Archivos procesados',
+    'rows': 'Filas cargadas a staging',
+    'errors': 'Errores (lote o SP)',
+    'duplicates': 'Re-entregas omitidas por el catálogo',
+    'rejects': 'Filas con valores que no convierten (copia en tabla de rechazos)',
+}
+_GAUGE_HELP = {
+    'backlog_files': 'Archivos pendientes en origen tras el último lote',
+    'rows_per_second': 'Filas/s del último lote (filas / duración total)',
+    'last_batch_timestamp_seconds': 'Epoch del último lote completado',
+    'batch_limit_files': 'Tope de archivos del próximo lote (AdaptiveBatchSizer)',
+    'backlog_eta_seconds': 'Segundos estimados para vaciar el backlog al ritmo del último lote',
+}
+
+
+class PipelineMetrics:
+    """Registro thread-safe de métricas; lo comparten todos los workers."""
+
+    def __init__(self, jsonl_path: str = None, jsonl_max_mb: int = 50,
+                 jsonl_backups: int = 5, buckets: tuple = DEFAULT_BUCKETS):
+        """
+        Args:
+            jsonl_path: archivo JSONL por lote (None = sin archivo)
+            jsonl_max_mb: tamaño que dispara la rotación
+            jsonl_backups: archivos rotados a conservar (.1 .. .N)
+        """
+        self.buckets = tuple(sorted(buckets))
+        self._lock = threading.Lock()
+        self._hist = {}      # (source, stage) -> [bucket_counts, sum, count]
+        self._counters = {}  # (name, source) -> valor
+        self._gauges = {}    # (name, source) -> valor
+        self._server = None
+
+        self._jsonl = None
+        if jsonl_path:
+            os.makedirs(os.path.dirname(os.path.abspath(jsonl_path)), exist_ok=True)
+            handler = logging.handlers.RotatingFileHandler(
+                jsonl_path, maxBytes=jsonl_max_mb * 1024 * 1024,
+                backupCount=jsonl_backups, encoding='utf-8')
+            handler.setFormatter(logging.Formatter('%(message)s'))
+            self._jsonl = logging.getLogger(f'ewm.metrics.{id(self)}')
+            self._jsonl.propagate = False
+            self._jsonl.setLevel(logging.INFO)
+            self._jsonl.addHandler(handler)
+            _log('METRICS', f'JSONL por lote en {jsonl_path} '
+                            f'(rota a {jsonl_max_mb}MB, {jsonl_backups} respaldos)')
+
+    # ── Registro ──────────────────────────────────────────────────
+
+    def observe(self, stage: str, source: str, seconds: float):
+        """Agrega una duración al histograma (fuente, etapa)."""
+        with self._lock:
+            hist = self._hist.get((source, stage))
+            if hist is None:
+                hist = self._hist[(source, stage)] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if seconds <= bound:
+                    hist[0][i] += 1
+            hist[1] += seconds
+            hist[2] += 1
+
+    def stage_done(self, timings: dict, stage: str, source: str, t0: float) -> float:
+        """Cierra una etapa iniciada en t0: observa y acumula en timings (lote)."""
+        elapsed = time.time() - t0
+        self.observe(stage, source, elapsed)
+        timings[stage] = timings.get(stage, 0.0) + elapsed
+        return elapsed
+
+    def inc(self, name: str, source: str, value: float = 1):
+        with self._lock:
+            self._counters[(name, source)] = self._counters.get((name, source), 0) + value
+
+    def set(self, name: str, source: str, value: float):
+        with self._lock:
+            self._gauges[(name, source)] = value
+
+    def record_batch(self, source: str, **fields):
+        """Escribe un registro JSONL del lote (ts, fuente + campos libres)."""
+        if self._jsonl is None:
+            return
+        record = {'ts': datetime.now().isoformat(timespec='milliseconds'), 'source': source}
+        record.update(fields)
+        self._jsonl.info(json.dumps(record, ensure_ascii=False, default=str))
+
+    # ── Exposición ────────────────────────────────────────────────
+
+    def render(self) -> str:
+        """Texto de exposición Prometheus (version 0.0.4)."""
+        with self._lock:
+            hist = {k: (list(v[0]), v[1], v[2]) for k, v in self._hist.items()}
+            counters = dict(self._counters)
+            gauges = dict(self._gauges)
+
+        out = [f'# HELP {_PREFIX}_stage_seconds Duración por etapa del lote',
+               f'# TYPE {_PREFIX}_stage_seconds histogram']
+        for (source, stage), (counts, total, count) in sorted(hist.items()):
+            labels = f'source="{_escape(source)}",stage="{_escape(stage)}"'
+            for bound, n in zip(self.buckets, counts):
+                out.append(f'{_PREFIX}_stage_seconds_bucket{{{labels},le="{bound:g}"}} {n}')
+            out.append(f'{_PREFIX}_stage_seconds_bucket{{{labels},le="+Inf"}} {count}')
+            out.append(f'{_PREFIX}_stage_seconds_sum{{{labels}}} {total:.6f}')
+            out.append(f'{_PREFIX}_stage_seconds_count{{{labels}}} {count}')
+
+        for kind, values, helps in (('counter', counters, _COUNTER_HELP),
+                                    ('gauge', gauges, _GAUGE_HELP)):
+            for name in sorted({n for n, _ in values}):
+                metric = f'{_PREFIX}_{name}_total' if kind == 'counter' else f'{_PREFIX}_{name}'
+                out.append(f'# HELP {metric} {helps.get(name, name)}')
+                out.append(f'# TYPE {metric} {kind}')
+                for (n, source), value in sorted(values.items()):
+                    if n == name:
+                        out.append(f'{metric}{{source="{_escape(source)}"}} {value:g}')
+        return '\n'.join(out) + '\n'
+
+    def start_http(self, port: int, host: str = '127.0.0.1'):
+        """Sirve GET /metrics en un hilo daemon."""
+        metrics = self
+
+        class _Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split('?')[0] not in ('/metrics', '/'):
+                    self.send_error(404)
+                    return
+                body = metrics.render().encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass  # Sin ruido en el log del runner
+
+        try:
+            self._server = ThreadingHTTPServer((host, port), _Handler)
+        except OSError as e:
+            _log('METRICS', f'WARN: no se pudo abrir {host}:{port} ({e}). Endpoint deshabilitado')
+            return
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, name='metrics-http',
+                         daemon=True).start()
+        _log('METRICS', f'Endpoint Prometheus en http://{host}:{port}/metrics')
+
+    def close(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+        if self._jsonl is not None:
+            for handler in list(self._jsonl.handlers):
+                handler.close()
+                self._jsonl.removeHandler(handler)
+
+
+def _escape(value: str) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
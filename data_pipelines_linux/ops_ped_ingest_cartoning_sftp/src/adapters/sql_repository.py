@@ -5,10 +5,30 @@ Mejoras FASE 3:
   - bulk_insert_arrow(): bulk insert directo desde PyArrow Table (zero-copy → pandas)
   - truncate_tables(): limpia staging antes de insertar nuevo lote
   - Mantiene bulk_insert() legacy para retrocompatibilidad
+
+Backends de carga para bulk_insert_arrow() (seleccionables por tabla):
+  - 'pandas'      : Arrow → pandas → to_sql con fast_executemany (INSERTs por lotes)
+  - 'bcp'         : archivo delimitado + utilidad bcp (bulk copy TDS real)
+  - 'bulk_insert' : archivo delimitado en carpeta compartida + BULK INSERT
+  Los dos nativos escriben el archivo por RecordBatch con pyarrow.compute
+  (sin DataFrame) y un format file que mapea columnas Arrow → columnas de la
+  tabla. Ante cualquier falla se reintenta con 'pandas'.
+
+bulk_insert_stream() consume un pyarrow.RecordBatchReader batch a batch (modo
+streaming del DuckDBBatchProcessor): nunca materializa la tabla completa.
+
+Aislamiento por corrida (run_id): en vez de truncate_tables() por lote, cada
+carga agrega la columna RunID (BIGINT, ver new_run_id()) a sus filas. Los SP
+reciben @RunID, delete_run() limpia solo un lote fallido y purge_stale_runs()
+barre lo que dejaron corridas interrumpidas.
 """
 
 import os
 import re
+import struct
+import subprocess
+import tempfile
+import threading
 import time
 import traceback
 import urllib
@@ -18,19 +38,118 @@ import pandas as pd
 
 try:
     import pyarrow as pa
+    import pyarrow.compute as pc
     HAS_PYARROW = True
 except ImportError:
     HAS_PYARROW = False
 
 
+BULK_BACKEND_PANDAS = 'pandas'
+BULK_BACKEND_BCP = 'bcp'
+BULK_BACKEND_BULK_INSERT = 'bulk_insert'
+BULK_BACKENDS = (BULK_BACKEND_PANDAS, BULK_BACKEND_BCP, BULK_BACKEND_BULK_INSERT)
+
+# Formato del archivo de carga (char, UTF-8). Tab/CR/LF dentro de los valores
+# se reemplazan por espacio; NULL y '' se escriben vacíos (→ NULL en SQL).
+_BULK_FIELD_SEP = '\t'
+_BULK_ROW_SEP = '\r\n'
+_BULK_SANITIZE_RE = r'[\t\r\n]'
+
+
 def _log(tag: str, msg: str):
     """Log centralizado con timestamp y etapa."""
     ts = datetime.now().strftime('%H:%M:%S.%f')[:-3]
     print(f"[{ts}] [{tag}] {msg}")
 
 
+class _PartialBulkLoad(RuntimeError):
+    """bcp confirmó menos filas que las enviadas: no se reintenta con pandas
+    (duplicaría las filas ya cargadas), salvo que la carga tenga run_id y se
+    puedan borrar primero."""
+
+
+RUN_ID_COLUMN = 'RunID'
+
+_run_id_lock = threading.Lock()
+_last_run_id = 0
+
+
+def new_run_id() -> int:
+    """RunID de staging: microsegundos desde epoch, único y creciente en el proceso.
+
+    Al ser una marca de tiempo, purge_stale_runs() puede barrer por antigüedad
+    sin tabla de control.
+    """
+    global _last_run_id
+    with _run_id_lock:
+        _last_run_id = max(time.time_ns() // 1000, _last_run_id + 1)
+        return _last_run_id
+
+
+def _with_run_id(data, run_id: int):
+    """Table o RecordBatch + columna RunID constante (int64)."""
+    column = pa.repeat(pa.scalar(run_id, pa.int64()), data.num_rows)
+    return data.append_column(RUN_ID_COLUMN, column)
+
+
+def _reader_with_run_id(reader: 'pa.RecordBatchReader', run_id: int) -> 'pa.RecordBatchReader':
+    schema = reader.schema.append(pa.field(RUN_ID_COLUMN, pa.int64()))
+    return pa.RecordBatchReader.from_batches(
+        schema, (_with_run_id(batch, run_id) for batch in reader))
+
+
+def _encode_batch(batch: 'pa.RecordBatch') -> 'pa.Buffer':
+    """RecordBatch → bytes 'v1\\tv2\\t...\\r\\n' por fila, todo en pyarrow.compute.
+
+    Une columnas con binary_join_element_wise y devuelve directamente el buffer
+    de datos del StringArray resultante (las filas quedan contiguas).
+    """
+    cols = []
+    for col in batch.columns:
+        if not pa.types.is_string(col.type):
+            col = pc.cast(col, pa.string())
+        col = pc.replace_substring_regex(col, _BULK_SANITIZE_RE, ' ')
+        cols.append(pc.fill_null(col, ''))
+    lines = pc.binary_join_element_wise(*cols, _BULK_FIELD_SEP)
+    lines = pc.binary_join_element_wise(lines, '', _BULK_ROW_SEP)
+    _, offsets, data = lines.buffers()
+    start = struct.unpack_from('<i', offsets, lines.offset * 4)[0]
+    end = struct.unpack_from('<i', offsets, (lines.offset + len(lines)) * 4)[0]
+    return data[start:end]
+
+
 class SqlRepository:
-    def __init__(self, host, db, user=None, password=None, driver="ODBC Driver 17 for SQL Server"):
+    def __init__(self, host, db, user=None, password=None, driver="ODBC Driver 17 for SQL Server",
+                 bulk_backend: str = BULK_BACKEND_PANDAS, bulk_backends: dict = None,
+                 bulk_stage_dir: str = None, bulk_server_dir: str = None,
+                 bcp_path: str = 'bcp', bulk_batch_rows: int = 100000):
+        """
+        Args:
+            bulk_backend: backend por defecto de bulk_insert_arrow (ver BULK_BACKENDS)
+            bulk_backends: override por tabla, p.ej. {'Staging_EWM_OBDConfirm_Posiciones': 'bcp'}
+            bulk_stage_dir: carpeta donde se escriben los archivos de carga
+                            (default: <tmp>/ewm_bulk)
+            bulk_server_dir: la misma carpeta vista desde SQL Server (UNC) para
+                             'bulk_insert'; None = misma ruta que bulk_stage_dir
+            bcp_path: ejecutable bcp (mssql-tools)
+            bulk_batch_rows: filas por RecordBatch al escribir el archivo
+        """
+        # Parámetros guardados para clone() (una conexión por worker)
+        self._conn_args = (host, db, user, password, driver)
+        self._bulk_opts = dict(bulk_backend=bulk_backend, bulk_backends=bulk_backends,
+                               bulk_stage_dir=bulk_stage_dir, bulk_server_dir=bulk_server_dir,
+                               bcp_path=bcp_path, bulk_batch_rows=bulk_batch_rows)
+        for backend in [bulk_backend] + list((bulk_backends or {}).values()):
+            if backend not in BULK_BACKENDS:
+                raise ValueError(f"bulk backend inválido: {backend!r} (opciones: {BULK_BACKENDS})")
+        self.bulk_backend = bulk_backend
+        self.bulk_backends = dict(bulk_backends or {})
+        self.bulk_stage_dir = bulk_stage_dir or os.path.join(tempfile.gettempdir(), 'ewm_bulk')
+        self.bulk_server_dir = bulk_server_dir
+        self.bcp_path = bcp_path
+        self.bulk_batch_rows = bulk_batch_rows
+        self._column_cache = {}           # tabla -> {columna: ordinal}
+        self._disabled_backends = set()   # p.ej. bcp no instalado
 
         # Lógica inteligente: ¿SQL Auth o Windows Auth?
         if user and password:
@@ -68,11 +187,19 @@ class SqlRepository:
         except Exception as e:
             _log('SQL-CONN', f'ERROR verificando conexión: {e}')
 
+    def clone(self) -> 'SqlRepository':
+        """Crea un repositorio nuevo (engine y pool propios) con las mismas credenciales.
+
+        Usado por los workers paralelos de MultiSourcePipeline: cada fuente
+        carga staging y ejecuta su SP por su propia conexión.
+        """
+        return SqlRepository(*self._conn_args, **self._bulk_opts)
+
     def init_schema(self, script_path: str):
         if not os.path.exists(script_path):
             _log('SQL-SCHEMA', f'WARN: Script no encontrado: {script_path}')
             return
-        _log('SQL-SCHEMA', f'Ejecutando setup_database.sql...')
+        _log('SQL-SCHEMA', f'Ejecutando {os.path.basename(script_path)}...')
         t0 = time.time()
         try:
             with open(script_path, 'r', encoding='utf-8') as f:
@@ -93,10 +220,94 @@ class SqlRepository:
     #  BULK INSERT: PyArrow (nuevo) y pandas (legacy)
     # ─────────────────────────────────────────────────────────────
 
-    def bulk_insert_arrow(self, arrow_table: 'pa.Table', table_name: str) -> bool:
-        """Inserta un PyArrow Table en SQL Server.
+    def bulk_backend_for(self, table_name: str) -> str:
+        """Backend de carga efectivo para una tabla (override por tabla o default)."""
+        return self.bulk_backends.get(table_name, self.bulk_backend)
+
+    def bulk_insert_arrow(self, arrow_table: 'pa.Table', table_name: str,
+                          run_id: int = None) -> bool:
+        """Inserta un PyArrow Table en SQL Server con el backend de la tabla.
+
+        'bcp' / 'bulk_insert' cargan en una sola transacción (todo o nada); si
+        fallan se reintenta con 'pandas'.
+
+        Args:
+            run_id: marca las filas con RunID (aislamiento por corrida)
+        """
+        if run_id is not None:
+            arrow_table = _with_run_id(arrow_table, run_id)
+        backend = self.bulk_backend_for(table_name)
+        if backend != BULK_BACKEND_PANDAS and backend not in self._disabled_backends:
+            try:
+                if self._bulk_insert_arrow_native(arrow_table, table_name, backend):
+                    return True
+            except _PartialBulkLoad as e:
+                _log('SQL-INSERT', f'[{backend}] ERROR CRITICO en {table_name}: {e}')
+                if not self._undo_partial_load(table_name, run_id):
+                    return False
+            _log('SQL-INSERT', f'[{backend}] WARN: reintentando {table_name} con pandas/to_sql')
+        return self._bulk_insert_arrow_pandas(arrow_table, table_name)
+
+    def bulk_insert_stream(self, open_reader, table_name: str, run_id: int = None):
+        """Inserta un stream de RecordBatch sin materializar la tabla completa.
+
+        Args:
+            open_reader: callable sin argumentos → pyarrow.RecordBatchReader. Se
+                         vuelve a llamar si el backend nativo falla y hay que
+                         reintentar con 'pandas'.
+            run_id: marca las filas con RunID (aislamiento por corrida)
 
-        Convierte Arrow → pandas (zero-copy cuando es posible) y usa
+        Returns:
+            Filas insertadas, o None si falló (todo o nada en cualquier backend).
+        """
+        if run_id is not None:
+            opener = open_reader
+            open_reader = lambda: _reader_with_run_id(opener(), run_id)
+        backend = self.bulk_backend_for(table_name)
+        if backend != BULK_BACKEND_PANDAS and backend not in self._disabled_backends:
+            try:
+                reader = open_reader()
+                rows = self._bulk_load_native(reader.schema.names, reader, table_name, backend)
+                if rows is not None:
+                    return rows
+            except _PartialBulkLoad as e:
+                _log('SQL-INSERT', f'[{backend}] ERROR CRITICO en {table_name}: {e}')
+                if not self._undo_partial_load(table_name, run_id):
+                    return None
+            _log('SQL-INSERT', f'[{backend}] WARN: reintentando {table_name} con pandas/to_sql')
+        return self._bulk_insert_stream_pandas(open_reader(), table_name)
+
+    def _undo_partial_load(self, table_name: str, run_id: int) -> bool:
+        """Tras una carga parcial: con run_id se borran sus filas y se puede reintentar."""
+        return run_id is not None and self.delete_run([table_name], run_id)
+
+    def _bulk_insert_stream_pandas(self, reader: 'pa.RecordBatchReader', table_name: str):
+        """to_sql por RecordBatch dentro de una sola transacción."""
+        try:
+            t0 = time.time()
+            rows = 0
+            _log('SQL-INSERT', f'[Stream] Insertando en {table_name} (cols: {", ".join(reader.schema.names)})')
+            with self.engine.begin() as conn:
+                for batch in reader:
+                    if not batch.num_rows:
+                        continue
+                    df = batch.to_pandas(types_mapper=pd.ArrowDtype)
+                    df = df.where(df.notna(), None)
+                    df.to_sql(table_name, con=conn, if_exists='append',
+                              index=False, chunksize=20000)
+                    rows += batch.num_rows
+            elapsed = time.time() - t0
+            rate = rows / elapsed if elapsed > 0 else 0
+            _log('SQL-INSERT', f'[Stream] OK: {rows} filas en {table_name} ({elapsed:.2f}s, {rate:.0f} filas/s)')
+            return rows
+
+        except Exception as e:
+            _log('SQL-INSERT', f'[Stream] ERROR en {table_name}: {e}')
+            _log('SQL-INSERT', f'  Traceback: {traceback.format_exc()}')
+            return None
+
+    def _bulk_insert_arrow_pandas(self, arrow_table: 'pa.Table', table_name: str) -> bool:
+        """Convierte Arrow → pandas (zero-copy cuando es posible) y usa
         fast_executemany para máximo throughput.
         """
         try:
@@ -128,6 +339,150 @@ class SqlRepository:
             _log('SQL-INSERT', f'  Traceback: {traceback.format_exc()}')
             return False
 
+    # ─────────────────────────────────────────────────────────────
+    #  BULK COPY NATIVO: bcp / BULK INSERT desde archivo delimitado
+    # ─────────────────────────────────────────────────────────────
+
+    def _bulk_insert_arrow_native(self, arrow_table: 'pa.Table', table_name: str,
+                                  backend: str) -> bool:
+        _log('SQL-INSERT', f'[{backend}] Insertando {arrow_table.num_rows} filas en {table_name}')
+        batches = arrow_table.to_batches(max_chunksize=self.bulk_batch_rows)
+        return self._bulk_load_native(arrow_table.column_names, batches,
+                                      table_name, backend) is not None
+
+    def _bulk_load_native(self, names: list, batches, table_name: str, backend: str):
+        """Escribe los batches a archivo y carga con bcp / BULK INSERT.
+
+        Returns:
+            Filas cargadas, o None si falló (reintentable con pandas)
+        """
+        tag = f'[{backend}]'
+        data_path = fmt_path = None
+        try:
+            t0 = time.time()
+            data_path, fmt_path, rows = self._write_bulk_files(names, batches, table_name)
+            t_write = time.time() - t0
+
+            if backend == BULK_BACKEND_BCP:
+                loaded = self._run_bcp(table_name, data_path, fmt_path)
+                if loaded != rows:
+                    raise _PartialBulkLoad(f'bcp cargó {loaded} de {rows} filas')
+            else:
+                self._run_bulk_insert(table_name, data_path, fmt_path, rows)
+
+            elapsed = time.time() - t0
+            rate = rows / elapsed if elapsed > 0 else 0
+            _log('SQL-INSERT', f'{tag} OK: {rows} filas en {table_name} ({elapsed:.2f}s, '
+                               f'{rate:.0f} filas/s, archivo {t_write:.2f}s)')
+            return rows
+
+        except _PartialBulkLoad:
+            raise
+        except FileNotFoundError as e:
+            if backend == BULK_BACKEND_BCP and data_path:
+                _log('SQL-INSERT', f'{tag} ERROR: {self.bcp_path} no encontrado ({e}). '
+                                   f'Backend deshabilitado para esta conexión')
+                self._disabled_backends.add(backend)
+            else:
+                _log('SQL-INSERT', f'{tag} ERROR en {table_name}: {e}')
+            return None
+        except Exception as e:
+            _log('SQL-INSERT', f'{tag} ERROR en {table_name}: {e}')
+            _log('SQL-INSERT', f'  Traceback: {traceback.format_exc()}')
+            return None
+        finally:
+            for path in (data_path, fmt_path):
+                if path:
+                    try:
+                        os.remove(path)
+                    except OSError:
+                        pass
+
+    def _target_columns(self, table_name: str) -> dict:
+        """Columnas de la tabla destino → ordinal (cacheado por tabla)."""
+        cols = self._column_cache.get(table_name)
+        if cols is None:
+            with self.engine.connect() as conn:
+                result = conn.execute(
+                    text("SELECT name, column_id FROM sys.columns WHERE object_id = OBJECT_ID(:t)"),
+                    {"t": table_name})
+                cols = {name: column_id for name, column_id in result}
+            if not cols:
+                raise ValueError(f'tabla {table_name} no encontrada')
+            self._column_cache[table_name] = cols
+        return cols
+
+    def _write_bulk_files(self, names: list, batches, table_name: str) -> tuple:
+        """Escribe archivo de datos + format file (non-XML) para bcp/BULK INSERT.
+
+        Los batches se codifican y escriben de a uno (tabla o RecordBatchReader),
+        así la memoria queda acotada al batch en curso.
+
+        Returns:
+            (data_path, fmt_path, filas) en bulk_stage_dir
+        """
+        ordinals = self._target_columns(table_name)
+        missing = [c for c in names if c not in ordinals]
+        if missing:
+            raise ValueError(f'columnas sin destino en {table_name}: {missing}')
+
+        os.makedirs(self.bulk_stage_dir, exist_ok=True)
+        token = f'{table_name}_{os.getpid()}_{threading.get_ident()}_{time.time_ns()}'
+        data_path = os.path.join(self.bulk_stage_dir, token + '.dat')
+        fmt_path = os.path.join(self.bulk_stage_dir, token + '.fmt')
+
+        rows = 0
+        with open(data_path, 'wb') as f:
+            for batch in batches:
+                if batch.num_rows:
+                    f.write(_encode_batch(batch))
+                    rows += batch.num_rows
+
+        with open(fmt_path, 'w', encoding='ascii', newline='\r\n') as f:
+            f.write('10.0\n')
+            f.write(f'{len(names)}\n')
+            for i, name in enumerate(names, 1):
+                term = r'\r\n' if i == len(names) else r'\t'
+                f.write(f'{i}\tSQLCHAR\t0\t0\t"{term}"\t{ordinals[name]}\t{name}\t""\n')
+        return data_path, fmt_path, rows
+
+    def _run_bcp(self, table_name: str, data_path: str, fmt_path: str) -> int:
+        """bcp in en una sola transacción (sin -b). Retorna filas copiadas."""
+        host, db, user, password, _ = self._conn_args
+        cmd = [self.bcp_path, f'dbo.{table_name}', 'in', data_path,
+               '-S', host, '-d', db, '-f', fmt_path, '-C', '65001',
+               '-k', '-m', '1', '-h', 'TABLOCK']
+        cmd += ['-U', user, '-P', password] if user and password else ['-T']
+        proc = subprocess.run(cmd, capture_output=True, text=True, timeout=3600)
+        match = re.search(r'(\d+) rows copied', proc.stdout)
+        if proc.returncode != 0 or not match:
+            out = (proc.stdout + proc.stderr).strip().replace(password or '\0', '***')
+            raise RuntimeError(f'bcp rc={proc.returncode}: {out[-800:]}')
+        return int(match.group(1))
+
+    def _run_bulk_insert(self, table_name: str, data_path: str, fmt_path: str, rows: int):
+        """BULK INSERT desde la carpeta compartida, en transacción: si el conteo
+        no coincide se hace ROLLBACK (seguro reintentar con pandas)."""
+        data_src, fmt_src = data_path, fmt_path
+        if self.bulk_server_dir:
+            sep = '\\' if '\\' in self.bulk_server_dir else '/'
+            base = self.bulk_server_dir.rstrip('\\/')
+            data_src = base + sep + os.path.basename(data_path)
+            fmt_src = base + sep + os.path.basename(fmt_path)
+        # Literal SQL: comillas duplicadas y ':' escapado para text() (E:\...)
+        data_src, fmt_src = (s.replace("'", "''").replace(':', '\\:') for s in (data_src, fmt_src))
+        query = (
+            "SET NOCOUNT ON; "
+            f"BULK INSERT dbo.{table_name} FROM '{data_src}' "
+            f"WITH (FORMATFILE = '{fmt_src}', CODEPAGE = '65001', "
+            "TABLOCK, KEEPNULLS, MAXERRORS = 0); "
+            "SELECT @@ROWCOUNT;"
+        )
+        with self.engine.begin() as conn:
+            loaded = conn.execute(text(query)).scalar()
+            if loaded != rows:
+                raise RuntimeError(f'BULK INSERT cargó {loaded} de {rows} filas')
+
     def bulk_insert(self, df: pd.DataFrame, table_name: str) -> bool:
         """Inserta un pandas DataFrame en SQL Server (legacy)."""
         try:
@@ -179,6 +534,80 @@ class SqlRepository:
             _log('SQL-TRUNC', f'ERROR truncando staging: {e}')
             return False
 
+    # ─────────────────────────────────────────────────────────────
+    #  STAGING POR CORRIDA (RunID)
+    # ─────────────────────────────────────────────────────────────
+
+    def delete_run(self, table_names: list, run_id: int) -> bool:
+        """Borra de staging solo las filas de una corrida (lote fallido o parcial)."""
+        try:
+            t0 = time.time()
+            deleted = 0
+            with self.engine.begin() as conn:
+                for tbl in table_names:
+                    result = conn.execute(
+                        text(f"DELETE FROM {tbl} WHERE {RUN_ID_COLUMN} = :run_id"),
+                        {"run_id": run_id})
+                    deleted += max(result.rowcount or 0, 0)
+            _log('SQL-RUN', f'RunID={run_id}: {deleted} filas borradas de '
+                            f'{len(table_names)} tablas ({time.time()-t0:.2f}s)')
+            return True
+        except Exception as e:
+            _log('SQL-RUN', f'ERROR borrando RunID={run_id}: {e}')
+            return False
+
+    def missing_run_support(self, table_names: list, sp_names: list) -> list:
+        """Objetos sin la migración RunID: tablas sin columna RunID y SP sin @RunID.
+
+        Returns:
+            Lista de faltantes ('tabla.RunID' / 'sp @RunID'); vacía = modo 'run' OK.
+            Si la consulta falla se informa como faltante (no se asume migrado).
+        """
+        missing = []
+        try:
+            with self.engine.connect() as conn:
+                for tbl in table_names:
+                    if conn.execute(text("SELECT COL_LENGTH(:t, :c)"),
+                                    {"t": tbl, "c": RUN_ID_COLUMN}).scalar() is None:
+                        missing.append(f'{tbl}.{RUN_ID_COLUMN}')
+                for sp in sp_names:
+                    found = conn.execute(
+                        text("SELECT 1 FROM sys.parameters "
+                             "WHERE object_id = OBJECT_ID(:sp) AND name = :p"),
+                        {"sp": sp, "p": f'@{RUN_ID_COLUMN}'}).first()
+                    if found is None:
+                        missing.append(f'{sp} @{RUN_ID_COLUMN}')
+        except Exception as e:
+            _log('SQL-RUN', f'ERROR verificando migración RunID: {e}')
+            missing.append(f'verificación ({e.__class__.__name__})')
+        return missing
+
+    def purge_stale_runs(self, table_names: list, max_age_hours: float) -> int:
+        """Barre staging de corridas interrumpidas (RunID más antiguo que max_age_hours).
+
+        También borra filas sin RunID (cargadas en modo truncate). Usar al
+        arranque, antes de que haya lotes en vuelo.
+
+        Returns:
+            Filas borradas (-1 si falló)
+        """
+        cutoff = int((time.time() - max_age_hours * 3600) * 1_000_000)
+        try:
+            deleted = 0
+            with self.engine.begin() as conn:
+                for tbl in table_names:
+                    result = conn.execute(
+                        text(f"DELETE FROM {tbl} WHERE {RUN_ID_COLUMN} IS NULL "
+                             f"OR {RUN_ID_COLUMN} < :cutoff"),
+                        {"cutoff": cutoff})
+                    deleted += max(result.rowcount or 0, 0)
+            _log('SQL-RUN', f'Staging: {deleted} filas de corridas > {max_age_hours:g}h '
+                            f'o sin RunID borradas ({len(table_names)} tablas)')
+            return deleted
+        except Exception as e:
+            _log('SQL-RUN', f'ERROR barriendo corridas antiguas: {e}')
+            return -1
+
     # ─────────────────────────────────────────────────────────────
     #  EXECUTE STORED PROCEDURE
     # ─────────────────────────────────────────────────────────────
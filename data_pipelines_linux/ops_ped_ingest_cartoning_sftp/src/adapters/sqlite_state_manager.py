@@ -0,0 +1,201 @@
+"""
+SqliteStateManager — Estado de archivos en SQLite (WAL) en vez de state_store.json.
+
+Mismos métodos que StateManager (drop-in), pero cada escritura es una
+transacción que toca solo las claves del lote: mark_batch_processed() con N
+archivos = N upserts, sin re-serializar el historial completo. El arranque no
+carga el estado a memoria; las consultas van por clave primaria.
+
+  - journal_mode=WAL + synchronous=NORMAL: commits baratos y sin archivo roto
+    ante un corte (el último commit queda o no queda, entero).
+  - Claves idénticas al JSON: 'archivo' (legacy) y 'Fuente:archivo' (lotes).
+  - Migración única desde state_store.json (migrate_json), en una transacción;
+    el JSON se renombra a *.migrated para no volver a importarlo. Es un paso
+    explícito, no lo hace el arranque:
+        python -m src.adapters.sqlite_state_manager state_store.json state_store.db
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime
+
+
+def _log(tag: str, msg: str):
+    ts = datetime.now().strftime('%H:%M:%S.%f')[:-3]
+    print(f"[{ts}] [{tag}] {msg}")
+
+
+_SCHEMA_SQL = """
+    CREATE TABLE IF NOT EXISTS file_state (
+        state_key    TEXT PRIMARY KEY,
+        source       TEXT,
+        filename     TEXT NOT NULL,
+        mtime        REAL,
+        size         INTEGER,
+        sql_ok       INTEGER NOT NULL DEFAULT 0,
+        processed_at TEXT
+    ) WITHOUT ROWID
+"""
+
+_UPSERT_SQL = """
+    INSERT INTO file_state (state_key, source, filename, mtime, size, sql_ok, processed_at)
+    VALUES (?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT(state_key) DO UPDATE SET
+        source = excluded.source,
+        filename = excluded.filename,
+        mtime = COALESCE(excluded.mtime, file_state.mtime),
+        size = COALESCE(excluded.size, file_state.size),
+        sql_ok = excluded.sql_ok,
+        processed_at = COALESCE(excluded.processed_at, file_state.processed_at)
+"""
+
+# SQLite limita los parámetros por sentencia; las búsquedas masivas van por bloques
+_LOOKUP_CHUNK = 500
+
+
+class SqliteStateManager:
+    def __init__(self, db_path: str):
+        """
+        Args:
+            db_path: archivo SQLite (se crea si no existe)
+        """
+        self.path = db_path
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(_SCHEMA_SQL)
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def count(self) -> int:
+        """Cantidad de claves registradas."""
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM file_state").fetchone()[0]
+
+    # ─── Métodos legacy (retrocompatibilidad) ───────────────────
+
+    def is_new_or_modified(self, filename: str, mtime: int, size: int) -> bool:
+        stored = self.get_many([filename]).get(filename)
+        if not stored:
+            return True
+        if mtime > (stored['mtime'] or 0) or size != (stored['size'] or 0):
+            return True
+        return False
+
+    def register_download(self, filename: str, mtime: int, size: int):
+        self.upsert_many([(filename, None, filename, mtime, size, False, None)])
+
+    def mark_as_processed_in_sql(self, filename: str):
+        with self._lock:
+            self._conn.execute("UPDATE file_state SET sql_ok = 1 WHERE state_key = ?", (filename,))
+
+    def is_pending_sql(self, filename: str) -> bool:
+        record = self.get_many([filename]).get(filename)
+        return not record or not record['sql_ok']
+
+    # ─── Métodos v2: batch ──────────────────────────────────────
+
+    def mark_batch_processed(self, source_name: str, filenames: list):
+        """Registra un lote completo como procesado exitosamente (una transacción).
+
+        Args:
+            source_name: Nombre de la fuente (Cartoning, WaveConfirm, etc.)
+            filenames: Lista de nombres de archivo procesados
+        """
+        ts = datetime.now().isoformat()
+        self.upsert_many([(f"{source_name}:{fname}", source_name, fname, None, None, True, ts)
+                          for fname in filenames])
+
+    def is_file_processed(self, source_name: str, filename: str) -> bool:
+        """Verifica si un archivo específico ya fue procesado."""
+        return bool(self.processed_among(source_name, [filename]))
+
+    # ─── Bulk: upsert / lookup ──────────────────────────────────
+
+    def upsert_many(self, rows: list):
+        """Inserta o actualiza registros en una sola transacción.
+
+        Args:
+            rows: tuplas (state_key, source, filename, mtime, size, sql_ok, processed_at);
+                  mtime/size/processed_at en None conservan el valor previo
+        """
+        if not rows:
+            return
+        rows = [(k, src, fn, mt, sz, int(bool(ok)), ts) for k, src, fn, mt, sz, ok, ts in rows]
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._conn.executemany(_UPSERT_SQL, rows)
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def get_many(self, keys: list) -> dict:
+        """Registros de varias claves → {state_key: dict} (las ausentes se omiten)."""
+        result = {}
+        keys = list(keys)
+        with self._lock:
+            for i in range(0, len(keys), _LOOKUP_CHUNK):
+                chunk = keys[i:i + _LOOKUP_CHUNK]
+                marks = ','.join('?' * len(chunk))
+                for key, source, mtime, size, sql_ok, processed_at in self._conn.execute(
+                        f"SELECT state_key, source, mtime, size, sql_ok, processed_at "
+                        f"FROM file_state WHERE state_key IN ({marks})", chunk):
+                    result[key] = {'source': source, 'mtime': mtime, 'size': size,
+                                   'sql_ok': bool(sql_ok), 'processed_at': processed_at}
+        return result
+
+    def processed_among(self, source_name: str, filenames: list) -> set:
+        """Subconjunto de filenames ya procesados en SQL para la fuente."""
+        keys = {f"{source_name}:{fname}": fname for fname in filenames}
+        return {keys[k] for k, rec in self.get_many(list(keys)).items() if rec['sql_ok']}
+
+    # ─── Migración desde state_store.json ───────────────────────
+
+    def migrate_json(self, json_path: str) -> int:
+        """Importa state_store.json (una vez) y lo renombra a *.migrated.
+
+        Returns:
+            Claves importadas
+        """
+        t0 = time.time()
+        try:
+            with open(json_path, 'r') as f:
+                state = json.load(f)
+        except Exception as e:
+            _log('STATE', f'WARN: no se pudo leer {json_path} para migrar: {e}')
+            return 0
+
+        rows = []
+        for key, rec in state.items():
+            source = rec.get('source')
+            filename = key.split(':', 1)[1] if source and ':' in key else key
+            rows.append((key, source, filename, rec.get('mtime'), rec.get('size'),
+                         rec.get('sql_ok', False), rec.get('processed_at')))
+        self.upsert_many(rows)
+        os.replace(json_path, json_path + '.migrated')
+        _log('STATE', f'Migradas {len(rows)} claves de {json_path} a {self.path} '
+                      f'en {time.time()-t0:.2f}s')
+        return len(rows)
+
+
+if __name__ == "__main__":
+    import sys
+    if len(sys.argv) != 3:
+        print("Uso: python -m src.adapters.sqlite_state_manager <state_store.json> <state_store.db>")
+        sys.exit(2)
+    if not os.path.exists(sys.argv[1]):
+        _log('STATE', f'ERROR: no existe {sys.argv[1]}')
+        sys.exit(1)
+    manager = SqliteStateManager(sys.argv[2])
+    manager.migrate_json(sys.argv[1])
+    manager.close()
+    # migrate_json renombra el JSON solo si lo importó
+    sys.exit(1 if os.path.exists(sys.argv[1]) else 0)
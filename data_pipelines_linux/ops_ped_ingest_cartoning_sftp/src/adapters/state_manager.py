@@ -5,16 +5,21 @@ Cambios v2:
   - mark_batch_processed(): registra un lote completo de archivos de golpe
   - Mantiene retrocompatibilidad con métodos individuales
   - Guarda timestamp ISO y fuente para auditoría
+  - Thread-safe: fuentes en paralelo comparten la misma instancia
+
+Para historiales grandes usar SqliteStateManager (mismos métodos, escrituras O(lote)).
 """
 
 import os
 import json
+import threading
 from datetime import datetime
 
 
 class StateManager:
     def __init__(self, state_file_path: str):
         self.path = state_file_path
+        self._lock = threading.RLock()
         self.state = self._load()
 
     def _load(self):
@@ -27,8 +32,13 @@ class StateManager:
         return {}
 
     def save(self):
-        with open(self.path, 'w') as f:
-            json.dump(self.state, f, indent=4)
+        with self._lock:
+            with open(self.path, 'w') as f:
+                json.dump(self.state, f, indent=4)
+
+    def count(self) -> int:
+        """Cantidad de claves registradas (misma interfaz que SqliteStateManager)."""
+        return len(self.state)
 
     # ─── Métodos legacy (retrocompatibilidad) ───────────────────
 
@@ -41,17 +51,19 @@ class StateManager:
         return False
 
     def register_download(self, filename: str, mtime: int, size: int):
-        self.state[filename] = {
-            'mtime': mtime,
-            'size': size,
-            'sql_ok': False
-        }
-        self.save()
+        with self._lock:
+            self.state[filename] = {
+                'mtime': mtime,
+                'size': size,
+                'sql_ok': False
+            }
+            self.save()
 
     def mark_as_processed_in_sql(self, filename: str):
-        if filename in self.state:
-            self.state[filename]['sql_ok'] = True
-        self.save()
+        with self._lock:
+            if filename in self.state:
+                self.state[filename]['sql_ok'] = True
+            self.save()
 
     def is_pending_sql(self, filename: str) -> bool:
         record = self.state.get(filename)
@@ -67,14 +79,15 @@ class StateManager:
             filenames: Lista de nombres de archivo procesados
         """
         ts = datetime.now().isoformat()
-        for fname in filenames:
-            state_key = f"{source_name}:{fname}"
-            self.state[state_key] = {
-                'sql_ok': True,
-                'processed_at': ts,
-                'source': source_name,
-            }
-        self.save()
+        with self._lock:
+            for fname in filenames:
+                state_key = f"{source_name}:{fname}"
+                self.state[state_key] = {
+                    'sql_ok': True,
+                    'processed_at': ts,
+                    'source': source_name,
+                }
+            self.save()
 
     def is_file_processed(self, source_name: str, filename: str) -> bool:
         """Verifica si un archivo específico ya fue procesado."""
@@ -0,0 +1,115 @@
+"""
+AdaptiveBatchSizer — Tamaño de micro-lote por fuente según la latencia SQL observada.
+
+Sin tope adaptativo, tras una caída de fin de semana un lote puede traer miles
+de archivos: una transacción larga, locks largos y, si un SP falla, todo el
+lote vuelve a origen. El sizer ajusta el tope de archivos por fuente estilo
+AIMD (como la ventana de congestión TCP):
+
+  - Señal: segundos de SQL del lote (truncate + insert + SP), es decir, lo que
+    dura la escritura en SQL Server y sus locks.
+  - Lote OK bajo target_s y topado (quedó backlog): el tope sube. En arranque
+    (slow start) se duplica; tras la primera baja sube de a `increase_files`.
+  - Lote sobre target_s o fallido: el tope se multiplica por `decrease_factor`
+    (mínimo min_files) y se sale de slow start.
+  - Lote no topado (entró todo lo pendiente): no dice nada del tope, no cambia.
+
+Además limita filas por lote: con el promedio móvil de filas por archivo de la
+fuente, el tope efectivo es min(tope AIMD, max_rows / filas_por_archivo).
+"""
+
+import threading
+from datetime import datetime
+
+
+def _log(tag: str, msg: str):
+    ts = datetime.now().strftime('%H:%M:%S.%f')[:-3]
+    print(f"[{ts}] [{tag}] {msg}")
+
+
+# Peso de la última observación en el promedio de filas por archivo
+_ROWS_EWMA_ALPHA = 0.3
+
+
+class _SourceWindow:
+    def __init__(self, start: int):
+        self.limit = start
+        self.slow_start = True
+        self.rows_per_file = None
+
+
+class AdaptiveBatchSizer:
+    """Tope de archivos por lote y por fuente; thread-safe (un lote en vuelo por fuente)."""
+
+    def __init__(self, max_files: int = 500, min_files: int = 10, target_s: float = 30.0,
+                 max_rows: int = None, increase_files: int = None,
+                 decrease_factor: float = 0.5, start_files: int = None):
+        """
+        Args:
+            max_files: techo del tope (max_batch_files)
+            min_files: piso del tope
+            target_s: duración objetivo de la parte SQL del lote
+            max_rows: tope de filas por lote (None = sin tope de filas)
+            increase_files: incremento aditivo (default: min_files)
+            decrease_factor: factor de la baja multiplicativa
+            start_files: tope inicial (default: min_files; slow start lo duplica)
+        """
+        self.max_files = max(1, max_files)
+        self.min_files = max(1, min(min_files, self.max_files))
+        self.target_s = target_s
+        self.max_rows = max_rows
+        self.increase_files = max(1, increase_files or self.min_files)
+        self.decrease_factor = decrease_factor
+        self.start_files = min(self.max_files, max(self.min_files, start_files or self.min_files))
+        self._lock = threading.Lock()
+        self._windows = {}
+
+    def _window(self, source: str) -> _SourceWindow:
+        window = self._windows.get(source)
+        if window is None:
+            window = self._windows[source] = _SourceWindow(self.start_files)
+        return window
+
+    def limit(self, source: str) -> int:
+        """Tope de archivos para el próximo lote de la fuente (AIMD y filas)."""
+        with self._lock:
+            window = self._window(source)
+            limit = window.limit
+            if self.max_rows and window.rows_per_file:
+                limit = min(limit, max(1, int(self.max_rows / window.rows_per_file)))
+            return limit
+
+    def observe(self, source: str, files: int, rows: int, sql_seconds: float,
+                ok: bool, capped: bool) -> int:
+        """Ajusta el tope con el resultado de un lote.
+
+        Args:
+            files: archivos del lote
+            rows: filas cargadas a staging
+            sql_seconds: truncate + insert + SP del lote
+            ok: lote sin errores (carga y SP)
+            capped: el lote quedó topado (había backlog)
+
+        Returns:
+            Tope para el próximo lote
+        """
+        with self._lock:
+            window = self._window(source)
+            if ok and files and rows:
+                sample = rows / files
+                window.rows_per_file = (sample if window.rows_per_file is None else
+                                        _ROWS_EWMA_ALPHA * sample
+                                        + (1 - _ROWS_EWMA_ALPHA) * window.rows_per_file)
+
+            previous = window.limit
+            if not ok or sql_seconds > self.target_s:
+                window.limit = max(self.min_files, int(window.limit * self.decrease_factor))
+                window.slow_start = False
+                reason = 'lote fallido' if not ok else f'SQL {sql_seconds:.1f}s > {self.target_s:g}s'
+            elif capped:
+                grown = window.limit * 2 if window.slow_start else window.limit + self.increase_files
+                window.limit = min(self.max_files, grown)
+                reason = f'SQL {sql_seconds:.1f}s{", slow start" if window.slow_start else ""}'
+            if window.limit != previous:
+                _log('BATCH-SIZE', f'{source}: tope {previous} → {window.limit} archivos ({reason})')
+        return self.limit(source)
@@ -8,6 +8,28 @@ Cada fuente tiene su método batch_* que:
   1. Lee todo _processing/*.txt en una operación con DuckDB
   2. Aplica limpieza técnica (TRIM, cast, null handling) vectorizada 
   3. Retorna dict de {nombre_tabla_staging: pyarrow.Table}
+
+Modos de lectura (read_mode, seleccionable por fuente):
+  - 'native': read_csv multi-archivo de DuckDB sobre el glob completo
+    (latin-1, todo VARCHAR, filename=true). Split, TRIM y NombreArchivo
+    se resuelven dentro del motor vectorizado. Los IDoc (OBD / OBDC) usan un
+    splitter set-based: raw_segments + funciones ventana asignan cada línea a
+    su entrega dueña, sin máquina de estados en Python.
+  - 'python': lectura línea a línea en Python (fallback). Mismo schema Arrow.
+    Cartoning arma directamente columnas Arrow (list<string>) por bloques
+    de líneas y las vuelca a DuckDB: memoria plana aunque el archivo sea grande.
+
+Modo streaming (stream_batch): misma lectura + limpieza, pero en vez de
+materializar cada staging con .arrow() retorna {staging: open_reader}; cada
+open_reader() ejecuta la proyección y entrega un pyarrow.RecordBatchReader
+(fetch_record_batch) con tamaño de batch derivado del tope de memoria de la
+fuente. DuckDB queda con memory_limit y derrama a temp_directory.
+
+Tipos de staging (staging_schema): con un StagingSchema (sql/esquema_tablas.csv)
+la salida de cada batch_* pasa por una proyección TRY_CAST vectorizada a los
+tipos de la tabla staging (DECIMAL, DATE...). Un valor que no convierte
+queda NULL y la fila sigue en la salida; una copia de esa fila queda en
+take_rejects() para la tabla de rechazos (auditoría).
 """
 
 import os
@@ -16,6 +38,7 @@ import time
 import duckdb
 import pyarrow as pa
 from datetime import datetime
+from itertools import groupby
 
 
 def _log(tag: str, msg: str):
@@ -23,90 +46,346 @@ def _log(tag: str, msg: str):
     print(f"[{ts}] [{tag}] {msg}")
 
 
+READ_MODE_NATIVE = 'native'
+READ_MODE_PYTHON = 'python'
+
+# Streaming: la mitad de max_memory_mb va a DuckDB (memory_limit) y la otra a
+# los RecordBatch en vuelo, que aguas abajo se copian ~3 veces (Arrow, archivo
+# codificado o DataFrame). Filas SAP EWM: < 512 bytes en Arrow.
+_STREAM_ROW_BYTES = 512
+_STREAM_COPIES = 3
+_STREAM_MIN_ROWS = 1024
+_STREAM_MIN_DUCKDB_MB = 64
+
+# Lectura nativa: una columna por línea. El delimitador 0x1F (Unit Separator)
+# nunca aparece en archivos SAP, así cada línea llega entera y el split por ';'
+# se hace en SQL con string_split(); las filas de ancho variable quedan
+# rellenadas con NULL al indexar la lista fuera de rango.
+# Cartoning: separadores faltantes entre números ("12.000  3" → "12.000;3").
+# Mismo patrón que el regexp_replace nativo; ASCII para que \s y \d signifiquen
+# lo mismo que en RE2 (sin NBSP de latin-1)
+_CARTONING_SEP_RE = re.compile(r'(\d)\s{2,}(\d)', re.ASCII)
+
+# Lectura Python de Cartoning: líneas por bloque Arrow volcado a DuckDB
+_PY_CHUNK_LINES = 50000
+
+_READ_LINES_SQL = """
+    SELECT parse_filename(filename) AS NombreArchivo, line
+    FROM read_csv(?, columns = {'line': 'VARCHAR'}, delim = chr(31),
+                  header = false, auto_detect = false, quote = '', escape = '',
+                  comment = '', encoding = 'latin-1', all_varchar = true,
+                  strict_mode = false, filename = true)
+    WHERE TRIM(COALESCE(line, '')) <> ''
+"""
+
+
+# Proyecciones de limpieza (TRIM + cast) OBDConfirm: staging -> (tabla raw, query).
+# Compartidas por el splitter SQL nativo y el fallback Python.
+_OBDC_PROJECTIONS = {
+    'Staging_EWM_OBDConfirm_Cabecera': ('raw_obdc_cab', """
+        SELECT TRIM(Numero_Entrega) AS Numero_Entrega,
+               TRIM(Fecha_WSHDRLFDAT) AS Fecha_WSHDRLFDAT,
+               TRIM(Fecha_WSHDRWADTI) AS Fecha_WSHDRWADTI,
+               NombreArchivo
+        FROM raw_obdc_cab
+        WHERE TRIM(COALESCE(Numero_Entrega, '')) <> ''
+    """),
+    'Staging_EWM_OBDConfirm_Posiciones': ('raw_obdc_pos', """
+        SELECT TRIM(Numero_Entrega) AS Numero_Entrega,
+               TRIM(Numero_Posicion) AS Numero_Posicion,
+               TRIM(Pedido_Ref) AS Pedido_Ref,
+               TRIM(Material_SKU) AS Material_SKU,
+               TRIM(REPLACE(NULLIF(TRIM(Cantidad), ''), ',', '.')) AS Cantidad,
+               TRIM(Unidad) AS Unidad,
+               NombreArchivo
+        FROM raw_obdc_pos
+        WHERE TRIM(COALESCE(Numero_Entrega, '')) <> ''
+    """),
+    'Staging_EWM_OBDConfirm_Control_Posiciones': ('raw_obdc_ctl', """
+        SELECT TRIM(Numero_Entrega) AS Numero_Entrega,
+               TRIM(Numero_Posicion) AS Numero_Posicion,
+               TRIM(Flag_Confirmacion) AS Flag_Confirmacion,
+               NombreArchivo
+        FROM raw_obdc_ctl
+        WHERE TRIM(COALESCE(Numero_Entrega, '')) <> ''
+    """),
+    'Staging_EWM_OBDConfirm_Unidades_HDR': ('raw_obdc_uni', """
+        SELECT TRIM(Numero_Entrega) AS Numero_Entrega,
+               TRIM(ID_Unidad_Manipulacion) AS ID_Unidad_Manipulacion,
+               TRIM(Tipo_Embalaje) AS Tipo_Embalaje,
+               TRIM(HU_Nivel) AS HU_Nivel,
+               TRIM(Numero_Externo) AS Numero_Externo,
+               TRIM(REPLACE(NULLIF(TRIM(Cantidad_HU), ''), ',', '.')) AS Cantidad_HU,
+               NombreArchivo
+        FROM raw_obdc_uni
+        WHERE TRIM(COALESCE(Numero_Entrega, '')) <> ''
+    """),
+    'Staging_EWM_OBDConfirm_Contenido_Embalaje': ('raw_obdc_con', """
+        SELECT TRIM(ID_Unidad_Manipulacion_Padre) AS ID_Unidad_Manipulacion_Padre,
+               TRIM(ID_Unidad_Manipulacion_Hijo) AS ID_Unidad_Manipulacion_Hijo,
+               TRIM(Numero_Entrega) AS Numero_Entrega,
+               TRIM(Numero_Posicion) AS Numero_Posicion,
+               TRIM(REPLACE(NULLIF(TRIM(Cantidad_Empacada), ''), ',', '.')) AS Cantidad_Empacada,
+               TRIM(Unidad) AS Unidad,
+               TRIM(Material_SKU) AS Material_SKU,
+               TRIM(Nivel_HU) AS Nivel_HU,
+               NombreArchivo
+        FROM raw_obdc_con
+    """),
+    'Staging_EWM_OBDConfirm_Extensiones': ('raw_obdc_ext', """
+        SELECT TRIM(Nombre_Campo) AS Nombre_Campo,
+               TRIM(ID_Referencia) AS ID_Referencia,
+               TRIM(Valor_1) AS Valor_1,
+               TRIM(Valor_2) AS Valor_2,
+               TRIM(Valor_3) AS Valor_3,
+               NombreArchivo
+        FROM raw_obdc_ext
+    """),
+}
+
+
+class _DeferredQuery:
+    """Proyección final pendiente (modo streaming): se ejecuta al abrir el reader."""
+
+    num_rows = '?'  # Conteo desconocido hasta consumir el reader
+
+    def __init__(self, query: str):
+        self.query = query
+
+
 class DuckDBBatchProcessor:
     """Motor de transformación vectorizada con DuckDB para archivos SAP EWM."""
 
-    def __init__(self):
+    def __init__(self, temp_directory: str = None, staging_schema=None):
+        """
+        Args:
+            temp_directory: carpeta de spill de DuckDB cuando se supera
+                            memory_limit (modo streaming); None = default DuckDB
+            staging_schema: StagingSchema con los tipos de staging (None = sin tipar)
+        """
         # Conexión in-memory, cada lote es efímero
         self.con = duckdb.connect(database=':memory:')
+        if temp_directory:
+            os.makedirs(temp_directory, exist_ok=True)
+            self.con.execute("SET temp_directory = ?", [temp_directory])
+        self._stream_rows = None      # != None mientras corre stream_batch
+        self._memory_limited = False
+        self.staging_schema = staging_schema
+        self._rejects = []            # pa.Table de rechazos del último lote
         _log('DUCKDB', 'Motor DuckDB inicializado (in-memory)')
 
     def close(self):
         self.con.close()
 
+    # ═══════════════════════════════════════════════════════════════
+    # LECTURA: nativa (read_csv) vs Python (fallback)
+    # ═══════════════════════════════════════════════════════════════
+
+    def _run_mode(self, tag: str, read_mode: str, native_fn, python_fn,
+                  processing_dir: str) -> dict:
+        """Ejecuta la variante nativa; si falla, cae a la variante Python."""
+        if self._stream_rows is None and self._memory_limited:
+            self.con.execute("RESET memory_limit")
+            self._memory_limited = False
+        self._rejects = []
+        result = None
+        if read_mode == READ_MODE_NATIVE:
+            try:
+                result = native_fn(processing_dir)
+            except Exception as e:
+                _log(tag, f'WARN: lectura nativa falló ({e}). Usando fallback Python...')
+        if result is None:
+            result = python_fn(processing_dir)
+        if self.staging_schema is None:
+            return result
+        return {name: self._apply_types(tag, name, value) for name, value in result.items()}
+
+    def _apply_types(self, tag: str, table_name: str, value):
+        """Tipa una salida staging según staging_schema y copia sus rechazos.
+
+        pa.Table: se tipa en el momento. _DeferredQuery (streaming): los
+        rechazos se materializan ahora y la proyección tipada queda diferida.
+        """
+        if isinstance(value, _DeferredQuery):
+            source_sql = f'({value.query})'
+            columns = [d[0] for d in self.con.execute(
+                f'SELECT * FROM {source_sql} LIMIT 0').description]
+        elif value.num_rows == 0:
+            return value
+        else:
+            self.con.register('_typed_src', value)
+            source_sql, columns = '_typed_src', value.column_names
+
+        try:
+            queries = self.staging_schema.queries(table_name, source_sql, columns)
+            if queries is None:
+                return value
+            typed_sql, rejects_sql = queries
+            rejects = self.con.execute(rejects_sql).arrow()
+            typed = (_DeferredQuery(typed_sql) if isinstance(value, _DeferredQuery)
+                     else self.con.execute(typed_sql).arrow())
+        finally:
+            if not isinstance(value, _DeferredQuery):
+                self.con.unregister('_typed_src')
+
+        if rejects.num_rows:
+            self._rejects.append(rejects)
+            _log(tag, f'  WARN: {table_name}: {rejects.num_rows} filas con valores que no convierten (quedan NULL)')
+        return typed
+
+    def take_rejects(self):
+        """Copias de auditoría de las filas con valores que no convierten del último batch_* (pa.Table) o None; las entrega una vez."""
+        rejects, self._rejects = self._rejects, []
+        return pa.concat_tables(rejects) if rejects else None
+
+    def _load_raw_lines(self, processing_dir: str) -> tuple:
+        """Carga todas las líneas no vacías de _processing/*.txt en raw_lines.
+
+        El orden de inserción (rowid) conserva archivo + número de línea.
+
+        Returns:
+            (filas, archivos) cargados
+        """
+        glob_pattern = os.path.join(processing_dir, '*.txt').replace('\\', '/')
+        self.con.execute(f"CREATE OR REPLACE TABLE raw_lines AS {_READ_LINES_SQL}",
+                         [glob_pattern])
+        return self.con.execute(
+            "SELECT COUNT(*), COUNT(DISTINCT NombreArchivo) FROM raw_lines"
+        ).fetchone()
+
+    @staticmethod
+    def _has_txt_files(processing_dir: str) -> bool:
+        return any(f.lower().endswith('.txt') for f in os.listdir(processing_dir))
+
+    def _load_segments(self, processing_dir: str) -> int:
+        """Carga raw_lines y la expone separada en columnas en raw_segments.
+
+        raw_segments(line_no, NombreArchivo, seg, p): `p` es la lista de columnas
+        con TRIM (p[1] = segmento IDoc) y line_no conserva el orden archivo/línea,
+        lo que permite resolver la entrega dueña de cada línea con funciones ventana.
+
+        Returns:
+            Número de líneas cargadas (0 si no hay archivos)
+        """
+        if not self._has_txt_files(processing_dir):
+            return 0
+        line_count, _ = self._load_raw_lines(processing_dir)
+        self.con.execute("""
+            CREATE OR REPLACE TABLE raw_segments AS
+            SELECT line_no, NombreArchivo, p[1] AS seg, p
+            FROM (
+                SELECT rowid AS line_no, NombreArchivo,
+                       list_transform(string_split(TRIM(line), ';'), x -> TRIM(x)) AS p
+                FROM raw_lines
+            )
+        """)
+        return line_count
+
+    @staticmethod
+    def _iter_split_lines_python(processing_dir: str):
+        """Genera (NombreArchivo, [cols con strip]) leyendo archivo por archivo."""
+        for fname in sorted(os.listdir(processing_dir)):
+            if not fname.lower().endswith('.txt'):
+                continue
+            fpath = os.path.join(processing_dir, fname)
+            with open(fpath, 'r', encoding='latin-1', errors='replace') as f:
+                for line in f:
+                    line = line.strip()
+                    if line:
+                        yield fname, [c.strip() for c in line.split(';')]
+
     # ═══════════════════════════════════════════════════════════════
     # FUENTE 1: CARTONING
     # ═══════════════════════════════════════════════════════════════
 
-    def batch_cartoning(self, processing_dir: str) -> dict:
+    def batch_cartoning(self, processing_dir: str, read_mode: str = READ_MODE_NATIVE) -> dict:
         """Lee y limpia todos los archivos de Cartoning en un directorio.
         
         Returns:
             {'Staging_EWM_Cartoning': pyarrow.Table} o {} si vacío
         """
+        return self._run_mode('DUCK-CART', read_mode, self._cartoning_native,
+                              self._cartoning_python, processing_dir)
+
+    @staticmethod
+    def _cartoning_select(max_parts: int, source: str) -> str:
+        """SELECT común: TipoRegistro, C1..C{n-1}, NombreArchivo desde `parts`."""
+        col_names = ['TipoRegistro'] + [f'C{i}' for i in range(1, max_parts)]
+        clauses = [f"TRIM(parts[{i + 1}]) AS {name}" for i, name in enumerate(col_names)]
+        return f"""
+            SELECT {', '.join(clauses)}, NombreArchivo
+            FROM {source}
+            WHERE TRIM(COALESCE(parts[1], '')) <> ''
+        """
+
+    def _cartoning_native(self, processing_dir: str) -> dict:
+        tag = 'DUCK-CART'
+        t0 = time.time()
+        if not self._has_txt_files(processing_dir):
+            _log(tag, 'Sin archivos / sin datos')
+            return {}
+
+        _, file_count = self._load_raw_lines(processing_dir)
+
+        # Regla de negocio: insertar ; donde faltan separadores (mismo regex que Python)
+        self.con.execute(r"""
+            CREATE OR REPLACE TABLE raw_cartoning AS
+            SELECT string_split(regexp_replace(line, '(\d)\s{2,}(\d)', '\1;\2', 'g'), ';') AS parts,
+                   NombreArchivo
+            FROM raw_lines
+            ORDER BY rowid
+        """)
+        max_parts = self.con.execute("SELECT MAX(len(parts)) FROM raw_cartoning").fetchone()[0]
+        if not max_parts:
+            _log(tag, 'Sin archivos / sin datos')
+            return {}
+
+        result = self._fetch(self._cartoning_select(max_parts, 'raw_cartoning'))
+
+        _log(tag, f'OK [native]: {file_count} archivos → {result.num_rows} filas en {time.time()-t0:.2f}s')
+        return {'Staging_EWM_Cartoning': result}
+
+    def _cartoning_python(self, processing_dir: str) -> dict:
         tag = 'DUCK-CART'
         t0 = time.time()
-        glob_pattern = os.path.join(processing_dir, '*.txt').replace('\\', '/')
 
         try:
-            # Cartoning usa ; como separador pero a veces tiene espacios extra
-            # Pre-procesamos: leemos cada archivo, aplicamos regex, concatenamos
-            all_rows = []
+            # Línea a línea: regex precompilado + split, acumulado como columna
+            # list<string> (valores planos + offsets). Cada _PY_CHUNK_LINES líneas
+            # el bloque pasa a raw_cartoning; el ancho fijo (C1..Cn con NULL) lo
+            # resuelve _cartoning_select en DuckDB, sin rellenar filas en Python
+            self.con.execute("CREATE OR REPLACE TABLE raw_cartoning (parts VARCHAR[], NombreArchivo VARCHAR)")
+            repair = _CARTONING_SEP_RE.sub
+            values, offsets, names = [], [0], []
             file_count = 0
-            for fname in os.listdir(processing_dir):
+            for fname in sorted(os.listdir(processing_dir)):
                 if not fname.lower().endswith('.txt'):
                     continue
                 fpath = os.path.join(processing_dir, fname)
                 with open(fpath, 'r', encoding='latin-1', errors='replace') as f:
-                    raw = f.read()
-                # Regla de negocio: insertar ; donde faltan separadores
-                clean = re.sub(r'(\d)\s{2,}(\d)', r'\1;\2', raw)
-                for line in clean.splitlines():
-                    if line.strip():
-                        parts = line.split(';')
-                        all_rows.append(parts + [fname])
+                    for line in f:
+                        if not line.strip():
+                            continue
+                        # Regla de negocio: insertar ; donde faltan separadores
+                        values.extend(repair(r'\1;\2', line.rstrip('\r\n')).split(';'))
+                        offsets.append(len(values))
+                        names.append(fname)
+                        if len(names) >= _PY_CHUNK_LINES:
+                            self._append_parts('raw_cartoning', values, offsets, names)
+                            values, offsets, names = [], [0], []
                 file_count += 1
+            if names:
+                self._append_parts('raw_cartoning', values, offsets, names)
 
-            if not all_rows:
+            # Máx columnas (SAP varía); las filas cortas quedan con NULL
+            max_parts = self.con.execute("SELECT MAX(len(parts)) FROM raw_cartoning").fetchone()[0]
+            if not max_parts:
                 _log(tag, 'Sin archivos / sin datos')
                 return {}
 
-            # Determinar max columnas (SAP varía)
-            max_cols = max(len(r) for r in all_rows)
-            # Normalizar a misma longitud
-            for r in all_rows:
-                while len(r) < max_cols:
-                    r.append(None)
-
-            # Columnas: TipoRegistro, C1..C14, NombreArchivo
-            col_names = ['TipoRegistro'] + [f'C{i}' for i in range(1, max_cols - 1)] + ['NombreArchivo']
-            # Ajustar si hay más columnas de las esperadas
-            col_names = col_names[:max_cols]
-
-            # Crear tabla DuckDB desde lista de listas
-            self.con.execute("DROP TABLE IF EXISTS raw_cartoning")
-            placeholders = ', '.join([f'col{i} VARCHAR' for i in range(max_cols)])
-            self.con.execute(f"CREATE TABLE raw_cartoning ({placeholders})")
-
-            # Insertar batch
-            self.con.executemany(
-                f"INSERT INTO raw_cartoning VALUES ({', '.join(['?'] * max_cols)})",
-                all_rows
-            )
-
-            # Renombrar columnas y aplicar trim vectorizado
-            rename_clauses = []
-            for i, name in enumerate(col_names):
-                rename_clauses.append(f"TRIM(col{i}) AS {name}")
-
-            query = f"""
-                SELECT {', '.join(rename_clauses)}
-                FROM raw_cartoning
-                WHERE TRIM(COALESCE(col0, '')) <> ''
-            """
-            result = self.con.execute(query).arrow()
+            result = self._fetch(self._cartoning_select(max_parts, 'raw_cartoning'))
             
-            _log(tag, f'OK: {file_count} archivos → {result.num_rows} filas en {time.time()-t0:.2f}s')
+            _log(tag, f'OK [python]: {file_count} archivos → {result.num_rows} filas en {time.time()-t0:.2f}s')
             return {'Staging_EWM_Cartoning': result}
 
         except Exception as e:
@@ -117,15 +396,51 @@ class DuckDBBatchProcessor:
     # FUENTE 2: WAVECONFIRM
     # ═══════════════════════════════════════════════════════════════
 
-    def batch_waveconfirm(self, processing_dir: str) -> dict:
+    def batch_waveconfirm(self, processing_dir: str, read_mode: str = READ_MODE_NATIVE) -> dict:
         """Lee y limpia todos los archivos de WaveConfirm.
 
-        Usa lectura Python (tolerante a encodings y columnas variables)
-        + limpieza vectorizada DuckDB.
-
         Returns:
             {'Staging_EWM_WaveConfirm': pyarrow.Table} o {} si vacío
         """
+        return self._run_mode('DUCK-WAVE', read_mode, self._waveconfirm_native,
+                              self._waveconfirm_python, processing_dir)
+
+    def _waveconfirm_native(self, processing_dir: str) -> dict:
+        tag = 'DUCK-WAVE'
+        t0 = time.time()
+        if not self._has_txt_files(processing_dir):
+            _log(tag, 'Sin datos. 0 archivos omitidos.')
+            return {}
+
+        line_count, file_count = self._load_raw_lines(processing_dir)
+        if not line_count:
+            _log(tag, 'Sin datos. Archivos vacíos o sin datos válidos.')
+            return {}
+
+        # Normalizar a 5 columnas: parts[i] fuera de rango → NULL
+        result = self._fetch("""
+            WITH w AS (
+                SELECT string_split(TRIM(line), ';') AS parts, NombreArchivo
+                FROM raw_lines
+                ORDER BY rowid
+            )
+            SELECT
+                TRIM(parts[1]) AS WaveID,
+                TRIM(parts[2]) AS PedidoID,
+                TRIM(parts[3]) AS columna0,
+                TRIM(parts[4]) AS CajaID,
+                TRIM(parts[5]) AS columna_extra,
+                NombreArchivo
+            FROM w
+            WHERE TRIM(COALESCE(parts[1], '')) <> ''
+        """)
+
+        _log(tag, f'OK [native]: {file_count} archivos → {result.num_rows} filas en {time.time()-t0:.2f}s')
+        return {'Staging_EWM_WaveConfirm': result}
+
+    def _waveconfirm_python(self, processing_dir: str) -> dict:
+        """Lectura Python (tolerante a encodings y columnas variables)
+        + limpieza vectorizada DuckDB."""
         tag = 'DUCK-WAVE'
         t0 = time.time()
 
@@ -182,7 +497,7 @@ class DuckDBBatchProcessor:
                 all_rows
             )
 
-            result = self.con.execute("""
+            result = self._fetch("""
                 SELECT
                     TRIM(col0) AS WaveID,
                     TRIM(col1) AS PedidoID,
@@ -192,11 +507,11 @@ class DuckDBBatchProcessor:
                     archivo    AS NombreArchivo
                 FROM raw_wave
                 WHERE TRIM(COALESCE(col0, '')) <> ''
-            """).arrow()
+            """)
 
             if skipped > 0:
                 _log(tag, f'  {skipped} archivos omitidos (vacíos/error)')
-            _log(tag, f'OK: {file_count} archivos → {result.num_rows} filas en {time.time()-t0:.2f}s')
+            _log(tag, f'OK [python]: {file_count} archivos → {result.num_rows} filas en {time.time()-t0:.2f}s')
             return {'Staging_EWM_WaveConfirm': result}
 
         except Exception as e:
@@ -207,7 +522,7 @@ class DuckDBBatchProcessor:
     # FUENTE 3: OUTBOUND DELIVERY (SHP_OBDLV_SAVE_REPLICA)
     # ═══════════════════════════════════════════════════════════════
 
-    def batch_outbound_delivery(self, processing_dir: str) -> dict:
+    def batch_outbound_delivery(self, processing_dir: str, read_mode: str = READ_MODE_NATIVE) -> dict:
         """Lee y limpia archivos IDoc de OutboundDelivery.
         
         Estructura: segmentos E1BPOBDLVHDR, E1BPOBDLVITEM, E1BPADR1, E1BPEXTC
@@ -217,122 +532,199 @@ class DuckDBBatchProcessor:
             {'Staging_EWM_OutboundDelivery_Header': arrow, 
              'Staging_EWM_OutboundDelivery_Items': arrow} o {} si vacío
         """
+        return self._run_mode('DUCK-OBD', read_mode, self._outbound_delivery_native,
+                              self._outbound_delivery_python, processing_dir)
+
+    def _outbound_delivery_native(self, processing_dir: str) -> dict:
+        """Splitter IDoc set-based: cada línea se asigna a la última cabecera
+        E1BPOBDLVHDR en o antes de ella (mismo archivo) vía función ventana.
+        Cabeceras e ítems salen como proyecciones SQL, sin loop Python."""
         tag = 'DUCK-OBD'
         t0 = time.time()
+        if not self._load_segments(processing_dir):
+            _log(tag, 'Sin datos de cabecera')
+            return {}
+
+        self.con.execute("""
+            CREATE OR REPLACE TABLE obd_lines AS
+            SELECT line_no, NombreArchivo, seg, p,
+                   MAX(CASE WHEN seg = 'E1BPOBDLVHDR' THEN line_no END) OVER w AS hdr_line,
+                   LAST_VALUE(CASE WHEN seg = 'E1BPOBDLVHDR' THEN COALESCE(p[2], '') END IGNORE NULLS)
+                       OVER w AS hdr_delivery
+            FROM raw_segments
+            WINDOW w AS (PARTITION BY NombreArchivo ORDER BY line_no
+                         ROWS BETWEEN UNBOUNDED PRECEDING AND CURRENT ROW)
+        """)
+
+        # Cabecera + enriquecimiento (último E1BPADR1 / E1BPEXTC del bloque gana)
+        self.con.execute("DROP TABLE IF EXISTS raw_obd_hdr")
+        self.con.execute("""
+            CREATE TABLE raw_obd_hdr AS
+            SELECT h.hdr_delivery AS Delivery_ID,
+                   NULLIF(h.p[7], '') AS Peso_Bruto,
+                   NULLIF(h.p[11], '') AS Volumen,
+                   b.Destinatario, b.Direccion, b.Region, b.Transportista, b.Fecha_Entrega,
+                   h.NombreArchivo
+            FROM obd_lines h
+            LEFT JOIN (
+                SELECT hdr_line,
+                       ARG_MAX_NULL(p[4], line_no) FILTER (WHERE seg = 'E1BPADR1') AS Destinatario,
+                       ARG_MAX_NULL(NULLIF(TRIM(COALESCE(p[17], '') || ' ' || COALESCE(p[9], '')), ''),
+                                    line_no) FILTER (WHERE seg = 'E1BPADR1') AS Direccion,
+                       ARG_MAX_NULL(p[29], line_no) FILTER (WHERE seg = 'E1BPADR1') AS Region,
+                       ARG_MAX_NULL(p[3], line_no)
+                           FILTER (WHERE seg = 'E1BPEXTC' AND p[2] = 'ZCARRIER_NAME') AS Transportista,
+                       ARG_MAX_NULL(p[3], line_no)
+                           FILTER (WHERE seg = 'E1BPEXTC' AND p[2] = 'ZDELV_DATE') AS Fecha_Entrega
+                FROM obd_lines
+                WHERE seg IN ('E1BPADR1', 'E1BPEXTC') AND hdr_delivery <> ''
+                GROUP BY hdr_line
+            ) b ON b.hdr_line = h.line_no
+            WHERE h.seg = 'E1BPOBDLVHDR' AND h.hdr_delivery <> ''
+            ORDER BY h.line_no
+        """)
+
+        self.con.execute("DROP TABLE IF EXISTS raw_obd_itm")
+        self.con.execute("""
+            CREATE TABLE raw_obd_itm AS
+            SELECT p[2] AS Delivery_ID_FK, p[3] AS Item_Number, p[4] AS Material_SKU,
+                   p[6] AS Descripcion, p[9] AS Cantidad, p[10] AS Unidad_Medida,
+                   p[16] AS Peso_Neto_Item, NombreArchivo
+            FROM obd_lines
+            WHERE seg = 'E1BPOBDLVITEM' AND hdr_delivery <> ''
+            ORDER BY line_no
+        """)
+
+        hdr_count = self.con.execute("SELECT COUNT(*) FROM raw_obd_hdr").fetchone()[0]
+        if not hdr_count:
+            _log(tag, 'Sin datos de cabecera')
+            return {}
+        itm_count = self.con.execute("SELECT COUNT(*) FROM raw_obd_itm").fetchone()[0]
+        return self._outbound_delivery_project(READ_MODE_NATIVE, t0, itm_count > 0)
 
+    def _outbound_delivery_python(self, processing_dir: str) -> dict:
         try:
-            headers_data = []
-            items_data = []
+            return self._outbound_delivery_from_lines(
+                self._iter_split_lines_python(processing_dir), READ_MODE_PYTHON)
+        except Exception as e:
+            _log('DUCK-OBD', f'ERROR: {e}')
+            return {}
 
-            for fname in sorted(os.listdir(processing_dir)):
-                if not fname.lower().endswith('.txt'):
-                    continue
-                fpath = os.path.join(processing_dir, fname)
-                with open(fpath, 'r', encoding='latin-1', errors='replace') as f:
-                    lines = [line.strip() for line in f if line.strip()]
+    def _outbound_delivery_from_lines(self, lines, read_mode: str) -> dict:
+        """Arma Header/Items a partir de (NombreArchivo, cols) en orden de línea."""
+        tag = 'DUCK-OBD'
+        t0 = time.time()
+
+        headers_data = []
+        items_data = []
+
+        for fname, file_lines in groupby(lines, key=lambda r: r[0]):
+            current_delivery_id = None
+            current_header = {}
+            current_block = []
+
+            for _, cols in file_lines:
+                seg = cols[0] if cols else ''
+
+                if seg == 'E1BPOBDLVHDR':
+                    # Flush previous
+                    if current_delivery_id and current_header:
+                        current_header = self._enrich_obd_header(current_header, current_block)
+                        current_header['NombreArchivo'] = fname
+                        headers_data.append(current_header)
+
+                    current_delivery_id = cols[1] if len(cols) > 1 else None
+                    peso = cols[6] if len(cols) > 6 else None
+                    volumen = cols[10] if len(cols) > 10 else None
+                    current_header = {
+                        'Delivery_ID': current_delivery_id,
+                        'Peso_Bruto': peso if peso else None,
+                        'Volumen': volumen if volumen else None,
+                    }
+                    current_block = [cols]
+
+                elif current_delivery_id:
+                    current_block.append(cols)
+                    if seg == 'E1BPOBDLVITEM':
+                        items_data.append({
+                            'Delivery_ID_FK': cols[1] if len(cols) > 1 else None,
+                            'Item_Number': cols[2] if len(cols) > 2 else None,
+                            'Material_SKU': cols[3] if len(cols) > 3 else None,
+                            'Descripcion': cols[5] if len(cols) > 5 else None,
+                            'Cantidad': cols[8] if len(cols) > 8 else None,
+                            'Unidad_Medida': cols[9] if len(cols) > 9 else None,
+                            'Peso_Neto_Item': cols[15] if len(cols) > 15 else None,
+                            'NombreArchivo': fname,
+                        })
 
-                current_delivery_id = None
-                current_header = {}
-                current_block_lines = []
+            # Flush last block
+            if current_delivery_id and current_header:
+                current_header = self._enrich_obd_header(current_header, current_block)
+                current_header['NombreArchivo'] = fname
+                headers_data.append(current_header)
 
-                for line in lines:
-                    cols = line.split(';')
-                    seg = cols[0].strip() if cols else ''
-
-                    if seg == 'E1BPOBDLVHDR':
-                        # Flush previous
-                        if current_delivery_id and current_header:
-                            current_header = self._enrich_obd_header(current_header, current_block_lines)
-                            current_header['NombreArchivo'] = fname
-                            headers_data.append(current_header)
-
-                        current_delivery_id = cols[1].strip() if len(cols) > 1 else None
-                        peso = cols[6].strip() if len(cols) > 6 else None
-                        volumen = cols[10].strip() if len(cols) > 10 else None
-                        current_header = {
-                            'Delivery_ID': current_delivery_id,
-                            'Peso_Bruto': peso if peso else None,
-                            'Volumen': volumen if volumen else None,
-                        }
-                        current_block_lines = [line]
-
-                    elif current_delivery_id:
-                        current_block_lines.append(line)
-                        if seg == 'E1BPOBDLVITEM':
-                            items_data.append({
-                                'Delivery_ID_FK': cols[1].strip() if len(cols) > 1 else None,
-                                'Item_Number': cols[2].strip() if len(cols) > 2 else None,
-                                'Material_SKU': cols[3].strip() if len(cols) > 3 else None,
-                                'Descripcion': cols[5].strip() if len(cols) > 5 else None,
-                                'Cantidad': cols[8].strip() if len(cols) > 8 else None,
-                                'Unidad_Medida': cols[9].strip() if len(cols) > 9 else None,
-                                'Peso_Neto_Item': cols[15].strip() if len(cols) > 15 else None,
-                                'NombreArchivo': fname,
-                            })
-
-                # Flush last block
-                if current_delivery_id and current_header:
-                    current_header = self._enrich_obd_header(current_header, current_block_lines)
-                    current_header['NombreArchivo'] = fname
-                    headers_data.append(current_header)
-
-            if not headers_data:
-                _log(tag, 'Sin datos de cabecera')
-                return {}
+        if not headers_data:
+            _log(tag, 'Sin datos de cabecera')
+            return {}
 
-            # Limpiar con DuckDB vectorizado
-            self.con.execute("DROP TABLE IF EXISTS raw_obd_hdr")
-            self.con.execute("DROP TABLE IF EXISTS raw_obd_itm")
+        self.con.execute("DROP TABLE IF EXISTS raw_obd_hdr")
+        self.con.execute("DROP TABLE IF EXISTS raw_obd_itm")
+        self._create_from_pylist('raw_obd_hdr', headers_data)
+        if items_data:
+            self._create_from_pylist('raw_obd_itm', items_data)
+        return self._outbound_delivery_project(read_mode, t0, bool(items_data))
 
-            self.con.execute("CREATE TABLE raw_obd_hdr AS SELECT * FROM ?", [pa.Table.from_pylist(headers_data)])
-            hdr_result = self.con.execute("""
+    def _outbound_delivery_project(self, read_mode: str, t0: float, has_items: bool) -> dict:
+        """Limpieza vectorizada (TRIM + cast) sobre raw_obd_hdr / raw_obd_itm."""
+        tag = 'DUCK-OBD'
+        hdr_result = self._fetch("""
+            SELECT 
+                TRIM(Delivery_ID) AS Delivery_ID,
+                TRY_CAST(REPLACE(NULLIF(TRIM(Peso_Bruto), ''), ',', '.') AS DECIMAL(18,3)) AS Peso_Bruto,
+                TRY_CAST(REPLACE(NULLIF(TRIM(Volumen), ''), ',', '.') AS DECIMAL(18,3)) AS Volumen,
+                TRIM(Destinatario) AS Destinatario,
+                TRIM(Direccion) AS Direccion,
+                TRIM(Region) AS Region,
+                TRIM(Transportista) AS Transportista,
+                TRIM(Fecha_Entrega) AS Fecha_Entrega,
+                NombreArchivo
+            FROM raw_obd_hdr
+            WHERE TRIM(COALESCE(Delivery_ID, '')) <> ''
+        """)
+
+        if has_items:
+            itm_result = self._fetch("""
                 SELECT 
-                    TRIM(Delivery_ID) AS Delivery_ID,
-                    TRY_CAST(REPLACE(NULLIF(TRIM(Peso_Bruto), ''), ',', '.') AS DECIMAL(18,3)) AS Peso_Bruto,
-                    TRY_CAST(REPLACE(NULLIF(TRIM(Volumen), ''), ',', '.') AS DECIMAL(18,3)) AS Volumen,
-                    TRIM(Destinatario) AS Destinatario,
-                    TRIM(Direccion) AS Direccion,
-                    TRIM(Region) AS Region,
-                    TRIM(Transportista) AS Transportista,
-                    TRIM(Fecha_Entrega) AS Fecha_Entrega,
+                    TRIM(Delivery_ID_FK) AS Delivery_ID_FK,
+                    TRIM(Item_Number) AS Item_Number,
+                    TRIM(Material_SKU) AS Material_SKU,
+                    TRIM(Descripcion) AS Descripcion,
+                    TRY_CAST(REPLACE(NULLIF(TRIM(Cantidad), ''), ',', '.') AS DECIMAL(18,3)) AS Cantidad,
+                    TRIM(Unidad_Medida) AS Unidad_Medida,
+                    TRY_CAST(REPLACE(NULLIF(TRIM(Peso_Neto_Item), ''), ',', '.') AS DECIMAL(18,3)) AS Peso_Neto_Item,
                     NombreArchivo
-                FROM raw_obd_hdr
-                WHERE TRIM(COALESCE(Delivery_ID, '')) <> ''
-            """).arrow()
-
-            if items_data:
-                self.con.execute("CREATE TABLE raw_obd_itm AS SELECT * FROM ?", [pa.Table.from_pylist(items_data)])
-                itm_result = self.con.execute("""
-                    SELECT 
-                        TRIM(Delivery_ID_FK) AS Delivery_ID_FK,
-                        TRIM(Item_Number) AS Item_Number,
-                        TRIM(Material_SKU) AS Material_SKU,
-                        TRIM(Descripcion) AS Descripcion,
-                        TRY_CAST(REPLACE(NULLIF(TRIM(Cantidad), ''), ',', '.') AS DECIMAL(18,3)) AS Cantidad,
-                        TRIM(Unidad_Medida) AS Unidad_Medida,
-                        TRY_CAST(REPLACE(NULLIF(TRIM(Peso_Neto_Item), ''), ',', '.') AS DECIMAL(18,3)) AS Peso_Neto_Item,
-                        NombreArchivo
-                    FROM raw_obd_itm
-                    WHERE TRIM(COALESCE(Delivery_ID_FK, '')) <> ''
-                """).arrow()
-            else:
-                itm_result = pa.table({'Delivery_ID_FK': [], 'Item_Number': [], 'Material_SKU': [],
-                                       'Descripcion': [], 'Cantidad': [], 'Unidad_Medida': [],
-                                       'Peso_Neto_Item': [], 'NombreArchivo': []})
-
-            _log(tag, f'OK: {hdr_result.num_rows} headers, {itm_result.num_rows} items en {time.time()-t0:.2f}s')
-            return {
-                'Staging_EWM_OutboundDelivery_Header': hdr_result,
-                'Staging_EWM_OutboundDelivery_Items': itm_result,
-            }
-
-        except Exception as e:
-            _log(tag, f'ERROR: {e}')
-            return {}
+                FROM raw_obd_itm
+                WHERE TRIM(COALESCE(Delivery_ID_FK, '')) <> ''
+            """)
+        else:
+            itm_result = pa.table({'Delivery_ID_FK': [], 'Item_Number': [], 'Material_SKU': [],
+                                   'Descripcion': [], 'Cantidad': [], 'Unidad_Medida': [],
+                                   'Peso_Neto_Item': [], 'NombreArchivo': []})
+
+        _log(tag, f'OK [{read_mode}]: {hdr_result.num_rows} headers, {itm_result.num_rows} items '
+                  f'en {time.time()-t0:.2f}s')
+        return {
+            'Staging_EWM_OutboundDelivery_Header': hdr_result,
+            'Staging_EWM_OutboundDelivery_Items': itm_result,
+        }
 
     @staticmethod
-    def _enrich_obd_header(header: dict, block_lines: list) -> dict:
-        """Enriquecer cabecera OBD con datos de E1BPADR1 y E1BPEXTC."""
+    def _enrich_obd_header(header: dict, block: list) -> dict:
+        """Enriquecer cabecera OBD con datos de E1BPADR1 y E1BPEXTC.
+
+        Args:
+            block: líneas del bloque de la entrega, ya separadas en columnas con strip
+        """
         enriched = header.copy()
         enriched.setdefault('Destinatario', None)
         enriched.setdefault('Direccion', None)
@@ -340,18 +732,17 @@ class DuckDBBatchProcessor:
         enriched.setdefault('Transportista', None)
         enriched.setdefault('Fecha_Entrega', None)
 
-        for line in block_lines:
-            cols = line.split(';')
-            seg = cols[0].strip() if cols else ''
+        for cols in block:
+            seg = cols[0] if cols else ''
             if seg == 'E1BPADR1':
-                enriched['Destinatario'] = cols[3].strip() if len(cols) > 3 else None
-                ciudad = cols[8].strip() if len(cols) > 8 else ''
-                calle = cols[16].strip() if len(cols) > 16 else ''
+                enriched['Destinatario'] = cols[3] if len(cols) > 3 else None
+                ciudad = cols[8] if len(cols) > 8 else ''
+                calle = cols[16] if len(cols) > 16 else ''
                 enriched['Direccion'] = f"{calle} {ciudad}".strip() or None
-                enriched['Region'] = cols[28].strip() if len(cols) > 28 else None
+                enriched['Region'] = cols[28] if len(cols) > 28 else None
             elif seg == 'E1BPEXTC':
-                z_field = cols[1].strip() if len(cols) > 1 else None
-                z_value = cols[2].strip() if len(cols) > 2 else None
+                z_field = cols[1] if len(cols) > 1 else None
+                z_value = cols[2] if len(cols) > 2 else None
                 if z_field == 'ZCARRIER_NAME':
                     enriched['Transportista'] = z_value
                 elif z_field == 'ZDELV_DATE':
@@ -362,12 +753,123 @@ class DuckDBBatchProcessor:
     # FUENTE 4: OUTBOUND DELIVERY CONFIRM (SHP_OBDLV_CONFIRM_DECENTRAL)
     # ═══════════════════════════════════════════════════════════════
 
-    def batch_outbound_delivery_confirm(self, processing_dir: str) -> dict:
+    def batch_outbound_delivery_confirm(self, processing_dir: str, read_mode: str = READ_MODE_NATIVE) -> dict:
         """Lee y limpia archivos IDoc de OutboundDeliveryConfirm.
         
         Returns:
             dict con 6 tablas staging como pyarrow.Table, o {} si vacío
         """
+        return self._run_mode('DUCK-OBDC', read_mode, self._outbound_delivery_confirm_native,
+                              self._outbound_delivery_confirm_python, processing_dir)
+
+    def _outbound_delivery_confirm_native(self, processing_dir: str) -> dict:
+        """Splitter IDoc set-based: la entrega dueña de cada línea es el último
+        número de entrega (columna 2 numérica) visto en el archivo hasta esa
+        línea inclusive, resuelto con LAST_VALUE(... IGNORE NULLS) OVER ventana."""
+        tag = 'DUCK-OBDC'
+        t0 = time.time()
+        if not self._load_segments(processing_dir):
+            _log(tag, 'Sin datos de cabecera')
+            return {}
+
+        self.con.execute("""
+            CREATE OR REPLACE TABLE obdc_lines AS
+            SELECT line_no, NombreArchivo, seg, p,
+                   LAST_VALUE(CASE WHEN regexp_full_match(COALESCE(p[2], ''), '[0-9]+')
+                                   THEN p[2] END IGNORE NULLS) OVER w AS entrega
+            FROM raw_segments
+            WINDOW w AS (PARTITION BY NombreArchivo ORDER BY line_no
+                         ROWS BETWEEN UNBOUNDED PRECEDING AND CURRENT ROW)
+        """)
+
+        raw_queries = {
+            # Una cabecera por (archivo, entrega); las fechas DEADLN aplican solo
+            # después de la primera línea de cabecera y gana la última.
+            'raw_obdc_cab': """
+                WITH cab AS (
+                    SELECT NombreArchivo, entrega, MIN(line_no) AS first_line
+                    FROM obdc_lines
+                    WHERE seg IN ('E1BPOBDLVHDRCON', 'E1BPOBDLVHDRCTRLCON')
+                      AND entrega IS NOT NULL
+                    GROUP BY NombreArchivo, entrega
+                )
+                SELECT c.entrega AS Numero_Entrega,
+                       ARG_MAX_NULL(d.p[4], d.line_no)
+                           FILTER (WHERE d.p[3] = 'WSHDRLFDAT') AS Fecha_WSHDRLFDAT,
+                       ARG_MAX_NULL(d.p[4], d.line_no)
+                           FILTER (WHERE d.p[3] = 'WSHDRWADTI') AS Fecha_WSHDRWADTI,
+                       c.NombreArchivo
+                FROM cab c
+                LEFT JOIN obdc_lines d
+                  ON d.seg = 'E1BPDLVDEADLN'
+                 AND d.NombreArchivo = c.NombreArchivo
+                 AND d.entrega = c.entrega
+                 AND d.line_no > c.first_line
+                GROUP BY c.NombreArchivo, c.entrega, c.first_line
+                ORDER BY c.first_line
+            """,
+            'raw_obdc_pos': """
+                SELECT entrega AS Numero_Entrega, p[3] AS Numero_Posicion, p[4] AS Pedido_Ref,
+                       p[5] AS Material_SKU, p[6] AS Cantidad, p[9] AS Unidad, NombreArchivo
+                FROM obdc_lines
+                WHERE seg = 'E1BPOBDLVITEMCON' AND entrega IS NOT NULL
+                ORDER BY line_no
+            """,
+            'raw_obdc_ctl': """
+                SELECT entrega AS Numero_Entrega, p[3] AS Numero_Posicion,
+                       p[4] AS Flag_Confirmacion, NombreArchivo
+                FROM obdc_lines
+                WHERE seg = 'E1BPOBDLVITEMCTRLCON' AND entrega IS NOT NULL
+                ORDER BY line_no
+            """,
+            'raw_obdc_uni': """
+                SELECT entrega AS Numero_Entrega, p[3] AS ID_Unidad_Manipulacion,
+                       p[4] AS Tipo_Embalaje, p[5] AS HU_Nivel, p[6] AS Numero_Externo,
+                       p[7] AS Cantidad_HU, NombreArchivo
+                FROM obdc_lines
+                WHERE seg = 'E1BPDLVHDUNHDR' AND entrega IS NOT NULL
+                ORDER BY line_no
+            """,
+            'raw_obdc_con': """
+                SELECT p[2] AS ID_Unidad_Manipulacion_Padre, p[3] AS ID_Unidad_Manipulacion_Hijo,
+                       p[4] AS Numero_Entrega, p[5] AS Numero_Posicion,
+                       p[6] AS Cantidad_Empacada, p[7] AS Unidad, p[8] AS Material_SKU,
+                       p[9] AS Nivel_HU, NombreArchivo
+                FROM obdc_lines
+                WHERE seg = 'E1BPDLVHDUNITM'
+                ORDER BY line_no
+            """,
+            'raw_obdc_ext': """
+                SELECT p[2] AS Nombre_Campo, p[3] AS ID_Referencia, p[4] AS Valor_1,
+                       p[5] AS Valor_2, p[6] AS Valor_3, NombreArchivo
+                FROM obdc_lines
+                WHERE seg = 'E1BPEXTC'
+                ORDER BY line_no
+            """,
+        }
+
+        present = set()
+        for raw_name, query in raw_queries.items():
+            self.con.execute(f"DROP TABLE IF EXISTS {raw_name}")
+            self.con.execute(f"CREATE TABLE {raw_name} AS {query}")
+            if self.con.execute(f"SELECT COUNT(*) FROM {raw_name}").fetchone()[0]:
+                present.add(raw_name)
+
+        if 'raw_obdc_cab' not in present:
+            _log(tag, 'Sin datos de cabecera')
+            return {}
+        return self._outbound_delivery_confirm_project(READ_MODE_NATIVE, t0, present)
+
+    def _outbound_delivery_confirm_python(self, processing_dir: str) -> dict:
+        try:
+            return self._outbound_delivery_confirm_from_lines(
+                self._iter_split_lines_python(processing_dir), READ_MODE_PYTHON)
+        except Exception as e:
+            _log('DUCK-OBDC', f'ERROR: {e}')
+            return {}
+
+    def _outbound_delivery_confirm_from_lines(self, lines, read_mode: str) -> dict:
+        """Arma las 6 tablas staging a partir de (NombreArchivo, cols) en orden de línea."""
         tag = 'DUCK-OBDC'
         t0 = time.time()
 
@@ -378,232 +880,222 @@ class DuckDBBatchProcessor:
         contenido_data = []
         extensiones_data = []
 
-        try:
-            for fname in sorted(os.listdir(processing_dir)):
-                if not fname.lower().endswith('.txt'):
-                    continue
-                fpath = os.path.join(processing_dir, fname)
-                with open(fpath, 'r', encoding='latin-1', errors='replace') as f:
-                    lines = [line.strip() for line in f if line.strip()]
+        # Índice (NombreArchivo, Numero_Entrega) -> fila de cabecera_data:
+        # dedup y enriquecimiento de fechas en O(1) por línea.
+        cabecera_index = {}
 
-                current_delivery_id = None
+        for fname, file_lines in groupby(lines, key=lambda r: r[0]):
+            current_delivery_id = None
 
-                for line in lines:
-                    cols = [c.strip() for c in line.split(';')]
-                    seg = cols[0] if cols else ''
-
-                    # Identificar número de entrega
-                    if len(cols) > 1 and cols[1] and cols[1].isdigit():
-                        current_delivery_id = cols[1]
-
-                    # CABECERA
-                    if seg in ('E1BPOBDLVHDRCON', 'E1BPOBDLVHDRCTRLCON'):
-                        if current_delivery_id and not any(
-                            c['Numero_Entrega'] == current_delivery_id for c in cabecera_data
-                            if c['NombreArchivo'] == fname
-                        ):
-                            cabecera_data.append({
-                                'Numero_Entrega': current_delivery_id,
-                                'Fecha_WSHDRLFDAT': None,
-                                'Fecha_WSHDRWADTI': None,
-                                'NombreArchivo': fname,
-                            })
-
-                    elif seg == 'E1BPDLVDEADLN' and current_delivery_id:
-                        fecha_tipo = cols[2] if len(cols) > 2 else None
-                        fecha_valor = cols[3] if len(cols) > 3 else None
-                        for cab in cabecera_data:
-                            if cab['Numero_Entrega'] == current_delivery_id and cab['NombreArchivo'] == fname:
-                                if fecha_tipo == 'WSHDRLFDAT':
-                                    cab['Fecha_WSHDRLFDAT'] = fecha_valor
-                                elif fecha_tipo == 'WSHDRWADTI':
-                                    cab['Fecha_WSHDRWADTI'] = fecha_valor
-
-                    # POSICIONES
-                    elif seg == 'E1BPOBDLVITEMCON' and current_delivery_id:
-                        posiciones_data.append({
-                            'Numero_Entrega': current_delivery_id,
-                            'Numero_Posicion': cols[2] if len(cols) > 2 else None,
-                            'Pedido_Ref': cols[3] if len(cols) > 3 else None,
-                            'Material_SKU': cols[4] if len(cols) > 4 else None,
-                            'Cantidad': cols[5] if len(cols) > 5 else None,
-                            'Unidad': cols[8] if len(cols) > 8 else None,
-                            'NombreArchivo': fname,
-                        })
+            for _, cols in file_lines:
+                seg = cols[0] if cols else ''
 
-                    # CONTROL POSICIONES
-                    elif seg == 'E1BPOBDLVITEMCTRLCON' and current_delivery_id:
-                        control_data.append({
-                            'Numero_Entrega': current_delivery_id,
-                            'Numero_Posicion': cols[2] if len(cols) > 2 else None,
-                            'Flag_Confirmacion': cols[3] if len(cols) > 3 else None,
-                            'NombreArchivo': fname,
-                        })
+                # Identificar número de entrega
+                if len(cols) > 1 and cols[1] and cols[1].isdigit():
+                    current_delivery_id = cols[1]
 
-                    # UNIDADES HU
-                    elif seg == 'E1BPDLVHDUNHDR' and current_delivery_id:
-                        unidades_data.append({
+                # CABECERA
+                if seg in ('E1BPOBDLVHDRCON', 'E1BPOBDLVHDRCTRLCON'):
+                    key = (fname, current_delivery_id)
+                    if current_delivery_id and key not in cabecera_index:
+                        cab = {
                             'Numero_Entrega': current_delivery_id,
-                            'ID_Unidad_Manipulacion': cols[2] if len(cols) > 2 else None,
-                            'Tipo_Embalaje': cols[3] if len(cols) > 3 else None,
-                            'HU_Nivel': cols[4] if len(cols) > 4 else None,
-                            'Numero_Externo': cols[5] if len(cols) > 5 else None,
-                            'Cantidad_HU': cols[6] if len(cols) > 6 else None,
+                            'Fecha_WSHDRLFDAT': None,
+                            'Fecha_WSHDRWADTI': None,
                             'NombreArchivo': fname,
-                        })
+                        }
+                        cabecera_index[key] = cab
+                        cabecera_data.append(cab)
 
-                    # CONTENIDO EMBALAJE
-                    elif seg == 'E1BPDLVHDUNITM':
-                        contenido_data.append({
-                            'ID_Unidad_Manipulacion_Padre': cols[1] if len(cols) > 1 else None,
-                            'ID_Unidad_Manipulacion_Hijo': cols[2] if len(cols) > 2 else None,
-                            'Numero_Entrega': cols[3] if len(cols) > 3 else None,
-                            'Numero_Posicion': cols[4] if len(cols) > 4 else None,
-                            'Cantidad_Empacada': cols[5] if len(cols) > 5 else None,
-                            'Unidad': cols[6] if len(cols) > 6 else None,
-                            'Material_SKU': cols[7] if len(cols) > 7 else None,
-                            'Nivel_HU': cols[8] if len(cols) > 8 else None,
-                            'NombreArchivo': fname,
-                        })
+                elif seg == 'E1BPDLVDEADLN' and current_delivery_id:
+                    cab = cabecera_index.get((fname, current_delivery_id))
+                    if cab is not None:
+                        fecha_tipo = cols[2] if len(cols) > 2 else None
+                        fecha_valor = cols[3] if len(cols) > 3 else None
+                        if fecha_tipo == 'WSHDRLFDAT':
+                            cab['Fecha_WSHDRLFDAT'] = fecha_valor
+                        elif fecha_tipo == 'WSHDRWADTI':
+                            cab['Fecha_WSHDRWADTI'] = fecha_valor
+
+                # POSICIONES
+                elif seg == 'E1BPOBDLVITEMCON' and current_delivery_id:
+                    posiciones_data.append({
+                        'Numero_Entrega': current_delivery_id,
+                        'Numero_Posicion': cols[2] if len(cols) > 2 else None,
+                        'Pedido_Ref': cols[3] if len(cols) > 3 else None,
+                        'Material_SKU': cols[4] if len(cols) > 4 else None,
+                        'Cantidad': cols[5] if len(cols) > 5 else None,
+                        'Unidad': cols[8] if len(cols) > 8 else None,
+                        'NombreArchivo': fname,
+                    })
+
+                # CONTROL POSICIONES
+                elif seg == 'E1BPOBDLVITEMCTRLCON' and current_delivery_id:
+                    control_data.append({
+                        'Numero_Entrega': current_delivery_id,
+                        'Numero_Posicion': cols[2] if len(cols) > 2 else None,
+                        'Flag_Confirmacion': cols[3] if len(cols) > 3 else None,
+                        'NombreArchivo': fname,
+                    })
+
+                # UNIDADES HU
+                elif seg == 'E1BPDLVHDUNHDR' and current_delivery_id:
+                    unidades_data.append({
+                        'Numero_Entrega': current_delivery_id,
+                        'ID_Unidad_Manipulacion': cols[2] if len(cols) > 2 else None,
+                        'Tipo_Embalaje': cols[3] if len(cols) > 3 else None,
+                        'HU_Nivel': cols[4] if len(cols) > 4 else None,
+                        'Numero_Externo': cols[5] if len(cols) > 5 else None,
+                        'Cantidad_HU': cols[6] if len(cols) > 6 else None,
+                        'NombreArchivo': fname,
+                    })
+
+                # CONTENIDO EMBALAJE
+                elif seg == 'E1BPDLVHDUNITM':
+                    contenido_data.append({
+                        'ID_Unidad_Manipulacion_Padre': cols[1] if len(cols) > 1 else None,
+                        'ID_Unidad_Manipulacion_Hijo': cols[2] if len(cols) > 2 else None,
+                        'Numero_Entrega': cols[3] if len(cols) > 3 else None,
+                        'Numero_Posicion': cols[4] if len(cols) > 4 else None,
+                        'Cantidad_Empacada': cols[5] if len(cols) > 5 else None,
+                        'Unidad': cols[6] if len(cols) > 6 else None,
+                        'Material_SKU': cols[7] if len(cols) > 7 else None,
+                        'Nivel_HU': cols[8] if len(cols) > 8 else None,
+                        'NombreArchivo': fname,
+                    })
+
+                # EXTENSIONES
+                elif seg == 'E1BPEXTC':
+                    extensiones_data.append({
+                        'Nombre_Campo': cols[1] if len(cols) > 1 else None,
+                        'ID_Referencia': cols[2] if len(cols) > 2 else None,
+                        'Valor_1': cols[3] if len(cols) > 3 else None,
+                        'Valor_2': cols[4] if len(cols) > 4 else None,
+                        'Valor_3': cols[5] if len(cols) > 5 else None,
+                        'NombreArchivo': fname,
+                    })
+
+        if not cabecera_data:
+            _log(tag, 'Sin datos de cabecera')
+            return {}
 
-                    # EXTENSIONES
-                    elif seg == 'E1BPEXTC':
-                        extensiones_data.append({
-                            'Nombre_Campo': cols[1] if len(cols) > 1 else None,
-                            'ID_Referencia': cols[2] if len(cols) > 2 else None,
-                            'Valor_1': cols[3] if len(cols) > 3 else None,
-                            'Valor_2': cols[4] if len(cols) > 4 else None,
-                            'Valor_3': cols[5] if len(cols) > 5 else None,
-                            'NombreArchivo': fname,
-                        })
+        raw_data = {
+            'raw_obdc_cab': cabecera_data,
+            'raw_obdc_pos': posiciones_data,
+            'raw_obdc_ctl': control_data,
+            'raw_obdc_uni': unidades_data,
+            'raw_obdc_con': contenido_data,
+            'raw_obdc_ext': extensiones_data,
+        }
+        for raw_name, rows in raw_data.items():
+            self.con.execute(f"DROP TABLE IF EXISTS {raw_name}")
+            if rows:
+                self._create_from_pylist(raw_name, rows)
+
+        return self._outbound_delivery_confirm_project(
+            read_mode, t0, {name for name, rows in raw_data.items() if rows})
+
+    def _outbound_delivery_confirm_project(self, read_mode: str, t0: float, present: set) -> dict:
+        """Limpieza vectorizada (TRIM + cast) sobre las tablas raw_obdc_* presentes.
+
+        Solo se retornan las tablas staging cuya tabla raw tiene filas.
+        """
+        tag = 'DUCK-OBDC'
+        result = {}
+        for staging_name, (raw_name, query) in _OBDC_PROJECTIONS.items():
+            if raw_name in present:
+                result[staging_name] = self._fetch(query)
 
-            if not cabecera_data:
-                _log(tag, 'Sin datos de cabecera')
-                return {}
+        # Resumen
+        for tbl_name, tbl in result.items():
+            short = tbl_name.replace('Staging_EWM_OBDConfirm_', '')
+            _log(tag, f'  {short}: {tbl.num_rows} filas')
+        _log(tag, f'OK [{read_mode}]: procesado en {time.time()-t0:.2f}s')
 
-            # Limpiar con DuckDB vectorizado (TRIM + cast numéricos)
-            tables_raw = {
-                'cab': (cabecera_data, 'Staging_EWM_OBDConfirm_Cabecera'),
-                'pos': (posiciones_data, 'Staging_EWM_OBDConfirm_Posiciones'),
-                'ctl': (control_data, 'Staging_EWM_OBDConfirm_Control_Posiciones'),
-                'uni': (unidades_data, 'Staging_EWM_OBDConfirm_Unidades_HDR'),
-                'con': (contenido_data, 'Staging_EWM_OBDConfirm_Contenido_Embalaje'),
-                'ext': (extensiones_data, 'Staging_EWM_OBDConfirm_Extensiones'),
-            }
-
-            result = {}
-
-            # Cabecera — solo trim
-            if cabecera_data:
-                self.con.execute("DROP TABLE IF EXISTS raw_obdc_cab")
-                self.con.execute("CREATE TABLE raw_obdc_cab AS SELECT * FROM ?",
-                                 [pa.Table.from_pylist(cabecera_data)])
-                result['Staging_EWM_OBDConfirm_Cabecera'] = self.con.execute("""
-                    SELECT TRIM(Numero_Entrega) AS Numero_Entrega,
-                           TRIM(Fecha_WSHDRLFDAT) AS Fecha_WSHDRLFDAT,
-                           TRIM(Fecha_WSHDRWADTI) AS Fecha_WSHDRWADTI,
-                           NombreArchivo
-                    FROM raw_obdc_cab
-                    WHERE TRIM(COALESCE(Numero_Entrega, '')) <> ''
-                """).arrow()
-
-            # Posiciones — trim + cast cantidad
-            if posiciones_data:
-                self.con.execute("DROP TABLE IF EXISTS raw_obdc_pos")
-                self.con.execute("CREATE TABLE raw_obdc_pos AS SELECT * FROM ?",
-                                 [pa.Table.from_pylist(posiciones_data)])
-                result['Staging_EWM_OBDConfirm_Posiciones'] = self.con.execute("""
-                    SELECT TRIM(Numero_Entrega) AS Numero_Entrega,
-                           TRIM(Numero_Posicion) AS Numero_Posicion,
-                           TRIM(Pedido_Ref) AS Pedido_Ref,
-                           TRIM(Material_SKU) AS Material_SKU,
-                           TRIM(REPLACE(NULLIF(TRIM(Cantidad), ''), ',', '.')) AS Cantidad,
-                           TRIM(Unidad) AS Unidad,
-                           NombreArchivo
-                    FROM raw_obdc_pos
-                    WHERE TRIM(COALESCE(Numero_Entrega, '')) <> ''
-                """).arrow()
-
-            # Control
-            if control_data:
-                self.con.execute("DROP TABLE IF EXISTS raw_obdc_ctl")
-                self.con.execute("CREATE TABLE raw_obdc_ctl AS SELECT * FROM ?",
-                                 [pa.Table.from_pylist(control_data)])
-                result['Staging_EWM_OBDConfirm_Control_Posiciones'] = self.con.execute("""
-                    SELECT TRIM(Numero_Entrega) AS Numero_Entrega,
-                           TRIM(Numero_Posicion) AS Numero_Posicion,
-                           TRIM(Flag_Confirmacion) AS Flag_Confirmacion,
-                           NombreArchivo
-                    FROM raw_obdc_ctl
-                    WHERE TRIM(COALESCE(Numero_Entrega, '')) <> ''
-                """).arrow()
-
-            # Unidades HU — trim + cast cantidad
-            if unidades_data:
-                self.con.execute("DROP TABLE IF EXISTS raw_obdc_uni")
-                self.con.execute("CREATE TABLE raw_obdc_uni AS SELECT * FROM ?",
-                                 [pa.Table.from_pylist(unidades_data)])
-                result['Staging_EWM_OBDConfirm_Unidades_HDR'] = self.con.execute("""
-                    SELECT TRIM(Numero_Entrega) AS Numero_Entrega,
-                           TRIM(ID_Unidad_Manipulacion) AS ID_Unidad_Manipulacion,
-                           TRIM(Tipo_Embalaje) AS Tipo_Embalaje,
-                           TRIM(HU_Nivel) AS HU_Nivel,
-                           TRIM(Numero_Externo) AS Numero_Externo,
-                           TRIM(REPLACE(NULLIF(TRIM(Cantidad_HU), ''), ',', '.')) AS Cantidad_HU,
-                           NombreArchivo
-                    FROM raw_obdc_uni
-                    WHERE TRIM(COALESCE(Numero_Entrega, '')) <> ''
-                """).arrow()
-
-            # Contenido embalaje — trim + cast cantidad
-            if contenido_data:
-                self.con.execute("DROP TABLE IF EXISTS raw_obdc_con")
-                self.con.execute("CREATE TABLE raw_obdc_con AS SELECT * FROM ?",
-                                 [pa.Table.from_pylist(contenido_data)])
-                result['Staging_EWM_OBDConfirm_Contenido_Embalaje'] = self.con.execute("""
-                    SELECT TRIM(ID_Unidad_Manipulacion_Padre) AS ID_Unidad_Manipulacion_Padre,
-                           TRIM(ID_Unidad_Manipulacion_Hijo) AS ID_Unidad_Manipulacion_Hijo,
-                           TRIM(Numero_Entrega) AS Numero_Entrega,
-                           TRIM(Numero_Posicion) AS Numero_Posicion,
-                           TRIM(REPLACE(NULLIF(TRIM(Cantidad_Empacada), ''), ',', '.')) AS Cantidad_Empacada,
-                           TRIM(Unidad) AS Unidad,
-                           TRIM(Material_SKU) AS Material_SKU,
-                           TRIM(Nivel_HU) AS Nivel_HU,
-                           NombreArchivo
-                    FROM raw_obdc_con
-                """).arrow()
-
-            # Extensiones — solo trim
-            if extensiones_data:
-                self.con.execute("DROP TABLE IF EXISTS raw_obdc_ext")
-                self.con.execute("CREATE TABLE raw_obdc_ext AS SELECT * FROM ?",
-                                 [pa.Table.from_pylist(extensiones_data)])
-                result['Staging_EWM_OBDConfirm_Extensiones'] = self.con.execute("""
-                    SELECT TRIM(Nombre_Campo) AS Nombre_Campo,
-                           TRIM(ID_Referencia) AS ID_Referencia,
-                           TRIM(Valor_1) AS Valor_1,
-                           TRIM(Valor_2) AS Valor_2,
-                           TRIM(Valor_3) AS Valor_3,
-                           NombreArchivo
-                    FROM raw_obdc_ext
-                """).arrow()
-
-            # Resumen
-            for tbl_name, tbl in result.items():
-                short = tbl_name.replace('Staging_EWM_OBDConfirm_', '')
-                _log(tag, f'  {short}: {tbl.num_rows} filas')
-            _log(tag, f'OK: procesado en {time.time()-t0:.2f}s')
+        return result
 
-            return result
+    # ═══════════════════════════════════════════════════════════════
+    # STREAMING: RecordBatchReader con memoria acotada por fuente
+    # ═══════════════════════════════════════════════════════════════
 
-        except Exception as e:
-            _log(tag, f'ERROR: {e}')
-            return {}
+    @staticmethod
+    def stream_batch_rows(max_memory_mb: int) -> int:
+        """Filas por RecordBatch para un tope de memoria (mitad del tope, ver _STREAM_*)."""
+        budget = max_memory_mb * 1024 * 1024 // 2
+        return max(_STREAM_MIN_ROWS, budget // (_STREAM_ROW_BYTES * _STREAM_COPIES))
+
+    def stream_batch(self, batch_method: str, processing_dir: str,
+                     read_mode: str = READ_MODE_NATIVE, max_memory_mb: int = 512) -> dict:
+        """Variante streaming de batch_*: lee y limpia, pero no materializa staging.
+
+        Returns:
+            {staging_table: open_reader} o {} si vacío. open_reader() ejecuta la
+            proyección y retorna un pyarrow.RecordBatchReader; se puede llamar de
+            nuevo (reintento) mientras no se procese otro lote con este motor.
+            Los readers comparten la conexión: abrir uno invalida el anterior,
+            así que se consumen de a uno.
+        """
+        batch_rows = self.stream_batch_rows(max_memory_mb)
+        duckdb_mb = max(_STREAM_MIN_DUCKDB_MB, max_memory_mb // 2)
+        self.con.execute(f"SET memory_limit = '{duckdb_mb}MB'")
+        self._memory_limited = True
+        self._stream_rows = batch_rows
+        try:
+            result = getattr(self, batch_method)(processing_dir, read_mode=read_mode)
+        finally:
+            self._stream_rows = None
+        return {name: self._reader_opener(value, batch_rows) for name, value in result.items()}
+
+    def _fetch(self, query: str):
+        """Proyección final: pa.Table (modo tabla) o _DeferredQuery (modo streaming)."""
+        if self._stream_rows is not None:
+            return _DeferredQuery(query)
+        return self.con.execute(query).arrow()
+
+    def _reader_opener(self, value, batch_rows: int):
+        if isinstance(value, _DeferredQuery):
+            return lambda: self.con.execute(value.query).fetch_record_batch(batch_rows)
+        return lambda: value.to_reader(max_chunksize=batch_rows)  # pa.Table ya materializada
 
     # ═══════════════════════════════════════════════════════════════
     # UTILIDADES
     # ═══════════════════════════════════════════════════════════════
 
+    def _create_from_pylist(self, table_name: str, rows: list):
+        """Crea una tabla DuckDB desde lista de dicts (vía Arrow registrado).
+
+        Columnas 100% None se tipan como string (no como null) para que
+        TRIM/NULLIF de las proyecciones no fallen.
+        """
+        table = pa.Table.from_pylist(rows)
+        table = table.cast(pa.schema([
+            pa.field(f.name, pa.string()) if pa.types.is_null(f.type) else f
+            for f in table.schema
+        ]))
+        self.con.register('_pylist_src', table)
+        try:
+            self.con.execute(f"CREATE TABLE {table_name} AS SELECT * FROM _pylist_src")
+        finally:
+            self.con.unregister('_pylist_src')
+
+    def _append_parts(self, table_name: str, values: list, offsets: list, names: list):
+        """Agrega un bloque (parts VARCHAR[], NombreArchivo) a una tabla DuckDB.
+
+        Args:
+            values: columnas de todas las líneas, concatenadas
+            offsets: inicio de cada línea en values (+ fin de la última)
+            names: NombreArchivo por línea
+        """
+        parts = pa.ListArray.from_arrays(pa.array(offsets, pa.int32()),
+                                         pa.array(values, pa.string()))
+        chunk = pa.Table.from_arrays([parts, pa.array(names, pa.string())],
+                                     names=['parts', 'NombreArchivo'])
+        self.con.register('_parts_chunk', chunk)
+        try:
+            self.con.execute(f"INSERT INTO {table_name} SELECT * FROM _parts_chunk")
+        finally:
+            self.con.unregister('_parts_chunk')
+
     @staticmethod
     def _fix_filename_column(table: pa.Table) -> pa.Table:
         """Reemplaza rutas completas por solo el basename en columna NombreArchivo."""
@@ -266,6 +266,8 @@ class FileParser:
             _log('PARSER-OBDC', f'  Archivo leído: {len(lines)} líneas')
             
             current_delivery_id = None
+            # Índice Numero_Entrega -> fila de cabecera_data (dedup/fechas en O(1))
+            cabecera_index = {}
             
             for line in lines:
                 if not line:
@@ -281,24 +283,26 @@ class FileParser:
                 
                 # TABLA 1: CABECERA_ENTREGA
                 if segment_type in ['E1BPOBDLVHDRCON', 'E1BPOBDLVHDRCTRLCON']:
-                    if current_delivery_id and not any(c['Numero_Entrega'] == current_delivery_id for c in cabecera_data):
-                        cabecera_data.append({
+                    if current_delivery_id and current_delivery_id not in cabecera_index:
+                        cab = {
                             'Numero_Entrega': current_delivery_id,
                             'Fecha_WSHDRLFDAT': None,
                             'Fecha_WSHDRWADTI': None
-                        })
+                        }
+                        cabecera_index[current_delivery_id] = cab
+                        cabecera_data.append(cab)
                 
                 elif segment_type == 'E1BPDLVDEADLN' and current_delivery_id:
                     # Actualizar fechas en cabecera
                     fecha_tipo = cols[2] if len(cols) > 2 else None
                     fecha_valor = cols[3] if len(cols) > 3 else None
                     
-                    for cab in cabecera_data:
-                        if cab['Numero_Entrega'] == current_delivery_id:
-                            if fecha_tipo == 'WSHDRLFDAT':
-                                cab['Fecha_WSHDRLFDAT'] = fecha_valor
-                            elif fecha_tipo == 'WSHDRWADTI':
-                                cab['Fecha_WSHDRWADTI'] = fecha_valor
+                    cab = cabecera_index.get(current_delivery_id)
+                    if cab is not None:
+                        if fecha_tipo == 'WSHDRLFDAT':
+                            cab['Fecha_WSHDRLFDAT'] = fecha_valor
+                        elif fecha_tipo == 'WSHDRWADTI':
+                            cab['Fecha_WSHDRWADTI'] = fecha_valor
                 
                 # TABLA 2: POSICIONES
                 elif segment_type == 'E1BPOBDLVITEMCON' and current_delivery_id:
@@ -0,0 +1,141 @@
+"""
+StagingSchema — Tipos de salida por tabla staging, aplicados en DuckDB.
+
+La fuente de verdad es sql/esquema_tablas.csv (export de sys.columns:
+esquema;tabla;ordinal;columna;tipo;largo;precision;escala;nullable;identity;
+default;pk). Las columnas staging con tipo no texto (decimal, int, date,
+datetime...) se convierten en DuckDB con TRY_CAST vectorizado antes de cargar
+staging, así SQL Server recibe columnas nativas y los SP no convierten fila a
+fila.
+
+Un valor no vacío que no convierte queda NULL en staging, como con el
+TRY_CONVERT de los SP, y la fila sigue su camino a las tablas finales. No se
+anula en silencio: una copia de la fila va a la tabla de rechazos
+(REJECTS_TABLE), solo para auditoría, en JSON (tal como salió de la limpieza,
+en texto) con las columnas que fallaron. Las fechas "sin fecha" de SAP
+('00000000', '00000000000000') cuentan como vacías: quedan NULL sin copia en
+rechazos.
+
+Cartoning queda en texto: sus columnas C1..Cn cambian de significado según
+TipoRegistro, así que no tienen un tipo único.
+"""
+
+import csv
+import os
+from datetime import datetime
+
+
+def _log(tag: str, msg: str):
+    ts = datetime.now().strftime('%H:%M:%S.%f')[:-3]
+    print(f"[{ts}] [{tag}] {msg}")
+
+
+REJECTS_TABLE = 'EWM_Staging_Rechazos'
+
+_TEXT_TYPES = {'char', 'nchar', 'varchar', 'nvarchar', 'text', 'ntext'}
+_INT_TYPES = {'tinyint': 'UTINYINT', 'smallint': 'SMALLINT', 'int': 'INTEGER', 'bigint': 'BIGINT'}
+_FLOAT_TYPES = {'real': 'FLOAT', 'float': 'DOUBLE'}
+_DATETIME_TYPES = {'datetime', 'datetime2', 'smalldatetime'}
+
+# Columnas de staging que no vienen del archivo
+_SKIP_COLUMNS = {'RunID'}
+
+# Fecha / timestamp vacío de SAP: solo ceros (con separadores opcionales)
+_SAP_ZERO_DATE = r'^[0 .:/-]+$'
+
+
+def _raw_expr(col: str, sql_type: str) -> str:
+    """Valor crudo en texto con TRIM; '' (y fechas SAP en cero) como NULL."""
+    raw = f"NULLIF(TRIM(CAST({col} AS VARCHAR)), '')"
+    if sql_type == 'date' or sql_type in _DATETIME_TYPES:
+        return f"CASE WHEN regexp_matches({raw}, '{_SAP_ZERO_DATE}') THEN NULL ELSE {raw} END"
+    return raw
+
+
+def _cast_expr(col: str, sql_type: str, precision: int, scale: int) -> str:
+    """TRY_CAST DuckDB desde el valor crudo (texto SAP con TRIM / coma decimal)."""
+    raw = _raw_expr(col, sql_type)
+    if sql_type in ('decimal', 'numeric'):
+        return f"TRY_CAST(REPLACE({raw}, ',', '.') AS DECIMAL({precision},{scale}))"
+    if sql_type in _INT_TYPES:
+        return f"TRY_CAST({raw} AS {_INT_TYPES[sql_type]})"
+    if sql_type in _FLOAT_TYPES:
+        return f"TRY_CAST(REPLACE({raw}, ',', '.') AS {_FLOAT_TYPES[sql_type]})"
+    if sql_type == 'date':
+        # Fechas SAP: AAAAMMDD, a veces seguidas de HHMMSS (mismo criterio que el
+        # TRY_CONVERT(DATE, LEFT(..., 8), 112) de los SP)
+        return f"CAST(TRY_STRPTIME(LEFT({raw}, 8), '%Y%m%d') AS DATE)"
+    if sql_type in _DATETIME_TYPES:
+        return (f"COALESCE(TRY_STRPTIME({raw}, '%Y%m%d%H%M%S'), "
+                f"TRY_STRPTIME(LEFT({raw}, 8), '%Y%m%d'))")
+    if sql_type == 'bit':
+        return f"TRY_CAST({raw} AS BOOLEAN)"
+    raise ValueError(f'tipo SQL sin conversión DuckDB: {sql_type}')
+
+
+def _quote(name: str) -> str:
+    return '"' + name.replace('"', '""') + '"'
+
+
+class StagingSchema:
+    """Columnas tipadas por tabla staging: {tabla: {columna: (tipo, precision, escala)}}."""
+
+    def __init__(self, typed: dict):
+        self.typed = typed
+
+    @classmethod
+    def from_csv(cls, csv_path: str, table_prefix: str = 'Staging_') -> 'StagingSchema':
+        """Lee esquema_tablas.csv y se queda con las columnas staging no texto.
+
+        Se omiten identity y columnas con default (ID, FechaCreacion): no
+        vienen del archivo.
+        """
+        typed = {}
+        with open(csv_path, 'r', encoding='utf-8-sig', newline='') as f:
+            for row in csv.reader(f, delimiter=';'):
+                if len(row) < 12 or not row[1].startswith(table_prefix):
+                    continue
+                _, table, _, column, sql_type, _, precision, scale, _, identity, default, _ = row[:12]
+                sql_type = sql_type.lower()
+                if (sql_type in _TEXT_TYPES or identity == '1' or default not in ('', 'NULL')
+                        or column in _SKIP_COLUMNS):
+                    continue
+                _cast_expr('c', sql_type, int(precision), int(scale))  # tipo soportado
+                typed.setdefault(table, {})[column] = (sql_type, int(precision), int(scale))
+        _log('SCHEMA', f'Tipos staging desde {os.path.basename(csv_path)}: ' +
+             ', '.join(f'{t} ({len(c)})' for t, c in sorted(typed.items())))
+        return cls(typed)
+
+    def queries(self, table: str, source_sql: str, columns: list) -> tuple:
+        """Proyección tipada y de rechazos sobre `source_sql` (subquery o tabla).
+
+        Args:
+            columns: columnas de la salida actual (orden a conservar)
+
+        Returns:
+            (typed_sql, rejects_sql) o None si la tabla no tiene columnas tipadas
+        """
+        spec = {c: t for c, t in self.typed.get(table, {}).items() if c in columns}
+        if not spec:
+            return None
+        casts = {c: f'__typed_{i}' for i, c in enumerate(spec)}
+        base = ("WITH t AS (SELECT *, " +
+                ', '.join(f"{_cast_expr(_quote(c), *spec[c])} AS {casts[c]}" for c in spec) +
+                f" FROM {source_sql})")
+        failed = {c: f"({casts[c]} IS NULL AND {_raw_expr(_quote(c), spec[c][0])} IS NOT NULL)"
+                  for c in spec}
+        any_failed = ' OR '.join(failed.values())
+
+        select = ', '.join(f"{casts[c]} AS {_quote(c)}" if c in spec else _quote(c)
+                           for c in columns)
+        typed_sql = f"{base} SELECT {select} FROM t"
+
+        row_json = ', '.join(f"{_quote(c)} := {_quote(c)}" for c in columns if c != 'NombreArchivo')
+        bad_cols = ', '.join(f"CASE WHEN {failed[c]} THEN '{c}' END" for c in spec)
+        rejects_sql = f"""{base}
+            SELECT '{table}' AS TablaStaging,
+                   concat_ws(',', {bad_cols}) AS Columnas,
+                   CAST(to_json(struct_pack({row_json})) AS VARCHAR) AS FilaJson,
+                   NombreArchivo
+            FROM t WHERE {any_failed}"""
+        return typed_sql, rejects_sql
@@ -5,17 +5,109 @@ Flujo por fuente:
   1. batch_move_to_processing() → mover archivos a _processing/
   2. DuckDBBatchProcessor.batch_*() → leer + limpiar → PyArrow Tables
   3. SqlRepository.truncate_tables() + bulk_insert_arrow() → cargar staging
+     (o, con config['staging_isolation'] = 'run', filas marcadas con RunID)
   4. SqlRepository.execute_sp() → migrar staging → tablas finales
+     (SP por lote con la lista ordenada de archivos si la fuente define
+     batch_sp_name; si falla, reintento con el SP por archivo)
   5. StateManager.mark_batch_processed() + archive_processed() → cerrar lote
+
+Modo concurrente (config['threads'] > 1):
+  Cada fuente corre en un worker de un ThreadPoolExecutor (tope = threads) con
+  su propio DuckDBBatchProcessor y su propia conexión SQL (SqlRepository.clone()).
+  Cada fuente tiene su propio reloj de polling: un lote lento de OBDConfirm no
+  retrasa el siguiente ciclo de Cartoning. Las carpetas y tablas staging de las
+  fuentes son disjuntas, por lo que no comparten estado salvo StateManager
+  (thread-safe) y self.stats (protegido con lock).
+
+Modo por eventos (config['event_driven'] = True):
+  En vez de dormir poll_interval entre ciclos, un FileArrivalWatcher (inotify,
+  con fallback a polling) despierta cada fuente apenas hay archivos estables,
+  agrupados en micro-lotes por debounce / max_batch_files / max_wait_s.
+  poll_interval queda como re-escaneo de seguridad.
+
+Modo pipelined (config['pipelined'] = True, ciclos por polling):
+  Los pasos se reparten en etapas con un hilo cada una, unidas por colas
+  acotadas (config['pipeline_depth']): move+catálogo+parse → carga staging →
+  SP → estado+archivo. Mientras SQL Server carga o ejecuta el SP del lote de
+  una fuente, DuckDB ya parsea el lote de la siguiente; el ciclo tiende a
+  durar la etapa más lenta y no la suma. Cada fuente tiene a lo sumo un lote
+  en vuelo (su _processing/ y sus tablas staging son exclusivas), así que el
+  orden de lotes por fuente se mantiene.
+
+Modo streaming (DataSource.max_memory_mb o config['max_memory_mb']):
+  Los pasos 2-3 usan DuckDBBatchProcessor.stream_batch() +
+  SqlRepository.bulk_insert_stream(): cada staging pasa de DuckDB a SQL Server
+  como RecordBatch de tamaño acotado, sin materializar las tablas del lote.
+  DuckDB queda limitado a la mitad del tope y derrama a config['duckdb_temp_dir'].
+
+Catálogo persistente (config['catalog_path']):
+  Tras el paso 1 cada archivo se identifica por nombre + hash de contenido
+  contra FileCatalog. Las re-entregas idénticas se archivan sin tocar SQL
+  Server; con config['catalog_replay'] se recargan a staging desde la copia
+  columnar del catálogo, sin re-leer el archivo. Los archivos parseados se
+  catalogan antes de cargar staging (en streaming, con los mismos batches de
+  la carga, vía CatalogTee) y quedan vigentes para dedup al cerrar
+  el lote (paso 5) solo si todos los SP terminaron OK.
+
+Staging por corrida (config['staging_isolation'] = 'run'):
+  Cada lote obtiene un RunID (new_run_id) con el que marca sus filas de
+  staging y que pasa a los SP (@RunID). No hay TRUNCATE por lote: fuentes y
+  lotes en vuelo cargan a la vez sin pisarse, los SP descartan filas de sus
+  archivos dejadas por otra corrida y un lote fallido borra solo su RunID
+  (delete_run). Al arrancar se barren corridas más antiguas que
+  config['staging_run_ttl_h']. El orden por fuente lo sigue dando su
+  _processing/ (un lote en vuelo por fuente). Requiere la migración RunID de
+  setup_database.sql (columna RunID en staging y @RunID en los SP): si al
+  arrancar falta algo, el pipeline vuelve a 'truncate' y lo informa.
+
+Micro-lotes adaptativos (config['adaptive_batch'] = True):
+  AdaptiveBatchSizer fija el tope de archivos de cada lote por fuente (AIMD
+  sobre los segundos de truncate + insert + SP, con objetivo
+  config['batch_target_s'] y tope de filas config['max_batch_rows']). Un
+  backlog grande se drena en lotes de ese tamaño, con transacciones y locks
+  acotados; el backlog restante y su ETA se reportan por lote.
+
+Tipos de staging (config['staging_schema_csv'] = sql/esquema_tablas.csv):
+  Opcional (None = staging en texto, como siempre). DuckDB entrega las fechas
+  staging como DATE en vez de texto; al arrancar se ejecuta además
+  config['staging_schema_sql'] (sql/setup_staging_tipada.sql: migración de
+  esas columnas y tabla de rechazos). Un valor que no convierte queda NULL en
+  staging, igual que con el TRY_CONVERT de los SP, y la fila llega a las
+  tablas finales; una copia va a la tabla de rechazos (con su RunID) solo
+  para auditoría.
+
+Retome tras un corte (config['journal_path']):
+  BatchJournal registra cada lote antes de cargar staging y marca por archivo
+  los SP con COMMIT. Si el proceso muere antes de archivar, al arrancar cada
+  fuente revisa su _processing/: los archivos con SP confirmado en el último
+  lote que los incluyó (y con el mismo mtime y tamaño) se registran y
+  archivan sin re-ejecutar el SP, y el resto se vuelve a cargar en un lote de
+  retome.
+
+Métricas (PipelineMetrics): cada paso se mide por fuente (move, catalog,
+parse, truncate, insert, sp_batch / sp_file, archive, total) en histogramas,
+junto con contadores de self.stats y gauges de backlog y filas/s. Se exponen
+en config['metrics_port'] (texto Prometheus) y en config['metrics_jsonl'].
 """
 
+import json
 import os
+import queue
 import time
+import threading
 import traceback
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from contextlib import contextmanager
 from datetime import datetime
+from src.adapters.batch_journal import BatchJournal, STAGE_SP_OK
+from src.adapters.file_catalog import FileCatalog
+from src.adapters.file_watcher import FileArrivalWatcher
+from src.adapters.metrics import PipelineMetrics
 from src.adapters.state_manager import StateManager
-from src.adapters.sql_repository import SqlRepository
-from src.domain.duckdb_batch_processor import DuckDBBatchProcessor
+from src.adapters.sql_repository import SqlRepository, new_run_id
+from src.domain.batch_sizer import AdaptiveBatchSizer
+from src.domain.duckdb_batch_processor import DuckDBBatchProcessor, READ_MODE_NATIVE
+from src.domain.staging_schema import StagingSchema, REJECTS_TABLE
 
 
 def _log(tag: str, msg: str):
@@ -24,6 +116,11 @@ def _log(tag: str, msg: str):
     print(f"[{ts}] [{tag}] {msg}")
 
 
+# config['staging_isolation']
+STAGING_TRUNCATE = 'truncate'   # TRUNCATE por lote (staging exclusivo de un lote)
+STAGING_RUN = 'run'             # filas marcadas con RunID, sin TRUNCATE
+
+
 class DataSource:
     """Configuración de una fuente de datos.
     
@@ -33,14 +130,56 @@ class DataSource:
         staging_tables: lista de nombres de tablas staging en SQL Server
         sp_name: Stored Procedure que mueve staging → final
         batch_method: nombre del método en DuckDBBatchProcessor
+        read_mode: 'native' (read_csv de DuckDB) o 'python' (fallback línea a línea)
+        batch_sp_name: SP set-based que procesa todo el lote en una llamada
+                       (@ArchivosJson); None = solo SP por archivo
+        max_memory_mb: tope de memoria del lote → modo streaming;
+                       None = config['max_memory_mb'] (None = tablas completas)
     """
     def __init__(self, name, file_client, staging_tables: list,
-                 sp_name: str, batch_method: str):
+                 sp_name: str, batch_method: str, read_mode: str = READ_MODE_NATIVE,
+                 batch_sp_name: str = None, max_memory_mb: int = None):
         self.name = name
         self.file_client = file_client
         self.staging_tables = staging_tables  # Lista uniforme de tablas staging
         self.sp_name = sp_name
         self.batch_method = batch_method  # e.g. 'batch_cartoning'
+        self.read_mode = read_mode
+        self.batch_sp_name = batch_sp_name
+        self.max_memory_mb = max_memory_mb
+
+
+class _Batch:
+    """Estado de un lote de una fuente mientras recorre los pasos 1-5.
+
+    En modo secuencial/concurrente lo recorre un solo hilo; en modo pipelined
+    pasa de una etapa a la siguiente por colas (un hilo por etapa).
+    """
+    def __init__(self, source: DataSource):
+        self.source = source
+        self.tag = f'SRC-{source.name[:4].upper()}'
+        self.t0 = time.time()
+        self.timings = {}           # etapa -> segundos en este lote
+        self.filenames = []         # orden de llegada (orden de versionado en los SP)
+        self.hashes = {}            # catálogo: archivo -> hash
+        self.catalog_tee = None     # catálogo en streaming (CatalogTee)
+        self.catalog_ok = False     # copia al catálogo completa (se puede confirmar)
+        self.replay_names = []
+        self.parse_names = []
+        self.replay = {}            # staging -> pa.Table desde el catálogo
+        self.rejects = None         # pa.Table de filas rechazadas por tipo (o None)
+        self.tables = {}            # staging -> pa.Table | open_reader (streaming)
+        self.max_memory_mb = None
+        self.total_rows = 0
+        self.sp_ok = 0
+        self.sp_err = 0
+        self.capped = False         # lote topado por AdaptiveBatchSizer (quedó backlog)
+        self.run_id = None          # staging por corrida (None = modo truncate)
+        self.sql = None             # repositorio que cargó staging (limpieza por RunID)
+        self.batch_id = None        # lote en BatchJournal (None = sin journal)
+        # Se marca cuando la carga terminó de leer los readers streaming: hasta
+        # entonces el DuckDB que parseó el lote no puede parsear otro
+        self.readers_done = threading.Event()
 
 
 class MultiSourcePipeline:
@@ -54,9 +193,39 @@ class MultiSourcePipeline:
         self.cfg = config
         self.is_running = True
         self.cycle_count = 0
-        self.processor = DuckDBBatchProcessor()
-        self.stats = {src.name: {'batches': 0, 'files': 0, 'rows': 0, 'errors': 0}
+        self.staging_schema = None
+        if config.get('staging_schema_csv'):
+            self.staging_schema = StagingSchema.from_csv(config['staging_schema_csv'])
+        self.processor = DuckDBBatchProcessor(config.get('duckdb_temp_dir'), self.staging_schema)
+        self.stats = {src.name: {'batches': 0, 'files': 0, 'rows': 0, 'errors': 0,
+                                 'duplicates': 0, 'rejects': 0}
                       for src in sources}
+        self.metrics = PipelineMetrics(jsonl_path=config.get('metrics_jsonl'),
+                                       jsonl_max_mb=config.get('metrics_jsonl_max_mb', 50))
+        self.staging_isolation = config.get('staging_isolation', STAGING_TRUNCATE)
+        if self.staging_isolation not in (STAGING_TRUNCATE, STAGING_RUN):
+            raise ValueError(f"staging_isolation inválido: {self.staging_isolation!r} "
+                             f"(opciones: {STAGING_TRUNCATE!r}, {STAGING_RUN!r})")
+        self.batcher = None
+        if config.get('adaptive_batch'):
+            self.batcher = AdaptiveBatchSizer(max_files=config.get('max_batch_files', 500),
+                                              min_files=config.get('batch_min_files', 10),
+                                              target_s=config.get('batch_target_s', 30),
+                                              max_rows=config.get('max_batch_rows'))
+        self.catalog = None
+        if config.get('catalog_path'):
+            self.catalog = FileCatalog(config['catalog_path'],
+                                       retention_days=config.get('catalog_retention_days', 90))
+        self.journal = None
+        if config.get('journal_path'):
+            self.journal = BatchJournal(config['journal_path'])
+        self._stats_lock = threading.Lock()
+
+        # Concurrencia: tope de workers = config['threads'] (1 = secuencial)
+        self.max_workers = max(1, min(int(config.get('threads', 1)), len(sources)))
+        self._worker_local = threading.local()
+        self._worker_resources = []  # [(processor, sql)] creados por workers
+        self._worker_lock = threading.Lock()
 
     def run_streaming(self):
         """Modo Servicio Continuo para múltiples fuentes."""
@@ -64,13 +233,44 @@ class MultiSourcePipeline:
         print(f" MULTI-SOURCE STREAMING SERVICE v2 (DuckDB)")
         print(f" Fuentes: {', '.join([s.name for s in self.sources])}")
         print(f" Intervalo de polling: {self.cfg['poll_interval']} segundos")
+        print(f" Workers en paralelo: {self.max_workers}")
         print(f"{'='*70}\n")
 
+        if self.cfg.get('metrics_port'):
+            self.metrics.start_http(self.cfg['metrics_port'])
+
         # Setup inicial SQL
         _log('INIT', 'Etapa 1/2: Inicializando esquema de BD...')
         self.sql.init_schema(self.cfg['sql_script_path'])
+        if self.staging_schema is not None:
+            self.sql.init_schema(self.cfg['staging_schema_sql'])
+        if self.staging_isolation == STAGING_RUN:
+            sp_names = {name for src in self.sources
+                        for name in (src.sp_name, src.batch_sp_name) if name}
+            missing = self.sql.missing_run_support(
+                [t for src in self.sources for t in src.staging_tables], sorted(sp_names))
+            if missing:
+                _log('INIT', f"WARN: staging_isolation='run' sin migración RunID "
+                             f"({', '.join(missing[:5])}{'...' if len(missing) > 5 else ''}). "
+                             f"Usando 'truncate'")
+                self.staging_isolation = STAGING_TRUNCATE
+        if self.staging_isolation == STAGING_RUN:
+            self.sql.purge_stale_runs([t for src in self.sources for t in src.staging_tables],
+                                      self.cfg.get('staging_run_ttl_h', 24))
+        if self.journal:
+            self._resume_interrupted()
         _log('INIT', 'Etapa 2/2: Esquema OK. Entrando en modo streaming...')
 
+        if self.cfg.get('event_driven'):
+            self._run_event_driven()
+            return
+        if self.cfg.get('pipelined'):
+            self._run_pipelined()
+            return
+        if self.max_workers > 1:
+            self._run_concurrent()
+            return
+
         try:
             while self.is_running:
                 self.cycle_count += 1
@@ -85,10 +285,16 @@ class MultiSourcePipeline:
                 any_work_done = False
                 for idx, source in enumerate(self.sources, 1):
                     _log('CICLO', f'--- Fuente {idx}/{len(self.sources)}: {source.name} ---')
-                    work_done = self._process_source(source)
+                    work_done = self._process_source(source, self.processor, self.sql)
                     any_work_done = any_work_done or work_done
 
                 cycle_elapsed = time.time() - cycle_start
+                backlog = sum(src.file_client.backlog for src in self.sources)
+                if backlog:
+                    # Lotes topados por max_batch_files: seguir sin esperar
+                    _log('CICLO', f'Ciclo completado en {cycle_elapsed:.1f}s. '
+                         f'Backlog de {backlog} archivos: siguiente ciclo inmediato')
+                    continue
                 if not any_work_done:
                     _log('CICLO', f'Sin archivos nuevos. Ciclo duró {cycle_elapsed:.1f}s. '
                          f'Esperando {self.cfg["poll_interval"]}s...')
@@ -100,17 +306,305 @@ class MultiSourcePipeline:
 
         except KeyboardInterrupt:
             _log('SHUTDOWN', 'Deteniendo servicio ordenadamente...')
-            self.processor.close()
+            self._close_shared()
+            self._print_stats()
+
+    def _run_concurrent(self):
+        """Modo servicio con fuentes en paralelo.
+
+        Cada fuente se re-agenda poll_interval segundos después de terminar
+        su propio lote; el pool limita cuántas corren a la vez.
+        """
+        poll = self.cfg['poll_interval']
+        next_due = {src.name: 0.0 for src in self.sources}
+        in_flight = {}  # future -> DataSource
+
+        _log('CICLO', f'Modo concurrente: {len(self.sources)} fuentes, '
+                      f'{self.max_workers} workers')
+        pool = ThreadPoolExecutor(max_workers=self.max_workers,
+                                  thread_name_prefix='ewm-src')
+        try:
+            while self.is_running:
+                # Agendar fuentes vencidas que no estén corriendo
+                now = time.time()
+                running = {src.name for src in in_flight.values()}
+                for source in self.sources:
+                    if source.name not in running and now >= next_due[source.name]:
+                        _log('CICLO', f'--- Agendando fuente: {source.name} ---')
+                        in_flight[pool.submit(self._process_source_worker, source)] = source
+
+                # Esperar hasta que termine un worker o venza la próxima fuente
+                running = {src.name for src in in_flight.values()}
+                idle_due = [next_due[src.name] for src in self.sources
+                            if src.name not in running]
+                timeout = max(1.0, min(idle_due) - time.time()) if idle_due else None
+                if in_flight:
+                    done, _ = wait(list(in_flight), timeout=timeout,
+                                   return_when=FIRST_COMPLETED)
+                else:
+                    time.sleep(timeout)
+                    done = set()
+
+                for future in done:
+                    source = in_flight.pop(future)
+                    try:
+                        work_done = future.result()
+                    except Exception as e:
+                        _log('CICLO', f'ERROR worker {source.name}: {e}')
+                        self._add_stats(source.name, errors=1)
+                        work_done = False
+                    # Con backlog (lote topado) la fuente se re-agenda de inmediato
+                    delay = 0 if source.file_client.backlog else poll
+                    next_due[source.name] = time.time() + delay
+                    self.cycle_count += 1
+                    _log('CICLO', f'{source.name}: '
+                                  f'{"lote completado" if work_done else "sin archivos nuevos"}. '
+                                  f'Próximo polling en {delay}s')
+                    if work_done:
+                        self._print_stats()
+
+        except KeyboardInterrupt:
+            _log('SHUTDOWN', 'Deteniendo servicio ordenadamente (esperando workers)...')
+            self.is_running = False
+        finally:
+            pool.shutdown(wait=True)
+            self._close_worker_resources()
+            self._close_shared()
             self._print_stats()
 
+    def _run_pipelined(self):
+        """Modo servicio por etapas: el hilo principal mueve y parsea; carga,
+        SP y archivo corren cada uno en su hilo, unidos por colas acotadas."""
+        poll = self.cfg['poll_interval']
+        depth = max(1, int(self.cfg.get('pipeline_depth', 1)))
+        load_q, sp_q, finish_q = (queue.Queue(maxsize=depth) for _ in range(3))
+        # Un lote en vuelo por fuente: _processing/ y staging son de la fuente
+        slots = {src.name: threading.Semaphore(1) for src in self.sources}
+        load_sql, sp_sql = self.sql, self.sql.clone()
+
+        def load(batch):
+            return self._load_batch(batch, load_sql)
+
+        def run_sp(batch):
+            self._run_batch_sp(batch, sp_sql)
+            return True
+
+        def finish(batch):
+            self._finish_batch(batch)
+            return True
+
+        def release(batch):
+            slots[batch.source.name].release()
+
+        stages = [
+            threading.Thread(target=self._stage_loop, name=f'ewm-stage-{name}', daemon=True,
+                             args=(inbox, outbox, handler, release))
+            for name, inbox, outbox, handler in (('load', load_q, sp_q, load),
+                                                 ('sp', sp_q, finish_q, run_sp),
+                                                 ('archive', finish_q, None, finish))
+        ]
+        for stage in stages:
+            stage.start()
+
+        _log('CICLO', f'Modo pipelined: {len(self.sources)} fuentes, etapas '
+                      f'parse → carga → SP → archivo (profundidad de cola {depth})')
+        stream_guard = None  # último lote streaming: su DuckDB sigue en uso hasta cargar
+        try:
+            while self.is_running:
+                self.cycle_count += 1
+                cycle_start = time.time()
+
+                print(f"\n{'='*70}")
+                _log('CICLO', f'########## CICLO #{self.cycle_count} ##########')
+                self._print_stats()
+                print(f"{'='*70}")
+
+                any_work_done = False
+                for idx, source in enumerate(self.sources, 1):
+                    _log('CICLO', f'--- Fuente {idx}/{len(self.sources)}: {source.name} ---')
+                    slots[source.name].acquire()  # espera que su lote anterior salga
+                    if stream_guard is not None:
+                        stream_guard.wait()
+                    batch = self._prepare_batch(source, self.processor)
+                    if batch is None:
+                        slots[source.name].release()
+                        continue
+                    any_work_done = True
+                    if batch.max_memory_mb:
+                        stream_guard = batch.readers_done
+                    load_q.put(batch)  # bloquea si la carga va atrasada (cola llena)
+
+                cycle_elapsed = time.time() - cycle_start
+                backlog = sum(src.file_client.backlog for src in self.sources)
+                if backlog:
+                    _log('CICLO', f'Parseo del ciclo en {cycle_elapsed:.1f}s. '
+                         f'Backlog de {backlog} archivos: siguiente ciclo inmediato')
+                    continue
+                _log('CICLO', f'{"Parseo del ciclo" if any_work_done else "Sin archivos nuevos"} '
+                     f'en {cycle_elapsed:.1f}s (carga/SP siguen en sus etapas). '
+                     f'Esperando {poll}s...')
+                time.sleep(poll)
+
+        except KeyboardInterrupt:
+            _log('SHUTDOWN', 'Deteniendo servicio ordenadamente (vaciando etapas)...')
+            self.is_running = False
+        finally:
+            load_q.put(None)
+            for stage in stages:
+                stage.join()
+            sp_sql.engine.dispose()
+            self._close_shared()
+            self._print_stats()
+
+    def _stage_loop(self, inbox: queue.Queue, outbox: queue.Queue, handler, release):
+        """Hilo de una etapa: toma lotes de inbox, ejecuta handler y los pasa a
+        outbox. Un lote que falla o termina la última etapa libera su fuente.
+        None en inbox = fin (se propaga a la etapa siguiente)."""
+        while True:
+            batch = inbox.get()
+            if batch is None:
+                if outbox is not None:
+                    outbox.put(None)
+                return
+            done = True
+            try:
+                done = not handler(batch) or outbox is None
+            except Exception as e:
+                self._fail_batch(batch, 'error', e)
+            finally:
+                if done:
+                    release(batch)
+                else:
+                    outbox.put(batch)
+
+    def _run_event_driven(self):
+        """Modo servicio por eventos: cada fuente se procesa cuando el watcher
+        entrega un micro-lote de archivos estables. Sin trabajo, el hilo queda
+        bloqueado en el watcher (CPU ~0)."""
+        watcher = FileArrivalWatcher(
+            {src.name: src.file_client.source_path for src in self.sources},
+            stable_ms=self.cfg.get('stable_ms', 2000),
+            debounce_ms=self.cfg.get('debounce_ms', 1000),
+            max_batch_files=self.cfg.get('max_batch_files', 500),
+            max_wait_s=self.cfg.get('max_wait_s', 30),
+            fallback_poll_s=self.cfg.get('fallback_poll_s', 5),
+            rescan_s=self.cfg['poll_interval'],
+        )
+        by_name = {src.name: src for src in self.sources}
+        in_flight = {}  # future -> (DataSource, filenames)
+
+        _log('CICLO', f'Modo por eventos ({watcher.mode}): {len(self.sources)} fuentes, '
+                      f'{self.max_workers} workers')
+        pool = ThreadPoolExecutor(max_workers=self.max_workers,
+                                  thread_name_prefix='ewm-src')
+        try:
+            while self.is_running:
+                if self.batcher is not None:
+                    for src in self.sources:
+                        watcher.set_batch_limit(src.name, self.batcher.limit(src.name))
+                running = {src.name for src, _ in in_flight.values()}
+                ready = watcher.wait(self.cfg['poll_interval'], busy=running)
+
+                # Cerrar workers terminados y devolver sus archivos al watcher
+                for future in [f for f in in_flight if f.done()]:
+                    source, filenames = in_flight.pop(future)
+                    watcher.release(source.name, filenames)
+                    try:
+                        work_done = future.result()
+                    except Exception as e:
+                        _log('CICLO', f'ERROR worker {source.name}: {e}')
+                        self._add_stats(source.name, errors=1)
+                        work_done = False
+                    self.cycle_count += 1
+                    if work_done:
+                        self._print_stats()
+
+                # Agendar fuentes con lote listo que no estén corriendo
+                running = {src.name for src, _ in in_flight.values()}
+                for name in ready:
+                    if name in running:
+                        continue
+                    filenames = watcher.take_batch(name)
+                    self.metrics.set('backlog_files', name, watcher.pending_count(name))
+                    if not filenames:
+                        continue
+                    source = by_name[name]
+                    _log('CICLO', f'--- {name}: {len(filenames)} archivos estables ---')
+                    future = pool.submit(self._process_source_worker, source, filenames)
+                    future.add_done_callback(lambda _: watcher.wake())
+                    in_flight[future] = (source, filenames)
+
+        except KeyboardInterrupt:
+            _log('SHUTDOWN', 'Deteniendo servicio ordenadamente (esperando workers)...')
+            self.is_running = False
+        finally:
+            pool.shutdown(wait=True)
+            watcher.close()
+            self._close_worker_resources()
+            self._close_shared()
+            self._print_stats()
+
+    def _process_source_worker(self, source: 'DataSource', filenames: list = None) -> bool:
+        """Punto de entrada de un worker: usa el DuckDB + SQL propios del hilo."""
+        processor, sql = self._get_worker_resources()
+        return self._process_source(source, processor, sql, filenames)
+
+    def _get_worker_resources(self) -> tuple:
+        """DuckDBBatchProcessor y SqlRepository propios del hilo (lazy, reutilizados)."""
+        local = self._worker_local
+        if not hasattr(local, 'processor'):
+            local.processor = DuckDBBatchProcessor(self.cfg.get('duckdb_temp_dir'),
+                                                   self.staging_schema)
+            local.sql = self.sql.clone()
+            with self._worker_lock:
+                self._worker_resources.append((local.processor, local.sql))
+            _log('WORKER', f'{threading.current_thread().name}: DuckDB + conexión SQL propios')
+        return local.processor, local.sql
+
+    def _close_shared(self):
+        """Cierra recursos compartidos al detener el servicio."""
+        self.processor.close()
+        if self.catalog:
+            self.catalog.close()
+        if self.journal:
+            self.journal.close()
+        for source in self.sources:
+            source.file_client.close()
+        self.metrics.close()
+
+    def _close_worker_resources(self):
+        with self._worker_lock:
+            for processor, sql in self._worker_resources:
+                processor.close()
+                sql.engine.dispose()
+            self._worker_resources.clear()
+
+    def _add_stats(self, source_name: str, **deltas):
+        """Suma contadores de una fuente de forma atómica."""
+        with self._stats_lock:
+            stats = self.stats[source_name]
+            for key, value in deltas.items():
+                stats[key] += value
+        for key, value in deltas.items():
+            self.metrics.inc(key, source_name, value)
+
     def _print_stats(self):
         """Imprime estadísticas de todas las fuentes."""
+        with self._stats_lock:
+            snapshot = {name: dict(stats) for name, stats in self.stats.items()}
         _log('STATS', '--- Acumulado global ---')
         total_files = 0
         total_err = 0
-        for name, stats in self.stats.items():
+        moves = {src.name: src.file_client.move_stats() for src in self.sources}
+        for name, stats in snapshot.items():
             _log('STATS', f'  {name}: {stats["batches"]} lotes, {stats["files"]} archivos, '
-                 f'{stats["rows"]} filas, {stats["errors"]} errores')
+                 f'{stats["rows"]} filas, {stats["errors"]} errores, '
+                 f'{stats["duplicates"]} duplicados, {stats["rejects"]} rechazos')
+            mv_proc, mv_arch = moves[name]['processing'], moves[name]['archive']
+            _log('STATS', f'    moves: _processing {mv_proc["moved"]} '
+                 f'(p50 {mv_proc["p50_ms"]:.1f}ms, p95 {mv_proc["p95_ms"]:.1f}ms, '
+                 f'{mv_proc["failed"]} fallidos), _archive {mv_arch["moved"]} '
+                 f'(p95 {mv_arch["p95_ms"]:.1f}ms, {mv_arch["failed"]} fallidos)')
             total_files += stats['files']
             total_err += stats['errors']
         _log('STATS', f'  TOTAL: {total_files} archivos, {total_err} errores')
@@ -119,98 +613,436 @@ class MultiSourcePipeline:
     #  FLUJO PRINCIPAL POR FUENTE (5 pasos)
     # ─────────────────────────────────────────────────────────────
 
-    def _process_source(self, source: DataSource) -> bool:
-        """Procesa una fuente con el flujo micro-lote completo."""
-        tag = f'SRC-{source.name[:4].upper()}'
+    def _process_source(self, source: DataSource, processor: DuckDBBatchProcessor,
+                        sql: SqlRepository, only_files: list = None,
+                        resume_files: list = None) -> bool:
+        """Procesa una fuente con el flujo micro-lote completo.
+
+        Args:
+            processor: motor DuckDB a usar (propio del worker en modo concurrente)
+            sql: repositorio SQL a usar (propio del worker en modo concurrente)
+            only_files: lote entregado por el watcher (None = todo source_path)
+            resume_files: FileInfo ya en _processing/ (retome tras un corte)
+        """
+        batch = self._prepare_batch(source, processor, only_files, resume_files)
+        if batch is None:
+            return False
+        try:
+            if not self._load_batch(batch, sql):
+                return False
+            self._run_batch_sp(batch, sql)
+            self._finish_batch(batch)
+            return True
+        except Exception as e:
+            self._fail_batch(batch, 'error', e)
+            return False
+
+    def _resume_interrupted(self):
+        """Retoma lotes cortados entre la carga a staging y el archivado.
+
+        Por fuente, con lo que quedó en _processing/ y el journal:
+          - SP con COMMIT ('sp_ok') en el último lote del archivo, con el
+            mismo mtime y tamaño: se registra y se archiva, sin re-ejecutar el
+            SP.
+          - Resto (incluidos archivos movidos antes de que el lote llegara al
+            journal): se vuelve a cargar y pasa por el SP en un lote de retome.
+            El estado no cuenta: está por nombre, y una re-entrega con el
+            mismo nombre y otro contenido perdería su SP.
+        """
+        for source in self.sources:
+            tag = f'SRC-{source.name[:4].upper()}'
+            processing_dir = source.file_client.get_processing_path()
+            aside_dir = os.path.join(processing_dir, '_catalogo')
+            if os.path.isdir(aside_dir):
+                for fname in os.listdir(aside_dir):
+                    os.replace(os.path.join(aside_dir, fname), os.path.join(processing_dir, fname))
+
+            batch_ids, stages = self.journal.pending(source.name)
+            present = source.file_client.list_processing()
+            done = [fi.filename for fi in present
+                    if self._sp_confirmed(fi, stages.get(fi.filename))]
+            pending = [fi for fi in present if fi.filename not in set(done)]
+            if present:
+                _log(tag, f'RESUME: {len(present)} archivos de un lote interrumpido en '
+                          f'_processing/ ({len(done)} con SP confirmado, {len(pending)} a recargar)')
+            if done:
+                self.state.mark_batch_processed(source.name, done)
+                source.file_client.archive_processed(done)
+            if batch_ids:
+                self.journal.finish(batch_ids)
+            if pending:
+                self._process_source(source, self.processor, self.sql, resume_files=pending)
+
+    @staticmethod
+    def _sp_confirmed(fi, entry) -> bool:
+        """True si el journal tiene 'sp_ok' para este mismo archivo (mtime y tamaño)."""
+        if entry is None:
+            return False
+        stage, mtime, size = entry
+        if stage != STAGE_SP_OK:
+            return False
+        # Lotes registrados sin mtime/tamaño: solo cuenta el stage
+        return (mtime is None or mtime == fi.mtime) and (size is None or size == fi.size)
+
+    def _prepare_batch(self, source: DataSource, processor: DuckDBBatchProcessor,
+                       only_files: list = None, resume_files: list = None) -> '_Batch':
+        """Pasos 1-2: mover, catálogo y parseo DuckDB.
+
+        Con resume_files (retome) no se mueve nada: el lote son esos archivos,
+        que ya están en _processing/.
+
+        Returns:
+            _Batch listo para cargar, o None si no hay trabajo (o falló el parseo)
+        """
+        batch = _Batch(source)
+        tag = batch.tag
+        t0 = batch.t0
 
         # PASO 1: Mover archivos nuevos a _processing/
-        _log(tag, 'Paso 1/5: batch_move_to_processing...')
-        moved_files = source.file_client.batch_move_to_processing()
+        if resume_files is not None:
+            _log(tag, f'Paso 1/5: retome de {len(resume_files)} archivos en _processing/')
+            moved_files = resume_files
+        else:
+            limit = self.batcher.limit(source.name) if self.batcher is not None else None
+            _log(tag, f'Paso 1/5: batch_move_to_processing{f" (tope {limit})" if limit else ""}...')
+            moved_files = source.file_client.batch_move_to_processing(only_files, max_files=limit)
+            batch.capped = bool(limit) and len(moved_files) >= limit
+            self.metrics.stage_done(batch.timings, 'move', source.name, t0)
+            if only_files is None:
+                self.metrics.set('backlog_files', source.name, source.file_client.backlog)
         if not moved_files:
             _log(tag, 'Sin archivos nuevos.')
-            return False
+            return None
 
-        file_count = len(moved_files)
-        _log(tag, f'  → {file_count} archivos movidos a _processing/')
+        # Orden de llegada: define el orden de versionado en los SP
+        moved_files = sorted(moved_files, key=lambda fi: (fi.mtime, fi.filename))
+        filenames = [fi.filename for fi in moved_files]
+        _log(tag, f'  → {len(moved_files)} archivos movidos a _processing/')
 
         processing_dir = source.file_client.get_processing_path()
+        batch.max_memory_mb = source.max_memory_mb or self.cfg.get('max_memory_mb')
+
+        # Catálogo: dedup por nombre + hash; replay = conocidos sin re-leer
+        hashes, replay_names = {}, []
+        if self.catalog:
+            t0 = time.time()
+            try:
+                hashes = {fi.filename: FileCatalog.file_hash(fi.full_path) for fi in moved_files}
+            except OSError as e:
+                _log(tag, f'  WARN: no se pudo calcular hash ({e}). Lote sin catálogo')
+            known = self.catalog.known(source.name, hashes)
+            if known and self.cfg.get('catalog_replay'):
+                replay_names = [f for f in filenames if f in known]
+                _log(tag, f'  → {len(known)} archivos sin cambios: replay desde catálogo')
+            elif known:
+                dups = [f for f in filenames if f in known]
+                _log(tag, f'  → {len(dups)} re-entregas idénticas omitidas (catálogo)')
+                self.state.mark_batch_processed(source.name, dups)
+                source.file_client.archive_processed(dups)
+                self._add_stats(source.name, duplicates=len(dups))
+                filenames = [f for f in filenames if f not in known]
+                if not filenames:
+                    self.metrics.stage_done(batch.timings, 'catalog', source.name, t0)
+                    return None
+        batch.filenames = filenames
+        batch.hashes = hashes
+        if replay_names:
+            batch.replay = self.catalog.replay_tables(
+                source.name, source.staging_tables, {f: hashes[f] for f in replay_names})
+            if batch.replay is None:
+                batch.replay, replay_names = {}, []
+        if self.catalog:
+            self.metrics.stage_done(batch.timings, 'catalog', source.name, t0)
+        batch.replay_names = replay_names
+        batch.parse_names = [f for f in filenames if f not in set(replay_names)]
 
         try:
             # PASO 2: DuckDB batch processing
-            _log(tag, f'Paso 2/5: DuckDB {source.batch_method}...')
+            _log(tag, f'Paso 2/5: DuckDB {source.batch_method} ({source.read_mode})...')
             t0 = time.time()
-            batch_fn = getattr(self.processor, source.batch_method)
-            tables = batch_fn(processing_dir)
+            tables = {}
+            if batch.parse_names:
+                with self._set_aside(processing_dir, replay_names):
+                    if batch.max_memory_mb:
+                        tables = processor.stream_batch(source.batch_method, processing_dir,
+                                                        read_mode=source.read_mode,
+                                                        max_memory_mb=batch.max_memory_mb)
+                    else:
+                        batch_fn = getattr(processor, source.batch_method)
+                        tables = batch_fn(processing_dir, read_mode=source.read_mode)
+            batch.tables = tables
+            batch.rejects = processor.take_rejects()
+
+            self.metrics.stage_done(batch.timings, 'parse', source.name, t0)
 
-            if not tables:
+            if not tables and not batch.replay:
                 _log(tag, 'WARN: DuckDB retornó sin datos. Limpiando _processing/...')
                 source.file_client.cleanup_processing()
-                return False
+                return None
 
-            total_rows = sum(t.num_rows for t in tables.values())
-            _log(tag, f'  → {len(tables)} tablas, {total_rows} filas en {time.time()-t0:.2f}s')
+            if batch.replay:
+                _log(tag, f'  → replay: {sum(t.num_rows for t in batch.replay.values())} filas '
+                          f'de {len(replay_names)} archivos catalogados')
+            if batch.max_memory_mb:
+                _log(tag, f'  → {len(tables)} tablas en streaming (tope {batch.max_memory_mb}MB, '
+                          f'{processor.stream_batch_rows(batch.max_memory_mb)} filas/batch) '
+                          f'en {time.time()-t0:.2f}s')
+            else:
+                parsed_rows = sum(t.num_rows for t in tables.values())
+                _log(tag, f'  → {len(tables)} tablas, {parsed_rows} filas en {time.time()-t0:.2f}s')
 
-            # PASO 3: Truncate staging + Bulk Insert
-            _log(tag, 'Paso 3/5: Truncate staging + Bulk Insert Arrow...')
-            t0 = time.time()
+            if hashes and batch.parse_names:
+                parsed = {f: hashes[f] for f in batch.parse_names}
+                sizes = {fi.filename: fi.size for fi in moved_files}
+                if batch.max_memory_mb:
+                    # Streaming: la copia sale de los mismos batches que van a staging
+                    batch.catalog_tee = self.catalog.tee(source.name, parsed, sizes)
+                    if batch.catalog_tee is not None:
+                        batch.tables = {name: batch.catalog_tee.wrap(name, open_reader)
+                                        for name, open_reader in tables.items()}
+                else:
+                    batch.catalog_ok = self.catalog.store(source.name, tables, parsed, sizes)
 
-            if not self.sql.truncate_tables(source.staging_tables):
+            # Write-ahead: el lote queda en el journal antes de tocar SQL Server
+            if self.journal:
+                batch.batch_id = self.journal.begin(
+                    source.name, batch.filenames,
+                    {fi.filename: (fi.mtime, fi.size) for fi in moved_files})
+        except Exception as e:
+            self._fail_batch(batch, 'error', e)
+            return None
+        return batch
+
+    def _load_batch(self, batch: '_Batch', sql: SqlRepository) -> bool:
+        """Paso 3: truncate staging (o RunID) + bulk insert (tablas, streaming y replay)."""
+        source, tag = batch.source, batch.tag
+        t0 = time.time()
+
+        if self.staging_isolation == STAGING_RUN:
+            batch.run_id = new_run_id()
+            batch.sql = sql
+            _log(tag, f'Paso 3/5: Bulk Insert Arrow (RunID={batch.run_id})...')
+        else:
+            _log(tag, 'Paso 3/5: Truncate staging + Bulk Insert Arrow...')
+            if not sql.truncate_tables(source.staging_tables):
                 _log(tag, 'ERROR CRITICO: No se pudo limpiar staging')
-                source.file_client.cleanup_processing()
-                self.stats[source.name]['errors'] += 1
+                self._fail_batch(batch, 'error_truncate')
                 return False
+            self.metrics.stage_done(batch.timings, 'truncate', source.name, t0)
+            t0 = time.time()
 
-            insert_ok = True
-            for tbl_name, arrow_table in tables.items():
+        insert_ok = True
+        total_rows = 0
+        if batch.max_memory_mb:
+            for tbl_name, open_reader in batch.tables.items():
+                _log(tag, f'  → {tbl_name}: streaming...')
+                rows = sql.bulk_insert_stream(open_reader, tbl_name, run_id=batch.run_id)
+                if rows is None:
+                    _log(tag, f'  ERROR CRITICO: Fallo bulk insert en {tbl_name}')
+                    insert_ok = False
+                    break
+                total_rows += rows
+        else:
+            for tbl_name, arrow_table in batch.tables.items():
                 _log(tag, f'  → {tbl_name}: {arrow_table.num_rows} filas')
-                if not self.sql.bulk_insert_arrow(arrow_table, tbl_name):
+                total_rows += arrow_table.num_rows
+                if not sql.bulk_insert_arrow(arrow_table, tbl_name, run_id=batch.run_id):
                     _log(tag, f'  ERROR CRITICO: Fallo bulk insert en {tbl_name}')
                     insert_ok = False
                     break
-
+        for tbl_name, arrow_table in batch.replay.items():
             if not insert_ok:
-                source.file_client.cleanup_processing()
-                self.stats[source.name]['errors'] += 1
-                return False
+                break
+            _log(tag, f'  → {tbl_name} (replay): {arrow_table.num_rows} filas')
+            if not sql.bulk_insert_arrow(arrow_table, tbl_name, run_id=batch.run_id):
+                _log(tag, f'  ERROR CRITICO: Fallo bulk insert en {tbl_name}')
+                insert_ok = False
+            total_rows += arrow_table.num_rows
+        # Readers streaming consumidos (o abandonados): el motor DuckDB queda libre
+        batch.tables = {}
+        batch.readers_done.set()
+        if batch.catalog_tee is not None:
+            batch.catalog_ok = insert_ok and batch.catalog_tee.finish()
 
-            _log(tag, f'  Insert OK en {time.time()-t0:.2f}s')
+        if not insert_ok:
+            self._fail_batch(batch, 'error_insert')
+            return False
+
+        batch.total_rows = total_rows
+        if batch.rejects is not None:
+            self._load_rejects(batch, sql)
+        elapsed = self.metrics.stage_done(batch.timings, 'insert', source.name, t0)
+        _log(tag, f'  Insert OK en {elapsed:.2f}s')
+        return True
+
+    def _load_rejects(self, batch: '_Batch', sql: SqlRepository):
+        """Carga la copia de auditoría de las filas con valores que no convierten (best effort).
+
+        No falla el lote: esas filas ya están en staging (con NULL en la columna
+        que falló) y siguen a las tablas finales.
+        """
+        rejects = batch.rejects.num_rows
+        self._add_stats(batch.source.name, rejects=rejects)
+        by_file = len(set(batch.rejects.column('NombreArchivo').to_pylist()))
+        _log(batch.tag, f'  → {REJECTS_TABLE}: {rejects} filas con valores que no convierten (NULL en staging) '
+                        f'({by_file} archivos)')
+        if not sql.bulk_insert_arrow(batch.rejects, REJECTS_TABLE, run_id=batch.run_id):
+            _log(batch.tag, f'  WARN: no se pudieron guardar los rechazos en {REJECTS_TABLE}')
 
-            # PASO 4: Ejecutar SP para cada archivo (secuencial para evitar deadlocks)
+    def _run_batch_sp(self, batch: '_Batch', sql: SqlRepository):
+        """Paso 4: SP por lote (una llamada); por archivo como fallback."""
+        source, tag, filenames = batch.source, batch.tag, batch.filenames
+        file_count = len(filenames)
+        t0 = time.time()
+        if source.batch_sp_name:
+            _log(tag, f'Paso 4/5: Ejecutando {source.batch_sp_name} para {file_count} archivos...')
+            t0_sp = time.time()
+            params = {"ArchivosJson": json.dumps(filenames)}
+            if batch.run_id is not None:
+                params["RunID"] = batch.run_id
+            batch_sp_ok = sql.execute_sp(source.batch_sp_name, params)
+            self.metrics.stage_done(batch.timings, 'sp_batch', source.name, t0_sp)
+            if batch_sp_ok:
+                batch.sp_ok, batch.sp_err = file_count, 0
+                if batch.batch_id:
+                    self.journal.mark_sp_ok(batch.batch_id, filenames)
+            else:
+                # El SP por lote hace ROLLBACK completo: staging sigue intacto
+                _log(tag, '  WARN: SP por lote falló. Reintentando archivo por archivo...')
+                batch.sp_ok, batch.sp_err = self._execute_sp_per_file(
+                    tag, source, sql, filenames, batch.timings, batch.run_id, batch.batch_id)
+        else:
             _log(tag, f'Paso 4/5: Ejecutando {source.sp_name} para {file_count} archivos...')
-            t0 = time.time()
-            sp_ok = 0
-            sp_err = 0
-
-            for idx, fname in enumerate(moved_files, 1):
-                _log(tag, f'  SP [{idx}/{file_count}]: {fname}')
-                t0_sp = time.time()
-                if self.sql.execute_sp(source.sp_name, {"ArchivoActual": fname}):
-                    sp_ok += 1
-                    _log(tag, f'  SP [{idx}/{file_count}]: OK ({time.time()-t0_sp:.2f}s)')
-                else:
-                    sp_err += 1
-                    _log(tag, f'  SP [{idx}/{file_count}]: ERROR ({time.time()-t0_sp:.2f}s)')
+            batch.sp_ok, batch.sp_err = self._execute_sp_per_file(
+                tag, source, sql, filenames, batch.timings, batch.run_id, batch.batch_id)
 
-            _log(tag, f'  SP Resumen: {sp_ok} OK, {sp_err} errores en {time.time()-t0:.2f}s')
+        _log(tag, f'  SP Resumen: {batch.sp_ok} OK, {batch.sp_err} errores en {time.time()-t0:.2f}s')
+        if batch.sp_err and batch.run_id is not None:
+            # Sin TRUNCATE del lote siguiente: las filas de los SP fallidos se borran acá
+            sql.delete_run(source.staging_tables, batch.run_id)
 
-            # PASO 5: Registrar en state + archivar
-            _log(tag, 'Paso 5/5: Registrar estado + archivar...')
-            self.state.mark_batch_processed(source.name, moved_files)
-            source.file_client.archive_processed(moved_files)
+    def _finish_batch(self, batch: '_Batch'):
+        """Paso 5: registrar estado, confirmar catálogo, archivar y cerrar métricas."""
+        source, tag, filenames = batch.source, batch.tag, batch.filenames
+        _log(tag, 'Paso 5/5: Registrar estado + archivar...')
+        self.state.mark_batch_processed(source.name, filenames)
+        if batch.hashes and batch.parse_names:
+            if batch.sp_err:
+                _log(tag, f'  WARN: {batch.sp_err} SP con error; lote no queda vigente en catálogo')
+            elif not batch.catalog_ok:
+                _log(tag, '  WARN: copia al catálogo incompleta; lote no queda vigente en catálogo')
+            else:
+                self.catalog.confirm(source.name, batch.parse_names)
+            self.catalog.maintain()
+        t0 = time.time()
+        source.file_client.archive_processed(filenames)
+        self.metrics.stage_done(batch.timings, 'archive', source.name, t0)
+        if batch.batch_id:
+            self.journal.finish([batch.batch_id])
 
-            # Actualizar stats
-            self.stats[source.name]['batches'] += 1
-            self.stats[source.name]['files'] += file_count
-            self.stats[source.name]['rows'] += total_rows
-            self.stats[source.name]['errors'] += sp_err
+        # Actualizar stats
+        self._add_stats(source.name, batches=1, files=len(filenames),
+                        rows=batch.total_rows, errors=batch.sp_err)
+        self._record_batch(batch, 'ok', sp_ok=batch.sp_ok, sp_err=batch.sp_err,
+                           replayed=len(batch.replay_names),
+                           rejects=batch.rejects.num_rows if batch.rejects is not None else 0)
 
-            _log(tag, f'Lote completado: {file_count} archivos, {total_rows} filas')
-            return True
+        _log(tag, f'Lote completado: {len(filenames)} archivos, {batch.total_rows} filas')
 
-        except Exception as e:
-            _log(tag, f'ERROR NO CONTROLADO: {e}')
-            _log(tag, f'  Traceback: {traceback.format_exc()}')
-            # Devolver archivos a origen
-            source.file_client.cleanup_processing()
-            self.stats[source.name]['errors'] += 1
-            return False
+    def _fail_batch(self, batch: '_Batch', status: str, error: Exception = None):
+        """Aborta un lote: limpia _processing/, cuenta el error y cierra métricas."""
+        if error is not None:
+            _log(batch.tag, f'ERROR NO CONTROLADO: {error}')
+            _log(batch.tag, f'  Traceback: {traceback.format_exc()}')
+        batch.tables = {}
+        batch.readers_done.set()
+        if batch.run_id is not None and batch.sql is not None:
+            batch.sql.delete_run(batch.source.staging_tables, batch.run_id)
+        batch.source.file_client.cleanup_processing()
+        if batch.batch_id:
+            self.journal.finish([batch.batch_id])
+        self._add_stats(batch.source.name, errors=1)
+        if error is not None:
+            self._record_batch(batch, status, error=str(error))
+        else:
+            self._record_batch(batch, status)
+
+    def _record_batch(self, batch: '_Batch', status: str, **extra):
+        """Cierra las métricas del lote: etapa 'total', gauges y registro JSONL."""
+        source = batch.source
+        total = self.metrics.stage_done(batch.timings, 'total', source.name, batch.t0)
+        rows = batch.total_rows
+        rows_per_s = rows / total if total > 0 else 0.0
+        if status == 'ok':
+            self.metrics.set('rows_per_second', source.name, round(rows_per_s, 1))
+            self.metrics.set('last_batch_timestamp_seconds', source.name, int(time.time()))
+        if self.batcher is not None:
+            sql_s = sum(batch.timings.get(k, 0.0) for k in ('truncate', 'insert', 'sp_batch', 'sp_file'))
+            limit = self.batcher.observe(source.name, len(batch.filenames), rows, sql_s,
+                                         ok=status == 'ok' and not batch.sp_err,
+                                         capped=batch.capped)
+            self.metrics.set('batch_limit_files', source.name, limit)
+            backlog = source.file_client.backlog
+            if backlog and batch.filenames:
+                eta = backlog * total / len(batch.filenames)
+                self.metrics.set('backlog_eta_seconds', source.name, round(eta, 1))
+                _log(batch.tag, f'  Backlog: {backlog} archivos, próximo lote ≤ {limit} '
+                                f'(~{eta:.0f}s al ritmo de este lote)')
+            else:
+                self.metrics.set('backlog_eta_seconds', source.name, 0)
+        self.metrics.record_batch(
+            source.name, status=status, files=len(batch.filenames), rows=rows,
+            rows_per_s=round(rows_per_s, 1), backlog=source.file_client.backlog,
+            stages={k: round(v, 4) for k, v in batch.timings.items()}, **extra)
+
+    @staticmethod
+    @contextmanager
+    def _set_aside(processing_dir: str, filenames: list):
+        """Saca temporalmente archivos de _processing/ (a _processing/_catalogo/)
+        para que batch_* no los lea; al salir vuelven a su lugar."""
+        if not filenames:
+            yield
+            return
+        aside_dir = os.path.join(processing_dir, '_catalogo')
+        os.makedirs(aside_dir, exist_ok=True)
+        moved = []
+        try:
+            for fname in filenames:
+                os.replace(os.path.join(processing_dir, fname), os.path.join(aside_dir, fname))
+                moved.append(fname)
+            yield
+        finally:
+            for fname in moved:
+                os.replace(os.path.join(aside_dir, fname), os.path.join(processing_dir, fname))
+
+    def _execute_sp_per_file(self, tag: str, source: DataSource, sql: SqlRepository,
+                             filenames: list, timings: dict = None,
+                             run_id: int = None, batch_id: str = None) -> tuple:
+        """Ejecuta el SP por archivo en orden (secuencial para evitar deadlocks).
+
+        Con batch_id cada COMMIT queda en el journal apenas termina su SP.
+
+        Returns:
+            (sp_ok, sp_err)
+        """
+        file_count = len(filenames)
+        sp_ok = 0
+        sp_err = 0
+        for idx, fname in enumerate(filenames, 1):
+            _log(tag, f'  SP [{idx}/{file_count}]: {fname}')
+            t0_sp = time.time()
+            params = {"ArchivoActual": fname}
+            if run_id is not None:
+                params["RunID"] = run_id
+            ok = sql.execute_sp(source.sp_name, params)
+            self.metrics.stage_done(timings if timings is not None else {}, 'sp_file',
+                                    source.name, t0_sp)
+            if ok:
+                sp_ok += 1
+                if batch_id:
+                    self.journal.mark_sp_ok(batch_id, [fname])
+                _log(tag, f'  SP [{idx}/{file_count}]: OK ({time.time()-t0_sp:.2f}s)')
+            else:
+                sp_err += 1
+                _log(tag, f'  SP [{idx}/{file_count}]: ERROR ({time.time()-t0_sp:.2f}s)')
+        return sp_ok, sp_err
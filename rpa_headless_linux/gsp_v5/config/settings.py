@@ -90,7 +90,38 @@ class Settings(BaseSettings):
     # ── Playwright ────────────────────────────
     playwright_headless: bool = Field(True, alias="PLAYWRIGHT_HEADLESS")
     playwright_timeout: int = Field(60000, alias="PLAYWRIGHT_TIMEOUT")
-    playwright_slow_mo: int = Field(100, alias="PLAYWRIGHT_SLOW_MO")
+    playwright_slow_mo: int = Field(0, alias="PLAYWRIGHT_SLOW_MO")  # condition waits instead of per-action delay
+    # Warm Chromium per worker process, recycled after N orders or RSS (MB).
+    # Off until its rollout (False = fresh browser per order)
+    browser_pool_enabled: bool = Field(False, alias="BROWSER_POOL_ENABLED")
+    browser_pool_max_uses: int = Field(50, alias="BROWSER_POOL_MAX_USES")
+    browser_pool_max_rss_mb: int = Field(1500, alias="BROWSER_POOL_MAX_RSS_MB")
+    # Reuse the supervisor's authenticated storage_state across orders.
+    # Off until its rollout (False = log in for every order)
+    gsp_session_cache_enabled: bool = Field(False, alias="GSP_SESSION_CACHE_ENABLED")
+    # local = one session per worker process (solo pool: one order at a time per session).
+    # redis = one session shared by every worker: UNSAFE until GSP is verified to keep the
+    # impersonated consultora per tab, not per server session; requires the encryption key.
+    gsp_session_cache_backend: str = Field("local", alias="GSP_SESSION_CACHE_BACKEND")  # local | redis
+    gsp_session_encryption_key: str = Field("", alias="GSP_SESSION_ENCRYPTION_KEY")  # Fernet key (redis)
+    gsp_session_ttl: int = Field(1800, alias="GSP_SESSION_TTL")  # seconds
+    gsp_session_validate_timeout: int = Field(15000, alias="GSP_SESSION_VALIDATE_TIMEOUT")  # ms
+    gsp_session_wait_seconds: int = Field(45, alias="GSP_SESSION_WAIT_SECONDS")
+    # Orders per process_order_chunk task (1 = one task per order)
+    gsp_order_chunk_size: int = Field(1, alias="GSP_ORDER_CHUNK_SIZE")
+    # page.route policy: abort unused resources / trackers, cache JS+CSS on disk.
+    # Off until its rollout (False = no request interception)
+    gsp_block_resources: bool = Field(False, alias="GSP_BLOCK_RESOURCES")
+    gsp_blocked_resource_types: str = Field("image,media,font", alias="GSP_BLOCKED_RESOURCE_TYPES")
+    gsp_blocked_domains: str = Field(
+        "google-analytics.com,googletagmanager.com,doubleclick.net,googleadservices.com,"
+        "googlesyndication.com,facebook.net,connect.facebook.com,hotjar.com,hotjar.io,clarity.ms,"
+        "bat.bing.com,newrelic.com,nr-data.net,segment.io,segment.com,mixpanel.com,fullstory.com,"
+        "optimizely.com,criteo.com,tiktok.com,onesignal.com",
+        alias="GSP_BLOCKED_DOMAINS",
+    )
+    gsp_static_cache_dir: str = Field("/app/static_cache", alias="GSP_STATIC_CACHE_DIR")  # "" = off
+    gsp_static_cache_max_mb: int = Field(200, alias="GSP_STATIC_CACHE_MAX_MB")
     screenshot_on_error: bool = Field(True, alias="SCREENSHOT_ON_ERROR")
     screenshot_dir: Path = Field(Path("/app/screenshots"), alias="SCREENSHOT_DIR")
 
@@ -0,0 +1,245 @@
+# ──────────────────────────────────────────────
+# Browser Pool  –  Warm Chromium per worker process
+# ──────────────────────────────────────────────
+#
+# Launching Playwright + Chromium costs several seconds per order. The pool
+# keeps one Chromium per worker process (launched at worker start) and each
+# GSPBot only opens a fresh BrowserContext on it, so cookies / storage are
+# never shared between orders.
+#
+# The browser is recycled after `max_uses` orders or when the RSS of the
+# worker's child processes (Playwright driver + Chromium) exceeds
+# `max_rss_mb`. A disconnected browser is dropped and relaunched on the next
+# acquire. Hits, misses and launch times are logged and exposed via stats().
+#
+# Playwright's sync API is bound to the thread that started it: the pool is
+# meant for one task at a time per process (Celery solo / prefork).
+# ──────────────────────────────────────────────
+from __future__ import annotations
+
+import os
+import signal
+import time
+from typing import Optional
+
+from playwright.sync_api import sync_playwright, Browser
+
+from config.settings import get_settings
+from shared.logging_config import get_logger
+
+logger = get_logger("browser_pool")
+
+CHROME_ARGS = [
+    "--no-sandbox",
+    "--disable-setuid-sandbox",
+    "--disable-dev-shm-usage",
+    "--disable-gpu",
+    "--disable-http2",
+    "--disable-quic",
+    "--disable-blink-features=AutomationControlled",
+    "--dns-prefetch-disable",
+    "--disable-features=IsolateOrigins,site-per-process",
+    "--disable-site-isolation-trials",
+    "--ignore-certificate-errors",
+]
+
+
+def start_playwright():
+    """Start the Playwright driver, with a 30s guard against a hung subprocess."""
+    def _alarm_handler(signum, frame):
+        raise TimeoutError("sync_playwright().start() did not respond within 30s")
+
+    old_handler = signal.signal(signal.SIGALRM, _alarm_handler)
+    signal.alarm(30)
+    try:
+        return sync_playwright().start()
+    finally:
+        signal.alarm(0)
+        signal.signal(signal.SIGALRM, old_handler)
+
+
+def launch_chromium(pw, worker_id: str) -> Browser:
+    """Launch Chromium with the GSP flags (and the corporate proxy if configured)."""
+    settings = get_settings()
+    chrome_args = list(CHROME_ARGS)
+
+    # Proxy support: use corporate proxy if configured in env
+    proxy_url = os.environ.get("HTTPS_PROXY") or os.environ.get("https_proxy") or os.environ.get("HTTP_PROXY") or os.environ.get("http_proxy")
+    pw_proxy = None
+    if proxy_url:
+        logger.info("proxy_detected", proxy=proxy_url, worker=worker_id)
+        pw_proxy = {"server": proxy_url}
+    else:
+        # Only disable proxy when we know there isn't one
+        chrome_args.append("--no-proxy-server")
+
+    return pw.chromium.launch(
+        headless=settings.playwright_headless,
+        slow_mo=settings.playwright_slow_mo,
+        args=chrome_args,
+        proxy=pw_proxy,
+        timeout=60000,  # Hard 60s limit — raises if Chromium doesn't start
+    )
+
+
+def _children_rss_mb() -> float:
+    """RSS (MB) of every descendant of this process, read from /proc (Linux only)."""
+    parents = {}
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat") as f:
+                # pid (comm) state ppid ... — comm may contain spaces
+                parents[int(entry)] = int(f.read().rsplit(")", 1)[1].split()[1])
+        except (OSError, IndexError, ValueError):
+            continue
+
+    descendants, frontier = set(), {os.getpid()}
+    while frontier:
+        frontier = {pid for pid, ppid in parents.items() if ppid in frontier} - descendants
+        descendants |= frontier
+
+    page_size = os.sysconf("SC_PAGE_SIZE")
+    total = 0
+    for pid in descendants:
+        try:
+            with open(f"/proc/{pid}/statm") as f:
+                total += int(f.read().split()[1]) * page_size
+        except (OSError, IndexError, ValueError):
+            continue
+    return total / (1024 * 1024)
+
+
+class BrowserPool:
+    """One warm Chromium per worker process; hands out the browser for new contexts."""
+
+    def __init__(self, max_uses: int = 50, max_rss_mb: int = 1500):
+        self.max_uses = max(1, max_uses)
+        self.max_rss_mb = max_rss_mb
+        self._pw = None
+        self._browser: Optional[Browser] = None
+        self._uses = 0
+        self._stats = {
+            "hits": 0,
+            "misses": 0,
+            "launches": 0,
+            "recycles": 0,
+            "last_launch_seconds": 0.0,
+            "total_launch_seconds": 0.0,
+        }
+
+    def warm_up(self, worker_id: str | None = None) -> None:
+        """Launch the browser ahead of the first task (worker start)."""
+        if self._browser is None:
+            try:
+                self._launch(worker_id or f"worker-{os.getpid()}")
+            except Exception as e:
+                # Non-fatal: the first acquire() retries the launch
+                logger.warning("browser_pool_warmup_failed", error=str(e))
+
+    def acquire(self, worker_id: str) -> Browser:
+        """Return the warm browser (hit) or launch a new one (miss)."""
+        if self._browser is not None and not self._browser.is_connected():
+            logger.warning("browser_pool_disconnected", worker=worker_id)
+            self._shutdown_browser()
+
+        if self._browser is not None:
+            self._stats["hits"] += 1
+            logger.info("browser_pool_hit", worker=worker_id, uses=self._uses)
+        else:
+            self._stats["misses"] += 1
+            self._launch(worker_id)
+            logger.info("browser_pool_miss", worker=worker_id,
+                        launch_seconds=self._stats["last_launch_seconds"])
+        self._uses += 1
+        return self._browser
+
+    def release(self, worker_id: str) -> None:
+        """End of one order: recycle the browser if it hit max_uses or the RSS limit."""
+        if self._browser is None:
+            return
+        if not self._browser.is_connected():
+            self._shutdown_browser()
+            return
+
+        reason = None
+        if self._uses >= self.max_uses:
+            reason = f"max_uses={self.max_uses}"
+        elif self.max_rss_mb:
+            rss = _children_rss_mb()
+            if rss > self.max_rss_mb:
+                reason = f"rss={rss:.0f}MB>{self.max_rss_mb}MB"
+        if reason:
+            self._stats["recycles"] += 1
+            logger.info("browser_pool_recycle", worker=worker_id, reason=reason, uses=self._uses)
+            self._shutdown_browser()
+
+    def stats(self) -> dict:
+        """Hit/miss counters and launch times for this worker process."""
+        stats = dict(self._stats)
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = round(stats["hits"] / lookups, 3) if lookups else 0.0
+        stats["uses"] = self._uses
+        stats["browser_alive"] = self._browser is not None
+        return stats
+
+    def shutdown(self) -> None:
+        """Close the browser and the Playwright driver (worker shutdown)."""
+        self._shutdown_browser()
+
+    # ── Internals ─────────────────────────────
+
+    def _launch(self, worker_id: str) -> None:
+        t0 = time.time()
+        logger.info("launching_browser", headless=get_settings().playwright_headless,
+                    worker=worker_id, pooled=True)
+        self._pw = start_playwright()
+        try:
+            self._browser = launch_chromium(self._pw, worker_id)
+        except Exception:
+            self._pw.stop()
+            self._pw = None
+            raise
+        self._uses = 0
+        elapsed = round(time.time() - t0, 2)
+        self._stats["launches"] += 1
+        self._stats["last_launch_seconds"] = elapsed
+        self._stats["total_launch_seconds"] = round(self._stats["total_launch_seconds"] + elapsed, 2)
+        logger.info("browser_pool_launched", worker=worker_id, launch_seconds=elapsed)
+
+    def _shutdown_browser(self) -> None:
+        try:
+            if self._browser is not None:
+                self._browser.close()
+            if self._pw is not None:
+                self._pw.stop()
+        except Exception as e:
+            logger.warning("browser_close_error", error=str(e))
+        self._browser = None
+        self._pw = None
+        self._uses = 0
+
+
+# ── Per-process singleton ─────────────────────
+
+_pool: Optional[BrowserPool] = None
+
+
+def get_browser_pool() -> Optional[BrowserPool]:
+    """Pool of this worker process (created on first use); None if disabled."""
+    global _pool
+    settings = get_settings()
+    if not settings.browser_pool_enabled:
+        return None
+    if _pool is None:
+        _pool = BrowserPool(max_uses=settings.browser_pool_max_uses,
+                            max_rss_mb=settings.browser_pool_max_rss_mb)
+    return _pool
+
+
+def shutdown_browser_pool() -> None:
+    global _pool
+    if _pool is not None:
+        _pool.shutdown()
+        _pool = None
@@ -4,7 +4,7 @@
 from __future__ import annotations
 
 from celery import Celery
-from celery.signals import worker_init, worker_process_init
+from celery.signals import worker_init, worker_process_init, worker_process_shutdown, worker_ready, worker_shutdown
 
 from config.settings import get_settings
 from shared.logging_config import setup_logging
@@ -46,6 +46,7 @@ app.conf.update(
     # Routing
     task_routes={
         "worker.tasks.process_order": {"queue": "orders"},
+        "worker.tasks.process_order_chunk": {"queue": "orders"},
         "worker.tasks.process_batch": {"queue": "batches"},
         "worker.tasks.health_check": {"queue": "default"},
     },
@@ -82,3 +83,28 @@ def on_worker_process_init(**kwargs):
     # Import here to avoid circular imports at module import time
     from shared.database import dispose_engine
     dispose_engine()
+    # Prefork child: launch Chromium after the fork, never in the parent
+    _warm_browser_pool()
+
+
+@worker_ready.connect
+def on_worker_ready(sender=None, **kwargs):
+    """Solo pool runs tasks in the main process (no worker_process_init): warm up here."""
+    pool = getattr(sender, "pool", None)
+    if pool is not None and type(pool).__module__ == "celery.concurrency.solo":
+        _warm_browser_pool()
+
+
+@worker_process_shutdown.connect
+@worker_shutdown.connect
+def on_worker_shutdown(**kwargs):
+    """Close the pooled browser so no Chromium is left orphaned."""
+    from worker.browser_pool import shutdown_browser_pool
+    shutdown_browser_pool()
+
+
+def _warm_browser_pool() -> None:
+    from worker.browser_pool import get_browser_pool
+    pool = get_browser_pool()
+    if pool is not None:
+        pool.warm_up()
@@ -9,7 +9,6 @@
 from __future__ import annotations
 
 import os
-import signal
 import time
 import urllib.request
 import ssl
@@ -19,10 +18,14 @@ from typing import Callable, Optional
 import pandas as pd
 import tempfile
 
-from playwright.sync_api import sync_playwright, Browser, BrowserContext, Page, TimeoutError as PWTimeout
+from playwright.sync_api import Browser, BrowserContext, Page, TimeoutError as PWTimeout
 
 from config.settings import get_settings
 from shared.logging_config import get_logger
+from worker.browser_pool import BrowserPool, start_playwright, launch_chromium
+from worker.session_cache import GSPSessionCache
+from worker.wait_profiler import WaitProfiler
+from worker.resource_router import ResourceRouter
 from shared.exceptions import (
     LoginError,
     ConsultoraSearchError,
@@ -36,6 +39,41 @@ from shared.exceptions import (
 
 logger = get_logger("gsp_bot")
 
+# Installs (once per document) a MutationObserver stamping the last DOM change,
+# and restarts the quiet window so a wait never returns before the page reacts.
+_DOM_QUIET_JS = """() => {
+    if (!window.__gspMutationObserver) {
+        window.__gspMutationObserver = new MutationObserver(() => {
+            window.__gspLastMutation = performance.now();
+        });
+        window.__gspMutationObserver.observe(document, {
+            childList: true, subtree: true, attributes: true, characterData: true,
+        });
+    }
+    window.__gspLastMutation = performance.now();
+}"""
+
+_CART_ROW_SELECTOR = "li.row-products__container"
+# Modals GSP shows once the bulk upload has been processed
+_UPLOAD_RESULT_TEXTS = ["indisponibles", "No podemos encontrar los Códigos", "hemos detectado inconsistencias"]
+_UPLOAD_BUDGET_MS = 15000  # The fixed server-processing sleep this flow replaced
+
+
+def _is_upload_response(response) -> bool:
+    """The bulk upload itself: multipart/form-data XHR/fetch POST/PUT to a Natura host.
+
+    Cart / telemetry calls fired around the upload are JSON, so requiring the
+    multipart body keeps them from being taken for the upload.
+    """
+    from urllib.parse import urlparse
+    request = response.request
+    return (
+        request.method in ("POST", "PUT")
+        and request.resource_type in ("xhr", "fetch")
+        and request.headers.get("content-type", "").lower().startswith("multipart/form-data")
+        and "natura" in urlparse(response.url).netloc
+    )
+
 
 class GSPBot:
     """Stateful Playwright bot that executes the full GSP order flow."""
@@ -48,12 +86,23 @@ class GSPBot:
         supervisor_password: str,
         order_id: int | None = None,
         worker_id: str | None = None,
+        browser_pool: BrowserPool | None = None,
+        session_cache: GSPSessionCache | None = None,
     ):
         self.settings = get_settings()
         self.supervisor_code = supervisor_code
         self.supervisor_password = supervisor_password
         self.order_id = order_id
         self.worker_id = worker_id or f"worker-{os.getpid()}"
+        # Warm browser shared across tasks of this worker process; each bot
+        # still gets its own BrowserContext (None = own Chromium per bot)
+        self._browser_pool = browser_pool
+        # Authenticated storage_state reused across orders (None = always log in)
+        self._session_cache = session_cache
+        self._session_entry: Optional[dict] = None
+        self._refreshing_session = False
+        # Post-login page (consultora selection); used to switch consultora
+        self._home_url: Optional[str] = None
 
         self._pw = None
         self._browser: Optional[Browser] = None
@@ -61,6 +110,9 @@ class GSPBot:
         self.page: Optional[Page] = None
 
         self._step_log: list[dict] = []
+        self._profiler = WaitProfiler()
+        # Aborts images/fonts/trackers and serves JS/CSS from disk (None = off)
+        self._router = ResourceRouter.from_settings()
         self.progress_callback: Optional[Callable] = None
         # Tracks whether the cart had items at arrival (audit count)
         self.cart_initial_count: int = 0
@@ -76,53 +128,22 @@ class GSPBot:
         return False
 
     def start_browser(self) -> None:
-        """Launch Chromium via Playwright."""
-        logger.info("launching_browser", headless=self.settings.playwright_headless, worker=self.worker_id)
-
-        # Guard: timeout if Playwright server subprocess hangs on start
-        def _alarm_handler(signum, frame):
-            raise TimeoutError("sync_playwright().start() did not respond within 30s")
-
-        old_handler = signal.signal(signal.SIGALRM, _alarm_handler)
-        signal.alarm(30)
-        try:
-            self._pw = sync_playwright().start()
-        finally:
-            signal.alarm(0)
-            signal.signal(signal.SIGALRM, old_handler)
-
-        # Build Chromium args dynamically
-        chrome_args = [
-            "--no-sandbox",
-            "--disable-setuid-sandbox",
-            "--disable-dev-shm-usage",
-            "--disable-gpu",
-            "--disable-http2",
-            "--disable-quic",
-            "--disable-blink-features=AutomationControlled",
-            "--dns-prefetch-disable",
-            "--disable-features=IsolateOrigins,site-per-process",
-            "--disable-site-isolation-trials",
-            "--ignore-certificate-errors",
-        ]
-
-        # Proxy support: use corporate proxy if configured in env
-        proxy_url = os.environ.get("HTTPS_PROXY") or os.environ.get("https_proxy") or os.environ.get("HTTP_PROXY") or os.environ.get("http_proxy")
-        pw_proxy = None
-        if proxy_url:
-            logger.info("proxy_detected", proxy=proxy_url, worker=self.worker_id)
-            pw_proxy = {"server": proxy_url}
+        """Open a fresh BrowserContext on the pooled browser, or launch Chromium."""
+        if self._browser_pool is not None:
+            self._browser = self._browser_pool.acquire(self.worker_id)
         else:
-            # Only disable proxy when we know there isn't one
-            chrome_args.append("--no-proxy-server")
-
-        self._browser = self._pw.chromium.launch(
-            headless=self.settings.playwright_headless,
-            slow_mo=self.settings.playwright_slow_mo,
-            args=chrome_args,
-            proxy=pw_proxy,
-            timeout=60000,  # Hard 60s limit — raises if Chromium doesn't start
-        )
+            logger.info("launching_browser", headless=self.settings.playwright_headless, worker=self.worker_id)
+            self._pw = start_playwright()
+            self._browser = launch_chromium(self._pw, self.worker_id)
+
+        if self._session_cache is not None:
+            self._session_entry = self._session_cache.get()
+        self._open_context(self._session_entry["state"] if self._session_entry else None)
+        logger.info("browser_ready", worker=self.worker_id, order_id=self.order_id,
+                    cached_session=self._session_entry is not None)
+
+    def _open_context(self, storage_state: dict | None = None) -> None:
+        """Create the BrowserContext + page (optionally seeded with a storage_state)."""
         # Anti-detection headers used in troubleshooting runs
         extra_headers = {
             "sec-ch-ua": '"Chromium";v="121", "Not_A Brand";v="8"',
@@ -137,8 +158,12 @@ class GSPBot:
             user_agent="Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/121.0.0.0 Safari/537.36",
             extra_http_headers=extra_headers,
             ignore_https_errors=True,
+            storage_state=storage_state,
         )
 
+        if self._router is not None:
+            self._router.install(self._context)
+
         # Hide automation flag to reduce bot detection
         try:
             self._context.add_init_script("Object.defineProperty(navigator, 'webdriver', {get: () => false});")
@@ -147,19 +172,39 @@ class GSPBot:
             logger.info("add_init_script_failed", worker=self.worker_id)
         self._context.set_default_timeout(self.settings.playwright_timeout)
         self.page = self._context.new_page()
-        logger.info("browser_ready", worker=self.worker_id, order_id=self.order_id)
+
+    def _reset_context(self, storage_state: dict | None = None) -> None:
+        """Replace the current context (drops any stale cookies / localStorage)."""
+        try:
+            self._context.close()
+        except Exception as e:
+            logger.warning("browser_close_error", error=str(e))
+        self._open_context(storage_state)
 
     def close(self) -> None:
-        """Clean up browser resources."""
+        """Clean up browser resources (pooled browser stays up for the next task)."""
         try:
             if self._context:
                 self._context.close()
-            if self._browser:
-                self._browser.close()
-            if self._pw:
-                self._pw.stop()
         except Exception as e:
             logger.warning("browser_close_error", error=str(e))
+        if self._session_cache is not None:
+            self._session_cache.release_refresh()
+        try:
+            if self._browser_pool is not None:
+                if self._browser:
+                    # Recycles the browser on max uses / RSS or if it died
+                    self._browser_pool.release(self.worker_id)
+            else:
+                if self._browser:
+                    self._browser.close()
+                if self._pw:
+                    self._pw.stop()
+        except Exception as e:
+            logger.warning("browser_close_error", error=str(e))
+        self._context = None
+        self._browser = None
+        self._pw = None
 
     # ── Helpers ───────────────────────────────
 
@@ -175,6 +220,7 @@ class GSPBot:
             "worker_id": self.worker_id,
         }
         self._step_log.append(entry)
+        self._profiler.step(step)
         log_fn = getattr(logger, level.lower(), logger.info)
         log_fn(message, **{k: v for k, v in entry.items() if k not in ("message", "level")})
 
@@ -188,6 +234,93 @@ class GSPBot:
     def get_step_log(self) -> list[dict]:
         return list(self._step_log)
 
+    def _log_wait_profile(self) -> None:
+        """Append the wait-vs-act breakdown per step to the step log."""
+        profile = self._profiler.summary()
+        total = sum(p["total_s"] for p in profile.values())
+        waiting = sum(p["wait_s"] for p in profile.values())
+        top = ", ".join(f"{s} {p['total_s']}s (wait {p['wait_s']}s)" for s, p in list(profile.items())[:3])
+        pct = round(100 * waiting / total) if total else 0
+        self._log_step("wait_profile", f"Time {total:.1f}s, waiting {waiting:.1f}s ({pct}%). Slowest: {top}",
+                       details={"steps": profile})
+
+    def _log_network_stats(self) -> None:
+        """Append the request-routing counters (blocked, cache, bytes saved) to the step log."""
+        if self._router is None:
+            return
+        stats = self._router.stats
+        blocked = sum(stats["blocked"].values())
+        from_disk = stats["cache_hits"] + stats["cache_revalidated"]
+        self._log_step("network", f"Blocked {blocked} requests {stats['blocked']}, "
+                                  f"{from_disk} static files from disk cache, "
+                                  f"{stats['bytes_saved'] / 1024:.0f} KB saved",
+                       details=dict(stats))
+
+    # ── Condition waits ───────────────────────
+    # Each returns False on timeout instead of raising: callers continue as
+    # they did after the fixed sleeps these replace (timeout = old sleep).
+
+    def _wait_dom_quiet(self, step: str, quiet_ms: int = 500, timeout: int = 5000, label: str = "dom_quiet") -> bool:
+        """Wait until the DOM has had no mutations for quiet_ms."""
+        with self._profiler.waiting(step, label):
+            try:
+                self.page.evaluate(_DOM_QUIET_JS)
+                self.page.wait_for_function(
+                    "q => performance.now() - window.__gspLastMutation >= q",
+                    arg=quiet_ms, timeout=timeout, polling=100,
+                )
+                return True
+            except Exception:
+                # Navigation in flight (context destroyed) or never quiet
+                try:
+                    self.page.wait_for_load_state("domcontentloaded", timeout=timeout)
+                except Exception:
+                    pass
+                return False
+
+    def _wait_state(self, step: str, selector: str, state: str = "visible",
+                    timeout: int = 5000, label: str | None = None) -> bool:
+        """Wait for the first match of `selector` to reach `state`."""
+        with self._profiler.waiting(step, label or f"{state}:{selector[:40]}"):
+            try:
+                self.page.locator(selector).first.wait_for(state=state, timeout=timeout)
+                return True
+            except Exception:
+                return False
+
+    def _wait_cart_rows_at_most(self, step: str, max_rows: int, timeout: int = 5000,
+                                label: str = "cart_rows") -> bool:
+        """Wait until the cart shows at most `max_rows` product rows."""
+        with self._profiler.waiting(step, label):
+            try:
+                self.page.wait_for_function(
+                    "([sel, n]) => document.querySelectorAll(sel).length <= n",
+                    arg=[_CART_ROW_SELECTOR, max_rows], timeout=timeout, polling=100,
+                )
+                return True
+            except Exception:
+                return False
+
+    def _wait_upload_outcome(self, step: str, rows_before: int, timeout: int,
+                             label: str = "upload_outcome") -> bool:
+        """Wait for an upload result modal or new cart rows (the upload was processed)."""
+        with self._profiler.waiting(step, label):
+            try:
+                self.page.wait_for_function(
+                    """([sel, n, texts]) => document.querySelectorAll(sel).length > n
+                        || texts.some(t => (document.body.innerText || '').includes(t))""",
+                    arg=[_CART_ROW_SELECTOR, rows_before, _UPLOAD_RESULT_TEXTS],
+                    timeout=timeout, polling=250,
+                )
+                return True
+            except Exception:
+                return False
+
+    def _pause(self, step: str, ms: int, label: str = "backoff") -> None:
+        """Deliberate delay (retry backoff), accounted as waiting."""
+        with self._profiler.waiting(step, label):
+            self.page.wait_for_timeout(ms)
+
     def _preflight_check(self, url: str, step: str = "preflight") -> None:
         """Verify network connectivity from the container before Playwright navigates.
 
@@ -316,8 +449,25 @@ class GSPBot:
     # ── STEP 1: Login ─────────────────────────
 
     def login(self) -> None:
-        """Navigate to GSP login and authenticate as supervisor."""
+        """Navigate to GSP login and authenticate as supervisor (or reuse a cached session)."""
         step = "login"
+        if self._session_cache is not None:
+            if self._session_entry is not None and self._resume_session(step):
+                return
+            self._refreshing_session = self._session_cache.acquire_refresh()
+            if not self._refreshing_session:
+                # Another worker is logging in right now: reuse its session
+                self._log_step(step, "Session refresh in progress on another worker; waiting")
+                stale_at = self._session_entry["saved_at"] if self._session_entry else 0.0
+                entry = self._session_cache.wait_for_refresh(
+                    stale_at, timeout=self.settings.gsp_session_wait_seconds,
+                )
+                if entry is not None:
+                    self._session_entry = entry
+                    self._reset_context(entry["state"])
+                    if self._resume_session(step):
+                        return
+
         self._log_step(step, "Navigating to login page")
 
         # ── Pre-flight: verify network connectivity from container ──
@@ -345,7 +495,7 @@ class GSPBot:
                         step=step,
                         details=f"screenshot={ss}",
                     )
-                self.page.wait_for_timeout(3000)  # wait 3s before retry
+                self._pause(step, 3000)  # wait 3s before retry
 
         # Select "Código" from the combobox
         self._log_step(step, "Selecting 'Código' from login type dropdown")
@@ -383,6 +533,55 @@ class GSPBot:
             )
 
         self._log_step(step, "Login successful ✓")
+        self._home_url = self.page.url
+
+        # Only the worker holding the refresh lock publishes the new session
+        if self._refreshing_session:
+            try:
+                self._session_entry = self._session_cache.put(self._context.storage_state(), self.page.url)
+            except Exception as e:
+                self._log_step(step, f"Could not cache session: {e}", level="WARNING")
+            self._session_cache.release_refresh()
+            self._refreshing_session = False
+
+    def _resume_session(self, step: str) -> bool:
+        """Open the cached post-login URL and check the session is still valid."""
+        entry = self._session_entry
+        age = int(time.time() - entry["saved_at"])
+        self._log_step(step, f"Reusing cached GSP session (age {age}s)")
+        try:
+            self.page.goto(entry["url"], wait_until="domcontentloaded", timeout=self.settings.playwright_timeout)
+            self.page.wait_for_selector(
+                'label[for="otherCn"]', state="visible", timeout=self.settings.gsp_session_validate_timeout,
+            )
+        except Exception as e:
+            self._log_step(step, f"Cached session rejected, falling back to full login: {e}", level="WARNING")
+            self._session_cache.invalidate(entry)
+            self._session_entry = None
+            self._reset_context()
+            return False
+        self._log_step(step, "Login skipped: cached session valid ✓", details={"session_age_s": age})
+        self._home_url = self.page.url
+        return True
+
+    def return_to_consultora_selection(self) -> None:
+        """Back to the post-login page to switch consultora without logging in again."""
+        step = "switch_consultora"
+        self._log_step(step, "Returning to consultora selection")
+        if self._home_url:
+            try:
+                self.page.goto(self._home_url, wait_until="domcontentloaded", timeout=self.settings.playwright_timeout)
+                self.page.wait_for_selector(
+                    'label[for="otherCn"]', state="visible", timeout=self.settings.gsp_session_validate_timeout,
+                )
+                self._log_step(step, "Back at consultora selection ✓")
+                return
+            except Exception as e:
+                self._log_step(step, f"Consultora selection not reachable: {e}", level="WARNING")
+
+        # Fresh context (cached session if any) and log in again
+        self._reset_context(self._session_entry["state"] if self._session_entry else None)
+        self.login()
 
     # ── STEP 2: Select "Para otra Consultora" ─
 
@@ -532,8 +731,8 @@ class GSPBot:
             self._log_step(step, "Waiting for product grid to confirm load...")
             self.page.wait_for_selector('div[data-testid="cards-list"]', state="visible", timeout=60000)
             self.page.wait_for_selector('div[data-testid="cards-list"] >> div[data-testid^="card-"]', state="visible", timeout=30000)
-            # Stabilization pause as in reference script
-            self.page.wait_for_timeout(2000)
+            # Stabilization: grid finished rendering
+            self._wait_dom_quiet(step, quiet_ms=500, timeout=2000, label="grid_render")
 
             # Now open the cart (use button selector from reference)
             self._log_step(step, "Opening cart")
@@ -1069,7 +1268,6 @@ class GSPBot:
         self._log_step(step, "Clicked Vaciar carrito, waiting for Eliminar confirmation...")
 
         # ── Wait for and click the "Eliminar" confirmation button ──
-        self.page.wait_for_timeout(1500)
         eliminar_clicked = False
         for sel in [
             'button:has(span:has-text("Eliminar"))',
@@ -1077,7 +1275,8 @@ class GSPBot:
         ]:
             try:
                 loc = self.page.locator(sel)
-                loc.first.wait_for(state='visible', timeout=8000)
+                if not self._wait_state(step, sel, timeout=8000, label="eliminar_dialog"):
+                    continue
                 if loc.count() > 0 and loc.first.is_visible():
                     try:
                         loc.first.click(timeout=5000)
@@ -1105,7 +1304,8 @@ class GSPBot:
         if not eliminar_clicked:
             self._log_step(step, "Eliminar confirmation not found; cart may have cleared without dialog", level="WARNING")
 
-        self.page.wait_for_timeout(3000)
+        # Rows gone = server confirmed the clear
+        self._wait_cart_rows_at_most(step, 0, timeout=3000, label="vaciar_rows_gone")
         return True
 
     def _delete_items_one_by_one(self, step: str) -> int:
@@ -1122,13 +1322,15 @@ class GSPBot:
                 break
 
             try:
+                rows_before = self._count_cart_items()
                 btn = del_btns.first
                 btn.scroll_into_view_if_needed(timeout=3000)
                 btn.click(timeout=5000)
                 self._log_step(step, f"Clicked delete button for item {removed + 1}")
 
                 # Handle confirmation dialog if it appears
-                self.page.wait_for_timeout(1500)
+                self._wait_state(step, 'button:has-text("Eliminar"), button:has-text("Confirmar")',
+                                 timeout=1500, label="delete_confirm")
                 for confirm_text in ["Eliminar", "Confirmar", "Sí", "OK"]:
                     try:
                         confirm_btn = self.page.locator(f'button:has-text("{confirm_text}")')
@@ -1139,7 +1341,7 @@ class GSPBot:
                     except Exception:
                         continue
 
-                self.page.wait_for_timeout(2000)
+                self._wait_cart_rows_at_most(step, rows_before - 1, timeout=2000, label="row_removed")
                 removed += 1
             except Exception as e:
                 self._log_step(step, f"Failed to delete item: {e}", level="WARNING")
@@ -1185,12 +1387,14 @@ class GSPBot:
                         # Click the trash button on this row
                         del_btn = row.locator('div.row-products__delete button')
                         if del_btn.count() > 0:
+                            rows_before = rows.count()
                             del_btn.first.scroll_into_view_if_needed(timeout=3000)
                             del_btn.first.click(timeout=5000)
                             self._log_step(step, f"Clicked delete for extra product {code}")
 
                             # Handle confirmation dialog
-                            self.page.wait_for_timeout(1500)
+                            self._wait_state(step, 'button:has-text("Eliminar"), button:has-text("Confirmar")',
+                                             timeout=1500, label="delete_confirm")
                             for confirm_text in ["Eliminar", "Confirmar", "Sí", "OK"]:
                                 try:
                                     cb = self.page.locator(f'button:has-text("{confirm_text}")')
@@ -1200,7 +1404,7 @@ class GSPBot:
                                 except Exception:
                                     continue
 
-                            self.page.wait_for_timeout(2000)
+                            self._wait_cart_rows_at_most(step, rows_before - 1, timeout=2000, label="row_removed")
                             removed += 1
                             found = True
                             break
@@ -1247,14 +1451,16 @@ class GSPBot:
                     if loc.count() > 0 and loc.first.is_visible(timeout=3000):
                         loc.first.click(timeout=5000)
                         self._log_step(step, f"Dismissed stock dialog via '{sel}'")
-                        self.page.wait_for_timeout(1500)
+                        self._wait_state(step, 'div[role="dialog"]', state="hidden", timeout=1500,
+                                         label="stock_dialog_closed")
                         return True
                 except Exception:
                     continue
 
             # Fallback: Escape key
             self.page.keyboard.press("Escape")
-            self.page.wait_for_timeout(1500)
+            self._wait_state(step, 'div[role="dialog"]', state="hidden", timeout=1500,
+                             label="stock_dialog_closed")
             return True
         except Exception:
             return False
@@ -1301,17 +1507,9 @@ class GSPBot:
 
             # 2. Wait for Agregar button to become enabled (product loads)
             agregar_btn = None
-            for wait_tick in range(20):  # 20 × 500ms = 10s max
-                try:
-                    loc = self.page.locator(
-                        'button.MuiButton-containedPrimary:not(.Mui-disabled):has-text("Agregar")'
-                    )
-                    if loc.count() > 0 and loc.first.is_visible(timeout=500):
-                        agregar_btn = loc.first
-                        break
-                except Exception:
-                    pass
-                self.page.wait_for_timeout(500)
+            enabled_sel = 'button.MuiButton-containedPrimary:not(.Mui-disabled):has-text("Agregar")'
+            if self._wait_state(step, enabled_sel, timeout=10000, label="agregar_enabled"):
+                agregar_btn = self.page.locator(enabled_sel).first
 
             if not agregar_btn:
                 # Fallback: try broader selector
@@ -1347,7 +1545,8 @@ class GSPBot:
             # 4. Click Agregar to add product to cart
             agregar_btn.click(timeout=5000)
             self._log_step(step, f"Clicked Agregar for {product_code}")
-            self.page.wait_for_timeout(3000)
+            # Cart row or stock dialog rendered
+            self._wait_dom_quiet(step, quiet_ms=750, timeout=3000, label="agregar_render")
 
             # 5. Check for stock limit dialog
             if self._dismiss_stock_dialog(step):
@@ -1377,7 +1576,7 @@ class GSPBot:
         Returns number of items removed.
         """
         self._log_step(step, "Waiting for cart content to render...")
-        self.page.wait_for_timeout(2000)
+        self._wait_dom_quiet(step, quiet_ms=750, timeout=2000, label="cart_render")
 
         initial_count = self._count_cart_items()
 
@@ -1387,7 +1586,7 @@ class GSPBot:
                 vaciar_check = self.page.locator('button:has-text("Vaciar carrito")')
                 if vaciar_check.count() > 0 and vaciar_check.first.is_visible(timeout=3000):
                     self._log_step(step, "'Vaciar carrito' visible but no item rows — waiting longer")
-                    self.page.wait_for_timeout(3000)
+                    self._wait_state(step, _CART_ROW_SELECTOR, state="attached", timeout=3000, label="cart_rows")
                     initial_count = self._count_cart_items()
             except Exception:
                 pass
@@ -1404,12 +1603,12 @@ class GSPBot:
         # ── Phase 1: Bulk clear via "Vaciar carrito" (up to 3 attempts) ──
         for attempt in range(1, 4):
             if self._try_vaciar_carrito(step, attempt):
-                self.page.wait_for_timeout(3000)
+                self._wait_cart_rows_at_most(step, 0, timeout=3000, label="vaciar_rows_gone")
                 remaining = self._count_cart_items()
 
-                # Double-check after brief wait
+                # Double-check once the cart stops re-rendering
                 if remaining == 0:
-                    self.page.wait_for_timeout(2000)
+                    self._wait_dom_quiet(step, quiet_ms=750, timeout=2000, label="vaciar_settle")
                     remaining = self._count_cart_items()
 
                 if remaining == 0:
@@ -1458,7 +1657,7 @@ class GSPBot:
             try:
                 current_url = self.page.url or "(blank)"
                 self._log_step(step, f"Attempt #{attempt+1}/{max_attempts} | URL: {current_url}")
-                self.page.wait_for_timeout(2500)
+                self._wait_dom_quiet(step, quiet_ms=750, timeout=2500, label="page_settle")
 
                 # If already at cart, audit & cleanup and return removed count
                 if self._is_at_cart():
@@ -1479,7 +1678,7 @@ class GSPBot:
                                     break
                             except Exception:
                                 continue
-                        self.page.wait_for_timeout(800)
+                        self._wait_state(step, '[data-testid="cycle-accept-button"]', timeout=800, label="cycle_accept")
                         try:
                             self.page.locator('[data-testid="cycle-accept-button"]').evaluate('el => el.click()')
                         except Exception:
@@ -1487,7 +1686,8 @@ class GSPBot:
                                 self.page.get_by_role('button', name='Aceptar').first.evaluate('el => el.click()')
                             except Exception:
                                 self._log_step(step, "Failed to accept cycle popup", level="WARNING")
-                        self.page.wait_for_timeout(3000)
+                        self._wait_state(step, 'input[data-testid="cycle-radio-button"]', state="hidden",
+                                         timeout=3000, label="cycle_closed")
                         continue
                 except Exception:
                     pass
@@ -1496,12 +1696,13 @@ class GSPBot:
                 try:
                     if self.page.locator('label[for="id_1"]').is_visible(timeout=2000):
                         self.page.locator('label[for="id_1"]').evaluate('el => el.click()')
-                        self.page.wait_for_timeout(800)
+                        self._wait_state(step, 'button:has-text("Aceptar")', timeout=800, label="venta_directa_accept")
                         try:
                             self.page.get_by_role('button', name='Aceptar').first.evaluate('el => el.click()')
                         except Exception:
                             pass
-                        self.page.wait_for_timeout(3000)
+                        self._wait_state(step, 'label[for="id_1"]', state="hidden", timeout=3000,
+                                         label="venta_directa_closed")
                         continue
                 except Exception:
                     pass
@@ -1511,7 +1712,8 @@ class GSPBot:
                     listo = self.page.locator('button:has-text("LISTO")')
                     if listo.count() > 0 and listo.first.is_visible(timeout=2000):
                         listo.first.evaluate('el => el.click()')
-                        self.page.wait_for_timeout(2000)
+                        self._wait_state(step, 'button:has-text("LISTO")', state="hidden", timeout=2000,
+                                         label="listo_closed")
                         continue
                 except Exception:
                     pass
@@ -1523,7 +1725,8 @@ class GSPBot:
                             self.page.get_by_role('button', name='Eliminar Pedido').evaluate('el => el.click()')
                         except Exception:
                             pass
-                        self.page.wait_for_timeout(3000)
+                        self._wait_state(step, 'text=Este pedido esta guardado', state="hidden", timeout=3000,
+                                         label="recover_order_closed")
                         continue
                 except Exception:
                     pass
@@ -1542,7 +1745,8 @@ class GSPBot:
                         cart_url = f"{parsed.scheme}://{parsed.netloc}/cart"
                         self._log_step(step, f"Navigating to cart URL: {cart_url}")
                         self.page.goto(cart_url, wait_until="domcontentloaded", timeout=30000)
-                        self.page.wait_for_timeout(4000)
+                        # Cart XHRs answered and rows rendered
+                        self._wait_dom_quiet(step, quiet_ms=1000, timeout=4000, label="cart_load")
                         if self._is_at_cart():
                             removed = self._cleanup_cart(step)
                             self._log_step(step, f"Arrived at cart and cleaned: removed {removed} items")
@@ -1555,7 +1759,7 @@ class GSPBot:
                     try:
                         self.page.reload()
                         self.page.wait_for_load_state("domcontentloaded", timeout=20000)
-                        self.page.wait_for_timeout(3000)
+                        self._wait_dom_quiet(step, quiet_ms=1000, timeout=3000, label="reload_settle")
                     except Exception:
                         pass
 
@@ -1590,7 +1794,6 @@ class GSPBot:
                     if loc.count() > 0 and loc.first.is_visible(timeout=3000):
                         self._log_step(step, f"Found import button via '{sel}'; clicking")
                         loc.first.click(timeout=5000)
-                        self.page.wait_for_timeout(2000)
                         import_clicked = True
                         break
                 except Exception:
@@ -1601,12 +1804,31 @@ class GSPBot:
             self._log_step(step, f"Import button search error (non-fatal): {import_err}", level="WARNING")
 
         try:
-            self.page.wait_for_selector('input[type="file"]', state="attached", timeout=60000)
-            # Use Playwright's set_input_files with selector
-            self.page.set_input_files('input[type="file"]', file_path)
-            self._log_step(step, "File injected into input; waiting for server processing...")
-            # Wait for server-side processing
-            self.page.wait_for_timeout(15000)
+            with self._profiler.waiting(step, "file_input"):
+                self.page.wait_for_selector('input[type="file"]', state="attached", timeout=60000)
+            # Use Playwright's set_input_files with selector. Instead of the old
+            # fixed 15s sleep: the multipart upload response, then a result
+            # modal or new cart rows, both within the same 15s budget
+            rows_before = self.page.locator(_CART_ROW_SELECTOR).count()
+            injected = False
+            t_inject = time.monotonic()
+            try:
+                with self._profiler.waiting(step, "upload_response"):
+                    with self.page.expect_response(_is_upload_response, timeout=_UPLOAD_BUDGET_MS) as upload_resp:
+                        self.page.set_input_files('input[type="file"]', file_path)
+                        injected = True
+                        self._log_step(step, "File injected into input; waiting for server processing...")
+                response = upload_resp.value
+                self._log_step(step, f"Upload response: HTTP {response.status} {response.url}")
+            except PWTimeout:
+                if not injected:
+                    raise
+                self._log_step(step, "No multipart upload response within 15s", level="WARNING")
+            remaining_ms = _UPLOAD_BUDGET_MS - int((time.monotonic() - t_inject) * 1000)
+            if not self._wait_upload_outcome(step, rows_before, timeout=max(remaining_ms, 1000)):
+                self._log_step(step, "No upload result modal or new cart rows within 15s; "
+                                     "continuing once the page settles", level="WARNING")
+            self._wait_dom_quiet(step, quiet_ms=1000, timeout=5000, label="upload_render")
 
             # Post-upload validations
             try:
@@ -1644,7 +1866,8 @@ class GSPBot:
                             self._log_step(step, "Could not click Entendido; trying Escape key", level="WARNING")
                             self.page.keyboard.press("Escape")
 
-                        self.page.wait_for_timeout(3000)
+                        self._wait_state(step, 'text=indisponibles', state="hidden", timeout=3000,
+                                         label="indisponibles_closed")
                 except Exception as e:
                     self._log_step(step, f"Indisponibles check error (non-fatal): {e}", level="WARNING")
 
@@ -1709,7 +1932,7 @@ class GSPBot:
         expected_codes = {p["product_code"]: p.get("quantity", 1) for p in expected_products}
 
         # Wait for cart to stabilize after modal dismissal
-        self.page.wait_for_timeout(3000)
+        self._wait_dom_quiet(step, quiet_ms=1000, timeout=3000, label="cart_stable")
 
         # ── 1. Scrape successfully added products from ul.bag-items ──
         added_codes = set()
@@ -1915,6 +2138,8 @@ class GSPBot:
             self._log_step("error", str(e), level="ERROR")
 
         result["duration_seconds"] = round(time.time() - start_time, 2)
+        self._log_wait_profile()
+        self._log_network_stats()
         result["step_log"] = self.get_step_log()
         return result
 
@@ -1924,6 +2149,7 @@ class GSPBot:
         self,
         consultora_code: str,
         products: list[dict],
+        switch_consultora: bool = False,
     ) -> dict:
         """
         Execute the complete order flow for one consultora.
@@ -1931,6 +2157,9 @@ class GSPBot:
         Args:
             consultora_code: The consultora code to search.
             products: List of dicts with keys 'product_code' and 'quantity'.
+            switch_consultora: Already logged in by a previous order of the
+                same chunk: go back to the consultora selection instead of
+                logging in.
 
         Returns:
             dict with results and step log.
@@ -1947,10 +2176,18 @@ class GSPBot:
             "duration_seconds": 0,
             "step_log": [],
         }
+        # Step log is per order (a chunk runs several orders on one bot)
+        self._step_log = []
+        self._profiler.reset()
+        if self._router is not None:
+            self._router.reset_stats()
 
         try:
-            # Step 1: Login
-            self.login()
+            # Step 1: Login (or back to the selection page within a chunk)
+            if switch_consultora:
+                self.return_to_consultora_selection()
+            else:
+                self.login()
             result["current_step"] = "login_ok"
 
             # Step 2: Select "Para otra Consultora"
@@ -2140,5 +2377,7 @@ class GSPBot:
             self._log_step("error", str(e), level="ERROR")
 
         result["duration_seconds"] = round(time.time() - start_time, 2)
+        self._log_wait_profile()
+        self._log_network_stats()
         result["step_log"] = self.get_step_log()
         return result
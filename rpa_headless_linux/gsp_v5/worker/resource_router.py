@@ -0,0 +1,254 @@
+# ──────────────────────────────────────────────
+# Resource Router  –  page.route policy for GSP pages
+# ──────────────────────────────────────────────
+#
+# Every GSP navigation pulls images, fonts, analytics and third-party tags
+# the bot never uses, through the corporate proxy. The router installs one
+# context.route("**/*") handler that:
+#
+#   - aborts configured resource types (image, media, font by default) and
+#     requests to known tracker domains;
+#   - serves GET scripts/stylesheets from a disk cache shared by the
+#     workers (keyed by URL; fresh entries per Cache-Control max-age are
+#     served directly, stale ones are revalidated with If-None-Match and a
+#     304 is answered from disk). The cache is pruned back under
+#     GSP_STATIC_CACHE_MAX_MB whenever this process's running total passes
+#     it, and at least every few minutes for the other workers' writes;
+#   - lets everything else through untouched (XHR, documents, uploads).
+#
+# Stylesheets are never blocked: visibility checks depend on CSS.
+# Counters (blocked per type, cache hits, bytes served from disk) are per
+# order and end up in the order's step log.
+# ──────────────────────────────────────────────
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import re
+import time
+from pathlib import Path
+from urllib.parse import urlparse
+
+from config.settings import get_settings
+from shared.logging_config import get_logger
+
+logger = get_logger("resource_router")
+
+_CACHEABLE_TYPES = {"script", "stylesheet"}
+_MAX_ENTRY_BYTES = 5 * 1024 * 1024
+# Response headers replayed when serving from disk
+_KEEP_HEADERS = {"content-type", "etag", "last-modified", "cache-control"}
+# Pruning: rescan at least this often (other workers write to the same dir),
+# and cut down to this fraction of the limit so puts do not prune every time
+_PRUNE_INTERVAL_S = 300
+_PRUNE_TARGET = 0.8
+
+
+def _split(value: str) -> set[str]:
+    return {v.strip().lower() for v in value.split(",") if v.strip()}
+
+
+def _max_age(cache_control: str) -> int:
+    if "no-store" in cache_control or "no-cache" in cache_control:
+        return 0
+    match = re.search(r"max-age=(\d+)", cache_control)
+    return int(match.group(1)) if match else 0
+
+
+class StaticCache:
+    """JS/CSS bodies on disk: <sha256(url)>.body + .json (headers, etag, expiry, size)."""
+
+    def __init__(self, directory: str, max_mb: int):
+        self.dir = Path(directory)
+        self.dir.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_mb * 1024 * 1024
+        self._bytes = 0  # Running total since the last scan
+        self._prune()
+
+    def _paths(self, url: str) -> tuple[Path, Path]:
+        key = hashlib.sha256(url.encode("utf-8")).hexdigest()
+        return self.dir / f"{key}.json", self.dir / f"{key}.body"
+
+    def get(self, url: str) -> tuple[dict, bytes] | None:
+        meta_path, body_path = self._paths(url)
+        try:
+            meta = json.loads(meta_path.read_text(encoding="utf-8"))
+            body = body_path.read_bytes()
+        except (OSError, ValueError):
+            return None
+        # Body replaced by another process after this metadata was written
+        if meta.get("size") != len(body):
+            return None
+        return meta, body
+
+    def put(self, url: str, headers: dict, body: bytes) -> bool:
+        etag = headers.get("etag")
+        max_age = _max_age(headers.get("cache-control", ""))
+        if len(body) > _MAX_ENTRY_BYTES or (not etag and not max_age):
+            return False  # Neither revalidatable nor fresh: not worth keeping
+        meta = {
+            "url": url,
+            "etag": etag,
+            "expires_at": time.time() + max_age,
+            "size": len(body),
+            "headers": {k: v for k, v in headers.items() if k in _KEEP_HEADERS},
+        }
+        meta_path, body_path = self._paths(url)
+        # Atomic replace, body first and metadata last: several worker
+        # processes share the directory and get() checks the body size
+        for path, data in ((body_path, body), (meta_path, json.dumps(meta).encode("utf-8"))):
+            tmp = path.with_suffix(f"{path.suffix}.{os.getpid()}.tmp")
+            tmp.write_bytes(data)
+            os.replace(tmp, path)
+        self._bytes += len(body)
+        if self._bytes > self.max_bytes or time.monotonic() - self._last_prune > _PRUNE_INTERVAL_S:
+            self._prune()
+        return True
+
+    def touch(self, url: str, headers: dict) -> None:
+        """Revalidated (304): extend freshness with the new Cache-Control."""
+        cached = self.get(url)
+        if cached is not None:
+            meta, body = cached
+            merged = {**meta["headers"], **{k: v for k, v in headers.items() if k in _KEEP_HEADERS}}
+            self.put(url, merged, body)
+
+    def _prune(self) -> None:
+        """Drop least recently written entries until the cache fits _PRUNE_TARGET of max_bytes."""
+        self._last_prune = time.monotonic()
+        try:
+            entries = []
+            for body in self.dir.glob("*.body"):
+                try:
+                    stat = body.stat()
+                except FileNotFoundError:
+                    continue  # Pruned by another worker meanwhile
+                entries.append((stat.st_mtime, stat.st_size, body))
+            total = sum(size for _, size, _ in entries)
+            if total > self.max_bytes:
+                target = self.max_bytes * _PRUNE_TARGET
+                for _, size, body in sorted(entries, key=lambda e: e[0]):
+                    if total <= target:
+                        break
+                    body.with_suffix(".json").unlink(missing_ok=True)
+                    body.unlink(missing_ok=True)
+                    total -= size
+                logger.info("static_cache_pruned", kept_mb=round(total / (1024 * 1024), 1))
+            self._bytes = total
+        except OSError as e:
+            logger.warning("static_cache_prune_failed", error=str(e))
+
+
+# ── Per-process cache (shared by every router of this worker) ──
+
+_caches: dict[str, StaticCache] = {}
+
+
+def _get_static_cache(directory: str, max_mb: int) -> StaticCache:
+    if directory not in _caches:
+        _caches[directory] = StaticCache(directory, max_mb)
+    return _caches[directory]
+
+
+class ResourceRouter:
+    """Route handler for one BrowserContext, with per-order counters."""
+
+    def __init__(self, blocked_types: set[str], blocked_domains: set[str],
+                 cache: StaticCache | None = None):
+        self.blocked_types = blocked_types - {"stylesheet", "document", "xhr", "fetch"}
+        self.blocked_domains = blocked_domains
+        self.cache = cache
+        self.reset_stats()
+
+    @classmethod
+    def from_settings(cls) -> ResourceRouter | None:
+        """Router per GSP_BLOCK_* / GSP_STATIC_CACHE_* settings; None if disabled."""
+        settings = get_settings()
+        if not settings.gsp_block_resources:
+            return None
+        cache = None
+        if settings.gsp_static_cache_dir:
+            try:
+                cache = _get_static_cache(settings.gsp_static_cache_dir, settings.gsp_static_cache_max_mb)
+            except OSError as e:
+                logger.warning("static_cache_disabled", error=str(e))
+        return cls(
+            _split(settings.gsp_blocked_resource_types),
+            _split(settings.gsp_blocked_domains),
+            cache,
+        )
+
+    def reset_stats(self) -> None:
+        self.stats = {
+            "blocked": {},          # resource type / "tracker" -> count
+            "cache_hits": 0,        # served from disk without a request
+            "cache_revalidated": 0, # 304 answered from disk
+            "cache_stored": 0,
+            "bytes_saved": 0,       # bodies served from disk
+        }
+
+    def install(self, context) -> None:
+        context.route("**/*", self._handle)
+
+    def _is_tracker(self, host: str) -> bool:
+        return any(host == d or host.endswith("." + d) for d in self.blocked_domains)
+
+    def _handle(self, route, request) -> None:
+        try:
+            rtype = request.resource_type
+            host = (urlparse(request.url).hostname or "").lower()
+
+            tracker = self._is_tracker(host)
+            if tracker or rtype in self.blocked_types:
+                label = "tracker" if tracker else rtype
+                self.stats["blocked"][label] = self.stats["blocked"].get(label, 0) + 1
+                route.abort("blockedbyclient")
+                return
+
+            if self.cache is not None and rtype in _CACHEABLE_TYPES and request.method == "GET":
+                self._serve_static(route, request)
+                return
+
+            route.fallback()
+        except Exception as e:
+            # Never break the page because of the router
+            logger.warning("resource_route_error", url=request.url[:200], error=str(e))
+            try:
+                route.fallback()
+            except Exception:
+                pass
+
+    def _serve_static(self, route, request) -> None:
+        url = request.url
+        cached = self.cache.get(url)
+        if cached is not None:
+            meta, body = cached
+            if meta["expires_at"] > time.time():
+                self._fulfill_cached(route, meta, body)
+                self.stats["cache_hits"] += 1
+                return
+            if meta.get("etag"):
+                response = route.fetch(headers={**request.headers, "if-none-match": meta["etag"]})
+                if response.status == 304:
+                    self.cache.touch(url, response.headers)
+                    self._fulfill_cached(route, meta, body)
+                    self.stats["cache_revalidated"] += 1
+                    return
+                self._store_and_fulfill(route, url, response)
+                return
+
+        self._store_and_fulfill(route, url, route.fetch())
+
+    def _fulfill_cached(self, route, meta: dict, body: bytes) -> None:
+        route.fulfill(status=200, headers=meta["headers"], body=body)
+        self.stats["bytes_saved"] += len(body)
+
+    def _store_and_fulfill(self, route, url: str, response) -> None:
+        if response.status == 200:
+            body = response.body()
+            if self.cache.put(url, response.headers, body):
+                self.stats["cache_stored"] += 1
+            route.fulfill(response=response, body=body)
+        else:
+            route.fulfill(response=response)
@@ -0,0 +1,180 @@
+# ──────────────────────────────────────────────
+# GSP Session Cache  –  Reusable authenticated storage_state
+# ──────────────────────────────────────────────
+#
+# Every order used to log in as the same supervisor account. After a
+# successful login the bot stores the Playwright storage_state (cookies +
+# localStorage) and the post-login URL here; the next bot opens its
+# BrowserContext with that state and only checks that the post-login page
+# still renders, falling back to a full login when it does not.
+#
+# Backends:
+#   local – per worker process (in-memory, TTL). Default: with --pool=solo
+#           each session runs one order at a time, so the consultora picked
+#           via impersonation is never switched under another order.
+#   redis – shared by every worker (key per account, TTL). A Redis lock lets
+#           only one worker refresh an expired session at a time; the others
+#           wait briefly for the new state. Opt-in and UNSAFE until verified:
+#           if GSP keeps the impersonated consultora per server session,
+#           concurrent workers overwrite each other's consultora and orders
+#           land in the wrong cart. Entries hold the supervisor's auth
+#           cookies, so they are Fernet-encrypted with
+#           GSP_SESSION_ENCRYPTION_KEY (no key = local), and the Redis port
+#           must not be published on the host before enabling it.
+#
+# Also falls back to local when Redis is unreachable.
+# ──────────────────────────────────────────────
+from __future__ import annotations
+
+import hashlib
+import json
+import time
+from typing import Optional
+
+import redis
+from cryptography.fernet import Fernet, InvalidToken
+
+from config.settings import get_settings
+from shared.logging_config import get_logger
+
+logger = get_logger("session_cache")
+
+_KEY_PREFIX = "gsp:session"
+
+# Per-process fallback store: key -> (expires_at, entry)
+_local: dict[str, tuple[float, dict]] = {}
+_redis_client: Optional[redis.Redis] = None
+
+
+def _get_redis() -> redis.Redis:
+    global _redis_client
+    if _redis_client is None:
+        _redis_client = redis.Redis.from_url(
+            get_settings().redis_url, socket_timeout=3, socket_connect_timeout=3,
+        )
+    return _redis_client
+
+
+def _fernet(key: str):
+    """Fernet for Redis entries; None (local backend) without a valid key."""
+    if not key:
+        logger.warning("gsp_session_redis_requires_key", fallback="local")
+        return None
+    try:
+        return Fernet(key.encode("utf-8"))
+    except ValueError as e:
+        logger.warning("gsp_session_invalid_key", error=str(e), fallback="local")
+        return None
+
+
+class GSPSessionCache:
+    """Cached storage_state for one GSP account."""
+
+    def __init__(self, account: str, ttl: int, backend: str = "local", lock_ttl: int = 120,
+                 encryption_key: str = ""):
+        # Never put the account code itself in the key
+        digest = hashlib.sha256(account.encode("utf-8")).hexdigest()[:16]
+        self.key = f"{_KEY_PREFIX}:{digest}"
+        self.ttl = ttl
+        self.lock_ttl = lock_ttl
+        self._redis = None
+        self._fernet = None
+        self._lock = None
+        if backend == "redis":
+            self._fernet = _fernet(encryption_key)
+            if self._fernet is not None:
+                self._redis = _get_redis()
+
+    # ── Entries ───────────────────────────────
+
+    def get(self) -> Optional[dict]:
+        """Cached entry {state, url, saved_at} or None if missing / expired."""
+        if self._redis is not None:
+            try:
+                raw = self._redis.get(self.key)
+                return json.loads(self._fernet.decrypt(raw)) if raw else None
+            except InvalidToken:
+                return None  # Written with another key: treat as a miss
+            except (redis.RedisError, ValueError) as e:
+                self._degrade(e)
+        expires_at, entry = _local.get(self.key, (0.0, None))
+        return entry if expires_at > time.time() else None
+
+    def put(self, state: dict, url: str) -> dict:
+        """Store a fresh storage_state; returns the entry."""
+        entry = {"state": state, "url": url, "saved_at": time.time()}
+        _local[self.key] = (time.time() + self.ttl, entry)
+        if self._redis is not None:
+            try:
+                token = self._fernet.encrypt(json.dumps(entry).encode("utf-8"))
+                self._redis.set(self.key, token, ex=self.ttl)
+            except redis.RedisError as e:
+                self._degrade(e)
+        logger.info("gsp_session_saved", key=self.key, ttl=self.ttl)
+        return entry
+
+    def invalidate(self, entry: dict) -> None:
+        """Drop `entry` if it is still the cached one (a newer refresh is kept)."""
+        current = self.get()
+        if current is None or current.get("saved_at") != entry.get("saved_at"):
+            return
+        _local.pop(self.key, None)
+        if self._redis is not None:
+            try:
+                self._redis.delete(self.key)
+            except redis.RedisError as e:
+                self._degrade(e)
+        logger.info("gsp_session_invalidated", key=self.key)
+
+    def wait_for_refresh(self, newer_than: float, timeout: float) -> Optional[dict]:
+        """Poll until another worker stores an entry newer than `newer_than`."""
+        deadline = time.time() + timeout
+        while time.time() < deadline:
+            entry = self.get()
+            if entry is not None and entry.get("saved_at", 0) > newer_than:
+                return entry
+            time.sleep(1)
+        return None
+
+    # ── Refresh lock ──────────────────────────
+
+    def acquire_refresh(self) -> bool:
+        """Non-blocking: True if this worker may log in and store a new session."""
+        if self._redis is None:
+            return True
+        try:
+            lock = self._redis.lock(f"{self.key}:lock", timeout=self.lock_ttl)
+            if lock.acquire(blocking=False):
+                self._lock = lock
+                return True
+            return False
+        except redis.RedisError as e:
+            self._degrade(e)
+            return True
+
+    def release_refresh(self) -> None:
+        """Release the refresh lock if held (idempotent; expires on its own anyway)."""
+        if self._lock is None:
+            return
+        try:
+            self._lock.release()
+        except redis.RedisError:
+            pass
+        self._lock = None
+
+    def _degrade(self, error: Exception) -> None:
+        logger.warning("gsp_session_redis_unavailable", error=str(error), fallback="local")
+        self._redis = None
+
+
+def get_session_cache(account: str) -> Optional[GSPSessionCache]:
+    """Session cache for `account`; None if disabled."""
+    settings = get_settings()
+    if not settings.gsp_session_cache_enabled:
+        return None
+    return GSPSessionCache(
+        account,
+        ttl=settings.gsp_session_ttl,
+        backend=settings.gsp_session_cache_backend,
+        encryption_key=settings.gsp_session_encryption_key,
+    )
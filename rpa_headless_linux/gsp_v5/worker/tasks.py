@@ -10,7 +10,7 @@ from datetime import datetime, timezone
 from datetime import timedelta
 
 from celery import shared_task
-from celery.exceptions import Retry
+from celery.exceptions import Retry, SoftTimeLimitExceeded
 from celery.utils.log import get_task_logger
 from sqlalchemy.orm import Session
 
@@ -20,7 +20,9 @@ from shared.models import (
     Order, OrderProduct, OrderLog, Batch,
     OrderStatus, ProductStatus, BatchStatus,
 )
+from worker.browser_pool import get_browser_pool
 from worker.gsp_bot import GSPBot
+from worker.session_cache import get_session_cache
 
 task_logger = get_task_logger(__name__)
 settings = get_settings()
@@ -30,6 +32,7 @@ STEP_PROGRESS = {
     "starting": 0,
     "preflight": 5,
     "login": 15,
+    "switch_consultora": 15,
     "select_otra_consultora": 25,
     "search_consultora": 35,
     "confirm_consultora": 45,
@@ -101,6 +104,68 @@ def _update_batch_counters(db: Session, batch_id: int) -> None:
     db.commit()
 
 
+def _persist_bot_result(db: Session, order_id: int, products: list[OrderProduct], result: dict) -> None:
+    """Persist the bot step log and per-product statuses from cart verification."""
+    # Persist bot step log to DB
+    for log_entry in result.get("step_log", []):
+        _record_log(
+            db, order_id,
+            step=log_entry["step"],
+            message=log_entry["message"],
+            level=log_entry["level"],
+            details=log_entry.get("details"),
+        )
+
+    # Update product statuses from cart verification
+    added_codes = {a["product_code"] for a in result.get("products_added", [])}
+    failed_items = {f["product_code"]: f.get("error", "") for f in result.get("products_failed", [])}
+
+    # Build code → name mapping from bot results
+    product_names = {}
+    for item in result.get("products_added", []):
+        if item.get("name"):
+            product_names[item["product_code"]] = item["name"]
+    for item in result.get("products_failed", []):
+        if item.get("name"):
+            product_names[item["product_code"]] = item["name"]
+
+    _record_log(db, order_id, "verify_cart",
+                f"Cart verification: {len(added_codes)} in cart, {len(failed_items)} failed. "
+                f"Added: {sorted(added_codes)}, Failed: {sorted(failed_items.keys())}",
+                level="WARNING" if failed_items else "INFO",
+                details={
+                    "products_added": result.get("products_added", []),
+                    "products_failed": result.get("products_failed", []),
+                    "has_out_of_stock": result.get("has_out_of_stock", False),
+                })
+
+    for p in products:
+        # Persist product name scraped from cart DOM
+        if p.product_code in product_names:
+            p.product_name = product_names[p.product_code]
+
+        if p.product_code in added_codes:
+            p.status = ProductStatus.ADDED
+            p.added_at = datetime.now(timezone.utc)
+        elif p.product_code in failed_items:
+            error_reason = failed_items[p.product_code]
+            if error_reason == "out_of_stock":
+                p.status = ProductStatus.OUT_OF_STOCK
+                p.error_message = "Producto agotado / sin stock"
+            elif error_reason == "not_found_in_cart":
+                p.status = ProductStatus.NOT_FOUND
+                p.error_message = "Producto no encontrado en carrito después del upload"
+            else:
+                p.status = ProductStatus.FAILED
+                p.error_message = error_reason or "Unknown error"
+        else:
+            # Product was in the order but bot didn't find it anywhere
+            p.status = ProductStatus.FAILED
+            p.error_message = "No verificado — producto no detectado en carrito ni en agotados"
+
+    db.commit()  # Persist product status changes immediately
+
+
 # ── Main Order Task ──────────────────────────
 
 @shared_task(
@@ -164,6 +229,8 @@ def process_order(self, order_id: int) -> dict:
             supervisor_password=settings.gsp_password,
             order_id=order_id,
             worker_id=worker_id,
+            browser_pool=get_browser_pool(),
+            session_cache=get_session_cache(settings.gsp_user_code),
         ) as bot:
             # Wire up Celery progress tracking for Flower dashboard
             _last_pct = [0]
@@ -192,64 +259,7 @@ def process_order(self, order_id: int) -> dict:
                 products=product_list,
             )
 
-        # Persist bot step log to DB
-        for log_entry in result.get("step_log", []):
-            _record_log(
-                db, order_id,
-                step=log_entry["step"],
-                message=log_entry["message"],
-                level=log_entry["level"],
-                details=log_entry.get("details"),
-            )
-
-        # Update product statuses from cart verification
-        added_codes = {a["product_code"] for a in result.get("products_added", [])}
-        failed_items = {f["product_code"]: f.get("error", "") for f in result.get("products_failed", [])}
-
-        # Build code → name mapping from bot results
-        product_names = {}
-        for item in result.get("products_added", []):
-            if item.get("name"):
-                product_names[item["product_code"]] = item["name"]
-        for item in result.get("products_failed", []):
-            if item.get("name"):
-                product_names[item["product_code"]] = item["name"]
-
-        _record_log(db, order_id, "verify_cart",
-                    f"Cart verification: {len(added_codes)} in cart, {len(failed_items)} failed. "
-                    f"Added: {sorted(added_codes)}, Failed: {sorted(failed_items.keys())}",
-                    level="WARNING" if failed_items else "INFO",
-                    details={
-                        "products_added": result.get("products_added", []),
-                        "products_failed": result.get("products_failed", []),
-                        "has_out_of_stock": result.get("has_out_of_stock", False),
-                    })
-
-        for p in products:
-            # Persist product name scraped from cart DOM
-            if p.product_code in product_names:
-                p.product_name = product_names[p.product_code]
-
-            if p.product_code in added_codes:
-                p.status = ProductStatus.ADDED
-                p.added_at = datetime.now(timezone.utc)
-            elif p.product_code in failed_items:
-                error_reason = failed_items[p.product_code]
-                if error_reason == "out_of_stock":
-                    p.status = ProductStatus.OUT_OF_STOCK
-                    p.error_message = "Producto agotado / sin stock"
-                elif error_reason == "not_found_in_cart":
-                    p.status = ProductStatus.NOT_FOUND
-                    p.error_message = "Producto no encontrado en carrito después del upload"
-                else:
-                    p.status = ProductStatus.FAILED
-                    p.error_message = error_reason or "Unknown error"
-            else:
-                # Product was in the order but bot didn't find it anywhere
-                p.status = ProductStatus.FAILED
-                p.error_message = "No verificado — producto no detectado en carrito ni en agotados"
-
-        db.commit()  # Persist product status changes immediately
+        _persist_bot_result(db, order_id, products, result)
 
         # Final order status
         order.duration_seconds = result.get("duration_seconds", 0)
@@ -331,6 +341,189 @@ def process_order(self, order_id: int) -> dict:
         db.close()
 
 
+# ── Multi-Consultora Chunk Task ──────────────
+
+# Chunk orders never processed again on redelivery
+_CHUNK_DONE_STATUSES = (OrderStatus.COMPLETED, OrderStatus.FAILED, OrderStatus.CANCELLED)
+
+
+def _requeue_single(db: Session, order: Order, countdown: int = 0) -> None:
+    """Send one order of a chunk back to the single-order task."""
+    task = process_order.apply_async(args=[order.id], queue="orders", countdown=countdown)
+    order.celery_task_id = task.id
+    db.commit()
+
+
+@shared_task(
+    bind=True,
+    name="worker.tasks.process_order_chunk",
+    acks_late=True,
+    reject_on_worker_lost=True,
+    time_limit=600,       # Per order; the dispatcher scales it by chunk size
+    soft_time_limit=540,
+)
+def process_order_chunk(self, order_ids: list[int]) -> dict:
+    """
+    Process a run of orders in one browser session.
+
+    Logs in once, then per order: switch consultora → cart → upload → verify.
+    Each order keeps its own DB status: a failed order is retried on its own
+    via process_order (or marked FAILED) and the chunk moves on. Orders not
+    reached before the soft time limit are requeued one by one.
+
+    The task is acks_late: after a lost worker the whole chunk is redelivered,
+    so orders already finished or handed to their own task are skipped.
+    """
+    worker_id = f"{socket.gethostname()}-{self.request.id[:8]}"
+    db = _get_db()
+    summary = {"completed": [], "failed": [], "requeued": [], "skipped": []}
+    logged_in = False
+
+    try:
+        with GSPBot(
+            supervisor_code=settings.gsp_user_code,
+            supervisor_password=settings.gsp_password,
+            worker_id=worker_id,
+            browser_pool=get_browser_pool(),
+            session_cache=get_session_cache(settings.gsp_user_code),
+        ) as bot:
+            for position, order_id in enumerate(order_ids, start=1):
+                order = None
+                try:
+                    order = db.query(Order).filter(Order.id == order_id).first()
+                    if not order:
+                        task_logger.error(f"Order {order_id} not found in database")
+                        continue
+                    if (order.status in _CHUNK_DONE_STATUSES
+                            or order.celery_task_id not in (None, self.request.id)):
+                        # Redelivered chunk: finished, or requeued to its own task
+                        task_logger.info(f"Order {order_id} skipped in chunk "
+                                         f"(status={order.status.value}, task={order.celery_task_id})")
+                        summary["skipped"].append(order_id)
+                        continue
+
+                    order.worker_id = worker_id
+                    order.celery_task_id = self.request.id
+                    order.started_at = datetime.now(timezone.utc)
+                    _update_order_status(db, order, OrderStatus.IN_PROGRESS, step="starting")
+                    _record_log(db, order_id, "starting",
+                                f"Worker {worker_id} picked up order ({position}/{len(order_ids)} of chunk)")
+
+                    products = db.query(OrderProduct).filter(OrderProduct.order_id == order_id).all()
+                    product_list = [{"product_code": p.product_code, "quantity": p.quantity} for p in products]
+                    if not product_list:
+                        _update_order_status(db, order, OrderStatus.FAILED, step="validation", error="No products in order")
+                        _record_log(db, order_id, "validation", "Order has no products", level="ERROR")
+                        _update_batch_counters(db, order.batch_id)
+                        summary["failed"].append(order_id)
+                        continue
+
+                    def _on_progress(step: str, message: str, details: dict | None = None,
+                                     _order=order, _position=position):
+                        try:
+                            self.update_state(state="PROGRESS", meta={
+                                "step": step,
+                                "message": message,
+                                "percent": STEP_PROGRESS.get(step, 0),
+                                "order_id": _order.id,
+                                "consultora": _order.consultora_code,
+                                "worker_id": worker_id,
+                                "chunk_position": _position,
+                                "chunk_size": len(order_ids),
+                            })
+                        except Exception:
+                            pass  # Non-fatal
+
+                    bot.order_id = order_id
+                    bot.progress_callback = _on_progress
+                    result = bot.execute_order(
+                        consultora_code=order.consultora_code,
+                        products=product_list,
+                        switch_consultora=logged_in,
+                    )
+                    # current_step is only set once login went through
+                    logged_in = logged_in or "current_step" in result
+
+                    _persist_bot_result(db, order_id, products, result)
+                    order.duration_seconds = result.get("duration_seconds", 0)
+                    order.finished_at = datetime.now(timezone.utc)
+
+                    if result["success"]:
+                        _update_order_status(db, order, OrderStatus.COMPLETED, step="completed")
+                        _record_log(db, order_id, "completed",
+                                    f"Order completed successfully in {result['duration_seconds']}s")
+                        summary["completed"].append(order_id)
+                    else:
+                        error_msg = result.get("error") or "Products failed"
+                        error_step = result.get("error_step") or "unknown"
+                        if order.retry_count < order.max_retries and result.get("error"):
+                            # Retry this order on its own, outside the chunk
+                            order.retry_count += 1
+                            _update_order_status(db, order, OrderStatus.RETRYING, step=error_step,
+                                                 error=error_msg, screenshot=result.get("screenshot"))
+                            _record_log(db, order_id, "retrying",
+                                        f"Retry {order.retry_count}/{order.max_retries}: {error_msg}",
+                                        level="WARNING")
+                            _requeue_single(db, order, countdown=settings.celery_retry_delay * order.retry_count)
+                            summary["requeued"].append(order_id)
+                        else:
+                            _update_order_status(db, order, OrderStatus.FAILED, step=error_step,
+                                                 error=error_msg, screenshot=result.get("screenshot"))
+                            _record_log(db, order_id, "failed",
+                                        f"Order failed after {order.retry_count} retries: {error_msg}",
+                                        level="ERROR")
+                            summary["failed"].append(order_id)
+                    _update_batch_counters(db, order.batch_id)
+
+                except SoftTimeLimitExceeded:
+                    raise
+
+                except Exception as exc:
+                    # Isolate: this order is retried on its own (as process_order
+                    # does for an unexpected error) or fails; the chunk goes on
+                    task_logger.exception(f"Unexpected error processing order {order_id} in chunk")
+                    requeued = False
+                    try:
+                        db.rollback()
+                        if order and order.retry_count < order.max_retries:
+                            order.retry_count += 1
+                            _update_order_status(db, order, OrderStatus.RETRYING, step="unexpected_error", error=str(exc))
+                            _record_log(db, order_id, "retrying",
+                                        f"Retry {order.retry_count}/{order.max_retries}: {exc}",
+                                        level="WARNING")
+                            _requeue_single(db, order, countdown=60)
+                            requeued = True
+                        elif order:
+                            _update_order_status(db, order, OrderStatus.FAILED, step="unexpected_error", error=str(exc))
+                            _record_log(db, order_id, "unexpected_error", str(exc), level="ERROR")
+                            _update_batch_counters(db, order.batch_id)
+                    except Exception:
+                        pass
+                    summary["requeued" if requeued else "failed"].append(order_id)
+
+    except Exception as exc:
+        # Soft time limit or browser failure: the rest of the chunk goes back
+        # to the single-order task
+        done = {oid for key in ("completed", "failed", "requeued", "skipped") for oid in summary[key]}
+        pending = [oid for oid in order_ids if oid not in done]
+        task_logger.warning(f"Chunk interrupted ({type(exc).__name__}: {exc}): "
+                            f"requeueing {len(pending)} orders individually")
+        db.rollback()
+        for order in db.query(Order).filter(Order.id.in_(pending)).all():
+            _update_order_status(db, order, OrderStatus.QUEUED, step="chunk_requeued")
+            _requeue_single(db, order)
+            summary["requeued"].append(order.id)
+
+    finally:
+        db.close()
+
+    task_logger.info(
+        f"Chunk done: {len(summary['completed'])} completed, {len(summary['failed'])} failed, "
+        f"{len(summary['requeued'])} requeued"
+    )
+    return {"success": not summary["failed"], "order_ids": order_ids, **summary}
+
+
 # ── Batch Dispatch Task ──────────────────────
 
 @shared_task(
@@ -338,11 +531,15 @@ def process_order(self, order_id: int) -> dict:
     name="worker.tasks.process_batch",
     time_limit=3600,
 )
-def process_batch(self, batch_id: int) -> dict:
+def process_batch(self, batch_id: int, chunk_size: int | None = None) -> dict:
     """
     Dispatch all orders in a batch to the order processing queue.
     This is the 'master' task that fans out work to workers.
+
+    With chunk_size > 1 (default: GSP_ORDER_CHUNK_SIZE) orders are grouped
+    into process_order_chunk tasks that share one browser session.
     """
+    chunk_size = max(1, chunk_size or settings.gsp_order_chunk_size)
     db = _get_db()
 
     try:
@@ -365,22 +562,36 @@ def process_batch(self, batch_id: int) -> dict:
         task_logger.info(f"Dispatching {len(orders)} orders for batch {batch_id}")
 
         dispatched = 0
-        for order in orders:
-            order.status = OrderStatus.QUEUED
-            order.celery_task_id = None
+        chunks = 0
+        for start in range(0, len(orders), chunk_size):
+            chunk = orders[start:start + chunk_size]
+            for order in chunk:
+                order.status = OrderStatus.QUEUED
+                order.celery_task_id = None
             db.commit()
 
             # Send to the orders queue
-            task = process_order.apply_async(
-                args=[order.id],
-                queue="orders",
-            )
-            order.celery_task_id = task.id
+            if len(chunk) == 1:
+                task = process_order.apply_async(
+                    args=[chunk[0].id],
+                    queue="orders",
+                )
+            else:
+                task = process_order_chunk.apply_async(
+                    args=[[o.id for o in chunk]],
+                    queue="orders",
+                    # Time limits are per order
+                    time_limit=600 * len(chunk),
+                    soft_time_limit=540 * len(chunk),
+                )
+            for order in chunk:
+                order.celery_task_id = task.id
             db.commit()
-            dispatched += 1
+            dispatched += len(chunk)
+            chunks += 1
 
-        task_logger.info(f"Batch {batch_id}: dispatched {dispatched} orders")
-        return {"success": True, "batch_id": batch_id, "dispatched": dispatched}
+        task_logger.info(f"Batch {batch_id}: dispatched {dispatched} orders in {chunks} tasks (chunk size {chunk_size})")
+        return {"success": True, "batch_id": batch_id, "dispatched": dispatched, "tasks": chunks}
 
     except Exception as exc:
         task_logger.exception(f"Error dispatching batch {batch_id}")
@@ -398,10 +609,12 @@ def process_batch(self, batch_id: int) -> dict:
 @shared_task(name="worker.tasks.health_check")
 def health_check() -> dict:
     """Simple health check task to verify workers are alive."""
+    pool = get_browser_pool()
     return {
         "status": "ok",
         "hostname": socket.gethostname(),
         "timestamp": datetime.now(timezone.utc).isoformat(),
+        "browser_pool": pool.stats() if pool else None,
     }
 
 
@@ -435,6 +648,7 @@ def stress_test_login(self, attempt_number: int, total_attempts: int) -> dict:
             supervisor_password=settings.gsp_password,
             order_id=None,
             worker_id=worker_id,
+            browser_pool=get_browser_pool(),
         ) as bot:
             def _on_progress(step: str, message: str, details: dict | None = None):
                 try:
@@ -484,6 +698,7 @@ def stress_test_login(self, attempt_number: int, total_attempts: int) -> dict:
 EMPTY_CART_PROGRESS = {
     "starting": 0,
     "login": 15,
+    "switch_consultora": 15,
     "select_otra_consultora": 30,
     "search_consultora": 45,
     "confirm_consultora": 55,
@@ -528,6 +743,8 @@ def empty_cart(self, consultora_code: str, attempt_number: int = 1, total_attemp
             supervisor_password=settings.gsp_password,
             order_id=None,
             worker_id=worker_id,
+            browser_pool=get_browser_pool(),
+            session_cache=get_session_cache(settings.gsp_user_code),
         ) as bot:
             _last_pct = [0]
 
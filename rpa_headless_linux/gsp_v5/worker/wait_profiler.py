@@ -0,0 +1,67 @@
+# ──────────────────────────────────────────────
+# Wait Profiler  –  Time spent waiting vs acting per step
+# ──────────────────────────────────────────────
+#
+# GSPBot reports every step change through _log_step(); the profiler turns
+# that into wall time per step. Condition waits (selector state, network
+# response, DOM quiescence) run inside waiting(), so each step splits into
+# wait_s (synchronisation with GSP) and act_s (everything else), with the
+# wait broken down by label. The summary goes into the order's step log.
+# ──────────────────────────────────────────────
+from __future__ import annotations
+
+import time
+from contextlib import contextmanager
+
+
+class WaitProfiler:
+    """Per-step wall time and condition-wait time for one order."""
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self) -> None:
+        self._steps: dict[str, dict] = {}
+        self._current: str | None = None
+        self._since = time.monotonic()
+
+    def _entry(self, step: str) -> dict:
+        return self._steps.setdefault(step, {"total_s": 0.0, "wait_s": 0.0, "waits": {}})
+
+    def step(self, name: str) -> None:
+        """Mark `name` as the step in progress (closes the previous one)."""
+        if name == self._current:
+            return
+        now = time.monotonic()
+        if self._current is not None:
+            self._entry(self._current)["total_s"] += now - self._since
+        self._current = name
+        self._since = now
+
+    @contextmanager
+    def waiting(self, step: str, label: str):
+        """Account the enclosed block as waiting time of `step`."""
+        t0 = time.monotonic()
+        try:
+            yield
+        finally:
+            elapsed = time.monotonic() - t0
+            entry = self._entry(step)
+            entry["wait_s"] += elapsed
+            entry["waits"][label] = entry["waits"].get(label, 0.0) + elapsed
+
+    def summary(self) -> dict:
+        """{step: {total_s, wait_s, act_s, waits: {label: s}}}, slowest step first."""
+        now = time.monotonic()
+        out = {}
+        for step, entry in self._steps.items():
+            total = entry["total_s"] + (now - self._since if step == self._current else 0.0)
+            # Waits may run before the step's first log line: never below wait_s
+            total = max(total, entry["wait_s"])
+            out[step] = {
+                "total_s": round(total, 2),
+                "wait_s": round(entry["wait_s"], 2),
+                "act_s": round(total - entry["wait_s"], 2),
+                "waits": {k: round(v, 2) for k, v in sorted(entry["waits"].items(), key=lambda kv: -kv[1])},
+            }
+        return dict(sorted(out.items(), key=lambda kv: -kv[1]["total_s"]))